@@ -0,0 +1,262 @@
+#!/usr/bin/python
+##
+#
+# @file OFSBenchmarkMetrics.py
+#
+# @brief Turns the output of the benchmarks into metrics.
+#
+# Each parser takes the output of one benchmark and returns a dictionary
+# metric name -> (value,unit). The benchmark functions in OFSVFSBenchmarks return it with
+# their return code, e.g. return (rc,metrics). OFSTestNode.runOFSTest puts the metrics in
+# its test record and OFSResultsStore keeps them, so runs can be compared.
+#
+# Values that a benchmark could not measure (bonnie++ prints +++++ for operations that
+# were too fast) are left out.
+#
+
+import os
+import re
+import logging
+
+## @var IOZONE_COLUMNS
+# Operations of the iozone -a table after the file size and record size columns.
+IOZONE_COLUMNS = [
+    "write",
+    "rewrite",
+    "read",
+    "reread",
+    "random_read",
+    "random_write",
+    "backward_read",
+    "record_rewrite",
+    "stride_read",
+    "fwrite",
+    "frewrite",
+    "fread",
+    "freread"
+    ]
+
+## @var BONNIE_FIELDS
+# Fields of the bonnie++ 1.03 CSV line with their units. None is a field that is not a metric.
+BONNIE_FIELDS = [
+    (None,None),
+    (None,None),
+    ("putc","K/sec"),
+    ("putc_cpu","%CPU"),
+    ("put_block","K/sec"),
+    ("put_block_cpu","%CPU"),
+    ("rewrite","K/sec"),
+    ("rewrite_cpu","%CPU"),
+    ("getc","K/sec"),
+    ("getc_cpu","%CPU"),
+    ("get_block","K/sec"),
+    ("get_block_cpu","%CPU"),
+    ("seeks","/sec"),
+    ("seeks_cpu","%CPU"),
+    (None,None),
+    ("sequential_create","files/sec"),
+    ("sequential_create_cpu","%CPU"),
+    ("sequential_read","files/sec"),
+    ("sequential_read_cpu","%CPU"),
+    ("sequential_delete","files/sec"),
+    ("sequential_delete_cpu","%CPU"),
+    ("random_create","files/sec"),
+    ("random_create_cpu","%CPU"),
+    ("random_read","files/sec"),
+    ("random_read_cpu","%CPU"),
+    ("random_delete","files/sec"),
+    ("random_delete_cpu","%CPU")
+    ]
+
+##
+# @fn getStdout(output):
+#
+# @param output Output list of runSingleCommand
+#
+# @return Standard output of the command. In streaming mode, the whole spill file, not only the head and tail.
+
+def getStdout(output):
+    return readOutput(output,1,3)
+
+##
+# @fn getStderr(output):
+#
+# @param output Output list of runSingleCommand
+#
+# @return Standard error of the command. In streaming mode, the whole spill file.
+
+def getStderr(output):
+    return readOutput(output,2,4)
+
+##
+# @fn readOutput(output,index,spill_index):
+#
+# @param output Output list of runSingleCommand
+# @param index Index of the output window
+# @param spill_index Index of the spill file
+#
+# @return Contents of the spill file if there is one, the window otherwise.
+
+def readOutput(output,index,spill_index):
+    if len(output) > spill_index and output[spill_index] is not None and os.path.isfile(output[spill_index]):
+        try:
+            f = open(output[spill_index],'r')
+            try:
+                return f.read()
+            finally:
+                f.close()
+        except IOError:
+            logging.exception("Could not read %s" % output[spill_index])
+    if len(output) > index:
+        return output[index]
+    return ""
+
+##
+# @fn toNumber(text):
+#
+# @param text Number printed by a benchmark
+#
+# @return float, or None if text is not a number (e.g. +++++).
+
+def toNumber(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+##
+# @fn parseIozone(text):
+#
+# Reads the table of iozone -a. Each row is a file size and record size.
+#
+# @param text Output of iozone
+#
+# @return Metrics <operation>.<file size>k.<record size>k in KB/sec, e.g. write.524288k.4096k.
+
+def parseIozone(text):
+    metrics = {}
+    in_table = False
+    for line in text.splitlines():
+        fields = line.split()
+        if "reclen" in fields:
+            in_table = True
+            continue
+        if not in_table:
+            continue
+        if len(fields) < 3 or len([field for field in fields if not field.isdigit()]) > 0:
+            # the table ends with the first line that is not all numbers.
+            if len(metrics) > 0:
+                break
+            continue
+        (file_size,record_size) = (fields[0],fields[1])
+        for (operation,value) in zip(IOZONE_COLUMNS,fields[2:]):
+            metrics["%s.%sk.%sk" % (operation,file_size,record_size)] = (float(value),"KB/sec")
+    return metrics
+
+##
+# @fn parseBonnie(text):
+#
+# Reads the CSV line that bonnie++ 1.03 prints after its tables.
+#
+# @param text Output of bonnie++
+#
+# @return Metrics for block and character IO in K/sec, seeks in /sec, file creation, read and deletion in files/sec, each with its %CPU.
+
+def parseBonnie(text):
+    metrics = {}
+    csv_lines = [line.strip().split(",") for line in text.splitlines() if line.count(",") >= len(BONNIE_FIELDS) - 1]
+    if len(csv_lines) == 0:
+        return metrics
+    fields = csv_lines[-1]
+    for ((name,unit),field) in zip(BONNIE_FIELDS,fields):
+        if name is None:
+            continue
+        value = toNumber(field)
+        if value is not None:
+            metrics[name] = (value,unit)
+    return metrics
+
+##
+# @fn parseDbench(text):
+#
+# Reads the throughput line of dbench and, if dbench prints it (version 4), the latency
+# table of each operation.
+#
+# @param text Output of dbench
+#
+# @return Metrics throughput in MB/sec, procs, and <operation>.count, <operation>.avg_latency and <operation>.max_latency in ms.
+
+def parseDbench(text):
+    metrics = {}
+    in_table = False
+    for line in text.splitlines():
+        match = re.search(r"Throughput\s+([\d.]+)\s+MB/sec(?:.*?(\d+)\s+(?:procs|clients))?",line)
+        if match is not None:
+            metrics["throughput"] = (float(match.group(1)),"MB/sec")
+            if match.group(2) is not None:
+                metrics["procs"] = (float(match.group(2)),"procs")
+            continue
+        fields = line.split()
+        if len(fields) >= 4 and fields[0] == "Operation" and fields[1] == "Count":
+            in_table = True
+            continue
+        if in_table:
+            match = re.match(r"^\s*(\w+)\s+(\d+)\s+([\d.]+)\s+([\d.]+)\s*$",line)
+            if match is None:
+                if line.strip() != "" and not line.strip().startswith("-"):
+                    in_table = False
+                continue
+            operation = match.group(1)
+            metrics["%s.count" % operation] = (float(match.group(2)),"ops")
+            metrics["%s.avg_latency" % operation] = (float(match.group(3)),"ms")
+            metrics["%s.max_latency" % operation] = (float(match.group(4)),"ms")
+    return metrics
+
+##
+# @fn parseFdtree(text):
+#
+# Reads the rates fdtree prints at the end of each phase, e.g. "File creates per second = 123".
+#
+# @param text Output of fdtree.bash
+#
+# @return Metrics directory_creates, file_creates, file_removals and directory_removals per second, and file_create_kbytes in KB/sec.
+
+def parseFdtree(text):
+    metrics = {}
+    for line in text.splitlines():
+        match = re.match(r"^\s*(.+?)\s+per second\s*=\s*([\d.]+)",line)
+        if match is None:
+            continue
+        name = "_".join(match.group(1).lower().split())
+        if name == "kbytes":
+            # only the file create phase prints KBytes per second.
+            metrics["file_create_kbytes"] = (float(match.group(2)),"KB/sec")
+        elif name.endswith("creates"):
+            metrics[name] = (float(match.group(2)),"creates/sec")
+        else:
+            metrics[name] = (float(match.group(2)),"removals/sec")
+    return metrics
+
+##
+# @fn parseDd(text):
+#
+# Reads the summary dd prints to standard error, e.g.
+# "1073741824 bytes (1.1 GB) copied, 10.5 s, 102 MB/s".
+#
+# @param text Standard error of dd
+#
+# @return Metrics bytes, seconds and throughput in bytes/sec.
+
+def parseDd(text):
+    metrics = {}
+    for line in text.splitlines():
+        match = re.search(r"(\d+)\s+bytes\b.*?copied,\s+([\d.]+)\s*s",line)
+        if match is None:
+            continue
+        bytes = float(match.group(1))
+        seconds = float(match.group(2))
+        metrics["bytes"] = (bytes,"bytes")
+        metrics["seconds"] = (seconds,"s")
+        if seconds > 0:
+            metrics["throughput"] = (bytes / seconds,"bytes/sec")
+    return metrics
@@ -0,0 +1,193 @@
+#!/usr/bin/python
+##
+#
+# @file OFSBroadcast.py
+#
+# @brief Copies one tar stream from a source node to many nodes through a tree of relays.
+#
+# The source node packs the files into one tar archive and streams it to its children
+# over ssh. Every node runs RELAY_SCRIPT: it passes the stream on to its own children
+# while it unpacks it, so all hops of the tree copy at the same time. A fan-out of 1 is
+# a chain of nodes, a fan-out of k a k-ary tree. The stream can be compressed once at the
+# source and is unpacked on every node.
+#
+# Each relay prints one BROADCAST_TAG line with the bytes it received and how long it
+# took. The lines of all nodes come back to the source, so the hop bandwidth of every
+# node is known.
+#
+# OFSTestNetwork.broadcast() runs a broadcast.
+#
+
+import base64
+
+## @var BROADCAST_TAG
+# First word of the report line of each relay.
+BROADCAST_TAG = "OFSBROADCAST"
+
+## @var COMPRESSORS
+# Compression name -> command that compresses stdin at the source. RELAY_SCRIPT knows the matching decompressor.
+COMPRESSORS = {
+    "none" : "cat",
+    "gzip" : "gzip -1 -c",
+    "lz4" : "lz4 -1 -c",
+    "zstd" : "zstd -1 -c"
+    }
+
+## @var RELAY_SCRIPT
+# Relay. Arguments: this script (base64), the plan (base64), id of this node, directory to
+# unpack into, compression name, and "send" on the source, which only passes the stream
+# on. Plan lines are "parent child user@address ssh_key", the key "-" for none.
+RELAY_SCRIPT = r'''
+script="$1"
+plan="$2"
+me="$3"
+dest="$4"
+compression="$5"
+mode="$6"
+
+PATH=$PATH:/sbin:/usr/sbin:/bin:/usr/bin
+
+now() {
+    echo ${EPOCHREALTIME:-$(date +%s.%N)}
+}
+
+start=$(now)
+dir=$(mktemp -d /tmp/ofstest-broadcast.XXXXXX)
+case "$compression" in
+    gzip) decompress="gzip -dc" ;;
+    lz4) decompress="lz4 -dc" ;;
+    zstd) decompress="zstd -dc" ;;
+    *) decompress="cat" ;;
+esac
+
+# start the relay of each child. It reads the stream from its own fifo.
+echo "$plan" | base64 -d > $dir/plan
+fifos=""
+i=0
+while read parent child target key; do
+    [ "$parent" = "$me" ] || continue
+    keyopt=""
+    if [ "$key" != "-" ]; then
+        keyopt="-i $key"
+    fi
+    relay=/tmp/ofstest-relay.$$.$child.sh
+    mkfifo $dir/fifo$i
+    ssh $keyopt -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no -o BatchMode=yes "$target" \
+        "echo $script | base64 -d > $relay; bash $relay $script $plan $child $dest $compression; rc=\$?; rm -f $relay; exit \$rc" \
+        < $dir/fifo$i > $dir/out$i 2>&1 &
+    fifos="$fifos $dir/fifo$i"
+    i=$((i+1))
+done < $dir/plan
+
+# a child that fails must not stop the stream to the others.
+trap '' PIPE
+if [ "$mode" = "send" ]; then
+    tee $fifos | dd bs=65536 of=/dev/null 2> $dir/dd
+else
+    mkdir -p "$dest"
+    tee $fifos | dd bs=65536 2> $dir/dd | $decompress | tar -C "$dest" -xf -
+fi
+rc=$?
+end=$(now)
+
+wait
+bytes=$(awk '/bytes/ {print $1; exit}' $dir/dd)
+echo "OFSBROADCAST $me ${bytes:-0} $start $end $rc"
+cat $dir/out* 2>/dev/null
+rm -rf $dir
+exit $rc
+'''
+
+##
+# @fn getTree(number_nodes,fanout=2):
+#
+# @param number_nodes Number of nodes including the source, which is node 0.
+# @param fanout Children per node. 1 gives a chain.
+#
+# @return List of (parent,child) node indexes. Children of node p are fanout*p+1 to fanout*p+fanout.
+
+def getTree(number_nodes,fanout=2):
+    if fanout < 1:
+        fanout = 1
+    return [((child - 1) / fanout,child) for child in range(1,number_nodes)]
+
+##
+# @fn getPlan(edges):
+#
+# @param edges List of (parent,child,user@address,ssh_key) tuples. ssh_key may be None.
+#
+# @return Plan for RELAY_SCRIPT, base64 encoded.
+
+def getPlan(edges):
+    lines = []
+    for (parent,child,target,key) in edges:
+        if key is None or key == "":
+            key = "-"
+        lines.append("%d %d %s %s" % (parent,child,target,key))
+    return base64.b64encode("\n".join(lines) + "\n")
+
+##
+# @fn getSendCommand(plan,paths,source_dir="/",destination_dir="/",compression="none",token="0"):
+#
+# @param plan Plan from getPlan.
+# @param paths Files and directories to send, relative to source_dir.
+# @param source_dir Directory the paths are relative to.
+# @param destination_dir Directory the paths are unpacked into on the other nodes.
+# @param compression Key of COMPRESSORS.
+# @param token Unique name for the relay script file of this broadcast.
+#
+# @return Shell command that runs the broadcast on the source node.
+
+def getSendCommand(plan,paths,source_dir="/",destination_dir="/",compression="none",token="0"):
+    compress = COMPRESSORS.get(compression)
+    if compress is None:
+        raise ValueError("Unknown broadcast compression %s. Use one of %s." % (compression,",".join(sorted(COMPRESSORS.keys()))))
+    encoded = base64.b64encode(RELAY_SCRIPT)
+    relay = "/tmp/ofstest-relay.%s.sh" % token
+    command = "echo %s | base64 -d > %s; " % (encoded,relay)
+    command += "set -o pipefail; tar -C %s -cf - %s | %s | bash %s %s %s 0 %s %s send; " % (source_dir," ".join(paths),compress,relay,encoded,plan,destination_dir,compression)
+    command += "rc=\\$?; rm -f %s; exit \\$rc" % relay
+    return command
+
+##
+# @fn parseReport(stdout):
+#
+# @param stdout Standard output of the send command.
+#
+# @return Dictionary node index -> dictionary with bytes, seconds and rc.
+
+def parseReport(stdout):
+    report = {}
+    for line in stdout.splitlines():
+        fields = line.split()
+        if len(fields) != 6 or fields[0] != BROADCAST_TAG:
+            continue
+        try:
+            report[int(fields[1])] = {"bytes" : int(fields[2]), "seconds" : float(fields[4]) - float(fields[3]), "rc" : int(fields[5])}
+        except ValueError:
+            continue
+    return report
+
+##
+# @fn formatReport(report,names,edges):
+#
+# @param report Result of parseReport.
+# @param names Node names by index.
+# @param edges List of (parent,child) from getTree.
+#
+# @return Text table with the bytes, time and bandwidth of each hop.
+
+def formatReport(report,names,edges):
+    width = max([len(name) for name in names] + [4])
+    lines = ["%s %s %10s %9s %9s %4s" % ("Node".ljust(width),"From".ljust(width),"MB","Time (s)","MB/s","rc")]
+    for (parent,child) in edges:
+        result = report.get(child)
+        if result is None:
+            lines.append("%s %s %10s %9s %9s %4s" % (names[child].ljust(width),names[parent].ljust(width),"-","-","-","?"))
+            continue
+        megabytes = result["bytes"] / 1048576.0
+        rate = 0.0
+        if result["seconds"] > 0:
+            rate = megabytes / result["seconds"]
+        lines.append("%s %s %10.1f %9.1f %9.1f %4d" % (names[child].ljust(width),names[parent].ljust(width),megabytes,result["seconds"],rate,result["rc"]))
+    return "\n".join(lines)
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+##
+#
+# @class OFSBuildCache
+#
+# @brief This class keeps installed OrangeFS builds on the local machine so a build is not repeated.
+#
+# Each build is stored as a compressed tar archive of the installation prefix. It is found
+# by a key: the hash of the source tree, the patch files, the configure and make options,
+# and the distribution, kernel and architecture of the build node. See getKey(). A later
+# run with the same key deploys the archive instead of running configure, make and make
+# install. Custom kernel packages are kept the same way. See
+# OFSTestNetwork.installCustomKernelOnNodes.
+#
+# The cache directory has an index.json with the size and last use of each archive. When
+# the archives take more than max_bytes, the least recently used ones are removed.
+#
+
+import os
+import time
+import json
+import hashlib
+import threading
+import logging
+import OFSJSONStore
+
+## @var BUILD_ATTRIBUTES
+# OFSTestNode attributes that configure, make and make install set. They are saved with each build.
+BUILD_ATTRIBUTES = [
+    "ofs_installation_location",
+    "build_kmod",
+    "module_name",
+    "enable_hadoop",
+    "hadoop_version",
+    "ofs_database",
+    "kernel_version",
+    "kernel_source_location"
+    ]
+
+##
+# @fn getKey(parts):
+#
+# @param parts Dictionary of everything the build depends on. Values must be JSON serializable.
+#
+# @return Hex SHA-256 of parts.
+
+def getKey(parts):
+    return hashlib.sha256(json.dumps(parts,sort_keys=True)).hexdigest()
+
+##
+# @fn getFileDigest(filename):
+#
+# @param filename Local file
+#
+# @return Hex SHA-256 of the file contents.
+
+def getFileDigest(filename):
+    digest = hashlib.sha256()
+    f = open(filename,'rb')
+    try:
+        while True:
+            block = f.read(1048576)
+            if not block:
+                break
+            digest.update(block)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+
+class OFSBuildCache(object):
+
+    ##
+    # @fn __init__(self,directory="ofs-build-cache",max_bytes=4294967296):
+    #
+    # Initialization routine. Reads the index if the cache exists.
+    #
+    # @param self The object pointer
+    # @param directory Cache directory on the local machine.
+    # @param max_bytes Total size of the archives kept.
+
+    def __init__(self,directory="ofs-build-cache",max_bytes=4294967296):
+
+        ## @var directory
+        # cache directory on the local machine
+        self.directory = directory
+
+        ## @var max_bytes
+        # Total size of the archives kept. Least recently used archives are removed above it.
+        self.max_bytes = max_bytes
+
+        ## @var entries
+        # Dictionary of index entries keyed by build key
+        self.entries = {}
+
+        ## @var lock
+        # Protects entries and the index file.
+        self.lock = threading.Lock()
+
+        self.load()
+
+    ##
+    # @fn getIndexFile(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Path of the index file.
+
+    def getIndexFile(self):
+        return os.path.join(self.directory,"index.json")
+
+    ##
+    # @fn getArchivePath(self,key):
+    #
+    # @param self The object pointer
+    # @param key Build key
+    #
+    # @return Path of the archive for key on the local machine.
+
+    def getArchivePath(self,key):
+        return os.path.join(self.directory,"%s.tar.gz" % key)
+
+    ##
+    # @fn load(self):
+    #
+    # Reads the index. Entries whose archive is gone are dropped.
+    #
+    # @param self The object pointer
+
+    def load(self):
+        entries = OFSJSONStore.loadJSONFile(self.getIndexFile(),"build cache index")
+        if entries is not None:
+            self.entries = dict([(key,entry) for (key,entry) in entries.items() if os.path.isfile(self.getArchivePath(key))])
+
+    ##
+    # @fn save(self):
+    #
+    # Writes the index. Call with lock held.
+    #
+    # @param self The object pointer
+
+    def save(self):
+        OFSJSONStore.saveJSONFile(self.getIndexFile(),self.entries,"build cache index")
+
+    ##
+    # @fn lookup(self,key):
+    #
+    # Finds a build and marks it as used.
+    #
+    # @param self The object pointer
+    # @param key Build key
+    #
+    # @return Index entry with file, size, last_used, description and attributes. None if the build is not cached.
+
+    def lookup(self,key):
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if not os.path.isfile(self.getArchivePath(key)):
+                del self.entries[key]
+                self.save()
+                return None
+            entry["last_used"] = time.time()
+            self.save()
+            return entry
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn store(self,key,archive_file,attributes={},description=""):
+    #
+    # Adds a build. The archive is moved into the cache. Old builds are removed if the cache is too big.
+    #
+    # @param self The object pointer
+    # @param key Build key
+    # @param archive_file Local archive of the installation. Must be on the same file system as the cache.
+    # @param attributes Dictionary of BUILD_ATTRIBUTES values.
+    # @param description What was built, for people reading the index.
+
+    def store(self,key,archive_file,attributes={},description=""):
+        self.lock.acquire()
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            os.rename(archive_file,self.getArchivePath(key))
+            now = time.time()
+            self.entries[key] = {"file" : os.path.basename(self.getArchivePath(key)), "size" : os.path.getsize(self.getArchivePath(key)), "created" : now, "last_used" : now, "description" : description, "attributes" : attributes}
+            self.evict(keep=key)
+            self.save()
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn evict(self,keep=None):
+    #
+    # Removes the least recently used builds until the cache fits in max_bytes. Call with lock held.
+    #
+    # @param self The object pointer
+    # @param keep Key that must not be removed.
+
+    def evict(self,keep=None):
+        total = sum([entry["size"] for entry in self.entries.values()])
+        for (key,entry) in sorted(self.entries.items(),key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            logging.info("Removing OrangeFS build %s (%s) from the build cache" % (key,entry.get("description","")))
+            try:
+                os.remove(self.getArchivePath(key))
+            except OSError:
+                logging.exception("Could not remove %s" % self.getArchivePath(key))
+            total -= entry["size"]
+            del self.entries[key]
+
+    ##
+    # @fn invalidate(self,key):
+    #
+    # Removes a build, e.g. when its archive could not be deployed.
+    #
+    # @param self The object pointer
+    # @param key Build key
+
+    def invalidate(self,key):
+        self.lock.acquire()
+        try:
+            if key not in self.entries:
+                return
+            del self.entries[key]
+            try:
+                os.remove(self.getArchivePath(key))
+            except OSError:
+                pass
+            self.save()
+        finally:
+            self.lock.release()
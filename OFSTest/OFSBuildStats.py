@@ -0,0 +1,142 @@
+#!/usr/bin/python
+##
+#
+# @file OFSBuildStats.py
+#
+# @brief Build times per stage and ccache hit rates of OrangeFS builds.
+#
+# OFSTestNode.runBuildStage() times each build command and records it under a stage:
+# configure, make, kmod or install. When the build node uses ccache, its statistics are
+# read before and after the build, so the hit rate of this build is known even though
+# the cache directory is kept between runs. formatBuildReport() prints both.
+#
+# CCACHE_STATS_COMMAND works with ccache 4 (--print-stats) and older versions (-s).
+#
+
+## @var CCACHE_STATS_COMMAND
+# Prints the ccache statistics.
+CCACHE_STATS_COMMAND = "ccache --print-stats 2>/dev/null || ccache -s"
+
+## @var CCACHE_MASQUERADE_PATH
+# Directories of the gcc and cc links to ccache used by the common distributions.
+CCACHE_MASQUERADE_PATH = "/usr/lib64/ccache:/usr/lib/ccache"
+
+## @var BUILD_STAGES
+# Build stages in report order. Other stages are listed after these.
+BUILD_STAGES = ["configure","make","kmod","install"]
+
+##
+# @fn getCCacheEnvironment(ccache_dir):
+#
+# @param ccache_dir Cache directory on the build node. Empty string for no ccache.
+#
+# @return Shell commands that make the following commands compile through ccache.
+# configure picks up CC, the kernel module build the gcc link on PATH.
+
+def getCCacheEnvironment(ccache_dir):
+    if ccache_dir is None or ccache_dir == "":
+        return ""
+    return "export CCACHE_DIR=%s; export PATH=%s:\\$PATH; export CC='ccache gcc'; " % (ccache_dir,CCACHE_MASQUERADE_PATH)
+
+##
+# @fn parseCCacheStats(stdout):
+#
+# @param stdout Standard output of CCACHE_STATS_COMMAND.
+#
+# @return Dictionary with hits and misses, or None if the output holds no statistics.
+
+def parseCCacheStats(stdout):
+    stats = {}
+    for line in stdout.splitlines():
+        # ccache 4: "direct_cache_hit<tab>12"
+        fields = line.split("\t")
+        if len(fields) == 2 and fields[1].strip().isdigit():
+            name = fields[0].strip()
+            value = int(fields[1])
+            if name in ["direct_cache_hit","preprocessed_cache_hit"]:
+                stats["hits"] = stats.get("hits",0) + value
+            elif name == "cache_miss":
+                stats["misses"] = stats.get("misses",0) + value
+            continue
+        # older ccache: "cache hit (direct)       12"
+        fields = line.rsplit(None,1)
+        if len(fields) != 2 or not fields[1].isdigit():
+            continue
+        name = fields[0].strip()
+        value = int(fields[1])
+        if name.startswith("cache hit"):
+            stats["hits"] = stats.get("hits",0) + value
+        elif name == "cache miss":
+            stats["misses"] = stats.get("misses",0) + value
+    if len(stats) == 0:
+        return None
+    return {"hits" : stats.get("hits",0), "misses" : stats.get("misses",0)}
+
+##
+# @fn getCCacheDelta(before,after):
+#
+# @param before Statistics from parseCCacheStats before the build.
+# @param after Statistics from parseCCacheStats after the build.
+#
+# @return Dictionary with the hits, misses and hit_rate (0 to 1, None if nothing was compiled) of the build. None if a side is missing.
+
+def getCCacheDelta(before,after):
+    if before is None or after is None:
+        return None
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    # the statistics were zeroed in between.
+    if hits < 0 or misses < 0:
+        (hits,misses) = (after["hits"],after["misses"])
+    hit_rate = None
+    if hits + misses > 0:
+        hit_rate = float(hits) / (hits + misses)
+    return {"hits" : hits, "misses" : misses, "hit_rate" : hit_rate}
+
+##
+# @fn getStageTotals(stage_times):
+#
+# @param stage_times List of (stage,seconds,rc) from OFSTestNode.runBuildStage.
+#
+# @return List of (stage,seconds,rc) with one entry per stage, in BUILD_STAGES order. rc is the first failure.
+
+def getStageTotals(stage_times):
+    totals = {}
+    order = []
+    for (stage,seconds,rc) in stage_times:
+        if stage not in totals:
+            totals[stage] = [0.0,0]
+            order.append(stage)
+        totals[stage][0] += seconds
+        if totals[stage][1] == 0:
+            totals[stage][1] = rc
+    order = [stage for stage in BUILD_STAGES if stage in totals] + [stage for stage in order if stage not in BUILD_STAGES]
+    return [(stage,totals[stage][0],totals[stage][1]) for stage in order]
+
+##
+# @fn formatBuildReport(hostname,stage_times,ccache_delta=None,incremental=False):
+#
+# @param hostname Build node
+# @param stage_times List of (stage,seconds,rc) from OFSTestNode.runBuildStage.
+# @param ccache_delta Result of getCCacheDelta, or None without ccache.
+# @param incremental Was the build directory kept from an earlier run?
+#
+# @return Text table of the build time per stage and the ccache hit rate.
+
+def formatBuildReport(hostname,stage_times,ccache_delta=None,incremental=False):
+    mode = "full"
+    if incremental:
+        mode = "incremental"
+    lines = ["OrangeFS build on %s (%s)" % (hostname,mode)]
+    lines.append("%-12s %9s %4s" % ("Stage","Time (s)","rc"))
+    total = 0.0
+    for (stage,seconds,rc) in getStageTotals(stage_times):
+        lines.append("%-12s %9.1f %4d" % (stage,seconds,rc))
+        total += seconds
+    lines.append("%-12s %9.1f" % ("total",total))
+    if ccache_delta is not None:
+        if ccache_delta["hit_rate"] is None:
+            lines.append("ccache: nothing compiled")
+        else:
+            lines.append("ccache: %d hits, %d misses, %.1f%% hit rate" % (ccache_delta["hits"],ccache_delta["misses"],ccache_delta["hit_rate"] * 100))
+    return "\n".join(lines)
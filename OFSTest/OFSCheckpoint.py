@@ -0,0 +1,322 @@
+#!/usr/bin/python
+##
+#
+# @class OFSCheckpoint
+#
+# @brief This class records finished setup stages so a failed run can resume where it stopped.
+#
+# After a setup stage (creating the cloud cluster, building OrangeFS, copying it to the
+# nodes...) succeeds, a checkpoint is written to the output directory. It holds a
+# fingerprint of what the stage was given and what the stage changed in the state of the
+# network and its nodes. The changes are found by comparing the state before and after
+# the stage, so the setup stages run one at a time while checkpoints are kept (see
+# OFSTestMain.setupOFS). start_test --resume skips a stage whose fingerprint still
+# matches: the node state is restored from the checkpoint instead, and the stage's check
+# must still pass on the nodes, e.g. the installation must still be there. See
+# OFSTestMain.runCheckpointed.
+#
+# The fingerprint of a stage includes the run id of each stage it depends on. When such a
+# stage runs again, it gets a new run id, so everything after it runs again too.
+#
+# Sources fetched by branch name are not fingerprinted by their contents. A resumed
+# build uses the source tree already on the build node.
+#
+
+import time
+import uuid
+import threading
+import logging
+import OFSBuildCache
+import OFSJSONStore
+
+## @var NETWORK_ATTRIBUTES
+# OFSTestNetwork attributes saved with each checkpoint.
+NETWORK_ATTRIBUTES = [
+    "mpi_nfs_directory",
+    "openmpi_version",
+    "number_mpi_slots",
+    "number_mpi_hosts"
+    ]
+
+## @var ROLLBACK_ATTRIBUTES
+# OFSTestNetwork objects a restore may replace, e.g. resuming the cloud nodes. Kept by
+# getRollbackState() so a restore that fails its check can be undone.
+ROLLBACK_ATTRIBUTES = [
+    "network_nodes",
+    "cloud_connection_manager",
+    "provisioning_cache_node",
+    "provisioning_cache_url"
+    ]
+
+## @var EXCLUDED_NODE_ATTRIBUTES
+# OFSTestNode attributes that belong to this run only and are never restored.
+EXCLUDED_NODE_ATTRIBUTES = [
+    "main_directories",
+    "ofs_build_cached",
+    "ofs_build_cache_key",
+    "ccache_stats",
+    "command_timeout",
+    "test_record"
+    ]
+
+##
+# @fn isCheckpointValue(value):
+#
+# @param value Attribute value
+#
+# @return True if value is plain data that can be saved as JSON and restored as it was.
+
+def isCheckpointValue(value):
+    if value is None or isinstance(value,(bool,int,long,float,str,unicode)):
+        return True
+    if isinstance(value,list):
+        return len([item for item in value if not isCheckpointValue(item)]) == 0
+    if isinstance(value,dict):
+        return len([key for (key,item) in value.items() if not isinstance(key,(str,unicode)) or not isCheckpointValue(item)]) == 0
+    return False
+
+##
+# @fn getNodeState(node):
+#
+# @param node OFSTestNode
+#
+# @return Dictionary of the plain data attributes of the node and its environment variables.
+
+def getNodeState(node):
+    attributes = {}
+    for (name,value) in vars(node).items():
+        if name in EXCLUDED_NODE_ATTRIBUTES or not isCheckpointValue(value):
+            continue
+        attributes[name] = value
+    return attributes
+
+##
+# @fn applyNodeState(node,attributes):
+#
+# Sets the attributes saved by getNodeState().
+#
+# @param node OFSTestNode
+# @param attributes Dictionary from getNodeState()
+
+def applyNodeState(node,attributes):
+    for (name,value) in attributes.items():
+        if name in EXCLUDED_NODE_ATTRIBUTES:
+            continue
+        setattr(node,name,value)
+
+##
+# @fn getNetworkState(network):
+#
+# @param network OFSTestNetwork
+#
+# @return Dictionary with the NETWORK_ATTRIBUTES and the state of every node, in network order.
+
+def getNetworkState(network):
+    state = {"attributes" : {}, "nodes" : []}
+    for name in NETWORK_ATTRIBUTES:
+        state["attributes"][name] = getattr(network,name)
+    for node in network.network_nodes:
+        state["nodes"].append(getNodeState(node))
+    return state
+
+##
+# @fn getStateChanges(before,after):
+#
+# @param before Result of getNetworkState() before a stage
+# @param after Result of getNetworkState() after the stage
+#
+# @return State with only the attributes that changed. Nodes keep their ip_address. Changes made by other threads during the stage are included too.
+
+def getStateChanges(before,after):
+    changes = {"attributes" : {}, "nodes" : []}
+    for (name,value) in after["attributes"].items():
+        if name not in before["attributes"] or before["attributes"][name] != value:
+            changes["attributes"][name] = value
+    old_nodes = dict([(attributes.get("ip_address"),attributes) for attributes in before["nodes"]])
+    for attributes in after["nodes"]:
+        old = old_nodes.get(attributes.get("ip_address"),{})
+        changed = dict([(name,value) for (name,value) in attributes.items() if name not in old or old[name] != value])
+        changed["ip_address"] = attributes.get("ip_address")
+        changes["nodes"].append(changed)
+    return changes
+
+##
+# @fn applyNetworkState(network,state):
+#
+# Sets the state saved by getNetworkState() on the nodes with the same IP addresses.
+#
+# @param network OFSTestNetwork
+# @param state Dictionary from getNetworkState()
+#
+# @return 0 on success. 1 if a saved node is not in the network.
+
+def applyNetworkState(network,state):
+    for (name,value) in state["attributes"].items():
+        setattr(network,name,value)
+    nodes = dict([(node.ip_address,node) for node in network.network_nodes])
+    for attributes in state["nodes"]:
+        node = nodes.get(attributes.get("ip_address"))
+        if node is None:
+            logging.warning("Checkpoint node %s is not in the network" % attributes.get("ip_address"))
+            return 1
+        applyNodeState(node,attributes)
+    return 0
+
+##
+# @fn getRollbackState(network):
+#
+# @param network OFSTestNetwork
+#
+# @return State from getNetworkState() plus the ROLLBACK_ATTRIBUTES. Not plain data, so it is never saved.
+
+def getRollbackState(network):
+    state = getNetworkState(network)
+    state["objects"] = {}
+    for name in ROLLBACK_ATTRIBUTES:
+        value = getattr(network,name)
+        if isinstance(value,list):
+            value = list(value)
+        state["objects"][name] = value
+    return state
+
+##
+# @fn rollbackNetworkState(network,state):
+#
+# Undoes a restore: puts back the nodes, the cloud connection and the state saved by
+# getRollbackState(). Nodes the restore added are dropped.
+#
+# @param network OFSTestNetwork
+# @param state Dictionary from getRollbackState()
+#
+# @return 0 on success.
+
+def rollbackNetworkState(network,state):
+    for (name,value) in state["objects"].items():
+        setattr(network,name,value)
+    return applyNetworkState(network,state)
+
+
+class OFSCheckpoint(object):
+
+    ##
+    # @fn __init__(self,filename="setup-checkpoints.json"):
+    #
+    # Initialization routine. Reads the checkpoints if the file exists.
+    #
+    # @param self The object pointer
+    # @param filename Checkpoint file on the local machine, usually in the output directory.
+
+    def __init__(self,filename="setup-checkpoints.json"):
+
+        ## @var filename
+        # checkpoint file on the local machine
+        self.filename = filename
+
+        ## @var entries
+        # Dictionary of checkpoints keyed by stage name
+        self.entries = {}
+
+        ## @var lock
+        # Protects entries and the checkpoint file.
+        self.lock = threading.Lock()
+
+        self.load()
+
+    ##
+    # @fn load(self):
+    #
+    # Reads the checkpoint file.
+    #
+    # @param self The object pointer
+
+    def load(self):
+        entries = OFSJSONStore.loadJSONFile(self.filename,"checkpoints")
+        if entries is not None:
+            self.entries = entries
+
+    ##
+    # @fn save(self):
+    #
+    # Writes the checkpoint file. Call with lock held.
+    #
+    # @param self The object pointer
+
+    def save(self):
+        OFSJSONStore.saveJSONFile(self.filename,self.entries,"checkpoints")
+
+    ##
+    # @fn getFingerprint(self,name,inputs,requires=[]):
+    #
+    # @param self The object pointer
+    # @param name Stage name
+    # @param inputs Dictionary of everything the stage is given. Values must be JSON serializable.
+    # @param requires Names of the checkpointed stages this stage depends on.
+    #
+    # @return Hex SHA-256 of the stage name, its inputs and the run ids of the stages it depends on.
+
+    def getFingerprint(self,name,inputs,requires=[]):
+        self.lock.acquire()
+        try:
+            run_ids = [self.entries.get(stage,{}).get("run_id","") for stage in requires]
+        finally:
+            self.lock.release()
+        return OFSBuildCache.getKey({"stage" : name, "inputs" : inputs, "requires" : run_ids})
+
+    ##
+    # @fn lookup(self,name,fingerprint):
+    #
+    # @param self The object pointer
+    # @param name Stage name
+    # @param fingerprint Result of getFingerprint
+    #
+    # @return Checkpoint with run_id, time and state. None if there is none with this fingerprint.
+
+    def lookup(self,name,fingerprint):
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(name)
+            if entry is None or entry.get("fingerprint") != fingerprint:
+                return None
+            return entry
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn record(self,name,fingerprint,network,before=None):
+    #
+    # Saves a checkpoint for a stage that finished. The stage gets a new run id.
+    #
+    # @param self The object pointer
+    # @param name Stage name
+    # @param fingerprint Result of getFingerprint
+    # @param network OFSTestNetwork after the stage
+    # @param before Result of getNetworkState() before the stage. Only the changes are saved. None saves everything.
+
+    def record(self,name,fingerprint,network,before=None):
+        state = getNetworkState(network)
+        if before is not None:
+            state = getStateChanges(before,state)
+        entry = {"fingerprint" : fingerprint, "run_id" : uuid.uuid4().hex, "time" : time.time(), "state" : state}
+        self.lock.acquire()
+        try:
+            self.entries[name] = entry
+            self.save()
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn invalidate(self,name):
+    #
+    # Removes the checkpoint of a stage, e.g. when the stage failed or its check did not pass.
+    #
+    # @param self The object pointer
+    # @param name Stage name
+
+    def invalidate(self,name):
+        self.lock.acquire()
+        try:
+            if name in self.entries:
+                del self.entries[name]
+                self.save()
+        finally:
+            self.lock.release()
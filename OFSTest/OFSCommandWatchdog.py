@@ -0,0 +1,151 @@
+#!/usr/bin/python
+##
+#
+# @class OFSCommandWatchdog
+#
+# @brief This class fires timeouts for running commands from one background thread.
+#
+# OFSTestNode.runSingleCommand registers every command that has a timeout with the
+# watchdog. If the command is still running when its time is up, the watchdog calls the
+# function it was given, which kills the command. A finished command cancels its entry.
+#
+# Use the module-level watch() and cancel() functions. They share one watchdog thread.
+#
+
+import time
+import heapq
+import threading
+import logging
+
+
+class OFSCommandWatchdog(object):
+
+    ##
+    # @fn __init__(self):
+    #
+    # Initialization routine. Starts the watchdog thread.
+    #
+    # @param self The object pointer
+
+    def __init__(self):
+
+        ## @var entries
+        # Heap of [fire time, sequence number, function, args, active] lists.
+        self.entries = []
+
+        ## @var sequence
+        # Keeps heap order stable for entries with the same fire time.
+        self.sequence = 0
+
+        ## @var condition
+        # Protects entries. Notified when an earlier entry is added.
+        self.condition = threading.Condition()
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    ##
+    # @fn watch(self,seconds,function,args=[]):
+    #
+    # Calls function(*args) from the watchdog thread after seconds, unless cancelled first.
+    #
+    # @param self The object pointer
+    # @param seconds Timeout in seconds
+    # @param function Function that kills the command
+    # @param args Arguments to function
+    #
+    # @return Entry to pass to cancel().
+
+    def watch(self,seconds,function,args=[]):
+        self.condition.acquire()
+        try:
+            self.sequence += 1
+            entry = [time.time() + seconds,self.sequence,function,args,True]
+            heapq.heappush(self.entries,entry)
+            self.condition.notify()
+            return entry
+        finally:
+            self.condition.release()
+
+    ##
+    # @fn cancel(self,entry):
+    #
+    # Cancels an entry returned by watch(). Does nothing if it has already fired.
+    #
+    # @param self The object pointer
+    # @param entry Entry returned by watch()
+
+    def cancel(self,entry):
+        self.condition.acquire()
+        entry[4] = False
+        self.condition.release()
+
+    ##
+    # @fn run(self):
+    #
+    # Body of the watchdog thread.
+    #
+    # @param self The object pointer
+
+    def run(self):
+        while True:
+            self.condition.acquire()
+            try:
+                # cancelled entries are dropped when they reach the top.
+                while len(self.entries) > 0 and self.entries[0][4] == False:
+                    heapq.heappop(self.entries)
+                if len(self.entries) == 0:
+                    self.condition.wait()
+                    continue
+                delay = self.entries[0][0] - time.time()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                entry = heapq.heappop(self.entries)
+                entry[4] = False
+            finally:
+                self.condition.release()
+
+            try:
+                entry[2](*entry[3])
+            except:
+                logging.exception("Command watchdog function failed")
+
+
+## @var watchdog
+# The shared OFSCommandWatchdog. Started on first use.
+watchdog = None
+watchdog_lock = threading.Lock()
+
+##
+# @fn watch(seconds,function,args=[]):
+#
+# Calls function(*args) from the shared watchdog thread after seconds, unless cancelled first.
+#
+# @param seconds Timeout in seconds
+# @param function Function that kills the command
+# @param args Arguments to function
+#
+# @return Entry to pass to cancel().
+
+def watch(seconds,function,args=[]):
+    global watchdog
+    watchdog_lock.acquire()
+    try:
+        if watchdog is None:
+            watchdog = OFSCommandWatchdog()
+    finally:
+        watchdog_lock.release()
+    return watchdog.watch(seconds,function,args)
+
+##
+# @fn cancel(entry):
+#
+# Cancels an entry returned by watch().
+#
+# @param entry Entry returned by watch()
+
+def cancel(entry):
+    if entry is not None and watchdog is not None:
+        watchdog.cancel(entry)
@@ -0,0 +1,163 @@
+#!/usr/bin/python
+##
+#
+# @file OFSConnectivityCheck.py
+#
+# @brief Checks that one node can reach many others with one remote execution.
+#
+# CHECK_SCRIPT pings every destination and, if a port is given, opens a TCP connection to
+# it. All destinations are checked at the same time. It prints one line per destination
+# with the ping and TCP results and their round trip times.
+#
+# OFSTestNode.checkConnectivity() runs it on one node. OFSTestNetwork.getConnectivityMatrix()
+# runs it on all nodes at once and builds the all-pairs matrix.
+#
+
+import base64
+
+## @var CHECK_SCRIPT
+# Connectivity check. Arguments: TCP port (0 for none), then the destinations.
+CHECK_SCRIPT = r'''
+port="$1"
+shift
+
+PATH=$PATH:/sbin:/usr/sbin:/bin:/usr/bin
+
+probe() {
+    d="$1"
+    ping_ok=0
+    rtt=-
+    out=$(ping -c 1 -W 2 "$d" 2>/dev/null)
+    if [ $? -eq 0 ]; then
+        ping_ok=1
+        rtt=$(echo "$out" | sed -n 's/.*time[=<]\([0-9.]*\).*/\1/p' | head -n 1)
+    fi
+    tcp_ok=-
+    tcp_ms=-
+    if [ "$port" != "0" ]; then
+        tcp_ok=0
+        # time only the connect, not the start of timeout and bash. Bash 5 has the clock built in.
+        times=$(timeout 2 bash -c 's=${EPOCHREALTIME:-$(date +%s.%N)}; exec 3<>/dev/tcp/$0/$1 && echo $s ${EPOCHREALTIME:-$(date +%s.%N)}' "$d" "$port" 2>/dev/null)
+        if [ -n "$times" ]; then
+            tcp_ok=1
+            tcp_ms=$(echo $times | awk '{printf "%.3f", ($2 - $1) * 1000}')
+        fi
+    fi
+    echo "$d $ping_ok ${rtt:--} $tcp_ok $tcp_ms"
+}
+
+dir=$(mktemp -d /tmp/ofstest-connectivity.XXXXXX)
+i=0
+for d in "$@"; do
+    probe "$d" > $dir/$i &
+    i=$((i+1))
+done
+wait
+i=0
+for d in "$@"; do
+    cat $dir/$i
+    i=$((i+1))
+done
+rm -rf $dir
+'''
+
+##
+# @fn getCheckCommand(destinations,port=0):
+#
+# @param destinations Hostnames or IP addresses to check.
+# @param port TCP port to connect to. 0 checks ping only.
+#
+# @return Shell command that runs the check.
+
+def getCheckCommand(destinations,port=0):
+    encoded = base64.b64encode(CHECK_SCRIPT)
+    if port is None:
+        port = 0
+    return "echo %s | base64 -d | bash -s -- %d %s" % (encoded,port," ".join(destinations))
+
+##
+# @fn parseValue(text):
+#
+# @param text Round trip time printed by the check, or "-".
+#
+# @return Time in ms, or None.
+
+def parseValue(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+##
+# @fn parseCheckOutput(stdout):
+#
+# @param stdout Standard output of the check command.
+#
+# @return Dictionary destination -> dictionary with ping (True/False), rtt_ms, tcp
+# (True/False, or None if not checked) and tcp_ms. Times are None if unknown.
+
+def parseCheckOutput(stdout):
+    results = {}
+    for line in stdout.splitlines():
+        fields = line.split()
+        if len(fields) != 5:
+            continue
+        (destination,ping_ok,rtt,tcp_ok,tcp_ms) = fields
+        if ping_ok not in ["0","1"]:
+            continue
+        tcp = None
+        if tcp_ok != "-":
+            tcp = (tcp_ok == "1")
+        results[destination] = {"ping" : ping_ok == "1", "rtt_ms" : parseValue(rtt), "tcp" : tcp, "tcp_ms" : parseValue(tcp_ms)}
+    return results
+
+##
+# @fn getUnreachableResult():
+#
+# @return Result for a destination that could not be checked at all.
+
+def getUnreachableResult():
+    return {"ping" : False, "rtt_ms" : None, "tcp" : None, "tcp_ms" : None}
+
+##
+# @fn formatMatrix(matrix,names):
+#
+# @param matrix Dictionary source -> destination -> result, as from OFSTestNetwork.getConnectivityMatrix.
+# @param names Node names in the order of rows and columns.
+#
+# @return Text table of ping round trip times in ms. X marks an unreachable pair. If TCP was
+# checked, a second table has the TCP connect times.
+
+def formatMatrix(matrix,names):
+    width = max([len(name) for name in names] + [8])
+
+    def table(ok_key,time_key):
+        lines = [" ".join([" " * width] + [name.rjust(width) for name in names])]
+        for source in names:
+            row = [source.ljust(width)]
+            for destination in names:
+                result = matrix.get(source,{}).get(destination)
+                if result is None:
+                    row.append("?".rjust(width))
+                elif result[ok_key] != True:
+                    row.append("X".rjust(width))
+                elif result[time_key] is None:
+                    row.append("ok".rjust(width))
+                else:
+                    row.append(("%.3f" % result[time_key]).rjust(width))
+            lines.append(" ".join(row))
+        return lines
+
+    lines = ["Ping round trip time (ms). Rows are sources, columns are destinations."]
+    lines.extend(table("ping","rtt_ms"))
+
+    checked_tcp = False
+    for row in matrix.values():
+        for result in row.values():
+            if result["tcp"] is not None:
+                checked_tcp = True
+    if checked_tcp:
+        lines.append("")
+        lines.append("TCP connect time (ms).")
+        lines.extend(table("tcp","tcp_ms"))
+    return "\n".join(lines)
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+##
+#
+# @file OFSDistributedBuild.py
+#
+# @brief Spreads compile jobs of the build node over the other nodes with distcc.
+#
+# distcc runs the compiler on the worker nodes over ssh, using the trust that
+# OFSTestNetwork.enablePasswordlessSSH() set up. No distccd daemon is needed. Object files
+# are only correct if every worker runs the same compiler as the build node, so each node
+# reports its gcc version and target first. Workers that differ or lack distcc are left
+# out. With no workers left, the build runs on the build node alone.
+#
+# OFSTestNetwork.setupDistributedBuild() picks the workers. OFSTestNode.getCompilerEnvironment()
+# uses DISTCC_HOSTS for configure and make, together with ccache if it is enabled.
+#
+
+## @var COMPILER_PROBE_COMMAND
+# Prints the gcc version line, the gcc target and the path of distcc, one per line.
+COMPILER_PROBE_COMMAND = "gcc --version 2>/dev/null | head -n 1; gcc -dumpmachine 2>/dev/null; which distcc 2>/dev/null"
+
+## @var DISTCC_MASQUERADE_PATH
+# Directories of the gcc and cc links to distcc used by the common distributions.
+DISTCC_MASQUERADE_PATH = "/usr/lib64/distcc/bin:/usr/lib/distcc/bin:/usr/lib/distcc"
+
+##
+# @fn parseCompilerProbe(stdout):
+#
+# @param stdout Standard output of COMPILER_PROBE_COMMAND.
+#
+# @return Dictionary with version, machine and distcc (True/False). None if gcc did not answer.
+
+def parseCompilerProbe(stdout):
+    lines = [line.strip() for line in stdout.splitlines() if line.strip() != ""]
+    if len(lines) < 2:
+        return None
+    return {"version" : lines[0], "machine" : lines[1], "distcc" : len(lines) > 2}
+
+##
+# @fn isCompatible(build_compiler,worker_compiler):
+#
+# @param build_compiler Result of parseCompilerProbe for the build node.
+# @param worker_compiler Result of parseCompilerProbe for a worker.
+#
+# @return True if the worker can compile for the build node.
+
+def isCompatible(build_compiler,worker_compiler):
+    if build_compiler is None or worker_compiler is None:
+        return False
+    return worker_compiler["distcc"] and build_compiler["version"] == worker_compiler["version"] and build_compiler["machine"] == worker_compiler["machine"]
+
+##
+# @fn getDistccHosts(local_slots,workers):
+#
+# @param local_slots Compile jobs on the build node itself.
+# @param workers List of (user,hostname,slots).
+#
+# @return DISTCC_HOSTS value. Workers are reached by ssh with compressed transfers.
+
+def getDistccHosts(local_slots,workers):
+    hosts = ["localhost/%d" % max(local_slots,1)]
+    for (user,hostname,slots) in workers:
+        hosts.append("%s@%s/%d,lzo" % (user,hostname,max(slots,1)))
+    return " ".join(hosts)
+
+##
+# @fn getDistccEnvironment(distcc_hosts,use_ccache=False):
+#
+# @param distcc_hosts DISTCC_HOSTS value from getDistccHosts.
+# @param use_ccache True if ccache wraps the compiler. ccache then calls distcc on a miss.
+#
+# @return Shell commands that send the compile jobs of the following commands to distcc.
+# configure picks up CC, the kernel module build the gcc link on PATH.
+
+def getDistccEnvironment(distcc_hosts,use_ccache=False):
+    if distcc_hosts is None or distcc_hosts == "":
+        return ""
+    environment = "export DISTCC_HOSTS='%s'; " % distcc_hosts
+    if use_ccache:
+        return environment + "export CCACHE_PREFIX=distcc; "
+    return environment + "export PATH=%s:\\$PATH; export CC='distcc gcc'; " % DISTCC_MASQUERADE_PATH
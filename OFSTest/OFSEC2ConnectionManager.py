@@ -14,6 +14,8 @@ import numpy as np
 
 import OFSCloudConnectionManager
 import OFSTestRemoteNode
+import OFSTestTrace
+import OFSTestWait
 
 flavors_order = [ 
        'm3.medium',
@@ -203,6 +205,7 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
     # @param debug  Debug level.
     #
 
+    @OFSTestTrace.traced("cloud")
     def connect(self,debug=0):
         
         msg = "Connecting to EC2/OpenStack region=%s endpoint=%s" % (self.ec2_region_name,self.ec2_endpoint)
@@ -229,6 +232,7 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
     # @return A list of available EC2 Images	
     #
 
+    @OFSTestTrace.traced("cloud")
     def getAllCloudImages(self,image_ids=None):
         self.checkCloudConnection()        
         self.cloud_image_list = self.ec2_connection.get_all_images(image_ids=image_ids, filters = {'name':'*ofstest*'})
@@ -247,6 +251,7 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
     #
     #
         
+    @OFSTestTrace.traced("cloud")
     def terminateCloudInstance(self,ip_address):
         
         self.checkCloudConnection()
@@ -288,6 +293,7 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
     #
     #
         
+    @OFSTestTrace.traced("cloud")
     def stopCloudInstance(self,ip_address):
         
         self.checkCloudConnection()
@@ -333,6 +339,7 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
     # @return	A list of new instances.
     #		
         
+    @OFSTestTrace.traced("cloud")
     def createNewCloudInstances(self,number_nodes,image_name=None,flavor_name="t2.micro",subnet_id=None,instance_suffix="",image_id=None,security_group_ids=None,spot_instance_bid=None ):
         self.checkCloudConnection()  
         
@@ -442,20 +449,21 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
                 msg = "Requesting %d new %s %s spot requests from AMI %s at %s per node-hour." % (number_nodes,flavor_name,image_name,image_id,spot_instance_bid)
                 print msg
                 logging.info(msg)   
-                time.sleep(10)     
-                fulfilled_requests = [r for r in requests if r.instance_id is not None]
+                
+                # the probe keeps the latest state of the requests.
+                spot_requests = {"requests" : requests}
+                def isFulfilled():
+                    spot_requests["requests"] = self.ec2_connection.get_all_spot_instance_requests(request_ids=[r.id for r in spot_requests["requests"]])
+                    filled = len([r for r in spot_requests["requests"] if r.instance_id is not None])
+                    print "%d of %d requests filled" % (filled,number_nodes)
+                    return filled >= number_nodes
     
                 print "Waiting up to 1 hour for spot requests"
-                count = 0
-                while len(fulfilled_requests) < number_nodes and count < 360:
-                    time.sleep(10)
-                    requests = self.ec2_connection.get_all_spot_instance_requests(request_ids=[r.id for r in requests])
-                    fulfilled_requests = [r for r in requests if r.instance_id is not None]
-                    count += 1
-                    print "%d of %d requests filled in %d seconds" % (len(fulfilled_requests),number_nodes,count*10)
-                    
+                fulfilled = OFSTestWait.waitUntil(isFulfilled,"%d spot requests" % number_nodes,timeout=3600,old_wait=10,initial_delay=5,max_delay=30)
+                requests = spot_requests["requests"]
+                fulfilled_requests = [r for r in requests if r.instance_id is not None]
                 
-                if count == 360:
+                if not fulfilled:
                     print "Spot request was not fulfilled in 1 hour. Cancelling request."
                     self.ec2_connection.cancel_spot_instance_requests(request_ids=[r.id for r in requests])
                     # Should be an empty list.
@@ -481,15 +489,13 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
             print msg
             logging.info(msg)
     
-            print "Waiting 60s for instances."
-            time.sleep(60)
-            
-            count = 0
-            while len(reservation.instances) < number_nodes and count < 24:
-                print "Waiting on instances %d seconds" % count*10
-                time.sleep(10)
-                count +=  1
-                #pprint(reservation.__dict__)
+            print "Waiting up to 300s for instances."
+            if not OFSTestWait.waitUntil(lambda: len([i for i in reservation.instances if self.isInstanceRunning(i)]) >= number_nodes,"%d EC2 instances" % number_nodes,timeout=300,old_wait=60,initial_delay=5):
+                msg = "%d EC2 instances are not running after 300s. Terminating them." % number_nodes
+                print msg
+                logging.error(msg)
+                self.terminateInstances(reservation.instances)
+                return []
                 
             new_instances = [n for n in reservation.instances]
     
@@ -509,9 +515,10 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
     # @param self The object pointer
     # @param instances List of instances to associate
     # @param domain Domain on which to allocate addresses
-    # @return A list of the external addresses
+    # @return A list of the external addresses. None if the instances do not report them.
     #
 
+    @OFSTestTrace.traced("cloud")
     def associateIPAddresses(self,instances=[],domain=None):
         external_addresses = []
         try:
@@ -533,11 +540,51 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
         
             
             
-        #print "Waiting 60 seconds for external networking"
-        time.sleep(10)
+        # wait until every instance reports its external address.
+        def isAssociated():
+            for (i,public_ip) in zip(instances,external_addresses):
+                i.update()
+                if i.ip_address != public_ip:
+                    return False
+            return True
+        
+        if not OFSTestWait.waitUntil(isAssociated,"external networking",timeout=60,old_wait=10):
+            print "External IP addresses were not associated in 60s."
+            return None
         
         return external_addresses
         
+    ##
+    #
+    # @fn isInstanceRunning(self,instance):
+    # Readiness probe. Refreshes the state of an instance. See OFSTestWait.
+    # @param self The object pointer
+    # @param instance EC2 instance
+    # @return True if the instance is running.
+    #
+
+    def isInstanceRunning(self,instance):
+        instance.update()
+        logging.info("Instance %s at %s has state %s with code %r" % (instance.id,instance.ip_address,instance.state,instance.state_code))
+        return instance.state == "running"
+
+    ##
+    #
+    # @fn terminateInstances(self,instances):
+    # Terminates instances that could not be set up.
+    # @param self The object pointer
+    # @param instances List of EC2 instances
+    #
+
+    def terminateInstances(self,instances):
+        for instance in instances:
+            print "Terminating instance %s" % instance.id
+            try:
+                instance.terminate()
+            except AttributeError:
+                # See terminateCloudInstance.
+                pass
+
     ##
     #
     # @fn checkCloudConnection(self):	
@@ -556,6 +603,7 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
     # @param self The object pointer
     #
     
+    @OFSTestTrace.traced("cloud")
     def getAllCloudInstances(self):
         self.checkCloudConnection()
         
@@ -603,30 +651,31 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
     #    @param security_group_ids List of security group ids for this instance.
     #    @param spot_instance_bid Maximum bid for spot instances. Ignored if not applicable.
     #
-    #    @returns list of new nodes.
+    #    @returns list of new nodes. Empty if the instances could not be created or did not come up. Those are terminated.
 
 
     
+    @OFSTestTrace.traced("cloud")
     def createNewCloudNodes(self,number_nodes,image_name=None,flavor_name="t2.micro",local_master=None,associateip=False,domain=None,cloud_subnet=None,instance_suffix="",image_id=None,security_group_ids=None,spot_instance_bid=None):
         
         # This function creates number nodes on the cloud system. 
         # It returns a list of nodes
         
         new_instances = self.createNewCloudInstances(number_nodes,image_name,flavor_name,cloud_subnet,instance_suffix,image_id,security_group_ids,spot_instance_bid)
+        if new_instances is None:
+            return []
         # new instances should have a 60 second delay to make sure everything is running.
 
         ip_addresses = []
         new_ofs_test_nodes = []
         
         for idx,instance in enumerate(new_instances):
-            instance.update()
-            logging.info("Instance %s at %s has state %s with code %r" % (instance.id,instance.ip_address,instance.state,instance.state_code))
-            
-            while instance.state_code == 0:
-                
-                time.sleep(10)
-                instance.update()
-                logging.info("Instance %s at %s has state %s with code %r" % (instance.id,instance.ip_address,instance.state,instance.state_code))
+            if not OFSTestWait.waitUntil(self.isInstanceRunning,"instance %s" % instance.id,timeout=600,args=[instance],initial_delay=5):
+                msg = "Instance %s is not running after 600s. Terminating the new instances." % instance.id
+                print msg
+                logging.error(msg)
+                self.terminateInstances(new_instances)
+                return []
             
             
         
@@ -634,6 +683,10 @@ class OFSEC2ConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManage
         if associateip:
             # if we need to associate an external ip address, do so
             ip_addresses = self.associateIPAddresses(new_instances,domain)
+            if ip_addresses is None:
+                logging.error("External IP addresses were not associated. Terminating the new instances.")
+                self.terminateInstances(new_instances)
+                return []
         else:
             #otherwise use the default internal address
             
@@ -0,0 +1,786 @@
+#!/usr/bin/python
+##
+#
+# @class OFSExecutionEngine
+#
+# @brief This class runs commands on many nodes from a single thread.
+#
+# OFSExecutionEngine is a small event loop in the style of asyncio, written for Python 2.
+# Work is expressed as coroutines: generators that yield what they are waiting for.
+# A coroutine may yield:
+#
+#   - an OFSCommandTask (from OFSTestNode.runSingleCommandAsync and friends). The coroutine
+#     resumes with the return code when the command exits.
+#   - another coroutine. The coroutine resumes with its result.
+#   - a list of tasks and coroutines. They run concurrently. The coroutine resumes with a
+#     list of results in the same order.
+#   - sleep(seconds).
+#   - inThread(function,*args). The blocking function runs in a worker thread. Use this
+#     for work that has no coroutine version.
+#
+# A coroutine returns a value with "raise Return(value)".
+#
+# Commands run as local child processes (ssh for remote nodes). All of their pipes are
+# watched with poll(), so hundreds of nodes need no more than one thread.
+#
+# Commands of a node (OFSTestNode.runSingleCommandAsync) go through the node like
+# runSingleCommand: they are not run after OFSTestNode.cancelCommands(), are killed by it,
+# and time out after the node's command_timeout or command_deadline, on both sides. They do
+# not use the remote agent or streaming capture: each runs over its own ssh, and its whole
+# output is kept in memory.
+#
+# Example:
+#
+#   def restart(node):
+#       yield node.runSingleCommandAsync("killall -s 9 pvfs2-server")
+#       yield sleep(5)
+#       rc = yield node.startOFSServerAsync()
+#       raise Return(rc)
+#
+#   results = ofs_network.gather(node_list,restart,concurrency=20,timeout=600)
+#
+
+import os
+import time
+import heapq
+import select
+import signal
+import types
+import threading
+import subprocess
+import collections
+import logging
+import OFSTestTrace
+
+
+##
+# @class Return
+#
+# Raised by a coroutine to return a value.
+
+class Return(Exception):
+    def __init__(self,value=None):
+        Exception.__init__(self,value)
+        self.value = value
+
+
+##
+# @class OFSTimeoutError
+#
+# Result of a coroutine that did not finish before its deadline.
+
+class OFSTimeoutError(Exception):
+    pass
+
+
+##
+# @class OFSSleep
+#
+# Yielded by a coroutine to wait without blocking other coroutines. Use sleep(seconds).
+
+class OFSSleep(object):
+    def __init__(self,seconds):
+        self.seconds = seconds
+
+##
+# @fn sleep(seconds):
+#
+# @param seconds Time to wait
+#
+# @return Object to yield from a coroutine.
+
+def sleep(seconds):
+    return OFSSleep(seconds)
+
+
+##
+# @class OFSThreadCall
+#
+# Yielded by a coroutine to run a blocking function in a worker thread. Use inThread().
+
+class OFSThreadCall(object):
+    def __init__(self,function,args,kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+##
+# @fn inThread(function,*args,**kwargs):
+#
+# @param function Blocking function
+# @param args Arguments of function
+# @param kwargs Keyword arguments of function
+#
+# @return Object to yield from a coroutine. The coroutine resumes with the return value of function.
+
+def inThread(function,*args,**kwargs):
+    return OFSThreadCall(function,args,kwargs)
+
+
+##
+# @class OFSCommandTask
+#
+# A shell command line that the engine will run as a local child process.
+# The engine fills output with [command_line, stdout, stderr] like OFSTestNode.runSingleCommand.
+
+class OFSCommandTask(object):
+
+    ##
+    # @fn __init__(self,command_line,output=None,stdin_file=None,node=None,command=None,remote_user=None):
+    #
+    # @param self The object pointer
+    # @param command_line Local shell command line, e.g. from OFSTestNode.prepareCommandLine.
+    # @param output Output list
+    # @param stdin_file File name to use as standard input. Default is /dev/null.
+    # @param node OFSTestNode the command runs on. Used by runCoroutine.
+    # @param command Command as passed to OFSTestNode.runSingleCommand. Used by runCoroutine.
+    # @param remote_user User that runs command. Used by runCoroutine.
+
+    def __init__(self,command_line,output=None,stdin_file=None,node=None,command=None,remote_user=None):
+        self.command_line = command_line
+        self.node = node
+        self.command = command
+        self.remote_user = remote_user
+        if output is None:
+            output = []
+        self.output = output
+        self.stdin_file = stdin_file
+        self.process = None
+        self.buffers = {}
+        self.rc = None
+        self.start_time = None
+        self.end_time = None
+        # set by OFSTestNode.prepareCommandTask
+        self.timeout = None
+        self.token = None
+        self.watch = None
+        self.timed_out = []
+
+    ##
+    # @fn runBlocking(self):
+    #
+    # Runs the command in the calling thread.
+    #
+    # @param self The object pointer
+    #
+    # @return Return code of the command
+
+    def runBlocking(self):
+        if self.node is not None and self.stdin_file is None:
+            self.rc = self.node.runSingleCommand(self.command,self.output,self.remote_user)
+            return self.rc
+
+        logging.info("Command: "+self.command_line)
+        stdin = open(os.devnull,'r')
+        if self.stdin_file is not None:
+            stdin.close()
+            stdin = open(self.stdin_file,'r')
+        p = subprocess.Popen(self.command_line,shell=True,stdin=stdin,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+        del self.output[:]
+        self.output.append(self.command_line)
+        for i in p.communicate():
+            self.output.append(i)
+        stdin.close()
+        self.rc = p.returncode
+        logging.info("RC: %r" % self.rc)
+        return self.rc
+
+
+##
+# @class OFSFrame
+#
+# One unit of work waiting in the engine: a coroutine, a command, a sleep or a list.
+# When it finishes, callback(value,error) is called.
+
+class OFSFrame(object):
+    def __init__(self,work,callback,root):
+        self.work = work
+        self.callback = callback
+        self.root = root
+        self.done = False
+
+
+##
+# @class OFSRoot
+#
+# Top-level piece of work started by spawn(), with its own deadline.
+
+class OFSRoot(object):
+    def __init__(self,key,work,timeout):
+        self.key = key
+        self.work = work
+        self.timeout = timeout
+        self.deadline = None
+        self.start_time = None
+        self.end_time = None
+        self.done = False
+        self.result = None
+        self.generators = []
+        self.tasks = []
+
+
+class OFSExecutionEngine(object):
+
+    ##
+    # @fn __init__(self,concurrency=None):
+    #
+    # Initialization routine.
+    #
+    # @param self The object pointer
+    # @param concurrency Maximum number of spawned roots running at once. None or 0 is unlimited.
+
+    def __init__(self,concurrency=None):
+
+        ## @var concurrency
+        # maximum number of roots running at once
+        self.concurrency = concurrency
+
+        ## @var roots
+        # all spawned roots, in spawn order
+        self.roots = []
+
+        self.waiting_roots = collections.deque()
+        self.active_roots = 0
+        self.ready = collections.deque()
+        self.timers = []
+        self.timer_count = 0
+        self.fd_tasks = {}
+        self.exiting_tasks = []
+        self.finished_threads = collections.deque()
+        self.poller = select.poll()
+
+        # worker threads write to this pipe to wake up poll()
+        (self.wake_read,self.wake_write) = os.pipe()
+        self.poller.register(self.wake_read,select.POLLIN)
+        self.thread_lock = threading.Lock()
+        self.running_threads = 0
+        self.closed = False
+
+    ##
+    # @fn spawn(self,key,work,timeout=None):
+    #
+    # Adds a piece of work to run when run() is called.
+    #
+    # @param self The object pointer
+    # @param key Key of the result in the dictionary returned by run(). Usually a node.
+    # @param work Coroutine, OFSCommandTask, list, or any other value (an already finished result).
+    # @param timeout Seconds the work may take after it starts. None is unlimited.
+
+    def spawn(self,key,work,timeout=None):
+        root = OFSRoot(key,work,timeout)
+        self.roots.append(root)
+        self.waiting_roots.append(root)
+
+    ##
+    # @fn run(self):
+    #
+    # Runs until all spawned work is finished.
+    #
+    # @param self The object pointer
+    #
+    # @return Dictionary key -> result. The result is the return value, or the exception that ended the work.
+
+    def run(self):
+        self.startWaitingRoots()
+
+        while self.active_roots > 0 or len(self.waiting_roots) > 0:
+
+            while len(self.ready) > 0:
+                (function,args) = self.ready.popleft()
+                function(*args)
+
+            if self.active_roots == 0 and len(self.waiting_roots) == 0:
+                break
+
+            now = time.time()
+
+            # fire timers
+            while len(self.timers) > 0 and self.timers[0][0] <= now:
+                (when,count,function,args) = heapq.heappop(self.timers)
+                self.ready.append((function,args))
+
+            # enforce deadlines
+            for root in self.roots:
+                if not root.done and root.deadline is not None and root.deadline <= now:
+                    self.cancelRoot(root,OFSTimeoutError("Timed out after %gs" % root.timeout))
+
+            self.reapTasks()
+
+            if len(self.ready) > 0:
+                continue
+
+            # wait for output, exits or the next timer
+            wait = 1.0
+            if len(self.timers) > 0:
+                wait = min(wait,max(0,self.timers[0][0]-now))
+            if len(self.exiting_tasks) > 0:
+                wait = min(wait,0.05)
+            for root in self.roots:
+                if not root.done and root.deadline is not None:
+                    wait = min(wait,max(0,root.deadline-now))
+
+            try:
+                events = self.poller.poll(wait*1000)
+            except select.error:
+                events = []
+            for (fd,event) in events:
+                if fd == self.wake_read:
+                    os.read(self.wake_read,4096)
+                else:
+                    self.readTask(fd)
+
+            while len(self.finished_threads) > 0:
+                self.ready.append(self.finished_threads.popleft())
+
+        # commands of cancelled work may still be exiting.
+        leftover = set(self.fd_tasks.values())
+        leftover.update(self.exiting_tasks)
+        for task in leftover:
+            killProcessGroup(task.process)
+            task.process.wait()
+            task.process.stdout.close()
+            task.process.stderr.close()
+            if task.node is not None:
+                task.node.finishCommandTask(task)
+        for fd in self.fd_tasks.keys():
+            self.poller.unregister(fd)
+        self.fd_tasks = {}
+        self.exiting_tasks = []
+        self.poller.unregister(self.wake_read)
+        # threads of cancelled work close the pipe when they finish.
+        self.thread_lock.acquire()
+        self.closed = True
+        if self.running_threads == 0:
+            self.closeWakePipe()
+        self.thread_lock.release()
+
+        results = {}
+        for root in self.roots:
+            results[root.key] = root.result
+        return results
+
+    ##
+    # @fn startWaitingRoots(self):
+    #
+    # Starts spawned roots until the concurrency limit is reached.
+    #
+    # @param self The object pointer
+
+    def startWaitingRoots(self):
+        while len(self.waiting_roots) > 0 and (not self.concurrency or self.active_roots < self.concurrency):
+            root = self.waiting_roots.popleft()
+            self.active_roots += 1
+            root.start_time = time.time()
+            if root.timeout is not None:
+                root.deadline = root.start_time + root.timeout
+            self.start(root.work,lambda value,error,root=root: self.finishRoot(root,value,error),root)
+
+    ##
+    # @fn finishRoot(self,root,value,error):
+    #
+    # Records the result of a root and starts the next waiting one.
+    #
+    # @param self The object pointer
+    # @param root OFSRoot that finished
+    # @param value Return value
+    # @param error Exception, or None
+
+    def finishRoot(self,root,value,error):
+        if root.done:
+            return
+        root.done = True
+        root.end_time = time.time()
+        if error is not None:
+            root.result = error
+        else:
+            root.result = value
+        self.active_roots -= 1
+        self.startWaitingRoots()
+
+    ##
+    # @fn cancelRoot(self,root,error):
+    #
+    # Kills the commands of a root and closes its coroutines.
+    #
+    # @param self The object pointer
+    # @param root OFSRoot to cancel
+    # @param error Exception recorded as the result
+
+    def cancelRoot(self,root,error):
+        logging.info("Cancelling work for %r: %s" % (root.key,error))
+        for task in root.tasks:
+            if task.process is not None and task.rc is None:
+                if task.node is not None and task.token is not None:
+                    # ssh can be slow. Do not hold up the loop.
+                    t = threading.Thread(target=task.node.killRemoteCommand,args=(task.token,task.remote_user))
+                    t.setDaemon(True)
+                    t.start()
+                killProcessGroup(task.process)
+        for gen in root.generators:
+            try:
+                gen.close()
+            except:
+                pass
+        self.finishRoot(root,None,error)
+
+    ##
+    # @fn start(self,work,callback,root):
+    #
+    # Starts one unit of work. callback(value,error) is queued when it finishes.
+    #
+    # @param self The object pointer
+    # @param work Coroutine, OFSCommandTask, OFSSleep, list, or plain value.
+    # @param callback Function called with (value,error).
+    # @param root OFSRoot the work belongs to.
+
+    def start(self,work,callback,root):
+        frame = OFSFrame(work,callback,root)
+
+        if isinstance(work,types.GeneratorType):
+            root.generators.append(work)
+            self.ready.append((self.step,(frame,None,None)))
+        elif isinstance(work,OFSCommandTask):
+            self.startTask(frame)
+        elif isinstance(work,OFSSleep):
+            self.addTimer(work.seconds,self.complete,(frame,None,None))
+        elif isinstance(work,OFSThreadCall):
+            self.startThread(frame)
+        elif isinstance(work,list):
+            self.startList(frame)
+        else:
+            # already a result
+            self.ready.append((self.complete,(frame,work,None)))
+
+    ##
+    # @fn complete(self,frame,value,error):
+    #
+    # Finishes a frame and hands the result to its callback.
+    #
+    # @param self The object pointer
+    # @param frame OFSFrame
+    # @param value Result
+    # @param error Exception, or None
+
+    def complete(self,frame,value,error):
+        if frame.done or frame.root.done:
+            return
+        frame.done = True
+        frame.callback(value,error)
+
+    ##
+    # @fn step(self,frame,value,error):
+    #
+    # Resumes a coroutine with value, or throws error into it.
+    #
+    # @param self The object pointer
+    # @param frame OFSFrame holding the coroutine
+    # @param value Value sent into the coroutine
+    # @param error Exception thrown into the coroutine, or None
+
+    def step(self,frame,value,error):
+        if frame.root.done:
+            return
+        try:
+            if error is not None:
+                item = frame.work.throw(error)
+            else:
+                item = frame.work.send(value)
+        except Return as r:
+            self.complete(frame,r.value,None)
+        except StopIteration:
+            self.complete(frame,None,None)
+        except Exception as e:
+            logging.exception("Coroutine failed")
+            self.complete(frame,None,e)
+        else:
+            self.start(item,lambda v,e,frame=frame: self.ready.append((self.step,(frame,v,e))),frame.root)
+
+    ##
+    # @fn startList(self,frame):
+    #
+    # Starts every element of a list concurrently. Completes with the list of results.
+    # An element that fails contributes its exception to the list.
+    #
+    # @param self The object pointer
+    # @param frame OFSFrame holding the list
+
+    def startList(self,frame):
+        items = frame.work
+        results = [None] * len(items)
+        remaining = [len(items)]
+
+        if len(items) == 0:
+            self.ready.append((self.complete,(frame,results,None)))
+            return
+
+        def finished(index,value,error):
+            if error is not None:
+                results[index] = error
+            else:
+                results[index] = value
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                self.complete(frame,results,None)
+
+        for index in range(len(items)):
+            self.start(items[index],lambda v,e,index=index: finished(index,v,e),frame.root)
+
+    ##
+    # @fn startThread(self,frame):
+    #
+    # Runs the function of an OFSThreadCall in a daemon thread. A cancelled thread is left
+    # to finish on its own; its result is ignored.
+    #
+    # @param self The object pointer
+    # @param frame OFSFrame holding the OFSThreadCall
+
+    def startThread(self,frame):
+        call = frame.work
+
+        def worker():
+            value = None
+            error = None
+            try:
+                value = call.function(*call.args,**call.kwargs)
+            except Exception as e:
+                logging.exception("Thread failed")
+                error = e
+            self.thread_lock.acquire()
+            self.running_threads -= 1
+            if self.closed == False:
+                self.finished_threads.append((self.complete,(frame,value,error)))
+                os.write(self.wake_write,'x')
+            elif self.running_threads == 0:
+                self.closeWakePipe()
+            self.thread_lock.release()
+
+        self.thread_lock.acquire()
+        self.running_threads += 1
+        self.thread_lock.release()
+        t = threading.Thread(target=worker)
+        t.setDaemon(True)
+        t.start()
+
+    ##
+    # @fn closeWakePipe(self):
+    #
+    # Closes the pipe used to wake up poll(). Called with thread_lock held.
+    #
+    # @param self The object pointer
+
+    def closeWakePipe(self):
+        os.close(self.wake_read)
+        os.close(self.wake_write)
+
+    ##
+    # @fn addTimer(self,seconds,function,args):
+    #
+    # Queues function(*args) after seconds.
+    #
+    # @param self The object pointer
+    # @param seconds Delay
+    # @param function Function to call
+    # @param args Arguments
+
+    def addTimer(self,seconds,function,args):
+        self.timer_count += 1
+        heapq.heappush(self.timers,(time.time()+seconds,self.timer_count,function,args))
+
+    ##
+    # @fn startTask(self,frame):
+    #
+    # Starts the child process of an OFSCommandTask in its own process group.
+    #
+    # @param self The object pointer
+    # @param frame OFSFrame holding the task
+
+    def startTask(self,frame):
+        task = frame.work
+        task.frame = frame
+        frame.root.tasks.append(task)
+
+        del task.output[:]
+        task.output.append(task.command_line)
+        if task.node is not None:
+            # a command with a deadline is tracked, so cancelRoot can kill it on the node.
+            rc = task.node.prepareCommandTask(task,track=(frame.root.deadline is not None))
+            if rc is not None:
+                task.rc = rc
+                self.ready.append((self.complete,(frame,rc,None)))
+                return
+
+        logging.info('---------------------------------------------------')
+        logging.info("Command: "+task.command_line)
+
+        if task.stdin_file is not None:
+            stdin = open(task.stdin_file,'r')
+        else:
+            stdin = open(os.devnull,'r')
+
+        task.start_time = time.time()
+        try:
+            task.process = subprocess.Popen(task.command_line,shell=True,stdin=stdin,stdout=subprocess.PIPE,stderr=subprocess.PIPE,close_fds=True,preexec_fn=os.setsid)
+        except OSError as e:
+            stdin.close()
+            logging.exception("Could not start command")
+            self.ready.append((self.complete,(frame,None,e)))
+            return
+        stdin.close()
+        if task.node is not None:
+            task.node.watchCommandTask(task)
+
+        for pipe in [task.process.stdout,task.process.stderr]:
+            fd = pipe.fileno()
+            task.buffers[fd] = []
+            self.fd_tasks[fd] = task
+            self.poller.register(fd,select.POLLIN | select.POLLHUP | select.POLLERR)
+
+    ##
+    # @fn readTask(self,fd):
+    #
+    # Reads available output of a task. Queues the task for exit when both pipes are closed.
+    #
+    # @param self The object pointer
+    # @param fd File descriptor with pending output
+
+    def readTask(self,fd):
+        task = self.fd_tasks.get(fd)
+        if task is None:
+            return
+        try:
+            data = os.read(fd,65536)
+        except OSError:
+            data = ''
+        if data != '':
+            task.buffers[fd].append(data)
+            return
+
+        # end of file
+        self.poller.unregister(fd)
+        del self.fd_tasks[fd]
+        if task.process.stdout.fileno() not in self.fd_tasks and task.process.stderr.fileno() not in self.fd_tasks:
+            self.exiting_tasks.append(task)
+
+    ##
+    # @fn reapTasks(self):
+    #
+    # Collects tasks whose process has exited.
+    #
+    # @param self The object pointer
+
+    def reapTasks(self):
+        still_exiting = []
+        for task in self.exiting_tasks:
+            if task.process.poll() is None:
+                still_exiting.append(task)
+                continue
+
+            task.end_time = time.time()
+            task.rc = task.process.returncode
+            task.output.append(''.join(task.buffers[task.process.stdout.fileno()]))
+            task.output.append(''.join(task.buffers[task.process.stderr.fileno()]))
+            task.process.stdout.close()
+            task.process.stderr.close()
+            task.buffers = {}
+            if task.node is not None:
+                task.rc = task.node.finishCommandTask(task)
+
+            logging.info("Command: "+task.command_line)
+            logging.info("RC: %r (%.3fs)" % (task.rc,task.end_time-task.start_time))
+            logging.info("STDOUT: %s" % task.output[1])
+            logging.info("STDERR: %s" % task.output[2])
+            
+            node = task.node
+            if node is None:
+                node = "local"
+            name = task.command
+            if name is None:
+                name = task.command_line
+            OFSTestTrace.record("command",node,name,task.start_time,task.end_time,task.rc,task.output)
+
+            self.ready.append((self.complete,(task.frame,task.rc,None)))
+        self.exiting_tasks = still_exiting
+
+    ##
+    # @fn getElapsedTimes(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Dictionary key -> seconds each spawned root ran.
+
+    def getElapsedTimes(self):
+        times = {}
+        for root in self.roots:
+            if root.start_time is not None and root.end_time is not None:
+                times[root.key] = root.end_time - root.start_time
+        return times
+
+
+##
+# @fn killProcessGroup(process):
+#
+# Kills a child started by the engine together with everything it started.
+#
+# @param process subprocess.Popen object
+
+def killProcessGroup(process):
+    try:
+        os.killpg(process.pid,signal.SIGKILL)
+    except OSError:
+        pass
+
+
+##
+# @fn runCoroutine(work):
+#
+# Runs a coroutine to completion in the calling thread, without an event loop. Commands run
+# one at a time through OFSTestNode.runSingleCommand, so the blocking methods of OFSTestNode
+# share their implementation with the coroutine versions and keep every feature of
+# runSingleCommand.
+#
+# @param work Coroutine, OFSCommandTask, OFSSleep, OFSThreadCall, list, or plain value.
+#
+# @return Result of the work. Exceptions raised by a coroutine are raised again.
+
+def runCoroutine(work):
+
+    if isinstance(work,types.GeneratorType):
+        value = None
+        error = None
+        while True:
+            try:
+                if error is not None:
+                    item = work.throw(error)
+                else:
+                    item = work.send(value)
+            except Return as r:
+                return r.value
+            except StopIteration:
+                return None
+            try:
+                value = runCoroutine(item)
+                error = None
+            except Exception as e:
+                value = None
+                error = e
+
+    elif isinstance(work,OFSCommandTask):
+        return work.runBlocking()
+
+    elif isinstance(work,OFSSleep):
+        time.sleep(work.seconds)
+        return None
+
+    elif isinstance(work,OFSThreadCall):
+        return work.function(*work.args,**work.kwargs)
+
+    elif isinstance(work,list):
+        results = []
+        for item in work:
+            try:
+                results.append(runCoroutine(item))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    return work
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+##
+#
+# @file OFSJSONStore.py
+#
+# @brief Reads and writes the JSON files the test program keeps between runs.
+#
+# The node facts cache, the build cache index, the setup checkpoints and the test history
+# are each one JSON dictionary on the local machine. A file is replaced in one step, so a
+# reader never sees half a file. A missing or damaged file reads as no file.
+#
+
+import os
+import json
+import logging
+
+##
+# @fn encodeStrings(value):
+#
+# @param value Value decoded from JSON.
+#
+# @return value with every unicode string, including dictionary keys, encoded as UTF-8 str.
+
+def encodeStrings(value):
+    if isinstance(value,unicode):
+        return value.encode("utf-8")
+    if isinstance(value,list):
+        return [encodeStrings(item) for item in value]
+    if isinstance(value,dict):
+        return dict([(encodeStrings(k),encodeStrings(v)) for (k,v) in value.items()])
+    return value
+
+##
+# @fn loadJSONFile(filename,description):
+#
+# @param filename JSON file on the local machine
+# @param description What the file holds, for the log, e.g. "checkpoints"
+#
+# @return Dictionary in the file, with str strings (see encodeStrings). None if the file is missing or damaged.
+
+def loadJSONFile(filename,description):
+    if not os.path.isfile(filename):
+        return None
+    try:
+        f = open(filename,'r')
+        try:
+            data = json.load(f)
+        finally:
+            f.close()
+    except (IOError,ValueError):
+        logging.exception("Could not read %s %s. Ignoring it." % (description,filename))
+        return None
+    if not isinstance(data,dict):
+        logging.warning("Ignoring %s %s. It does not hold a dictionary." % (description,filename))
+        return None
+    return encodeStrings(data)
+
+##
+# @fn saveJSONFile(filename,data,description):
+#
+# Writes data to a temporary file next to filename and renames it over filename. Creates
+# the directory of filename if needed.
+#
+# @param filename JSON file on the local machine
+# @param data Dictionary to write
+# @param description What the file holds, for the log, e.g. "checkpoints"
+#
+# @return 0 on success, 1 if the file could not be written.
+
+def saveJSONFile(filename,data,description):
+    temp_filename = "%s.%d" % (filename,os.getpid())
+    try:
+        directory = os.path.dirname(filename)
+        if directory != "" and not os.path.isdir(directory):
+            os.makedirs(directory)
+        f = open(temp_filename,'w')
+        try:
+            json.dump(data,f,indent=1,sort_keys=True)
+        finally:
+            f.close()
+        os.rename(temp_filename,filename)
+    except (IOError,OSError):
+        logging.exception("Could not write %s %s" % (description,filename))
+        return 1
+    return 0
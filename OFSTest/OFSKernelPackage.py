@@ -0,0 +1,178 @@
+#!/usr/bin/python
+##
+#
+# @file OFSKernelPackage.py
+#
+# @brief Builds a custom kernel once and installs it on many nodes.
+#
+# PACKAGE_SCRIPT packs a built kernel tree into one archive: the kernel image, System.map,
+# the config and the modules. INSTALL_SCRIPT installs such an archive on a node the way
+# make install and make modules_install would, without the source tree. The nodes then
+# only need the archive, which OFSTestNetwork.broadcast() sends to all of them at once.
+#
+# A package is found again by the kernel commit, the base config of the running kernel,
+# the config changes below, the architecture and the compiler. KEY_SCRIPT reads them
+# without cloning the repository. See OFSTestNetwork.installCustomKernelOnNodes.
+#
+
+import base64
+
+## @var CONFIG_EDITS
+# Changes to the kernel config after make olddefconfig.
+CONFIG_EDITS = [
+    # CRYPTO_AES_NI_INTEL causes kernel panic on boot as of 4.2.0_rc2. Do not compile it.
+    "sed -i s/CONFIG_CRYPTO_AES_NI_INTEL=y/CONFIG_CRYPTO_AES_NI_INTEL=n/ ./.config",
+    # Enable OrangeFS
+    "echo 'CONFIG_ORANGEFS_FS=m' >> ./.config"
+    ]
+
+## @var KEY_SCRIPT
+# Prints name=value lines with what a kernel build depends on. Arguments: git location and branch.
+KEY_SCRIPT = r'''
+location="$1"
+branch="$2"
+
+commit=$(git ls-remote "$location" "refs/heads/$branch" "refs/tags/$branch^{}" "refs/tags/$branch" 2>/dev/null | head -n 1 | cut -f 1)
+if [ -z "$commit" ] && echo "$branch" | grep -q -E '^[0-9a-f]{40}$'; then
+    commit="$branch"
+fi
+echo "commit=$commit"
+echo "config=$(cat /boot/config-$(uname -r) 2>/dev/null | sha256sum | cut -d ' ' -f 1)"
+echo "machine=$(uname -m)"
+echo "compiler=$(gcc --version 2>/dev/null | head -n 1)"
+'''
+
+## @var PACKAGE_SCRIPT
+# Packs a built kernel tree. Arguments: kernel source directory and package file. Prints the kernel release.
+PACKAGE_SCRIPT = r'''
+source="$1"
+package="$2"
+
+cd "$source" || exit 1
+release=$(make -s kernelrelease)
+[ -n "$release" ] || exit 1
+image=$(make -s image_name 2>/dev/null)
+if [ ! -f "$image" ]; then
+    image=arch/x86/boot/bzImage
+fi
+
+stage=$(mktemp -d /tmp/ofstest-kernel.XXXXXX)
+make INSTALL_MOD_PATH=$stage/root modules_install > $stage/modules_install.log 2>&1 || { cat $stage/modules_install.log; rm -rf $stage; exit 1; }
+mkdir -p $stage/package/modules
+mv $stage/root/lib/modules/$release $stage/package/modules/
+rm -f $stage/package/modules/$release/build $stage/package/modules/$release/source
+cp "$image" $stage/package/vmlinuz
+cp System.map $stage/package/System.map
+cp .config $stage/package/config
+echo "$release" > $stage/package/release
+tar -C $stage/package -czf "$package" release vmlinuz System.map config modules
+rc=$?
+rm -rf $stage
+echo "$release"
+exit $rc
+'''
+
+## @var INSTALL_SCRIPT
+# Installs a package from PACKAGE_SCRIPT. Run as root. Argument: package file. Prints the kernel release.
+INSTALL_SCRIPT = r'''
+package="$1"
+
+PATH=$PATH:/sbin:/usr/sbin:/bin:/usr/bin
+
+dir=$(mktemp -d /tmp/ofstest-kernel.XXXXXX)
+tar -C $dir -xzf "$package" || { rm -rf $dir; exit 1; }
+release=$(cat $dir/release)
+
+rm -rf /lib/modules/$release
+cp -a $dir/modules/$release /lib/modules/ || { rm -rf $dir; exit 1; }
+depmod -a $release
+
+# installkernel is what make install calls. It copies the image and builds the initramfs.
+if command -v installkernel > /dev/null; then
+    installkernel $release $dir/vmlinuz $dir/System.map /boot
+    rc=$?
+else
+    cp $dir/vmlinuz /boot/vmlinuz-$release && cp $dir/System.map /boot/System.map-$release
+    rc=$?
+    if [ $rc -eq 0 ]; then
+        if command -v dracut > /dev/null; then
+            dracut -f /boot/initramfs-$release.img $release
+        elif command -v update-initramfs > /dev/null; then
+            update-initramfs -c -k $release
+        elif command -v mkinitrd > /dev/null; then
+            mkinitrd /boot/initrd-$release $release
+        fi
+        rc=$?
+    fi
+fi
+cp $dir/config /boot/config-$release
+rm -rf $dir
+echo "$release"
+exit $rc
+'''
+
+##
+# @fn getScriptCommand(script,arguments):
+#
+# @param script Shell script
+# @param arguments List of arguments. They must not need quoting.
+#
+# @return Shell command that runs script with arguments.
+
+def getScriptCommand(script,arguments):
+    return "echo %s | base64 -d | bash -s -- %s" % (base64.b64encode(script)," ".join(arguments))
+
+##
+# @fn getKeyCommand(kernel_git_location,kernel_git_branch):
+#
+# @return Shell command that runs KEY_SCRIPT.
+
+def getKeyCommand(kernel_git_location,kernel_git_branch):
+    return getScriptCommand(KEY_SCRIPT,[kernel_git_location,kernel_git_branch])
+
+##
+# @fn getPackageCommand(source_location,package_file):
+#
+# @return Shell command that runs PACKAGE_SCRIPT.
+
+def getPackageCommand(source_location,package_file):
+    return getScriptCommand(PACKAGE_SCRIPT,[source_location,package_file])
+
+##
+# @fn getInstallCommand(package_file):
+#
+# @return Shell command that runs INSTALL_SCRIPT.
+
+def getInstallCommand(package_file):
+    return getScriptCommand(INSTALL_SCRIPT,[package_file])
+
+##
+# @fn parseKeyOutput(stdout):
+#
+# @param stdout Standard output of KEY_SCRIPT.
+#
+# @return Dictionary with commit, config, machine, compiler and the CONFIG_EDITS. None if the commit is not known.
+
+def parseKeyOutput(stdout):
+    parts = {}
+    for line in stdout.splitlines():
+        if "=" in line:
+            (name,value) = line.split("=",1)
+            parts[name.strip()] = value.strip()
+    if parts.get("commit","") == "":
+        return None
+    parts["config_edits"] = CONFIG_EDITS
+    return parts
+
+##
+# @fn getRelease(stdout):
+#
+# @param stdout Standard output of PACKAGE_SCRIPT or INSTALL_SCRIPT.
+#
+# @return Kernel release, the last line of the output.
+
+def getRelease(stdout):
+    lines = [line.strip() for line in stdout.splitlines() if line.strip() != ""]
+    if len(lines) == 0:
+        return ""
+    return lines[-1]
@@ -87,7 +87,7 @@ def IOR_posix(testing_node,output=[]):
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/src/C/IOR -a POSIX -F -i 1 -N %s -b %dm -k -t 4m -s 1 -o %s/mpivfsfile" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ior_installation_location,np,bs,testing_node.ofs_mount_point),output)
     
     #TODO: Compare actual results with expected.
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     testing_node.runSingleCommand("rm -f /tmp/mount/orangefs/mpivfsfile*")
     print output[1]
     print output[2]
@@ -118,7 +118,7 @@ def IOR_single_posix(testing_node,output=[]):
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/src/C/IOR -a POSIX -F -i 1 -N %s -b %dm -t 4m -s 1 -o %s/mpivfsfile" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ior_installation_location,np,bs,testing_node.ofs_mount_point),output)
     
     #TODO: Compare actual results with expected.
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     testing_node.runSingleCommand("rm -f /tmp/mount/orangefs/mpivfsfile*")
     print output[1]
     print output[2]
@@ -147,7 +147,7 @@ def IOR_single_mpiio(testing_node,output=[]):
     bs = 16384 / int(np)
     
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/src/C/IOR -a MPIIO -C -i 1 -N %s -b %dm -t 4m -s 1 -o pvfs2:%s/mpiiofile" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ior_installation_location,np,bs,testing_node.ofs_mount_point),output)
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     print output[1]
     print output[2]
     
@@ -176,7 +176,7 @@ def IOR_mpiio(testing_node,output=[]):
     
     
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/src/C/IOR -a MPIIO -C -i 1 -N %s -b %dm -k -t 4m -s 1 -o pvfs2:%s/mpiiofile" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ior_installation_location,np,bs,testing_node.ofs_mount_point),output)
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     print output[1]
     print output[2]
     
@@ -206,7 +206,7 @@ def mdtest(testing_node,output=[]):
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/mdtest  -n 256 -w 4194304 -i 1 -d %s/mdtest" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.mdtest_installation_location,testing_node.ofs_mount_point),output)
     
     #TODO: Compare actual results with expected.
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     print output[1]
     print output[2]
 
@@ -238,7 +238,7 @@ def simul(testing_node,output=[]):
     
     #TODO: Compare actual results with expected.
     # Wait for all changes to be written.
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     print output[1]
     print output[2]
 
@@ -271,7 +271,7 @@ def multi_md_test(testing_node,output=[]):
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/test/multi-md-test -d %s/multi_md_test -n 100 -s 1024 -a 0 -p 5 -c 1,1,%s" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point,np),output)
     
     #TODO: Compare actual results with expected.
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     print output[1]
     print output[2]
 
@@ -302,7 +302,7 @@ def multi_md_test_size_sweep(testing_node,output=[]):
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/test/multi-md-test-size-sweep -d %s/multi_md_size_sweep -n 1000 -a 0 -s 1,1,%s" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point,np),output)
     
     #TODO: Compare actual results with expected.
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     print output[1]
     print output[2]
 
@@ -346,13 +346,13 @@ def mpi_md_test_create(testing_node,output=[]):
     rc = testing_node.changeDirectory("%s" % testing_node.ofs_mount_point)
     np = testing_node.number_mpi_slots
     testing_node.runSingleCommand("mkdir -p %s/mpi_md_test" % testing_node.ofs_mount_point)
-    time.sleep(5)
+    testing_node.waitForOFSServerIdle(old_wait=5)
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/test/mpi-md-test -O -n 100 -d pvfs2:%s/mpi_md_test" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point),output)
 
     print output[1]
     print output[2]
     
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     #TODO: Compare actual results with expected.
     
     return rc
@@ -364,13 +364,13 @@ def mpi_md_test_resize(testing_node,output=[]):
     rc = testing_node.changeDirectory("%s" % testing_node.ofs_mount_point)
     np = testing_node.number_mpi_slots
 
-    time.sleep(5)
+    testing_node.waitForOFSServerIdle(old_wait=5)
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/test/mpi-md-test -R -n 100 -d pvfs2:%s/mpi_md_test" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point),output)
 
     print output[1]
     print output[2]
 
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     #TODO: Compare actual results with expected.
 
     return rc
@@ -381,13 +381,13 @@ def mpi_md_test_delete(testing_node,output=[]):
 
     rc = testing_node.changeDirectory("%s" % testing_node.ofs_mount_point)
     np = testing_node.number_mpi_slots
-    time.sleep(5)
+    testing_node.waitForOFSServerIdle(old_wait=5)
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/test/mpi-md-test -D -n 100 -d pvfs2:%s/mpi_md_test" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point),output)
 
     print output[1]
     print output[2]
 
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     #TODO: Compare actual results with expected.
 
     return rc
@@ -412,10 +412,10 @@ def mpi_unbalanced_test(testing_node,output=[]):
     rc = testing_node.changeDirectory("%s" % testing_node.ofs_mount_point)
     np = testing_node.number_mpi_slots
     testing_node.runSingleCommand("mkdir -p %s/mpi_unbalanced_test" % testing_node.ofs_mount_point)
-    time.sleep(5)
+    testing_node.waitForOFSServerIdle(old_wait=5)
     rc = testing_node.runSingleCommand("time %s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/test/mpi-unbalanced-test pvfs2:%s/mpi_unbalanced_test > /dev/null" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point),output)
     
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     #TODO: Compare actual results with expected.
     print output[1]
     print output[2]
@@ -449,10 +449,10 @@ def mpi_tile_io(testing_node,output=[]):
     if (int(np) > 1):
         tiles_y =  int(np)/2
     
-    time.sleep(5)
+    testing_node.waitForOFSServerIdle(old_wait=5)
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node  %s/mpi-tile-io --nr_tiles_x 2 --nr_tiles_y %d --sz_tile_x 1000 --sz_tile_y 1000 --sz_element 2048 --filename %s/mpi_tile_io/tilefile --collective" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.mpi_tile_io_installation_location,tiles_y,testing_node.ofs_mount_point),output)
     
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     #TODO: Compare actual results with expected.
     print output[1]
     print output[2]
@@ -492,10 +492,10 @@ def npb_mpi(testing_node,output=[]):
         sq_np = 16
      
     
-    time.sleep(5)
+    testing_node.waitForOFSServerIdle(old_wait=5)
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %d --machinefile %s --prefix %s --map-by node  %s/bin/bt.C.4.mpi_io_full" % (testing_node.openmpi_installation_location,sq_np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.npb_mpi_installation_location),output)
     
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     #TODO: Compare actual results with expected.
     print output[1]
     print output[2]
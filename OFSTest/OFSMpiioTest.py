@@ -84,7 +84,7 @@ def romio_testsuite(testing_node,output=[]):
     rc = testing_node.runSingleCommand("%s -machinefile=%s -fname=pvfs2:%s/romioruntests" % (testing_node.romio_runtests_pvfs2,testing_node.created_openmpihosts,testing_node.ofs_mount_point),output)
     
     #TODO: Compare actual results with expected.
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     return rc
 
 
@@ -115,7 +115,7 @@ def heidelberg_IO(testing_node,output=[]):
     print output[2]
 
     
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     #TODO: Compare actual results with expected.
     
     return rc
@@ -143,7 +143,7 @@ def mpi_io_test(testing_node,output=[]):
     
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node %s/test/mpi-io-test -f pvfs2:%s/mpi-io-test -b $((1024*1024*32))" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point),output)
     
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     #TODO: Compare actual results with expected.
 
     print output[1]
@@ -174,7 +174,7 @@ def mpi_io_test_collective(testing_node,output=[]):
     
     rc = testing_node.runSingleCommand("%s/bin/mpiexec -np %s --machinefile %s --prefix %s --map-by node %s/test/mpi-io-test -f pvfs2:%s/mpi-io-test-C -b $((1024*1024*32)) -C" % (testing_node.openmpi_installation_location,np,testing_node.created_openmpihosts,testing_node.openmpi_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point),output)
     
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
 
     print output[1]
     print output[2]
@@ -213,7 +213,7 @@ def stadler(testing_node,output=[]):
     
     
     #TODO: Compare actual results with expected.
-    time.sleep(30)
+    testing_node.waitForOFSServerIdle(old_wait=30)
     
     print output[1]
     print output[2]
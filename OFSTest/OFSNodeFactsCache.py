@@ -0,0 +1,205 @@
+#!/usr/bin/python
+##
+#
+# @class OFSNodeFactsCache
+#
+# @brief This class keeps the facts learned about each node between runs of the test program.
+#
+# The cache is a JSON file on the local machine. It has one entry per node, keyed by IP
+# address. An entry holds the node fact probe reply (see OFSNodeProbe) and the OrangeFS,
+# OpenMPI and benchmark settings found on the node.
+#
+# The facts are used while the node has the same boot id. The OrangeFS, OpenMPI and
+# benchmark settings are only used for an existing installation (see
+# OFSTestNode.findExistingOFSInstallation), and only while that installation has not
+# changed. OFSTestNode.getNodeFactsCacheKey() reads both keys with one remote command.
+# A reboot makes the node discover everything again.
+#
+
+import threading
+import logging
+import OFSJSONStore
+
+## @var CACHED_ATTRIBUTES
+# OFSTestNode attributes saved with the node facts.
+CACHED_ATTRIBUTES = [
+    "ofs_installation_location",
+    "ofs_conf_file",
+    "ofs_fs_name",
+    "ofs_mount_point",
+    "alias_list",
+    "openmpi_installation_location",
+    "openmpi_source_location",
+    "openmpi_version",
+    "ior_installation_location",
+    "mdtest_installation_location",
+    "simul_installation_location",
+    "miranda_io_installation_location",
+    "heidelberg_installation_location",
+    "stadler_installation_location",
+    "mpiiotest_installation_location",
+    "mpi_tile_io_installation_location",
+    "npb_mpi_installation_location"
+    ]
+
+
+class OFSNodeFactsCache(object):
+
+    ##
+    # @fn __init__(self,filename="node-facts-cache.json"):
+    #
+    # Initialization routine. Reads the cache file if it exists.
+    #
+    # @param self The object pointer
+    # @param filename Cache file on the local machine.
+
+    def __init__(self,filename="node-facts-cache.json"):
+
+        ## @var filename
+        # cache file on the local machine
+        self.filename = filename
+
+        ## @var entries
+        # Dictionary of cache entries keyed by IP address
+        self.entries = {}
+
+        ## @var lock
+        # Nodes are discovered from several threads at once.
+        self.lock = threading.Lock()
+
+        self.load()
+
+    ##
+    # @fn load(self):
+    #
+    # Reads the cache file. A missing or damaged file gives an empty cache.
+    #
+    # @param self The object pointer
+
+    def load(self):
+        entries = OFSJSONStore.loadJSONFile(self.filename,"node facts cache")
+        if entries is not None:
+            self.entries = entries
+
+    ##
+    # @fn save(self):
+    #
+    # Writes the cache file. See OFSJSONStore.
+    #
+    # @param self The object pointer
+
+    def save(self):
+        self.lock.acquire()
+        try:
+            OFSJSONStore.saveJSONFile(self.filename,self.entries,"node facts cache")
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn getEntry(self,ip_address):
+    #
+    # @param self The object pointer
+    # @param ip_address IP address of the node
+    #
+    # @return Cache entry for the node, valid or not. None if there is no entry.
+
+    def getEntry(self,ip_address):
+        self.lock.acquire()
+        try:
+            return self.entries.get(ip_address)
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn lookup(self,ip_address,boot_id):
+    #
+    # @param self The object pointer
+    # @param ip_address IP address of the node
+    # @param boot_id Current boot id of the node
+    #
+    # @return Cache entry, or None if there is no entry or it is from another boot.
+
+    def lookup(self,ip_address,boot_id):
+        entry = self.getEntry(ip_address)
+        if entry is None:
+            return None
+        if boot_id == "" or entry.get("boot_id") != boot_id:
+            logging.info("Node facts cache entry for %s is from another boot." % ip_address)
+            self.invalidate(ip_address)
+            return None
+        return entry
+
+    ##
+    # @fn lookupAttributes(self,ip_address,boot_id,install_mtime):
+    #
+    # @param self The object pointer
+    # @param ip_address IP address of the node
+    # @param boot_id Current boot id of the node
+    # @param install_mtime Current modification time of the cached OrangeFS installation, as a string.
+    #
+    # @return Dictionary of CACHED_ATTRIBUTES values, or None if there are none or the installation changed.
+
+    def lookupAttributes(self,ip_address,boot_id,install_mtime):
+        entry = self.lookup(ip_address,boot_id)
+        if entry is None or entry.get("attributes") is None:
+            return None
+        if install_mtime == "" or entry.get("install_mtime","") != install_mtime:
+            logging.info("OrangeFS installation on %s changed. Cached settings dropped." % ip_address)
+            self.lock.acquire()
+            try:
+                entry.pop("attributes",None)
+                entry["install_mtime"] = ""
+            finally:
+                self.lock.release()
+            self.save()
+            return None
+        return entry["attributes"]
+
+    ##
+    # @fn store(self,ip_address,boot_id,facts=None,attributes=None,install_mtime=None):
+    #
+    # Adds or updates the entry for a node and writes the cache file.
+    #
+    # @param self The object pointer
+    # @param ip_address IP address of the node
+    # @param boot_id Current boot id of the node. Nodes without one are not cached.
+    # @param facts Node fact probe reply. None keeps the cached facts.
+    # @param attributes Dictionary of CACHED_ATTRIBUTES values. None keeps the cached values.
+    # @param install_mtime Modification time of the OrangeFS installation. None keeps the cached value.
+
+    def store(self,ip_address,boot_id,facts=None,attributes=None,install_mtime=None):
+        if boot_id == "":
+            return
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(ip_address)
+            if entry is None or entry.get("boot_id") != boot_id:
+                entry = {"boot_id" : boot_id, "install_mtime" : "", "facts" : {}}
+                self.entries[ip_address] = entry
+            if facts is not None:
+                entry["facts"] = facts
+            if attributes is not None:
+                entry["attributes"] = attributes
+            if install_mtime is not None:
+                entry["install_mtime"] = install_mtime
+        finally:
+            self.lock.release()
+        self.save()
+
+    ##
+    # @fn invalidate(self,ip_address):
+    #
+    # Removes the entry for a node and writes the cache file.
+    #
+    # @param self The object pointer
+    # @param ip_address IP address of the node
+
+    def invalidate(self,ip_address):
+        self.lock.acquire()
+        try:
+            if ip_address not in self.entries:
+                return
+            del self.entries[ip_address]
+        finally:
+            self.lock.release()
+        self.save()
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+##
+#
+# @file OFSNodeProbe.py
+#
+# @brief Gathers all facts about a node in one remote execution.
+#
+# PROBE_SCRIPT is a bash script that prints one JSON object with the kernel, architecture,
+# cores, NUMA layout, memory, distribution, hostname, home directory group, boot id,
+# OrangeFS kernel module state and free disk space of the node. It is sent base64 encoded
+# on the command line, so it needs no copy step and no quoting beyond a plain word.
+#
+# OFSTestNode.probeNodeFacts() runs it. OFSTestNetwork.probeNodeFacts() runs it on all nodes
+# at once.
+#
+
+import base64
+import json
+import logging
+import OFSJSONStore
+
+## @var PROBE_SCRIPT
+# Node fact probe. Arguments: user name, then data locations to check for free space.
+PROBE_SCRIPT = r'''
+user="$1"
+shift
+
+# print a JSON string
+js() {
+    printf '"%s"' "$(printf '%s' "$1" | sed -e 's/\\/\\\\/g' -e 's/"/\\"/g' | tr -d '\n\r\t')"
+}
+
+PATH=$PATH:/sbin:/usr/sbin
+
+os=$(uname -s)
+kernel=$(uname -r)
+processor=$(uname -p)
+machine=$(uname -m)
+hostname=$(hostname)
+
+home_group=$(ls -l /home/ 2>/dev/null | grep "$user" | awk '{print $4}' | head -n 1)
+if [ -z "$home_group" ]; then
+    home_group=$(ls -l /Users/ 2>/dev/null | grep "$user" | awk '{print $4}' | head -n 1)
+fi
+
+if [ -f /proc/cpuinfo ]; then
+    cores=$(grep processor /proc/cpuinfo | wc -l)
+else
+    cores=$(sysctl -n hw.ncpu 2>/dev/null)
+fi
+memory_kb=$(awk '/^MemTotal:/ {print $2}' /proc/meminfo 2>/dev/null)
+
+# distribution files, in the order the test system has always checked them.
+if [ -f /etc/os-release ]; then
+    distro=$(grep PRETTY_NAME /etc/os-release | head -n 1 | cut -d= -f2-)
+elif [ -f /etc/redhat-release ]; then
+    distro=$(cat /etc/redhat-release)
+elif [ -f /etc/lsb-release ]; then
+    distro=$(grep DISTRIB_DESCRIPTION /etc/lsb-release | head -n 1 | cut -d= -f2-)
+elif [ -f /etc/SuSE-release ]; then
+    distro=$(head -n 1 /etc/SuSE-release)
+elif [ "$os" = "Darwin" ]; then
+    distro="Mac OS X-$(sw_vers -productVersion)"
+else
+    distro=""
+fi
+
+boot_id=$(cat /proc/sys/kernel/random/boot_id 2>/dev/null)
+
+module_loaded=false
+if lsmod 2>/dev/null | grep -q -E 'pvfs2|orangefs'; then
+    module_loaded=true
+fi
+module_available=false
+if modinfo orangefs >/dev/null 2>&1 || modinfo pvfs2 >/dev/null 2>&1; then
+    module_available=true
+fi
+
+printf '{'
+printf '"os":%s,' "$(js "$os")"
+printf '"kernel":%s,' "$(js "$kernel")"
+printf '"processor":%s,' "$(js "$processor")"
+printf '"machine":%s,' "$(js "$machine")"
+printf '"hostname":%s,' "$(js "$hostname")"
+printf '"home_group":%s,' "$(js "$home_group")"
+printf '"cores":%d,' "${cores:-1}"
+printf '"memory_kb":%d,' "${memory_kb:-0}"
+printf '"distro":%s,' "$(js "$distro")"
+printf '"boot_id":%s,' "$(js "$boot_id")"
+printf '"module_loaded":%s,' "$module_loaded"
+printf '"module_available":%s,' "$module_available"
+
+printf '"numa":['
+sep=""
+for d in /sys/devices/system/node/node[0-9]*; do
+    [ -d "$d" ] || continue
+    cpus=$(cat "$d/cpulist" 2>/dev/null)
+    mem=$(awk '/MemTotal:/ {print $4}' "$d/meminfo" 2>/dev/null)
+    printf '%s{"node":%d,"cpus":%s,"memory_kb":%d}' "$sep" "${d##*node}" "$(js "$cpus")" "${mem:-0}"
+    sep=","
+done
+printf '],'
+
+printf '"disk":['
+sep=""
+for location in "$@"; do
+    # the location may not exist yet. Check the file system it will be created on.
+    path="$location"
+    while [ ! -e "$path" ] && [ "$path" != "/" ] && [ "$path" != "." ]; do
+        path=$(dirname "$path")
+    done
+    free_kb=$(df -Pk "$path" 2>/dev/null | awk 'NR==2 {print $4}')
+    printf '%s{"path":%s,"free_kb":%d}' "$sep" "$(js "$location")" "${free_kb:-0}"
+    sep=","
+done
+printf ']'
+
+printf '}\n'
+'''
+
+##
+# @fn getProbeCommand(user,data_locations=[]):
+#
+# @param user User whose home directory group is looked up.
+# @param data_locations Directories to report free disk space for.
+#
+# @return Shell command that runs the probe.
+
+def getProbeCommand(user,data_locations=[]):
+    encoded = base64.b64encode(PROBE_SCRIPT)
+    arguments = " ".join([user] + [location for location in data_locations if location != ""])
+    return "echo %s | base64 -d | bash -s -- %s" % (encoded,arguments)
+
+##
+# @fn parseProbeOutput(stdout):
+#
+# @param stdout Standard output of the probe command.
+#
+# @return Dictionary of node facts, or None if the output holds no probe reply.
+
+def parseProbeOutput(stdout):
+    # login banners and shell noise may come first. The reply is the last JSON line.
+    for line in reversed(stdout.splitlines()):
+        line = line.strip()
+        if line.startswith("{"):
+            try:
+                facts = json.loads(line)
+            except ValueError:
+                logging.exception("Could not parse node probe reply: %s" % line)
+                return None
+            # json gives unicode. The rest of the test system expects str.
+            return OFSJSONStore.encodeStrings(facts)
+    return None
+
+##
+# @fn countCPUList(cpulist):
+#
+# @param cpulist CPU list in the kernel format, e.g. "0-3,8-11".
+#
+# @return Number of CPUs in the list.
+
+def countCPUList(cpulist):
+    count = 0
+    for item in cpulist.split(","):
+        item = item.strip()
+        if item == "":
+            continue
+        if "-" in item:
+            (first,last) = item.split("-",1)
+            count += int(last) - int(first) + 1
+        else:
+            count += 1
+    return count
@@ -21,6 +21,8 @@ import uuid
 
 import OFSCloudConnectionManager
 import OFSTestRemoteNode
+import OFSTestTrace
+import OFSTestWait
 import neutronclient.neutron.client as neutronclient
 import novaclient.client as novaclient
 
@@ -159,6 +161,7 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
     # @param debug  Debug level.
     #
 
+    @OFSTestTrace.traced("cloud")
     def connect(self,debug=0):
         
         logging.info("AUTH_URL=%s NOVA_USERNAME=%s NOVA_PASSWORD=%s NOVA_TENANT_NAME=%s NOVA_TENANT_ID=%s" % (self.nova_auth_url, self.nova_username, self.nova_password, self.nova_tenant_name, self.nova_tenant_id))
@@ -181,6 +184,7 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
     #
     #
         
+    @OFSTestTrace.traced("cloud")
     def terminateCloudInstance(self,ip_address):
         
         self.checkCloudConnection()
@@ -220,6 +224,7 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
     #
     #
         
+    @OFSTestTrace.traced("cloud")
     def stopCloudInstance(self,ip_address):
         
         self.checkCloudConnection()
@@ -265,6 +270,7 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
     # @return    A list of new instances.
     #        
         
+    @OFSTestTrace.traced("cloud")
     def createNewCloudInstances(self,number_nodes,image_name=None,flavor_name="m1.small",subnet_id=None,instance_suffix="",image_id=None,security_group_ids=None,spot_instance_bid=None):
         self.checkCloudConnection()  
         
@@ -314,9 +320,10 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
     # @param self The object pointer
     # @param instances List of instances to associate
     # @param domain Domain on which to allocate addresses
-    # @return A list of the external addresses
+    # @return A list of the external addresses. None if the instances do not report them.
     #
 
+    @OFSTestTrace.traced("cloud")
     def associateIPAddresses(self,instances=[],domain=None):
         
         external_addresses = []
@@ -339,14 +346,51 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
             external_addresses.append(floating_ip_list[idx].ip)
 
         #external_addresses = [s.addresses[self.nova_network_name][0]['addr'] for s in instances]
-        msg = "Waiting 60 seconds for external ip address association."
+        msg = "Waiting up to 120 seconds for external ip address association."
         print msg
         logging.info(msg) 
-        time.sleep(60)
+        
+        def isAssociated():
+            for (instance,ip) in zip(instances,external_addresses):
+                addresses = self.novaapi.servers.get(instance).addresses.get(self.nova_network_name,[])
+                if ip not in [a['addr'] for a in addresses]:
+                    return False
+            return True
+        
+        if not OFSTestWait.waitUntil(isAssociated,"external ip address association",timeout=120,old_wait=60,initial_delay=2):
+            print "External IP addresses were not associated in 120s."
+            return None
 
         
         return external_addresses
         
+    ##
+    #
+    # @fn isInstanceActive(self,instance):
+    # Readiness probe. Refreshes the status of an instance. See OFSTestWait.
+    # @param self The object pointer
+    # @param instance Nova server or server id
+    # @return True if the instance is active.
+    #
+
+    def isInstanceActive(self,instance):
+        instance = self.novaapi.servers.get(instance)
+        print "Instance %s has status %s" % (instance.id,instance.status)
+        return instance.status == "ACTIVE"
+
+    ##
+    #
+    # @fn terminateInstances(self,instances):
+    # Deletes instances that could not be set up.
+    # @param self The object pointer
+    # @param instances List of Nova servers
+    #
+
+    def terminateInstances(self,instances):
+        for instance in instances:
+            print "Deleting instance %s" % instance.id
+            instance.delete()
+
     ##
     #
     # @fn checkCloudConnection(self):	
@@ -365,6 +409,7 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
     # @param self The object pointer
     #
     
+    @OFSTestTrace.traced("cloud")
     def getAllCloudInstances(self):
         self.checkCloudConnection()
         self.cloud_instances = [s for s in self.novaapi.servers.list()]
@@ -378,6 +423,7 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
     # @param self The object pointer
     #
     
+    @OFSTestTrace.traced("cloud")
     def getAllCloudImages(self):
         self.checkCloudConnection()
 
@@ -397,6 +443,7 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
             print "Instance %s at %s has status %s" % (instance.id,instance.ip_address,instance.status)
 
     
+    @OFSTestTrace.traced("cloud")
     def refreshCloudInstanceList(self,instances=[]):
         new_instances = []
         for instance in instances:
@@ -427,6 +474,7 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
     def hardRebootCloudInstance(self,Cloud_node):
         pass
     
+    @OFSTestTrace.traced("cloud")
     def deleteAllCloudInstances(self):
         pass  
         
@@ -448,34 +496,33 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
     #    @param security_group_ids List of security groups for the new instance.
     #    @param spot_instance_bid Required for inhertance. Ignored.
     #
-    #    @returns list of new nodes.
+    #    @returns list of new nodes. Empty if the instances could not be created or did not come up. Those are deleted.
 
 
 
+    @OFSTestTrace.traced("cloud")
     def createNewCloudNodes(self,number_nodes,image_name,flavor_name,local_master,associateip=False,domain=None,cloud_subnet=None,instance_suffix="",image_id=None,security_group_ids=None,spot_instance_bid=None):
         
         # This function creates number nodes on the cloud system. 
         # It returns a list of nodes
         
         new_instances = self.createNewCloudInstances(number_nodes,image_name,flavor_name,cloud_subnet,instance_suffix,None,security_group_ids)
+        if new_instances is None:
+            return []
         # new instances should have a 60 second delay to make sure everything is running.
 
         ip_addresses = []
         new_ofs_test_nodes = []
         
         for idx,instance in enumerate(new_instances):
-            instance = self.novaapi.servers.get(instance)
-            print "Instance %s has status %s" % (instance.id,instance.status)
-            
-            while not instance.status == "ACTIVE":
-                
-                time.sleep(10)
-                instance = self.novaapi.servers.get(instance)
-                print "Instance %s has status %s" % (instance.id,instance.status)
+            if not OFSTestWait.waitUntil(self.isInstanceActive,"instance %s" % instance.id,timeout=600,args=[instance],initial_delay=5):
+                msg = "Instance %s is not active after 600s. Deleting the new instances." % instance.id
+                print msg
+                logging.error(msg)
+                self.terminateInstances(new_instances)
+                return []
             
-        
-        print "Waiting 120 seconds for networking"            
-        time.sleep(180)
+        # OFSTestNetwork.createNewCloudNodes waits for ssh to the new nodes. That replaces the old 180 second wait for networking.
         # refresh all the instances in the list.
         new_instances = self.refreshCloudInstanceList(new_instances)
 
@@ -483,6 +530,10 @@ class OFSNovaConnectionManager(OFSCloudConnectionManager.OFSCloudConnectionManag
         if associateip == True:
             # if we need to associate an external ip address, do so
             ip_addresses = self.associateIPAddresses(new_instances,domain)
+            if ip_addresses is None:
+                logging.error("External IP addresses were not associated. Deleting the new instances.")
+                self.terminateInstances(new_instances)
+                return []
         else:
             
             for idx,instance in enumerate(new_instances):
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+##
+#
+# @class OFSOutputCapture
+#
+# @brief This class captures one output stream of a command without holding all of it in memory.
+#
+# The stream is read line by line as the command runs. Every line is written to a spill
+# file and passed to an optional callback. Only the first head_size and the last tail_size
+# bytes are kept in memory. getWindow() returns them for the output list.
+#
+
+import os
+import threading
+import collections
+import logging
+
+## @var MAX_LINE
+# Longest line read in one piece. Longer lines are passed on in chunks.
+MAX_LINE = 65536
+
+
+class OFSOutputCapture(object):
+
+    ##
+    # @fn __init__(self,filename=None,line_callback=None,head_size=65536,tail_size=65536):
+    #
+    # Initialization routine.
+    #
+    # @param self The object pointer
+    # @param filename Spill file for the full stream. None keeps only the window.
+    # @param line_callback Function called with each line as it arrives.
+    # @param head_size Bytes kept from the start of the stream.
+    # @param tail_size Bytes kept from the end of the stream.
+
+    def __init__(self,filename=None,line_callback=None,head_size=65536,tail_size=65536):
+
+        ## @var filename
+        # spill file with the full stream
+        self.filename = filename
+
+        ## @var line_callback
+        # called with each line as it arrives
+        self.line_callback = line_callback
+
+        ## @var head_size
+        # bytes kept from the start of the stream
+        self.head_size = head_size
+
+        ## @var tail_size
+        # bytes kept from the end of the stream
+        self.tail_size = tail_size
+
+        ## @var total_bytes
+        # size of the whole stream
+        self.total_bytes = 0
+
+        self.head = []
+        self.head_bytes = 0
+        self.tail = collections.deque()
+        self.tail_bytes = 0
+
+    ##
+    # @fn consume(self,pipe):
+    #
+    # Reads pipe until end of file.
+    #
+    # @param self The object pointer
+    # @param pipe File object to read.
+
+    def consume(self,pipe):
+
+        spill = None
+        if self.filename is not None:
+            spill = open(self.filename,'w')
+
+        for line in iter(lambda: pipe.readline(MAX_LINE),''):
+            self.total_bytes += len(line)
+
+            if spill is not None:
+                spill.write(line)
+
+            if self.line_callback is not None:
+                try:
+                    self.line_callback(line)
+                except:
+                    # a broken parser must not stop the capture.
+                    logging.exception("Output line callback failed")
+
+            if self.head_bytes < self.head_size:
+                self.head.append(line)
+                self.head_bytes += len(line)
+            else:
+                self.tail.append(line)
+                self.tail_bytes += len(line)
+                while self.tail_bytes > self.tail_size and len(self.tail) > 1:
+                    self.tail_bytes -= len(self.tail.popleft())
+
+        if spill is not None:
+            spill.close()
+        pipe.close()
+
+    ##
+    # @fn isTruncated(self):
+    #
+    # @param self The object pointer
+    #
+    # @return True if part of the stream is only in the spill file.
+
+    def isTruncated(self):
+        return self.head_bytes + self.tail_bytes < self.total_bytes
+
+    ##
+    # @fn getWindow(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Head and tail of the stream, with a marker where bytes were left out.
+
+    def getWindow(self):
+        if not self.isTruncated():
+            return ''.join(self.head) + ''.join(self.tail)
+        omitted = self.total_bytes - self.head_bytes - self.tail_bytes
+        return "%s\n... [%d bytes omitted. Full output in %s] ...\n%s" % (''.join(self.head),omitted,self.filename,''.join(self.tail))
+
+
+##
+# @fn captureProcess(process,stdout_capture,stderr_capture):
+#
+# Reads stdout and stderr of process at the same time, then waits for it to exit.
+#
+# @param process subprocess.Popen object with stdout and stderr pipes.
+# @param stdout_capture OFSOutputCapture for stdout
+# @param stderr_capture OFSOutputCapture for stderr
+#
+# @return Return code of process.
+
+def captureProcess(process,stdout_capture,stderr_capture):
+    stderr_thread = threading.Thread(target=stderr_capture.consume,args=(process.stderr,))
+    stderr_thread.daemon = True
+    stderr_thread.start()
+    stdout_capture.consume(process.stdout)
+    stderr_thread.join()
+    return process.wait()
+
+
+##
+# @var spill_count
+# Number of spill file pairs created so far. Used to name them.
+spill_count = 0
+spill_lock = threading.Lock()
+
+##
+# @fn newSpillFiles(label,directory="command-output"):
+#
+# Returns names for a new pair of spill files. Creates directory if needed.
+#
+# @param label Text added to the file names, usually the hostname.
+# @param directory Directory that holds the spill files.
+#
+# @return (stdout file name, stderr file name)
+
+def newSpillFiles(label,directory="command-output"):
+    global spill_count
+    spill_lock.acquire()
+    try:
+        spill_count += 1
+        number = spill_count
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    finally:
+        spill_lock.release()
+    label = label.replace('/','_').replace(' ','_')
+    base = os.path.join(directory,"%05d-%s" % (number,label))
+    return (base + ".stdout", base + ".stderr")
@@ -0,0 +1,387 @@
+#!/usr/bin/python
+##
+#
+# @file OFSProvisioningCache.py
+#
+# @brief Downloads each package and tarball once for the whole cluster.
+#
+# PROXY_SCRIPT is a small caching HTTP proxy that runs on one node of the cluster. The
+# other nodes reach it by internal address:
+#
+#   - apt, yum/dnf and zypper use it as their http proxy. Package files are served from
+#     the cache without asking upstream. Repository metadata is fetched again each time
+#     and served from the cache only if upstream cannot be reached. https repositories are
+#     tunneled and not cached.
+#   - Tarballs are fetched with GET /fetch?url=<url>, also for https urls. See
+#     OFSTestNode.getDownloadCommand. They are always served from the cache once stored.
+#
+# Every body is stored once under its SHA-256 (objects/), and each url points to its body
+# (urls/). Nodes that ask for the same url at the same time wait for one upstream download.
+#
+# With offline mode the proxy never goes upstream, so a warmed cache provisions a cluster
+# without internet access. A mirror directory laid out as <host>/<path>, like wget -x
+# creates it, stands in for upstream, e.g. for testing.
+#
+# OFSTestNetwork.setupProvisioningCache() starts the proxy and points the nodes at it.
+# OFSTestNetwork.stopProvisioningCache() points them back and stops it after the tests.
+#
+
+import base64
+import json
+import urllib
+
+## @var DEFAULT_PORT
+# Port of the proxy. The same as apt-cacher-ng.
+DEFAULT_PORT = 3142
+
+## @var PROXY_SCRIPT
+# Caching proxy. Runs with python 2 or 3. Arguments: cache directory, address, port,
+# mirror directory or "-", "offline" or "online". It listens only on the internal address
+# of its node, so it is not an open proxy on the external one.
+PROXY_SCRIPT = r'''
+import os
+import sys
+import json
+import socket
+import select
+import hashlib
+import threading
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.request import build_opener, ProxyHandler, Request
+    from urllib.error import HTTPError
+    from urllib.parse import urlsplit, parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib2 import build_opener, ProxyHandler, Request, HTTPError
+    from urlparse import urlsplit, parse_qs
+
+(directory, address, port, mirror, mode) = sys.argv[1:6]
+offline = (mode == "offline")
+PACKAGE_SUFFIXES = (".deb", ".udeb", ".rpm", ".drpm", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip", ".jar")
+# the proxy itself must not use a proxy.
+opener = build_opener(ProxyHandler({}))
+stats = {"hits": 0, "misses": 0, "stale": 0, "mirror": 0, "errors": 0, "upstream_bytes": 0, "served_bytes": 0}
+stats_lock = threading.Lock()
+url_locks = {}
+url_locks_lock = threading.Lock()
+
+for d in ["objects", "urls", "tmp"]:
+    if not os.path.isdir(os.path.join(directory, d)):
+        os.makedirs(os.path.join(directory, d))
+
+def count(name, value=1):
+    stats_lock.acquire()
+    stats[name] += value
+    stats_lock.release()
+
+def url_lock(url):
+    url_locks_lock.acquire()
+    lock = url_locks.setdefault(url, threading.Lock())
+    url_locks_lock.release()
+    return lock
+
+def url_file(url):
+    return os.path.join(directory, "urls", hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+def lookup(url):
+    try:
+        f = open(url_file(url))
+        (digest, content_type) = f.read().split("\n")[:2]
+        f.close()
+    except (IOError, ValueError):
+        return None
+    path = os.path.join(directory, "objects", digest)
+    if not os.path.isfile(path):
+        return None
+    return (path, content_type)
+
+def mirror_lookup(url):
+    if mirror == "-":
+        return None
+    parts = urlsplit(url)
+    path = os.path.join(mirror, parts.netloc, parts.path.lstrip("/"))
+    if os.path.isfile(path):
+        return (path, "application/octet-stream")
+    return None
+
+def download(url):
+    response = opener.open(Request(url, headers={"User-Agent": "ofstest-provisioning-cache"}), timeout=60)
+    content_type = response.headers.get("Content-Type", "application/octet-stream")
+    digest = hashlib.sha256()
+    temp = os.path.join(directory, "tmp", "%d.%d" % (os.getpid(), threading.current_thread().ident))
+    f = open(temp, "wb")
+    size = 0
+    while True:
+        block = response.read(1048576)
+        if not block:
+            break
+        digest.update(block)
+        f.write(block)
+        size += len(block)
+    f.close()
+    path = os.path.join(directory, "objects", digest.hexdigest())
+    os.rename(temp, path)
+    f = open(url_file(url) + ".tmp", "w")
+    f.write("%s\n%s\n%s\n" % (digest.hexdigest(), content_type, url))
+    f.close()
+    os.rename(url_file(url) + ".tmp", url_file(url))
+    count("upstream_bytes", size)
+    return (path, content_type)
+
+# returns (path, content type), or raises HTTPError or IOError.
+def get(url, prefer_cache):
+    lock = url_lock(url)
+    lock.acquire()
+    try:
+        cached = lookup(url)
+        if cached is not None and (prefer_cache or offline):
+            count("hits")
+            return cached
+        mirrored = mirror_lookup(url)
+        if mirrored is not None:
+            count("mirror")
+            return mirrored
+        if offline:
+            raise IOError("%s is not cached" % url)
+        try:
+            result = download(url)
+            count("misses")
+            return result
+        except (HTTPError, IOError, socket.error):
+            if cached is not None:
+                count("stale")
+                return cached
+            raise
+    finally:
+        lock.release()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format, *args):
+        sys.stderr.write("%s %s\n" % (self.address_string(), format % args))
+
+    def send_file(self, path, content_type, body):
+        size = os.path.getsize(path)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        if body:
+            f = open(path, "rb")
+            while True:
+                block = f.read(1048576)
+                if not block:
+                    break
+                self.wfile.write(block)
+            f.close()
+            count("served_bytes", size)
+
+    def serve(self, body):
+        if self.path.startswith("/status"):
+            data = json.dumps(stats).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if body:
+                self.wfile.write(data)
+            return
+        if self.path.startswith("/fetch?"):
+            url = parse_qs(urlsplit(self.path).query).get("url", [""])[0]
+            prefer_cache = True
+        elif self.path.startswith("http://"):
+            url = self.path
+            prefer_cache = urlsplit(url).path.endswith(PACKAGE_SUFFIXES)
+        else:
+            self.send_error(404)
+            return
+        try:
+            (path, content_type) = get(url, prefer_cache)
+        except HTTPError as e:
+            count("errors")
+            self.send_error(e.code)
+            return
+        except Exception as e:
+            count("errors")
+            self.send_error(502, str(e))
+            return
+        self.send_file(path, content_type, body)
+
+    def do_GET(self):
+        self.serve(True)
+
+    def do_HEAD(self):
+        self.serve(False)
+
+    def do_CONNECT(self):
+        if offline:
+            self.send_error(502, "offline")
+            return
+        try:
+            (host, port) = self.path.rsplit(":", 1)
+            upstream = socket.create_connection((host, int(port)), timeout=60)
+        except Exception as e:
+            self.send_error(502, str(e))
+            return
+        self.send_response(200, "Connection established")
+        self.end_headers()
+        sockets = [self.connection, upstream]
+        while True:
+            (readable, _, broken) = select.select(sockets, [], sockets, 300)
+            if broken or not readable:
+                break
+            done = False
+            for s in readable:
+                data = s.recv(65536)
+                if not data:
+                    done = True
+                    break
+                if s is self.connection:
+                    upstream.sendall(data)
+                else:
+                    self.connection.sendall(data)
+            if done:
+                break
+        upstream.close()
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+Server((address, int(port)), Handler).serve_forever()
+'''
+
+## @var START_SCRIPT
+# Starts PROXY_SCRIPT in the background, replacing a running one. Arguments: cache
+# directory, address, port, mirror directory or "-", "offline" or "online", proxy script
+# (base64).
+START_SCRIPT = r'''
+directory="$1"
+address="$2"
+port="$3"
+mirror="$4"
+mode="$5"
+script="$6"
+
+mkdir -p "$directory" || exit 1
+if [ -f "$directory/proxy.pid" ]; then
+    kill $(cat "$directory/proxy.pid") 2>/dev/null
+    sleep 1
+fi
+python=$(command -v python3 || command -v python2 || command -v python)
+if [ -z "$python" ]; then
+    echo "No python on $(hostname)"
+    exit 1
+fi
+echo "$script" | base64 -d > "$directory/proxy.py"
+nohup $python "$directory/proxy.py" "$directory" "$address" "$port" "$mirror" "$mode" > "$directory/proxy.log" 2>&1 < /dev/null &
+echo $! > "$directory/proxy.pid"
+'''
+
+## @var CLIENT_SCRIPT
+# Points apt, yum, dnf, zypper and wget of a node at the proxy, or back with "off". Run as root. Argument: proxy url or "off".
+CLIENT_SCRIPT = r'''
+proxy="$1"
+
+apt_conf=/etc/apt/apt.conf.d/01ofstest-proxy
+rm -f $apt_conf
+for f in /etc/yum.conf /etc/dnf/dnf.conf /etc/wgetrc; do
+    [ -f $f ] && sed -i '/^# ofstest-proxy$/,+1d' $f
+done
+if [ -f /etc/sysconfig/proxy ]; then
+    sed -i -e 's/^PROXY_ENABLED=.*/PROXY_ENABLED="no"/' -e 's/^HTTP_PROXY=.*/HTTP_PROXY=""/' /etc/sysconfig/proxy
+fi
+[ "$proxy" = "off" ] && exit 0
+
+if [ -d /etc/apt/apt.conf.d ]; then
+    echo "Acquire::http::Proxy \"$proxy\";" > $apt_conf
+fi
+for f in /etc/yum.conf /etc/dnf/dnf.conf; do
+    [ -f $f ] && sed -i "/^\[main\]/a # ofstest-proxy\nproxy=$proxy" $f
+done
+if [ -f /etc/sysconfig/proxy ]; then
+    sed -i -e 's/^PROXY_ENABLED=.*/PROXY_ENABLED="yes"/' -e "s|^HTTP_PROXY=.*|HTTP_PROXY=\"$proxy\"|" /etc/sysconfig/proxy
+fi
+printf '# ofstest-proxy\nhttp_proxy = %s\n' "$proxy" >> /etc/wgetrc
+exit 0
+'''
+
+##
+# @fn getStartCommand(directory,address,port=DEFAULT_PORT,mirror_directory="",offline=False):
+#
+# @param directory Cache directory on the node that runs the proxy.
+# @param address Internal address of that node. The proxy listens only there.
+# @param port Port of the proxy.
+# @param mirror_directory Stand-in mirror on that node. Empty string for none.
+# @param offline Never go upstream?
+#
+# @return Shell command that starts the proxy in the background.
+
+def getStartCommand(directory,address,port=DEFAULT_PORT,mirror_directory="",offline=False):
+    if mirror_directory is None or mirror_directory == "":
+        mirror_directory = "-"
+    mode = "online"
+    if offline:
+        mode = "offline"
+    arguments = [directory,address,"%d" % port,mirror_directory,mode,base64.b64encode(PROXY_SCRIPT)]
+    return "echo %s | base64 -d | bash -s -- %s" % (base64.b64encode(START_SCRIPT)," ".join(arguments))
+
+##
+# @fn getStopCommand(directory):
+#
+# @param directory Cache directory on the node that runs the proxy.
+#
+# @return Shell command that stops the proxy.
+
+def getStopCommand(directory):
+    return "if [ -f %s/proxy.pid ]; then kill \\$(cat %s/proxy.pid); rm -f %s/proxy.pid; fi" % (directory,directory,directory)
+
+##
+# @fn getClientCommand(proxy_url):
+#
+# @param proxy_url http://address:port of the proxy, or "off".
+#
+# @return Shell command, to be run as root, that points the package managers and wget at proxy_url.
+
+def getClientCommand(proxy_url):
+    return "echo %s | base64 -d | bash -s -- %s" % (base64.b64encode(CLIENT_SCRIPT),proxy_url)
+
+##
+# @fn getFetchURL(proxy_url,url):
+#
+# @param proxy_url http://address:port of the proxy.
+# @param url Upstream url of a file.
+#
+# @return url that gets the file through the cache.
+
+def getFetchURL(proxy_url,url):
+    return "%s/fetch?url=%s" % (proxy_url,urllib.quote(url,safe=""))
+
+##
+# @fn parseStatus(stdout):
+#
+# @param stdout Body of GET /status.
+#
+# @return Dictionary of proxy counters, or None.
+
+def parseStatus(stdout):
+    try:
+        return json.loads(stdout.strip())
+    except ValueError:
+        return None
+
+##
+# @fn formatStatus(status):
+#
+# @param status Result of parseStatus.
+#
+# @return One line report of the cache hits and the upstream traffic.
+
+def formatStatus(status):
+    if status is None:
+        return "Provisioning cache: no statistics."
+    return "Provisioning cache: %d hits, %d upstream downloads, %d mirror, %d stale, %d errors. %.1f MB served, %.1f MB from upstream." % (status.get("hits",0),status.get("misses",0),status.get("mirror",0),status.get("stale",0),status.get("errors",0),status.get("served_bytes",0)/1048576.0,status.get("upstream_bytes",0)/1048576.0)
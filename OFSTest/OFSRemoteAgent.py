@@ -0,0 +1,414 @@
+#!/usr/bin/python
+##
+#
+# @class OFSRemoteAgent
+#
+# @brief This class runs operations on a remote node through a small, long-lived Python agent.
+#
+# The agent source is sent over a single ssh session and started with the node's own
+# Python interpreter. After that, operations travel over the same session as framed
+# requests. No new ssh process is started per operation.
+#
+# Frame format (both directions): the length of the payload in decimal ASCII, a newline,
+# then the payload, a UTF-8 JSON object.
+#
+# Requests have an "op" field: run, stat, read, write, checksum or exit.
+# Every reply has "rc", "stdout", "stderr" and "wall_time". Reads and stats also return "data".
+#
+# If the node has no Python interpreter, start() fails and the node falls back to
+# running each command through its own ssh process.
+#
+
+import os
+import re
+import json
+import time
+import base64
+import shlex
+import subprocess
+import tempfile
+import threading
+import logging
+
+##
+# @var AGENT_SOURCE
+#
+# Source of the agent that runs on the remote node. Must run under Python 2.6+ and Python 3.
+
+AGENT_SOURCE = r'''
+import sys, os, json, time, hashlib, base64, subprocess, traceback
+
+agent_in = getattr(sys.stdin, "buffer", sys.stdin)
+agent_out = getattr(sys.stdout, "buffer", sys.stdout)
+
+def send(obj):
+    data = json.dumps(obj).encode("utf-8")
+    agent_out.write(("%d\n" % len(data)).encode("ascii"))
+    agent_out.write(data)
+    agent_out.flush()
+
+def recv():
+    line = agent_in.readline()
+    if not line:
+        return None
+    return json.loads(agent_in.read(int(line)).decode("utf-8"))
+
+def text(b):
+    return b.decode("utf-8", "replace")
+
+def op_run(req):
+    stdin_data = req.get("stdin")
+    devnull = open(os.devnull, "rb")
+    if stdin_data is None:
+        stdin = devnull
+    else:
+        stdin = subprocess.PIPE
+        stdin_data = stdin_data.encode("utf-8")
+    p = subprocess.Popen(req["command"], shell=True, executable="/bin/bash", stdin=stdin,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
+    out, err = p.communicate(stdin_data)
+    devnull.close()
+    return {"rc": p.returncode, "stdout": text(out), "stderr": text(err)}
+
+def op_stat(req):
+    try:
+        st = os.stat(os.path.expanduser(req["path"]))
+    except OSError:
+        return {"rc": 1, "stderr": "%s: %s" % (req["path"], sys.exc_info()[1])}
+    return {"rc": 0, "data": {"mode": st.st_mode, "size": st.st_size, "mtime": st.st_mtime,
+        "uid": st.st_uid, "gid": st.st_gid, "isdir": os.path.isdir(os.path.expanduser(req["path"]))}}
+
+def op_read(req):
+    f = open(os.path.expanduser(req["path"]), "rb")
+    f.seek(req.get("offset", 0))
+    if req.get("length") is None:
+        data = f.read()
+    else:
+        data = f.read(req["length"])
+    f.close()
+    return {"rc": 0, "data": text(base64.b64encode(data))}
+
+def op_write(req):
+    path = os.path.expanduser(req["path"])
+    if req.get("append"):
+        f = open(path, "ab")
+    else:
+        f = open(path, "wb")
+    f.write(base64.b64decode(req["data"].encode("ascii")))
+    f.close()
+    if req.get("mode") is not None:
+        os.chmod(path, req["mode"])
+    return {"rc": 0}
+
+def op_checksum(req):
+    h = hashlib.new(req.get("algorithm", "md5"))
+    f = open(os.path.expanduser(req["path"]), "rb")
+    while True:
+        block = f.read(1048576)
+        if not block:
+            break
+        h.update(block)
+    f.close()
+    return {"rc": 0, "stdout": h.hexdigest()}
+
+ops = {"run": op_run, "stat": op_stat, "read": op_read, "write": op_write, "checksum": op_checksum}
+
+send({"rc": 0, "stdout": "ready", "python": sys.version.split()[0], "pid": os.getpid()})
+
+while True:
+    req = recv()
+    if req is None or req.get("op") == "exit":
+        break
+    start = time.time()
+    try:
+        res = ops[req["op"]](req)
+    except Exception:
+        res = {"rc": -1, "stderr": traceback.format_exc()}
+    res.setdefault("stdout", "")
+    res.setdefault("stderr", "")
+    res["id"] = req.get("id")
+    res["wall_time"] = time.time() - start
+    send(res)
+'''
+
+##
+# @var AGENT_START_COMMAND
+#
+# Remote shell command that finds a Python interpreter and reads the agent source from stdin.
+# rc 127 means no interpreter was found.
+
+AGENT_START_COMMAND = "P=`command -v python3 || command -v python || command -v python2` || exit 127; exec $P -u -c 'import sys;b=getattr(sys.stdin,\"buffer\",sys.stdin);exec(b.read(%d))'"
+
+
+class OFSRemoteAgent(object):
+
+    ##
+    # @fn __init__(self,node,remote_user=None):
+    #
+    # Initialization routine. Does not start the agent.
+    #
+    # @param self The object pointer
+    # @param node OFSTestRemoteNode the agent runs on.
+    # @param remote_user User the agent runs as. Default is node.current_user.
+
+    def __init__(self,node,remote_user=None):
+
+        ## @var node
+        # OFSTestRemoteNode the agent runs on
+        self.node = node
+
+        if remote_user == None:
+            remote_user = node.current_user
+
+        ## @var remote_user
+        # user the agent runs as
+        self.remote_user = remote_user
+
+        ## @var process
+        # local ssh process that carries the agent session
+        self.process = None
+
+        ## @var python_version
+        # version of the remote interpreter running the agent
+        self.python_version = None
+
+        ## @var request_id
+        # id of the last request sent
+        self.request_id = 0
+
+        ## @var lock
+        # one request at a time on the channel
+        self.lock = threading.Lock()
+
+    ##
+    # @fn start(self):
+    #
+    # Starts the agent on the remote node.
+    #
+    # @param self The object pointer
+    #
+    # @return 0 if the agent is running. Non-zero if the node should fall back to ssh per command.
+
+    def start(self):
+
+        ssh_args = ["/usr/bin/ssh"]
+        if self.node.sshLocalKeyFile is not None and self.node.sshLocalKeyFile != "":
+            ssh_args += ["-i",self.node.sshLocalKeyFile]
+        ssh_args += ["%s@%s" % (self.remote_user,self.node.ext_ip_address),"-o","UserKnownHostsFile=/dev/null","-o","StrictHostKeyChecking=no","-o","BatchMode=yes"]
+        ssh_args += shlex.split(self.node.getSSHConnectionOptions(self.remote_user))
+        source = AGENT_SOURCE.encode("utf-8")
+        ssh_args.append(AGENT_START_COMMAND % len(source))
+
+        logging.info("Starting remote agent on %s@%s" % (self.remote_user,self.node.ext_ip_address))
+
+        self.stderr_file = tempfile.TemporaryFile()
+        try:
+            self.process = subprocess.Popen(ssh_args,stdin=subprocess.PIPE,stdout=subprocess.PIPE,stderr=self.stderr_file,bufsize=-1)
+            self.process.stdin.write(source)
+            self.process.stdin.flush()
+            reply = self.receive()
+        except Exception:
+            reply = None
+
+        if reply is None or reply.get("rc") != 0:
+            self.stderr_file.seek(0)
+            logging.info("Remote agent not available on %s@%s. Using ssh per command. %s" % (self.remote_user,self.node.ext_ip_address,self.stderr_file.read()))
+            self.stop()
+            return 1
+
+        self.python_version = reply.get("python")
+        logging.info("Remote agent running on %s@%s with Python %s" % (self.remote_user,self.node.ext_ip_address,self.python_version))
+        return 0
+
+    ##
+    # @fn stop(self):
+    #
+    # Tells the agent to exit and closes the ssh session.
+    #
+    # @param self The object pointer
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            if self.process.poll() is None:
+                self.send({"op" : "exit"})
+                self.process.stdin.close()
+                self.process.wait()
+        except Exception:
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+        self.process = None
+
+    ##
+    # @fn isRunning(self):
+    #
+    # @param self The object pointer
+    #
+    # @return True if the agent session is alive.
+
+    def isRunning(self):
+        return self.process is not None and self.process.poll() is None
+
+    ##
+    # @fn send(self,request):
+    #
+    # Writes one framed request.
+    #
+    # @param self The object pointer
+    # @param request Dictionary to send.
+
+    def send(self,request):
+        data = json.dumps(request)
+        self.process.stdin.write("%d\n" % len(data))
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    ##
+    # @fn receive(self):
+    #
+    # Reads one framed reply.
+    #
+    # @param self The object pointer
+    #
+    # @return Reply dictionary, or None if the agent is gone.
+
+    def receive(self):
+        line = self.process.stdout.readline()
+        if not line:
+            return None
+        return json.loads(self.process.stdout.read(int(line)))
+
+    ##
+    # @fn request(self,op,wait=True,**kwargs):
+    #
+    # Sends one request and waits for the reply. Strings in the reply are returned as str.
+    #
+    # @param self The object pointer
+    # @param op Operation: run, stat, read, write or checksum.
+    # @param wait If False, return None at once when another request is in progress.
+    # @param kwargs Fields of the request.
+    #
+    # @return Reply dictionary, or None if the agent is gone or busy.
+
+    def request(self,op,wait=True,**kwargs):
+        if self.lock.acquire(wait) == False:
+            return None
+        try:
+            if not self.isRunning():
+                return None
+            self.request_id += 1
+            kwargs["op"] = op
+            kwargs["id"] = self.request_id
+            try:
+                self.send(kwargs)
+                reply = self.receive()
+            except (IOError,OSError,ValueError):
+                logging.exception("Lost remote agent on %s@%s" % (self.remote_user,self.node.ext_ip_address))
+                reply = None
+            if reply is None:
+                self.stop()
+                return None
+            for key in ["stdout","stderr","data"]:
+                if isinstance(reply.get(key),unicode):
+                    reply[key] = reply[key].encode("utf-8")
+            return reply
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn run(self,command,stdin=None,wait=True):
+    #
+    # Runs a shell command through /bin/bash on the remote node.
+    #
+    # @param self The object pointer
+    # @param command Shell command, as the remote shell should see it.
+    # @param stdin Data written to the standard input of the command.
+    # @param wait If False, return None at once when another request is in progress.
+    #
+    # @return Reply dictionary (rc, stdout, stderr, wall_time), or None if the agent is gone or busy.
+
+    def run(self,command,stdin=None,wait=True):
+        if stdin is None:
+            return self.request("run",wait,command=command)
+        return self.request("run",wait,command=command,stdin=stdin)
+
+    ##
+    # @fn stat(self,path):
+    #
+    # @param self The object pointer
+    # @param path Remote path
+    #
+    # @return Reply dictionary. data holds mode, size, mtime, uid, gid and isdir. rc is 1 if the path is missing.
+
+    def stat(self,path):
+        return self.request("stat",path=path)
+
+    ##
+    # @fn readFile(self,path,offset=0,length=None):
+    #
+    # @param self The object pointer
+    # @param path Remote path
+    # @param offset Start reading at this byte
+    # @param length Number of bytes to read. Default is the rest of the file.
+    #
+    # @return Contents of the file, or None on failure.
+
+    def readFile(self,path,offset=0,length=None):
+        reply = self.request("read",path=path,offset=offset,length=length)
+        if reply is None or reply["rc"] != 0:
+            return None
+        return base64.b64decode(reply["data"])
+
+    ##
+    # @fn writeFile(self,path,data,mode=None,append=False):
+    #
+    # @param self The object pointer
+    # @param path Remote path
+    # @param data Contents to write
+    # @param mode Permission bits to set afterwards. None leaves them alone.
+    # @param append Append instead of overwrite?
+    #
+    # @return Reply dictionary, or None if the agent is gone.
+
+    def writeFile(self,path,data,mode=None,append=False):
+        return self.request("write",path=path,data=base64.b64encode(data),mode=mode,append=append)
+
+    ##
+    # @fn checksum(self,path,algorithm="md5"):
+    #
+    # @param self The object pointer
+    # @param path Remote path
+    # @param algorithm Any hashlib algorithm name
+    #
+    # @return Hex digest of the file, or None on failure.
+
+    def checksum(self,path,algorithm="md5"):
+        reply = self.request("checksum",path=path,algorithm=algorithm)
+        if reply is None or reply["rc"] != 0:
+            return None
+        return reply["stdout"]
+
+
+##
+# @fn unquoteCommand(command):
+#
+# Commands in OFSTest are written to be placed inside double quotes on the local ssh
+# command line. The agent hands them to the remote shell directly, so remove one level of
+# double-quote processing first. If the local shell would have expanded something, let
+# it do so.
+#
+# @param command Command as passed to runSingleCommand.
+#
+# @return Command as the remote shell would have received it.
+
+def unquoteCommand(command):
+
+    # unescaped $ or ` is expanded by the local shell.
+    if re.search(r'(^|[^\\])(\\\\)*[$`]',command) is not None:
+        p = subprocess.Popen('printf "%%s" "%s"' % command,shell=True,executable="/bin/bash",stdout=subprocess.PIPE)
+        return p.communicate()[0]
+
+    return re.sub(r'\\([$`"\\\n])',r'\1',command)
@@ -0,0 +1,511 @@
+#!/usr/bin/python
+##
+#
+# @class OFSResultsStore
+#
+# @brief This class keeps the results of test runs in an SQLite database.
+#
+# Every run gets a run id. The store records the fingerprint of the config, the facts of
+# each node and, for every test, its group, package, return code, start and end time,
+# node, log files and the metrics the test reported. The results file (config.log_file)
+# is appended as results come in and written from the store at the end of the run, so it
+# reads as it always has. See OFSTestMain.writeOutput and OFSTestMain.closeResults.
+#
+# Each output directory has its own database (config.results_db). When
+# config.results_history_db is set, each finished run is also copied to that database, so
+# nightly runs in different output directories can be compared. The query_results script
+# lists and compares runs:
+#
+#   query_results -f results.db runs
+#   query_results -f /var/ofstest/history.db compare 20261017-0201 20261018-0203
+#
+
+import os
+import time
+import json
+import socket
+import sqlite3
+import threading
+import logging
+import OFSBuildCache
+import OFSCheckpoint
+import OFSTestNode
+
+## @var SCHEMA
+# Tables of the store. Results are keyed by run and position. Artifacts and metrics carry
+# the position of their result, because a test may run once per node in one section.
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, start_time REAL, end_time REAL, rc INTEGER, config_fingerprint TEXT, output_directory TEXT, hostname TEXT)",
+    "CREATE TABLE IF NOT EXISTS nodes (run_id TEXT, hostname TEXT, ip_address TEXT, facts TEXT)",
+    "CREATE TABLE IF NOT EXISTS sections (run_id TEXT, position INTEGER, header TEXT)",
+    "CREATE TABLE IF NOT EXISTS results (run_id TEXT, section INTEGER, position INTEGER, test_group TEXT, package TEXT, test TEXT, rc INTEGER, status TEXT, start_time REAL, end_time REAL, node TEXT)",
+    "CREATE TABLE IF NOT EXISTS artifacts (run_id TEXT, section INTEGER, test TEXT, kind TEXT, path TEXT, position INTEGER)",
+    "CREATE TABLE IF NOT EXISTS metrics (run_id TEXT, section INTEGER, test TEXT, name TEXT, value REAL, unit TEXT, position INTEGER)",
+    "CREATE INDEX IF NOT EXISTS results_run ON results (run_id, section, test)"
+    ]
+
+## @var ADDED_COLUMNS
+# Columns added to tables after the first version of the store. Older databases get them on open.
+ADDED_COLUMNS = [
+    ("artifacts","position INTEGER"),
+    ("metrics","position INTEGER")
+    ]
+
+## @var RUN_TABLES
+# Tables copied to the history database.
+RUN_TABLES = ["runs","nodes","sections","results","artifacts","metrics"]
+
+## @var EXCLUDED_CONFIG_ATTRIBUTES
+# Config attributes that change from run to run without changing what is tested.
+EXCLUDED_CONFIG_ATTRIBUTES = [
+    "instance_suffix",
+    "resume",
+    "log_file",
+    "results_db",
+    "results_history_db"
+    ]
+
+##
+# @fn getStatus(rc):
+#
+# @param rc Return code of a test
+#
+# @return PASS, FAIL or TIMEOUT
+
+def getStatus(rc):
+    if rc == OFSTestNode.COMMAND_TIMEOUT_RC:
+        return "TIMEOUT"
+    elif rc != 0:
+        return "FAIL"
+    return "PASS"
+
+##
+# @fn formatResult(name,rc):
+#
+# @param name Test name
+# @param rc Return code of the test
+#
+# @return Line of the results file for the test.
+
+def formatResult(name,rc):
+    status = getStatus(rc)
+    if status == "TIMEOUT":
+        return "%s........................................TIMEOUT.\n" % name
+    elif status == "FAIL":
+        return "%s........................................FAIL: RC = %r\n" % (name,rc)
+    return "%s........................................PASS.\n" % name
+
+##
+# @fn formatHeader(header):
+#
+# @param header Section header
+#
+# @return Header line of the results file.
+
+def formatHeader(header):
+    return "%s ==================================================\n" % header
+
+##
+# @fn getConfigFingerprint(config):
+#
+# @param config OFSTestConfig
+#
+# @return Hex SHA-256 of the plain data attributes of the config. Secrets are not stored, only the hash.
+
+def getConfigFingerprint(config):
+    attributes = {}
+    for (name,value) in vars(config).items():
+        if name in EXCLUDED_CONFIG_ATTRIBUTES or not OFSCheckpoint.isCheckpointValue(value):
+            continue
+        attributes[name] = value
+    return OFSBuildCache.getKey(attributes)
+
+
+class OFSResultsStore(object):
+
+    ##
+    # @fn __init__(self,filename="results.db",history_filename=None):
+    #
+    # Initialization routine. Opens the database and creates the tables.
+    #
+    # @param self The object pointer
+    # @param filename Database of this output directory.
+    # @param history_filename Database that collects every run. None for no history.
+
+    def __init__(self,filename="results.db",history_filename=None):
+
+        ## @var filename
+        # database file on the local machine
+        self.filename = filename
+
+        ## @var history_filename
+        # database that collects every run. None for no history.
+        self.history_filename = history_filename
+
+        ## @var run_id
+        # run being recorded. None before startRun().
+        self.run_id = None
+
+        ## @var section
+        # position of the current section in the run
+        self.section = -1
+
+        ## @var position
+        # number of results recorded in the run
+        self.position = 0
+
+        ## @var lock
+        # Protects the connection. Test shards record from their own threads.
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(filename,check_same_thread=False)
+        self.connection.text_factory = str
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        for (table,column) in ADDED_COLUMNS:
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(%s)" % table).fetchall()]
+            if column.split()[0] not in columns:
+                self.connection.execute("ALTER TABLE %s ADD COLUMN %s" % (table,column))
+        self.connection.commit()
+
+    ##
+    # @fn execute(self,statement,parameters=()):
+    #
+    # Runs a statement and commits it.
+    #
+    # @param self The object pointer
+    # @param statement SQL statement
+    # @param parameters Parameters of the statement
+
+    def execute(self,statement,parameters=()):
+        self.lock.acquire()
+        try:
+            self.connection.execute(statement,parameters)
+            self.connection.commit()
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn query(self,statement,parameters=()):
+    #
+    # @param self The object pointer
+    # @param statement SQL query
+    # @param parameters Parameters of the query
+    #
+    # @return List of rows as dictionaries.
+
+    def query(self,statement,parameters=()):
+        self.lock.acquire()
+        try:
+            cursor = self.connection.execute(statement,parameters)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names,row)) for row in cursor.fetchall()]
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn startRun(self,config,nodes):
+    #
+    # Starts recording a run.
+    #
+    # @param self The object pointer
+    # @param config OFSTestConfig of the run
+    # @param nodes List of OFSTestNodes of the run. Their node_facts are stored.
+    #
+    # @return The run id, e.g. 20261018-020311-1a2b.
+
+    def startRun(self,config,nodes):
+        now = time.time()
+        self.run_id = "%s-%s" % (time.strftime("%Y%m%d-%H%M%S",time.localtime(now)),os.urandom(2).encode("hex"))
+        self.section = -1
+        self.position = 0
+        self.execute("INSERT INTO runs (run_id, start_time, config_fingerprint, output_directory, hostname) VALUES (?,?,?,?,?)",(self.run_id,now,getConfigFingerprint(config),os.getcwd(),socket.gethostname()))
+        for node in nodes:
+            self.execute("INSERT INTO nodes (run_id, hostname, ip_address, facts) VALUES (?,?,?,?)",(self.run_id,node.hostname,node.ip_address,json.dumps(node.node_facts,sort_keys=True)))
+        msg = "Recording results of run %s in %s" % (self.run_id,self.filename)
+        print msg
+        logging.info(msg)
+        return self.run_id
+
+    ##
+    # @fn addSection(self,header):
+    #
+    # Starts a section of the results, e.g. "VFS Tests (kmod)". Results are recorded in the
+    # last section added.
+    #
+    # @param self The object pointer
+    # @param header Section header
+
+    def addSection(self,header):
+        self.lock.acquire()
+        self.section += 1
+        section = self.section
+        self.lock.release()
+        self.execute("INSERT INTO sections (run_id, position, header) VALUES (?,?,?)",(self.run_id,section,header))
+
+    ##
+    # @fn recordResult(self,name,rc,test_record=None):
+    #
+    # Records the result of a test in the current section.
+    #
+    # @param self The object pointer
+    # @param name Test name
+    # @param rc Return code of the test
+    # @param test_record Dictionary from OFSTestNode.runOFSTest with package, node, start, end, logfile, stdout_file, stderr_file and metrics. None if the test did not run.
+
+    def recordResult(self,name,rc,test_record=None):
+        if test_record is None:
+            test_record = {}
+        self.lock.acquire()
+        section = self.section
+        position = self.position
+        self.position += 1
+        self.lock.release()
+        header = self.query("SELECT header FROM sections WHERE run_id = ? AND position = ?",(self.run_id,section))
+        test_group = ""
+        if len(header) > 0:
+            test_group = header[0]["header"]
+        if not isinstance(rc,(int,long)) or isinstance(rc,bool):
+            rc = None
+        self.execute("INSERT INTO results (run_id, section, position, test_group, package, test, rc, status, start_time, end_time, node) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+            (self.run_id,section,position,test_group,test_record.get("package"),name,rc,getStatus(rc),test_record.get("start"),test_record.get("end"),test_record.get("node")))
+        for kind in ["logfile","stdout_file","stderr_file"]:
+            path = test_record.get(kind)
+            if path is not None and path != "":
+                self.execute("INSERT INTO artifacts (run_id, section, test, kind, path, position) VALUES (?,?,?,?,?,?)",(self.run_id,section,name,kind,path,position))
+        for (metric,value) in sorted(test_record.get("metrics",{}).items()):
+            unit = None
+            if isinstance(value,tuple):
+                (value,unit) = value
+            self.execute("INSERT INTO metrics (run_id, section, test, name, value, unit, position) VALUES (?,?,?,?,?,?,?)",(self.run_id,section,name,metric,value,unit,position))
+
+    ##
+    # @fn finishRun(self,rc):
+    #
+    # Records the end of the run and copies it to the history database.
+    #
+    # @param self The object pointer
+    # @param rc Return code of the run
+
+    def finishRun(self,rc):
+        if self.run_id is None:
+            return
+        if not isinstance(rc,(int,long)) or isinstance(rc,bool):
+            rc = None
+        self.execute("UPDATE runs SET end_time = ?, rc = ? WHERE run_id = ?",(time.time(),rc,self.run_id))
+        if self.history_filename is not None and self.history_filename != "":
+            self.copyRun(self.history_filename)
+
+    ##
+    # @fn copyRun(self,filename):
+    #
+    # Copies the current run to another database.
+    #
+    # @param self The object pointer
+    # @param filename Database file, e.g. the history database.
+
+    def copyRun(self,filename):
+        try:
+            # creates the tables if the database is new.
+            OFSResultsStore(filename).close()
+            self.lock.acquire()
+            try:
+                self.connection.execute("ATTACH DATABASE ? AS history",(filename,))
+                try:
+                    for table in RUN_TABLES:
+                        self.connection.execute("DELETE FROM history.%s WHERE run_id = ?" % table,(self.run_id,))
+                        self.connection.execute("INSERT INTO history.%s SELECT * FROM main.%s WHERE run_id = ?" % (table,table),(self.run_id,))
+                    self.connection.commit()
+                finally:
+                    self.connection.execute("DETACH DATABASE history")
+            finally:
+                self.lock.release()
+        except sqlite3.Error:
+            logging.exception("Could not copy run %s to %s" % (self.run_id,filename))
+
+    ##
+    # @fn close(self):
+    #
+    # Closes the database.
+    #
+    # @param self The object pointer
+
+    def close(self):
+        self.connection.close()
+
+    ##
+    # @fn formatLog(self,run_id=None):
+    #
+    # @param self The object pointer
+    # @param run_id Run. None is the current run.
+    #
+    # @return The results file of the run: each section header followed by its results.
+
+    def formatLog(self,run_id=None):
+        if run_id is None:
+            run_id = self.run_id
+        text = ""
+        results = self.query("SELECT section, test, rc FROM results WHERE run_id = ? ORDER BY position",(run_id,))
+        for section in self.query("SELECT position, header FROM sections WHERE run_id = ? ORDER BY position",(run_id,)):
+            text += formatHeader(section["header"])
+            for result in results:
+                if result["section"] == section["position"]:
+                    text += formatResult(result["test"],result["rc"])
+        return text
+
+    ##
+    # @fn writeLog(self,filename):
+    #
+    # Writes the results file of the current run.
+    #
+    # @param self The object pointer
+    # @param filename Results file
+
+    def writeLog(self,filename):
+        output = open(filename,'w')
+        output.write(self.formatLog())
+        output.close()
+
+    ##
+    # @fn findRun(self,run_id):
+    #
+    # @param self The object pointer
+    # @param run_id Run id or the start of one
+    #
+    # @return The full run id. None if no run or more than one run matches.
+
+    def findRun(self,run_id):
+        runs = self.query("SELECT run_id FROM runs WHERE run_id LIKE ? ORDER BY start_time",(run_id + "%",))
+        if len(runs) != 1:
+            return None
+        return runs[0]["run_id"]
+
+    ##
+    # @fn getRuns(self):
+    #
+    # @param self The object pointer
+    #
+    # @return List of runs, oldest first, with the number of tests and failures.
+
+    def getRuns(self):
+        return self.query("SELECT runs.*, COUNT(results.test) AS tests, SUM(CASE WHEN results.status != 'PASS' THEN 1 ELSE 0 END) AS failures " +
+            "FROM runs LEFT JOIN results ON results.run_id = runs.run_id GROUP BY runs.run_id ORDER BY runs.start_time")
+
+    ##
+    # @fn formatRuns(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Text table of the runs.
+
+    def formatRuns(self):
+        lines = ["%-20s %-19s %9s %6s %8s %-12s %s" % ("Run","Started","Time (s)","Tests","Failures","Config","Output directory")]
+        for run in self.getRuns():
+            elapsed = ""
+            if run["end_time"] is not None:
+                elapsed = "%.0f" % (run["end_time"] - run["start_time"])
+            lines.append("%-20s %-19s %9s %6d %8d %-12s %s" % (run["run_id"],time.strftime("%Y-%m-%d %H:%M:%S",time.localtime(run["start_time"])),elapsed,run["tests"],run["failures"] or 0,run["config_fingerprint"][:12],run["output_directory"]))
+        return "\n".join(lines)
+
+    ##
+    # @fn getResults(self,run_id):
+    #
+    # @param self The object pointer
+    # @param run_id Run
+    #
+    # @return Dictionary (test group,test,n) -> result with its metrics. n counts the runs of
+    # the same test in the same group, e.g. once per node, so runs on new nodes still compare.
+
+    def getResults(self,run_id):
+        results = {}
+        by_position = {}
+        for result in self.query("SELECT * FROM results WHERE run_id = ? ORDER BY position",(run_id,)):
+            result["metrics"] = {}
+            n = 0
+            while (result["test_group"],result["test"],n) in results:
+                n += 1
+            results[(result["test_group"],result["test"],n)] = result
+            by_position[result["position"]] = result
+        for metric in self.query("SELECT * FROM metrics WHERE run_id = ?",(run_id,)):
+            result = by_position.get(metric["position"])
+            if result is not None:
+                result["metrics"][metric["name"]] = (metric["value"],metric["unit"])
+        return results
+
+    ##
+    # @fn formatRun(self,run_id):
+    #
+    # @param self The object pointer
+    # @param run_id Run
+    #
+    # @return Text table of the results and metrics of the run.
+
+    def formatRun(self,run_id):
+        lines = ["%-28s %-28s %-8s %9s %s" % ("Group","Test","Status","Time (s)","Node")]
+        for result in sorted(self.getResults(run_id).values(),key=lambda r: r["position"]):
+            elapsed = ""
+            if result["start_time"] is not None and result["end_time"] is not None:
+                elapsed = "%.1f" % (result["end_time"] - result["start_time"])
+            lines.append("%-28s %-28s %-8s %9s %s" % (result["test_group"][:28],result["test"][:28],result["status"],elapsed,result["node"] or ""))
+            for (name,(value,unit)) in sorted(result["metrics"].items()):
+                lines.append("    %s = %g %s" % (name,value,unit or ""))
+        return "\n".join(lines)
+
+    ##
+    # @fn formatComparison(self,old_run_id,new_run_id):
+    #
+    # @param self The object pointer
+    # @param old_run_id Run to compare with
+    # @param new_run_id Run being compared
+    #
+    # @return Text table of the tests whose status changed, their times and the changes of their metrics.
+
+    def formatComparison(self,old_run_id,new_run_id):
+        old = self.getResults(old_run_id)
+        new = self.getResults(new_run_id)
+        old_run = self.query("SELECT config_fingerprint FROM runs WHERE run_id = ?",(old_run_id,))
+        new_run = self.query("SELECT config_fingerprint FROM runs WHERE run_id = ?",(new_run_id,))
+        lines = ["Comparing %s with %s" % (new_run_id,old_run_id)]
+        if len(old_run) > 0 and len(new_run) > 0 and old_run[0]["config_fingerprint"] != new_run[0]["config_fingerprint"]:
+            lines.append("The configs differ.")
+        lines.append("%-28s %-28s %-8s %-8s %9s %9s  %s" % ("Group","Test","Old","New","Old (s)","New (s)","Node"))
+
+        def getElapsed(result):
+            if result is None or result["start_time"] is None or result["end_time"] is None:
+                return None
+            return result["end_time"] - result["start_time"]
+
+        keys = sorted(set(old.keys() + new.keys()),key=lambda key: (new.get(key) or old.get(key))["position"])
+        for key in keys:
+            old_result = old.get(key)
+            new_result = new.get(key)
+            old_status = "-"
+            new_status = "-"
+            if old_result is not None:
+                old_status = old_result["status"]
+            if new_result is not None:
+                new_status = new_result["status"]
+            times = []
+            for elapsed in [getElapsed(old_result),getElapsed(new_result)]:
+                if elapsed is None:
+                    times.append("")
+                else:
+                    times.append("%.1f" % elapsed)
+            nodes = []
+            for result in [old_result,new_result]:
+                if result is not None and result["node"] and result["node"] not in nodes:
+                    nodes.append(result["node"])
+            marker = ""
+            if old_status != new_status:
+                marker = " *"
+            lines.append("%-28s %-28s %-8s %-8s %9s %9s  %s%s" % (key[0][:28],key[1][:28],old_status,new_status,times[0],times[1]," -> ".join(nodes),marker))
+            if old_result is None or new_result is None:
+                continue
+            for name in sorted(set(old_result["metrics"].keys()) & set(new_result["metrics"].keys())):
+                (old_value,unit) = old_result["metrics"][name]
+                new_value = new_result["metrics"][name][0]
+                change = ""
+                if old_value:
+                    change = " (%+.1f%%)" % ((new_value - old_value) * 100.0 / old_value)
+                lines.append("    %s: %g -> %g %s%s" % (name,old_value,new_value,unit or "",change))
+        return "\n".join(lines)
@@ -0,0 +1,253 @@
+#!/usr/bin/python
+##
+#
+# @class OFSSSHConnectionManager
+#
+# @brief This class manages a persistent, multiplexed ssh connection to one remote node.
+#
+# Every command, batch file and rsync the test system sends to a remote node is a
+# separate ssh process. Without multiplexing, each one does its own TCP and key
+# exchange handshake. OFSSSHConnectionManager starts one OpenSSH master connection
+# per (user, node) pair and hands out the ControlPath options that let every later
+# ssh invocation reuse it.
+#
+# The master is opened explicitly in the background (ssh -M -N -f). Commands use
+# ControlMaster=no, so a command never becomes a master itself. If the master could
+# not be opened (e.g. the node is still booting), commands silently fall back to a
+# direct connection. The master is not tried again until retry_interval has passed, so
+# commands to a node that is down do not each wait for a master in turn.
+#
+# Each manager counts the commands that ran over a master that was already open, i.e.
+# the handshakes saved, and reports them when its connections are closed.
+#
+
+import os
+import time
+import shutil
+import subprocess
+import tempfile
+import threading
+import logging
+
+
+class OFSSSHConnectionManager(object):
+
+    ## @var control_directory
+    # Local directory that holds the control sockets of all connections. Shared by all managers.
+    control_directory = None
+
+    ##
+    # @fn __init__(self,ip_address,key=None,persist=600,connect_timeout=10,retry_interval=60):
+    #
+    # Initialization routine. Does not connect. The master connection for a user is
+    # opened on first use.
+    #
+    # @param self The object pointer
+    # @param ip_address IP address of the node accessible from the local machine.
+    # @param key Location on local machine of SSH key used to access node.
+    # @param persist Seconds an idle master connection stays open.
+    # @param connect_timeout Seconds opening a master connection may take.
+    # @param retry_interval Seconds after a failed master connection during which commands use direct connections.
+
+    def __init__(self,ip_address,key=None,persist=600,connect_timeout=10,retry_interval=60):
+
+        ## @var ip_address
+        # address used to reach the node from the local machine
+        self.ip_address = ip_address
+
+        ## @var key
+        # local ssh key used to open the master connection
+        self.key = key
+
+        ## @var persist
+        # idle time in seconds before the master connection exits on its own
+        self.persist = persist
+
+        ## @var connect_timeout
+        # seconds ssh may take to connect when opening the master connection
+        self.connect_timeout = connect_timeout
+
+        ## @var retry_interval
+        # seconds after a failure before the master connection is tried again
+        self.retry_interval = retry_interval
+
+        ## @var failed_until
+        # Dictionary user -> time until which no master connection is tried.
+        self.failed_until = {}
+
+        ## @var lock
+        # serializes opening and closing of master connections across threads
+        self.lock = threading.Lock()
+
+        ## @var masters_opened
+        # Dictionary user -> number of master connections opened, i.e. handshakes done.
+        self.masters_opened = {}
+
+        ## @var commands_reused
+        # Dictionary user -> number of commands that ran over an open master, i.e. handshakes saved.
+        self.commands_reused = {}
+
+        if OFSSSHConnectionManager.control_directory is None:
+            OFSSSHConnectionManager.control_directory = tempfile.mkdtemp(prefix="ofssh-")
+
+    ##
+    # @fn getControlPath(self,user):
+    #
+    # @param self The object pointer
+    # @param user Remote user
+    #
+    # @return Location of the control socket for user on this node.
+
+    def getControlPath(self,user):
+        # Unix socket paths are limited to about 100 characters. Keep this short.
+        return os.path.join(OFSSSHConnectionManager.control_directory,"%s@%s" % (user,self.ip_address))
+
+    ##
+    # @fn getSSHOptions(self,user):
+    #
+    # Returns the ssh options that reuse the master connection for user. Opens the
+    # master connection if needed.
+    #
+    # @param self The object pointer
+    # @param user Remote user
+    #
+    # @return String of ssh -o options. Empty if no master connection is available.
+
+    def getSSHOptions(self,user):
+        if self.openConnection(user) != 0:
+            return ""
+        return "-o ControlMaster=no -o ControlPath=%s" % self.getControlPath(user)
+
+    ##
+    # @fn openConnection(self,user):
+    #
+    # Opens the background master connection for user, if it is not already open and it
+    # did not fail within retry_interval.
+    #
+    # @param self The object pointer
+    # @param user Remote user
+    #
+    # @return 0 if a master connection is available, otherwise ssh return code of the last try.
+
+    def openConnection(self,user):
+
+        control_path = self.getControlPath(user)
+
+        self.lock.acquire()
+        try:
+            # ssh removes the socket when the master exits.
+            if os.path.exists(control_path):
+                self.commands_reused[user] = self.commands_reused.get(user,0) + 1
+                return 0
+
+            (failed_until,failed_rc) = self.failed_until.get(user,(0,0))
+            if time.time() < failed_until:
+                return failed_rc
+
+            ssh_key_parm = ''
+            if self.key is not None:
+                ssh_key_parm = '-i %s' % self.key
+
+            command_line = "/usr/bin/ssh %s %s@%s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no -o BatchMode=yes -o ConnectTimeout=%d -o ServerAliveInterval=15 -o ServerAliveCountMax=3 -o ControlMaster=yes -o ControlPath=%s -o ControlPersist=%d -N -f" % (ssh_key_parm,user,self.ip_address,self.connect_timeout,control_path,self.persist)
+
+            # The master must not hold our pipes open, so send everything to /dev/null.
+            devnull = open(os.devnull,'w')
+            rc = subprocess.call(command_line,shell=True,stdout=devnull,stderr=devnull)
+            devnull.close()
+
+            if rc != 0:
+                logging.info("Could not open ssh master connection to %s@%s. rc = %d. Using direct connections for %d seconds." % (user,self.ip_address,rc,self.retry_interval))
+                self.failed_until[user] = (time.time() + self.retry_interval,rc)
+            else:
+                self.failed_until.pop(user,None)
+                logging.info("Opened ssh master connection to %s@%s at %s" % (user,self.ip_address,control_path))
+                self.masters_opened[user] = self.masters_opened.get(user,0) + 1
+            return rc
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn closeConnection(self,user):
+    #
+    # Tells the master connection for user to exit.
+    #
+    # @param self The object pointer
+    # @param user Remote user
+    #
+    # @return Return code of ssh -O exit.
+
+    def closeConnection(self,user):
+
+        control_path = self.getControlPath(user)
+
+        self.lock.acquire()
+        try:
+            if not os.path.exists(control_path):
+                return 0
+
+            command_line = "/usr/bin/ssh -o ControlPath=%s -O exit %s@%s" % (control_path,user,self.ip_address)
+            devnull = open(os.devnull,'w')
+            rc = subprocess.call(command_line,shell=True,stdout=devnull,stderr=devnull)
+            devnull.close()
+
+            if rc != 0:
+                # master is gone or hung. Remove the stale socket so it is not reused.
+                logging.info("Could not close ssh master connection to %s@%s. rc = %d" % (user,self.ip_address,rc))
+                try:
+                    os.remove(control_path)
+                except OSError:
+                    pass
+            return rc
+        finally:
+            self.lock.release()
+
+    ##
+    # @fn closeAllConnections(self):
+    #
+    # Closes the master connections for every user of this node.
+    #
+    # @param self The object pointer
+
+    def closeAllConnections(self):
+        if OFSSSHConnectionManager.control_directory is None or not os.path.isdir(OFSSSHConnectionManager.control_directory):
+            return
+        suffix = "@%s" % self.ip_address
+        for name in os.listdir(OFSSSHConnectionManager.control_directory):
+            if name.endswith(suffix):
+                self.closeConnection(name[:-len(suffix)])
+        logging.info(self.formatStatistics())
+
+    ##
+    # @fn getHandshakesSaved(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Number of commands, for all users, that ran over a master connection that was already open.
+
+    def getHandshakesSaved(self):
+        return sum(self.commands_reused.values())
+
+    ##
+    # @fn formatStatistics(self):
+    #
+    # @param self The object pointer
+    #
+    # @return One line report of the master connections opened and the handshakes saved, by user.
+
+    def formatStatistics(self):
+        users = sorted(set(self.masters_opened.keys() + self.commands_reused.keys()))
+        if len(users) == 0:
+            return "ssh %s: no master connections." % self.ip_address
+        counts = ["%s: %d master(s) opened, %d handshakes saved" % (user,self.masters_opened.get(user,0),self.commands_reused.get(user,0)) for user in users]
+        return "ssh %s: %s." % (self.ip_address,"; ".join(counts))
+
+    ##
+    # @fn removeControlDirectory():
+    #
+    # Removes the control socket directory. Call after all connections are closed.
+
+    @staticmethod
+    def removeControlDirectory():
+        if OFSSSHConnectionManager.control_directory is not None:
+            shutil.rmtree(OFSSSHConnectionManager.control_directory,ignore_errors=True)
+            OFSSSHConnectionManager.control_directory = None
@@ -0,0 +1,419 @@
+#!/usr/bin/python
+##
+#
+# @class OFSStageGraph
+#
+# @brief This class runs the setup of a test run as a graph of named stages.
+#
+# Each OFSStage names what it requires and what it provides, e.g. "Install OrangeFS"
+# requires ofs_build and provides ofs_install. A stage starts as soon as everything it
+# requires has been provided, so stages that do not depend on each other overlap, each in
+# a thread of its own. Node methods called from the stages use the execution engine as
+# usual; every thread keeps its own working directory on a node (see
+# OFSTestNode.getCurrentDirectory), so stages can share a node.
+#
+# When a stage fails, no new stage starts, the running ones are waited for and the stages
+# that did not run are reported as skipped. Stages with required=False only log their
+# failure and their outputs count as provided, like the checks the setup has always ignored.
+#
+# After the run, formatReport() lists the time of each stage and the critical path: the
+# chain of dependent stages that took longest. Shortening the critical path is the only
+# way to shorten the setup.
+#
+# Example:
+#
+#   graph = OFSStageGraph()
+#   graph.addStage("Build OrangeFS",ofs_network.buildOFSFromSource,provides=["ofs_build"])
+#   graph.addStage("Install OrangeFS",ofs_network.installOFSBuild,requires=["ofs_build"],provides=["ofs_install"])
+#   graph.addStage("Install benchmarks",ofs_network.installBenchmarks,provides=["benchmarks"])
+#   rc = graph.run()
+#   print graph.formatReport()
+#
+
+import time
+import threading
+import traceback
+import logging
+import OFSTestTrace
+
+##
+# @class OFSStage
+#
+# One stage of an OFSStageGraph.
+
+class OFSStage(object):
+
+    ##
+    # @fn __init__(self,name,function,args=[],kwargs={},requires=[],provides=[],required=True,description=""):
+    #
+    # Initialization routine.
+    #
+    # @param self The object pointer
+    # @param name Stage name. Must be unique in the graph.
+    # @param function Function that does the work. Returns 0 on success. Any other value, including None, is a failure.
+    # @param args List of arguments for function
+    # @param kwargs Dictionary of keyword arguments for function
+    # @param requires Names of the outputs that must be provided before the stage starts.
+    # @param provides Names of the outputs the stage provides.
+    # @param required Does a failure of this stage stop the setup?
+    # @param description Printed when the stage starts. Default is the name.
+
+    def __init__(self,name,function,args=[],kwargs={},requires=[],provides=[],required=True,description=""):
+
+        ## @var name
+        # stage name
+        self.name = name
+
+        ## @var function
+        # function that does the work
+        self.function = function
+
+        ## @var args
+        # arguments for function
+        self.args = args
+
+        ## @var kwargs
+        # keyword arguments for function
+        self.kwargs = kwargs
+
+        ## @var requires
+        # outputs needed before the stage starts
+        self.requires = list(requires)
+
+        ## @var provides
+        # outputs of the stage
+        self.provides = list(provides)
+
+        ## @var required
+        # does a failure stop the setup?
+        self.required = required
+
+        ## @var description
+        # printed when the stage starts
+        self.description = description
+        if self.description == "":
+            self.description = name
+
+        ## @var state
+        # waiting, running, done, failed or skipped
+        self.state = "waiting"
+
+        ## @var rc
+        # return code. None until the stage is done.
+        self.rc = None
+
+        ## @var start_time
+        # time the stage started
+        self.start_time = None
+
+        ## @var end_time
+        # time the stage finished
+        self.end_time = None
+
+    ##
+    # @fn getElapsedTime(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Seconds the stage ran. 0 if it did not run.
+
+    def getElapsedTime(self):
+        if self.start_time is None or self.end_time is None:
+            return 0.0
+        return self.end_time - self.start_time
+
+
+class OFSStageGraph(object):
+
+    ##
+    # @fn __init__(self,max_parallel=None):
+    #
+    # Initialization routine.
+    #
+    # @param self The object pointer
+    # @param max_parallel Maximum number of stages running at once. None or 0 is unlimited. 1 runs the stages one at a time.
+
+    def __init__(self,max_parallel=None):
+
+        ## @var stages
+        # stages in the order they were added
+        self.stages = []
+
+        ## @var max_parallel
+        # maximum number of stages running at once
+        self.max_parallel = max_parallel
+
+        ## @var start_time
+        # time run() started
+        self.start_time = None
+
+        ## @var end_time
+        # time run() finished
+        self.end_time = None
+
+        self.condition = threading.Condition()
+
+    ##
+    # @fn addStage(self,name,function,args=[],kwargs={},requires=[],provides=[],required=True,description=""):
+    #
+    # Adds a stage. See OFSStage.__init__ for the parameters.
+    #
+    # @param self The object pointer
+    #
+    # @return The new OFSStage
+
+    def addStage(self,name,function,args=[],kwargs={},requires=[],provides=[],required=True,description=""):
+        if self.getStage(name) is not None:
+            raise ValueError("Stage %s was added twice" % name)
+        stage = OFSStage(name,function,args,kwargs,requires,provides,required,description)
+        self.stages.append(stage)
+        return stage
+
+    ##
+    # @fn getStage(self,name):
+    #
+    # @param self The object pointer
+    # @param name Stage name
+    #
+    # @return OFSStage with the name, or None.
+
+    def getStage(self,name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        return None
+
+    ##
+    # @fn getProducers(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Dictionary output -> stage that provides it.
+
+    def getProducers(self):
+        producers = {}
+        for stage in self.stages:
+            for output in stage.provides:
+                if output in producers:
+                    raise ValueError("%s is provided by both %s and %s" % (output,producers[output].name,stage.name))
+                producers[output] = stage
+        return producers
+
+    ##
+    # @fn getDependencies(self,stage):
+    #
+    # @param self The object pointer
+    # @param stage OFSStage
+    #
+    # @return List of the stages that provide what stage requires.
+
+    def getDependencies(self,stage):
+        producers = self.getProducers()
+        dependencies = []
+        for output in stage.requires:
+            producer = producers.get(output)
+            if producer is not None and producer not in dependencies:
+                dependencies.append(producer)
+        return dependencies
+
+    ##
+    # @fn validate(self):
+    #
+    # Checks that every requirement is provided by a stage and that no stage depends on itself.
+    #
+    # @param self The object pointer
+    #
+    # @return List of problems. Empty if the graph can run.
+
+    def validate(self):
+        problems = []
+        try:
+            producers = self.getProducers()
+        except ValueError as e:
+            return [str(e)]
+        for stage in self.stages:
+            for output in stage.requires:
+                if output not in producers:
+                    problems.append("%s requires %s, which no stage provides" % (stage.name,output))
+        if len(problems) > 0:
+            return problems
+
+        # remove stages without unfinished dependencies until none are left. What remains is a cycle.
+        remaining = list(self.stages)
+        while len(remaining) > 0:
+            free = [stage for stage in remaining if len([d for d in self.getDependencies(stage) if d in remaining]) == 0]
+            if len(free) == 0:
+                problems.append("Stages depend on each other: %s" % ", ".join([stage.name for stage in remaining]))
+                break
+            remaining = [stage for stage in remaining if stage not in free]
+        return problems
+
+    ##
+    # @fn runStage(self,stage):
+    #
+    # Runs one stage in the calling thread and records the result.
+    #
+    # @param self The object pointer
+    # @param stage OFSStage
+
+    def runStage(self,stage):
+        rc = 1
+        try:
+            rc = stage.function(*stage.args,**stage.kwargs)
+            if not isinstance(rc,(int,long)):
+                msg = "Stage %s returned %r instead of a return code" % (stage.name,rc)
+                print msg
+                logging.warning(msg)
+                rc = 1
+        except:
+            print "Stage %s failed:" % stage.name
+            traceback.print_exc()
+            logging.exception("Stage %s failed" % stage.name)
+        end_time = time.time()
+        if rc != 0:
+            if stage.required:
+                msg = "Stage %s failed with rc=%r. No more stages will start." % (stage.name,rc)
+            else:
+                msg = "Stage %s failed with rc=%r. Continuing." % (stage.name,rc)
+            print msg
+            logging.error(msg)
+        OFSTestTrace.record("stage","",stage.name,stage.start_time,end_time,rc)
+        self.condition.acquire()
+        try:
+            stage.end_time = end_time
+            stage.rc = rc
+            if rc == 0:
+                stage.state = "done"
+            else:
+                stage.state = "failed"
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    ##
+    # @fn run(self):
+    #
+    # Runs all stages. Returns when every stage has finished or been skipped.
+    #
+    # @param self The object pointer
+    #
+    # @return 0 on success. Return code of the first required stage that failed otherwise.
+
+    def run(self):
+        problems = self.validate()
+        if len(problems) > 0:
+            for problem in problems:
+                print problem
+                logging.error(problem)
+            return 1
+
+        self.start_time = time.time()
+        first_failure = 0
+        provided = set()
+        self.condition.acquire()
+        try:
+            while True:
+                # collect what finished since the last pass.
+                for stage in self.stages:
+                    if stage.state == "done" or (stage.state == "failed" and not stage.required):
+                        provided.update(stage.provides)
+                    if stage.state == "failed" and stage.required and first_failure == 0:
+                        first_failure = stage.rc
+
+                running = [stage for stage in self.stages if stage.state == "running"]
+                waiting = [stage for stage in self.stages if stage.state == "waiting"]
+
+                if first_failure == 0:
+                    for stage in waiting:
+                        if self.max_parallel and len(running) >= self.max_parallel:
+                            break
+                        if len([output for output in stage.requires if output not in provided]) > 0:
+                            continue
+                        self.startStage(stage)
+                        running.append(stage)
+
+                if len(running) == 0:
+                    break
+                self.condition.wait(1.0)
+        finally:
+            self.condition.release()
+
+        for stage in self.stages:
+            if stage.state == "waiting":
+                stage.state = "skipped"
+        self.end_time = time.time()
+        return first_failure
+
+    ##
+    # @fn startStage(self,stage):
+    #
+    # Starts a stage in a new thread. Call with condition held.
+    #
+    # @param self The object pointer
+    # @param stage OFSStage
+
+    def startStage(self,stage):
+        print ""
+        print "==================================================================="
+        print stage.description
+        logging.info("Starting stage %s" % stage.name)
+        stage.state = "running"
+        stage.start_time = time.time()
+        t = threading.Thread(target=self.runStage,args=(stage,),name=stage.name)
+        t.setDaemon(True)
+        t.start()
+
+    ##
+    # @fn getCriticalPath(self):
+    #
+    # Finds the chain of dependent stages with the longest total time. Stages that did not
+    # run count as 0 seconds.
+    #
+    # @param self The object pointer
+    #
+    # @return (seconds,list of stages), first stage first.
+
+    def getCriticalPath(self):
+        longest = {}
+
+        def getLongest(stage):
+            if stage.name not in longest:
+                best = (0.0,[])
+                for dependency in self.getDependencies(stage):
+                    candidate = getLongest(dependency)
+                    if candidate[0] > best[0] or len(best[1]) == 0:
+                        best = candidate
+                longest[stage.name] = (best[0] + stage.getElapsedTime(),best[1] + [stage])
+            return longest[stage.name]
+
+        path = (0.0,[])
+        for stage in self.stages:
+            candidate = getLongest(stage)
+            if candidate[0] > path[0] or len(path[1]) == 0:
+                path = candidate
+        return path
+
+    ##
+    # @fn formatReport(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Text table of the start, time and state of each stage, followed by the critical path.
+
+    def formatReport(self):
+        if self.start_time is None:
+            return "Setup stages did not run."
+        lines = ["%-36s %9s %9s %-8s %s" % ("Stage","Start (s)","Time (s)","State","Requires")]
+        for stage in sorted(self.stages,key=lambda s: (s.start_time is None,s.start_time)):
+            start = ""
+            if stage.start_time is not None:
+                start = "%9.1f" % (stage.start_time - self.start_time)
+            lines.append("%-36s %9s %9.1f %-8s %s" % (stage.name[:36],start,stage.getElapsedTime(),stage.state,", ".join(stage.requires)))
+        wall_time = 0.0
+        if self.end_time is not None:
+            wall_time = self.end_time - self.start_time
+        busy_time = sum([stage.getElapsedTime() for stage in self.stages])
+        lines.append("Wall time %.1f s, %.1f s of stage time" % (wall_time,busy_time))
+        (seconds,path) = self.getCriticalPath()
+        lines.append("Critical path (%.1f s): %s" % (seconds," -> ".join(["%s (%.1f s)" % (stage.name,stage.getElapsedTime()) for stage in path])))
+        return "\n".join(lines)
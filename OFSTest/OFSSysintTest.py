@@ -268,3 +268,13 @@ tests = [ ping,
          symlink_sysint
          ]
 
+## @var exclusive
+# Tests that must run alone on the head node. See OFSTestShards.
+# The sysint tests work on the same files one after another and set_mode_admin changes the
+# whole file system, so none of them can run in a shard.
+exclusive = list(tests)
+
+## @var head_node_tests
+# Tests that must run on the head node. See OFSTestShards.
+head_node_tests = []
+
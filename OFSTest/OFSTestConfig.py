@@ -458,6 +458,163 @@ class OFSTestConfig(object):
         # Number of OpenMPI slots per client node. 
         self.number_mpi_slots = 1
         
+        ## @var remote_agent
+        #
+        # Run commands on remote nodes through a persistent Python agent instead of one ssh process per command.
+        # Nodes without Python fall back to ssh.
+        self.remote_agent = False
+        
+        ## @var max_workers
+        #
+        # Maximum number of nodes worked on at once by parallel operations. 0 is no limit.
+        self.max_workers = 32
+        
+        ## @var command_timeout
+        #
+        # Default timeout in seconds for every command run on a node. None is no timeout.
+        self.command_timeout = None
+        
+        ## @var test_timeout
+        #
+        # Seconds each test may take. Commands of a test still running then are killed and the test reports TIMEOUT. None is no timeout.
+        self.test_timeout = None
+        
+        ## @var node_facts_cache
+        #
+        # File on the local machine that keeps node facts between runs. None or "" disables the cache.
+        self.node_facts_cache = "node-facts-cache.json"
+        
+        ## @var trace_file
+        #
+        # Chrome trace event file with a span for every command of the run. A per-phase summary is written next to it. None or "" disables tracing.
+        self.trace_file = "ofstest-trace.json"
+        
+        ## @var max_mpi_slots
+        #
+        # Maximum MPI slots per node in the generated host files. None uses every core.
+        self.max_mpi_slots = None
+        
+        ## @var broadcast_fanout
+        #
+        # Children per node when installations are broadcast to the cluster. 1 passes the stream along a chain of nodes.
+        self.broadcast_fanout = 2
+        
+        ## @var broadcast_compression
+        #
+        # Compression of the broadcast stream: none, gzip, lz4 or zstd.
+        self.broadcast_compression = "none"
+        
+        ## @var build_cache
+        #
+        # Local directory of cached OrangeFS builds. Empty disables the build cache.
+        self.build_cache = "ofs-build-cache"
+        
+        ## @var build_cache_size
+        #
+        # Size of the build cache in MB. Least recently used builds are removed above it.
+        self.build_cache_size = 4096
+        
+        ## @var incremental_build
+        #
+        # Keep the OrangeFS build directory between runs and only rebuild what changed. For persistent nodes.
+        self.incremental_build = False
+        
+        ## @var ofs_build_location
+        #
+        # Build directory of incremental builds on the build node. Empty uses ~/ofs-build/<source directory>.
+        self.ofs_build_location = ""
+        
+        ## @var ccache_dir
+        #
+        # ccache directory of incremental builds on the build node. None uses ~/.ccache-ofstest, empty disables ccache.
+        self.ccache_dir = None
+        
+        ## @var make_jobs
+        #
+        # Parallel make jobs of the OrangeFS build. None uses the number of cores of the build node.
+        self.make_jobs = None
+        
+        ## @var distributed_build
+        #
+        # Spread the compile jobs of the build node over all nodes with distcc. Needs distcc on the nodes.
+        self.distributed_build = False
+        
+        ## @var kernel_build_once
+        #
+        # Build a custom kernel on one node and install it on all nodes. False builds it on every node.
+        self.kernel_build_once = True
+        
+        ## @var provisioning_cache
+        #
+        # Run a caching proxy for packages and tarballs on the first node and point all nodes at it.
+        self.provisioning_cache = False
+        
+        ## @var provisioning_cache_port
+        #
+        # Port of the provisioning cache.
+        self.provisioning_cache_port = 3142
+        
+        ## @var provisioning_cache_dir
+        #
+        # Cache directory on the first node. Empty string for ~/ofstest-provisioning-cache.
+        self.provisioning_cache_dir = ""
+        
+        ## @var provisioning_cache_local
+        #
+        # Local directory the provisioning cache is loaded from before the run and saved to after it. Empty string to not keep it.
+        self.provisioning_cache_local = "provisioning-cache"
+        
+        ## @var provisioning_mirror
+        #
+        # Local directory with a stand-in mirror, laid out as <host>/<path>. Requests for files in it never go upstream.
+        self.provisioning_mirror = ""
+        
+        ## @var provisioning_offline
+        #
+        # Serve only from the provisioning cache and mirror. Nothing is downloaded.
+        self.provisioning_offline = False
+        
+        ## @var max_parallel_stages
+        #
+        # Maximum number of setup stages (build, OpenMPI, benchmarks...) running at once. 1 runs them one after another.
+        # Stages run one after another while checkpoint_file is set.
+        self.max_parallel_stages = 4
+        
+        ## @var checkpoint_file
+        #
+        # File in the output directory where finished setup stages are recorded. Empty string for no checkpoints.
+        self.checkpoint_file = "setup-checkpoints.json"
+        
+        ## @var resume
+        #
+        # Skip the setup stages whose checkpoint still matches the config and the nodes. Set by start_test --resume.
+        self.resume = False
+        
+        ## @var test_shards
+        #
+        # Number of client nodes that run the sysint, VFS and usrint tests at the same time. 0 uses every node. 1 runs all tests on the head node.
+        self.test_shards = 0
+        
+        ## @var test_history_file
+        #
+        # File on the local machine with the wall time of every test from earlier runs. Used to balance the test shards. Use an absolute path to share it between output directories. None or "" disables the history.
+        self.test_history_file = "test-history.json"
+        
+        ## @var test_default_duration
+        #
+        # Seconds predicted for a test that has no history.
+        self.test_default_duration = 600
+        
+        ## @var results_db
+        #
+        # SQLite database in the output directory with the results, times and metrics of every test. log_file is generated from it. None or "" writes log_file directly.
+        self.results_db = "results.db"
+        
+        ## @var results_history_db
+        #
+        # SQLite database that collects the results of every run, e.g. of all nightly runs. None or "" for no history.
+        self.results_history_db = ""
+        
     ##
     #
     # @fn setConfig(self,kwargs={}):
@@ -954,4 +1111,128 @@ class OFSTestConfig(object):
         temp = d.get('number_mpi_slots')
         if temp != None:
             self.number_mpi_slots = temp
+        
+        temp = d.get('remote_agent')
+        if temp != None:
+            self.remote_agent = temp
+        
+        temp = d.get('max_workers')
+        if temp != None:
+            self.max_workers = temp
+        
+        temp = d.get('command_timeout')
+        if temp != None:
+            self.command_timeout = temp
+        
+        temp = d.get('test_timeout')
+        if temp != None:
+            self.test_timeout = temp
+        
+        temp = d.get('node_facts_cache')
+        if temp != None:
+            self.node_facts_cache = temp
+        
+        temp = d.get('trace_file')
+        if temp != None:
+            self.trace_file = temp
+        
+        temp = d.get('max_mpi_slots')
+        if temp != None:
+            self.max_mpi_slots = temp
+        
+        temp = d.get('broadcast_fanout')
+        if temp != None:
+            self.broadcast_fanout = temp
+        
+        temp = d.get('broadcast_compression')
+        if temp != None:
+            self.broadcast_compression = temp
+        
+        temp = d.get('build_cache')
+        if temp != None:
+            self.build_cache = temp
+        
+        temp = d.get('build_cache_size')
+        if temp != None:
+            self.build_cache_size = temp
+        
+        temp = d.get('incremental_build')
+        if temp != None:
+            self.incremental_build = temp
+        
+        temp = d.get('ofs_build_location')
+        if temp != None:
+            self.ofs_build_location = temp
+        
+        temp = d.get('ccache_dir')
+        if temp != None:
+            self.ccache_dir = temp
+        
+        temp = d.get('make_jobs')
+        if temp != None:
+            self.make_jobs = temp
+        
+        temp = d.get('distributed_build')
+        if temp != None:
+            self.distributed_build = temp
+        
+        temp = d.get('kernel_build_once')
+        if temp != None:
+            self.kernel_build_once = temp
+        
+        temp = d.get('provisioning_cache')
+        if temp != None:
+            self.provisioning_cache = temp
+        
+        temp = d.get('provisioning_cache_port')
+        if temp != None:
+            self.provisioning_cache_port = temp
+        
+        temp = d.get('provisioning_cache_dir')
+        if temp != None:
+            self.provisioning_cache_dir = temp
+        
+        temp = d.get('provisioning_cache_local')
+        if temp != None:
+            self.provisioning_cache_local = temp
+        
+        temp = d.get('provisioning_mirror')
+        if temp != None:
+            self.provisioning_mirror = temp
+        
+        temp = d.get('provisioning_offline')
+        if temp != None:
+            self.provisioning_offline = temp
+        
+        temp = d.get('max_parallel_stages')
+        if temp != None:
+            self.max_parallel_stages = temp
+        
+        temp = d.get('checkpoint_file')
+        if temp != None:
+            self.checkpoint_file = temp
+        
+        temp = d.get('resume')
+        if temp != None:
+            self.resume = temp
+        
+        temp = d.get('test_shards')
+        if temp != None:
+            self.test_shards = temp
+        
+        temp = d.get('test_history_file')
+        if temp != None:
+            self.test_history_file = temp
+        
+        temp = d.get('test_default_duration')
+        if temp != None:
+            self.test_default_duration = temp
+        
+        temp = d.get('results_db')
+        if temp != None:
+            self.results_db = temp
+        
+        temp = d.get('results_history_db')
+        if temp != None:
+            self.results_history_db = temp
                 
\ No newline at end of file
@@ -0,0 +1,155 @@
+#!/usr/bin/python
+##
+#
+# @class OFSTestHistory
+#
+# @brief This class keeps the wall time of every test from earlier runs.
+#
+# The times are kept in a JSON file on the local machine, keyed by test package and test
+# name, e.g. vfs-kmod/fsx. The test shards use them to put the longest tests first and to
+# predict how long a test group takes. See OFSTestShards.planShards.
+#
+# The file is relative to the output directory unless the path is absolute. Use an absolute
+# path to share the history between output directories.
+#
+
+import time
+import threading
+import OFSJSONStore
+
+## @var MAX_SAMPLES
+# Number of recent times kept for each test.
+MAX_SAMPLES = 10
+
+## @var PREDICTION_SAMPLES
+# Number of recent times whose median predicts the next one.
+PREDICTION_SAMPLES = 5
+
+
+class OFSTestHistory(object):
+
+    ##
+    # @fn __init__(self,filename="test-history.json",default_duration=600):
+    #
+    # Initialization routine. Reads the history if the file exists.
+    #
+    # @param self The object pointer
+    # @param filename History file on the local machine.
+    # @param default_duration Seconds predicted for a test without history.
+
+    def __init__(self,filename="test-history.json",default_duration=600):
+
+        ## @var filename
+        # history file on the local machine
+        self.filename = filename
+
+        ## @var default_duration
+        # Seconds predicted for a test without history. High, so unknown tests are started early.
+        self.default_duration = default_duration
+
+        ## @var entries
+        # Dictionary of histories keyed by package/test
+        self.entries = {}
+
+        ## @var lock
+        # Protects entries and the history file.
+        self.lock = threading.Lock()
+
+        self.load()
+
+    ##
+    # @fn getKey(self,package,name):
+    #
+    # @param self The object pointer
+    # @param package Test package, e.g. vfs-kmod
+    # @param name Test function name
+    #
+    # @return Key of the test in entries.
+
+    def getKey(self,package,name):
+        return "%s/%s" % (package,name)
+
+    ##
+    # @fn load(self):
+    #
+    # Reads the history file.
+    #
+    # @param self The object pointer
+
+    def load(self):
+        entries = OFSJSONStore.loadJSONFile(self.filename,"test history")
+        if entries is not None:
+            self.entries = entries
+
+    ##
+    # @fn save(self):
+    #
+    # Writes the history file. Call with lock held.
+    #
+    # @param self The object pointer
+
+    def save(self):
+        OFSJSONStore.saveJSONFile(self.filename,self.entries,"test history")
+
+    ##
+    # @fn getDuration(self,package,name):
+    #
+    # @param self The object pointer
+    # @param package Test package, e.g. vfs-kmod
+    # @param name Test function name
+    #
+    # @return Median of the last PREDICTION_SAMPLES times of the test. None if it has no history.
+
+    def getDuration(self,package,name):
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(self.getKey(package,name))
+            if entry is None or len(entry.get("durations",[])) == 0:
+                return None
+            samples = sorted(entry["durations"][-PREDICTION_SAMPLES:])
+        finally:
+            self.lock.release()
+        middle = len(samples) / 2
+        if len(samples) % 2 == 1:
+            return samples[middle]
+        return (samples[middle - 1] + samples[middle]) / 2.0
+
+    ##
+    # @fn getDurations(self,package,tests):
+    #
+    # @param self The object pointer
+    # @param package Test package, e.g. vfs-kmod
+    # @param tests List of test functions
+    #
+    # @return Dictionary test function -> predicted seconds. default_duration for tests without history.
+
+    def getDurations(self,package,tests):
+        durations = {}
+        for test in tests:
+            duration = self.getDuration(package,test.__name__)
+            if duration is None:
+                duration = self.default_duration
+            durations[test] = duration
+        return durations
+
+    ##
+    # @fn record(self,package,name,seconds,rc=0):
+    #
+    # Adds the time of a test that ran and writes the history file.
+    #
+    # @param self The object pointer
+    # @param package Test package, e.g. vfs-kmod
+    # @param name Test function name
+    # @param seconds Wall time of the test
+    # @param rc Return code of the test
+
+    def record(self,package,name,seconds,rc=0):
+        self.lock.acquire()
+        try:
+            entry = self.entries.setdefault(self.getKey(package,name),{"durations" : []})
+            entry["durations"] = (entry["durations"] + [round(seconds,3)])[-MAX_SAMPLES:]
+            entry["last_rc"] = rc
+            entry["last_run"] = time.time()
+            self.save()
+        finally:
+            self.lock.release()
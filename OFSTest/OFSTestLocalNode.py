@@ -17,6 +17,7 @@
 #
 
 import OFSTestNode
+import OFSTestTrace
 import os
 import subprocess
 import shlex
@@ -75,14 +76,27 @@ class OFSTestLocalNode(OFSTestNode.OFSTestNode):
     #==========================================================================
     
     ##       
-    # @fn runAllBatchCommands(self,output=[]):
+    # @fn runAllBatchCommands(self,output=None,debug=False,stream=False,line_callback=None,timeout=None):
     #
     # Writes stored batch commands to a file, then runs them.
     # 
     # @param self The object pointer
     # @param output Output of command
+    # @param debug Print debugging information?
+    # @param stream Capture output in streaming mode? See runSingleCommand.
+    # @param line_callback Function called with each line of stdout as it arrives.
+    # @param timeout Seconds before the batch is killed. See runSingleCommand.
+    #
+    # @return Return code of the batch. COMMAND_TIMEOUT_RC if it timed out.
      
-    def runAllBatchCommands(self,output=[],debug=False):
+    @OFSTestTrace.traced("batch")
+    def runAllBatchCommands(self,output=None,debug=False,stream=False,line_callback=None,timeout=None):
+        
+        if output is None:
+            output = []
+        if line_callback is not None:
+            stream = True
+        timeout = self.getCommandTimeout(timeout)
      
         
         # Open file with mode 700
@@ -90,7 +104,7 @@ class OFSTestLocalNode(OFSTestNode.OFSTestNode):
         script_file = open(batchfile,'w')
         script_file.write("#!/bin/bash\n")
         
-        for element in self.current_environment:
+        for element in self.current_environment.keys():
             script_file.write("export %s=%s\n" % (element, self.current_environment[element]))
         
         # change to current directory
@@ -127,15 +141,20 @@ class OFSTestLocalNode(OFSTestNode.OFSTestNode):
         logging.info("Command: "+batchfile)    
                     
         # run the command and capture stdout and stderr
-        p = subprocess.Popen(batchfile,shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE,bufsize=-1)
-        
         # clear the output list, then append stdout,stderr to list to get pass-by-reference to work
         del output[:]
         output.append(command)
-        for i in p.communicate():
-            output.append(i)
+        if self.isCancelled(output):
+            self.batch_commands = []
+            return -1
+        if self.isPastDeadline(timeout,output):
+            self.batch_commands = []
+            return OFSTestNode.COMMAND_TIMEOUT_RC
+        # the batch file runs locally, so killing the local process group is enough.
+        p = self.startCommandProcess(batchfile)
+        rc = self.waitForCommand(p,output,stream,line_callback,timeout=timeout)
         
-        logging.info("RC: %r" % p.returncode)
+        logging.info("RC: %r" % rc)
         logging.info("STDOUT: %s" % output[1] )
         logging.info("STDERR: %s" % output[2] )
         
@@ -143,7 +162,7 @@ class OFSTestLocalNode(OFSTestNode.OFSTestNode):
         self.batch_commands = []    
         OFSTestNode.batch_count = OFSTestNode.batch_count+1
 
-        return p.returncode
+        return rc
         
     ##       
     # @fn prepareCommandLine(self,command,outfile="",append_out=False,errfile="",append_err=False,remote_user=None):
@@ -194,7 +213,7 @@ class OFSTestLocalNode(OFSTestNode.OFSTestNode):
         # change to proper directory
         command_chunks.append("cd %s; " % self.current_directory)
         #now append each variable followed by a space
-        for variable in self.current_environment:
+        for variable in self.current_environment.keys():
             command_chunks.append("%s=%s; " % (variable,self.current_environment[variable]))
         #now append the command
         command_chunks.append(command)
@@ -222,8 +241,29 @@ class OFSTestLocalNode(OFSTestNode.OFSTestNode):
     #
     # @return Return code of copy command.
     
+    @OFSTestTrace.traced("copy")
     def copyToRemoteNode(self, source, destination_node, destination, recursive=False):
-        # This runs the copy command remotely 
+        output = []
+        rc = self.runSingleCommand(self.getCopyToRemoteNodeCommand(source,destination_node,destination,recursive),output)
+        if rc != 0:
+            logging.exception("Could not copy to remote node")
+        return rc
+    
+    ##
+    #
+    # @fn getCopyToRemoteNodeCommand(self, source, destination_node, destination, recursive=False):
+    #
+    # Returns the rsync command that copies files from this node to the remote node.
+    #
+    # @param self The object pointer
+    # @param source Source file or directory
+    # @param destination_node Node to which files should be copied
+    # @param destination Destination file or directory on remote node.
+    # @param recursive Copy recursively?
+    #
+    # @return rsync command
+    
+    def getCopyToRemoteNodeCommand(self, source, destination_node, destination, recursive=False):
         rflag = ""
 
         if recursive == True:
@@ -238,13 +278,9 @@ class OFSTestLocalNode(OFSTestNode.OFSTestNode):
         except:
             pass
           
-        rsync_command = "rsync %s -e \\\"ssh %s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no\\\" %s %s@%s:%s" % (rflag,ssh_key_parm,source,destination_node.current_user,destination_node.ext_ip_address,destination)
-        
-        output = []
-        rc = self.runSingleCommand(rsync_command,output)
-        if rc != 0:
-            logging.exception("Could not copy to remote node")
-        return rc
+        # rsync's ssh runs on the local machine, so it can reuse the persistent connection to destination_node.
+        rsync_command = "rsync %s -e \\\"ssh %s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no %s\\\" %s %s@%s:%s" % (rflag,ssh_key_parm,destination_node.getSSHConnectionOptions(),source,destination_node.current_user,destination_node.ext_ip_address,destination)
+        return rsync_command
     
     ##
     #
@@ -261,6 +297,7 @@ class OFSTestLocalNode(OFSTestNode.OFSTestNode):
     # @return Return code of copy command.
     
       
+    @OFSTestTrace.traced("copy")
     def copyFromRemoteNode(self, source_node, source, destination, recursive=False):
         # This runs the copy command remotely 
         rflag = ""
@@ -277,7 +314,7 @@ class OFSTestLocalNode(OFSTestNode.OFSTestNode):
         except:
             pass
         
-        rsync_command = "rsync %s -e \\\"ssh %s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no\\\"  %s@%s:%s %s" % (rflag,ssh_key_parm,source_node.current_user,source_node.ext_ip_address,source,destination)
+        rsync_command = "rsync %s -e \\\"ssh %s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no %s\\\"  %s@%s:%s %s" % (rflag,ssh_key_parm,source_node.getSSHConnectionOptions(),source_node.current_user,source_node.ext_ip_address,source,destination)
         
         output = []
         rc = self.runSingleCommand(rsync_command,output)
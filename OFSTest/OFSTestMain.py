@@ -29,14 +29,27 @@
 #
 #   runTest()       Runs the tests for OrangeFS as specified by the config.
 #
+#   writeTrace()    Writes the timeline of the run and the time spent per phase.
+#
 
 
 import OFSTestConfig
 import OFSTestConfigFile
 import OFSTestConfigMenu
 import OFSTestNetwork
+import OFSTestNode
+import OFSStageGraph
+import OFSCheckpoint
+import OFSTestShards
+import OFSTestHistory
+import OFSResultsStore
+import OFSBuildCache
+import OFSTestTrace
+import OFSTestWait
+import os
 import time
 import sys
+import threading
 import traceback
 from pprint import pprint
 import logging
@@ -67,6 +80,18 @@ class OFSTestMain(object):
 
         self.ofs_network = OFSTestNetwork.OFSTestNetwork()
         
+        ## @var self.checkpoint
+        # OFSCheckpoint of the setup stages. None if checkpoints are disabled.
+        self.checkpoint = None
+        
+        ## @var self.test_history
+        # OFSTestHistory with the wall times of earlier test runs. None if the history is disabled.
+        self.test_history = None
+        
+        ## @var self.results_store
+        # OFSResultsStore of the test run. None if the store is disabled or the tests have not started.
+        self.results_store = None
+        
         
     ##
     #
@@ -93,22 +118,26 @@ class OFSTestMain(object):
         self.config.printDict()
 
     ##
-    # @fn writeOutput(self,filename,function,rc):   
+    # @fn writeOutput(self,filename,function,rc,test_record=None):   
     #
     # Writes the output of a test to the output file. If test function returns 0, assume success, otherwise, failure.
+    # A test that ran out of time (OFSTestNode.COMMAND_TIMEOUT_RC) is reported as TIMEOUT.
+    #
+    # Results for config.log_file are also recorded in the results store. The line is
+    # appended, and closeResults() writes the file from the store once at the end.
     #
     # @param self The object pointer
     # @param filename Name of output file
     # @param function Function that was tested.
     # @param rc  Return code of the tested function
+    # @param test_record OFSTestNode.test_record of the test. None if the test did not run.
     #    
 
-    def writeOutput(self,filename,function,rc):
+    def writeOutput(self,filename,function,rc,test_record=None):
+        if filename == self.config.log_file and self.results_store is not None:
+            self.results_store.recordResult(function.__name__,rc,test_record)
         output = open(filename,'a+')
-        if rc != 0:
-            output.write("%s........................................FAIL: RC = %r\n" % (function.__name__,rc))
-        else:
-            output.write("%s........................................PASS.\n" % function.__name__)
+        output.write(OFSResultsStore.formatResult(function.__name__,rc))
         output.close()
     
 
@@ -122,11 +151,33 @@ class OFSTestMain(object):
     
     def initNetwork(self):
 
+        self.ofs_network.max_workers = self.config.max_workers
+        self.ofs_network.command_timeout = self.config.command_timeout
+        self.ofs_network.local_master.command_timeout = self.config.command_timeout
+        self.ofs_network.setNodeFactsCache(self.config.node_facts_cache)
+        self.ofs_network.broadcast_fanout = self.config.broadcast_fanout
+        self.ofs_network.broadcast_compression = self.config.broadcast_compression
+        self.ofs_network.setBuildCache(self.config.build_cache,self.config.build_cache_size)
+        self.ofs_network.kernel_build_once = self.config.kernel_build_once
+        if self.config.trace_file is None or self.config.trace_file == "":
+            OFSTestTrace.enabled = False
+        if self.config.checkpoint_file is not None and self.config.checkpoint_file != "":
+            self.checkpoint = OFSCheckpoint.OFSCheckpoint(self.config.checkpoint_file)
+        if self.config.test_history_file is not None and self.config.test_history_file != "":
+            self.test_history = OFSTestHistory.OFSTestHistory(self.config.test_history_file,self.config.test_default_duration)
+
     # if the configuration says that we need to create new Cloud nodes, 
         # do it.
         rc = 0
         if self.config.number_new_cloud_nodes > 0:
-            rc = self.setupNewCloudCluster()
+            inputs = {
+                "cloud" : [self.config.cloud_config,self.config.cloud_type,self.config.cloud_region,self.config.cloud_key_name],
+                "nodes" : [self.config.number_new_cloud_nodes,self.config.cloud_image,self.config.cloud_image_id,self.config.cloud_machine,self.config.instance_suffix],
+                "kernel" : [self.config.custom_kernel,self.config.kernel_git_location,self.config.kernel_git_branch],
+                "url_base" : self.config.url_base
+                }
+            rc = self.runCheckpointed("setupNewCloudCluster",self.setupNewCloudCluster,inputs=inputs,restore=self.resumeCloudCluster,
+                                      verify=self.ofs_network.verifyNodes)
 
         # If config.node_ip_addresses > 0, then we are dealing with existing 
         # nodes. Add them to the virtual cluster.
@@ -140,6 +191,9 @@ class OFSTestMain(object):
         if rc is not None and rc != 0:
             return rc
         
+        if self.config.remote_agent == True:
+            self.ofs_network.enableRemoteAgents()
+        
         # TODO: Make this smart enough to return success or failure.
         
         return self.checkNetwork()
@@ -147,6 +201,52 @@ class OFSTestMain(object):
         
         
 
+    ##
+    # @fn writeTrace(self)
+    #
+    # Writes the spans of the run as a Chrome trace (config.trace_file) and the per-phase
+    # summary next to it. Prints the summary and the time saved by readiness probes.
+    # See OFSTestTrace and OFSTestWait.
+    #
+    # @param self The object pointer
+    
+    def writeTrace(self):
+        msg = OFSTestWait.formatTimeSaved()
+        print msg
+        logging.info(msg)
+        
+        if self.config.trace_file is None or self.config.trace_file == "":
+            return
+        
+        summary_file = os.path.splitext(self.config.trace_file)[0] + "-summary.txt"
+        try:
+            OFSTestTrace.writeChromeTrace(self.config.trace_file)
+            OFSTestTrace.writePhaseSummary(summary_file)
+        except IOError:
+            logging.exception("Could not write trace to %s" % self.config.trace_file)
+            return
+        
+        print "==================================================================="
+        print "Time spent per phase. Timeline in %s" % self.config.trace_file
+        print OFSTestTrace.formatPhaseSummary()
+
+    ##
+    # @fn closeResults(self,rc)
+    #
+    # Records the end of the test run in the results store and closes it. config.log_file is
+    # written from the store. The run is copied to config.results_history_db, if set.
+    #
+    # @param self The object pointer
+    # @param rc Return code of the run
+    
+    def closeResults(self,rc):
+        if self.results_store is None:
+            return
+        self.results_store.writeLog(self.config.log_file)
+        self.results_store.finishRun(rc)
+        self.results_store.close()
+        self.results_store = None
+    
     ##
     # @fn checkOFS(self)
     #
@@ -165,6 +265,7 @@ class OFSTestMain(object):
     
         # TODO: Make this smart enough to detect if the installation is running
         print "Looking for existing OrangeFS installation"
+        OFSTestTrace.setPhase("Find existing OrangeFS installation")
         rc = self.ofs_network.findExistingOFSInstallation()
         if rc != 0:
             print "Existing OrangeFS installation not found."
@@ -224,7 +325,10 @@ class OFSTestMain(object):
     
     def checkNetwork(self):
     
-        return self.ofs_network.checkNetwork()
+        rc = self.ofs_network.checkNetwork()
+        # keep the round trip times with the results.
+        self.ofs_network.writeConnectivityMatrix("network-connectivity.txt")
+        return rc
         
     ##
     # @fn setupNewCloudCluster(self):      
@@ -238,20 +342,28 @@ class OFSTestMain(object):
         # First, if we're using Cloud/Openstack, open the connection
         print "===========================================================" 
         print "Connecting to EC2/OpenStack cloud using information from " + self.config.cloud_config
+        OFSTestTrace.setPhase("Connect to cloud")
         #print "%s,%s,%s,%s,%s" % (self.config.cloud_config,self.config.cloud_key_name,self.config.ssh_key_filepath,self.config.cloud_type,self.config.nova_password_file)
         self.ofs_network.addCloudConnection(self.config.cloud_config,self.config.cloud_key_name,self.config.ssh_key_filepath,self.config.cloud_type,self.config.nova_password_file,self.config.cloud_region)
 
 
         print "===========================================================" 
         print "Creating %d new EC2/OpenStack cloud nodes" % self.config.number_new_cloud_nodes
-        self.ofs_network.createNewCloudNodes(self.config.number_new_cloud_nodes,self.config.cloud_image,self.config.cloud_machine,self.config.cloud_associate_ip,self.config.cloud_domain,self.config.cloud_subnet,self.config.instance_suffix,self.config.cloud_image_id,self.config.cloud_security_group_ids,self.config.spot_instance_bid)
+        OFSTestTrace.setPhase("Create cloud nodes")
+        rc = self.ofs_network.createNewCloudNodes(self.config.number_new_cloud_nodes,self.config.cloud_image,self.config.cloud_machine,self.config.cloud_associate_ip,self.config.cloud_domain,self.config.cloud_subnet,self.config.instance_suffix,self.config.cloud_image_id,self.config.cloud_security_group_ids,self.config.spot_instance_bid)
+        if rc != 0:
+            print "Could not create the cloud nodes. Aborting."
+            return rc
     
                 
         # Upload the access key to all the nodes in the cluster.
         # TODO: Make this more secure.
         print "===========================================================" 
         print "Distributing SSH keys"
-        self.ofs_network.uploadKeys()
+        OFSTestTrace.setPhase("Distribute SSH keys")
+        rc = self.ofs_network.uploadKeys()
+        if rc != 0:
+            return rc
 
         # Sometimes virtual networking doesn't do a good job of letting the
         # hosts find each other. This method sets standard hostnames and 
@@ -259,21 +371,33 @@ class OFSTestMain(object):
         # can find everyone else.
         print "===========================================================" 
         print "Verifying hostname resolution"
-        self.ofs_network.updateEtcHosts()
+        OFSTestTrace.setPhase("Verify hostname resolution")
+        self.ofs_network.updateEtcHosts(max_slots=self.config.max_mpi_slots)
 
 
         # MPI and Hadoop testing require passwordless SSH access.
         print "===========================================================" 
         print "Enabling Passwordless SSH access"
-        self.ofs_network.enablePasswordlessSSH()
+        OFSTestTrace.setPhase("Enable passwordless SSH")
+        rc = self.ofs_network.enablePasswordlessSSH()
+        if rc != 0:
+            print "Could not enable passwordless SSH on %d node(s). Aborting." % rc
+            logging.error("Could not enable passwordless SSH on %d node(s)" % rc)
+            return rc
         #print "Enabling Passwordless SSH access for root"
         #self.ofs_network.enablePasswordlessSSH(user="root")
 
+        # Packages and tarballs for the update and the builds come through the cache.
+        rc = self.setupProvisioningCache()
+        if rc != 0:
+            return rc
+
         # Update new cloud nodes and reboot. We don't want to do this with real nodes 
         # because we don't want to step on the admin's toes.
         print ""
         print "==================================================================="
         print "Updating New Nodes (This may take awhile...)"
+        OFSTestTrace.setPhase("Update nodes")
         rc = self.ofs_network.updateCloudNodes(custom_kernel=self.config.custom_kernel,kernel_git_location=self.config.kernel_git_location, kernel_git_branch=self.config.kernel_git_branch,host_prefix=self.config.host_prefix)
  
         #TODO: Add useful return codes for all function calls.
@@ -307,6 +431,7 @@ class OFSTestMain(object):
 
         print "===========================================================" 
         print "Adding %d Existing Nodes to OFS cluster" % len(self.config.node_ip_addresses)
+        OFSTestTrace.setPhase("Add existing nodes")
 
         for i in range(len(self.config.node_ip_addresses)):
             
@@ -326,148 +451,272 @@ class OFSTestMain(object):
         print "Installing required OrangeFS software from "+ self.config.url_base
         self.ofs_network.setUrlBase(self.config.url_base)
 
+        rc = self.setupProvisioningCache()
+        if rc != 0:
+            return rc
+
         #TODO: Make this return something useful.
         return 0
 
     ##
-    # @fn setupOFS(self):      
+    # @fn resumeCloudCluster(self,state):      
     #
-    #    Builds the OFSTestNetwork as specified by the config.
+    #    Adds the cloud nodes of an earlier run from their checkpoint instead of creating new ones.
     #
     # @param self The object pointer
+    # @param state Network state saved by OFSCheckpoint.
+    #
+    # @return 0 on success.
         
-    def setupOFS(self):
+    def resumeCloudCluster(self,state):
+        print "===========================================================" 
+        print "Reconnecting to %d cloud nodes of the earlier run" % len(state["nodes"])
+        self.ofs_network.addCloudConnection(self.config.cloud_config,self.config.cloud_key_name,self.config.ssh_key_filepath,self.config.cloud_type,self.config.nova_password_file,self.config.cloud_region)
+        for attributes in state["nodes"]:
+            self.ofs_network.addRemoteNode(username=attributes["current_user"],ip_address=attributes["ip_address"],key=attributes["sshLocalKeyFile"],is_cloud=True,ext_ip_address=attributes["ext_ip_address"])
+        rc = OFSCheckpoint.applyNetworkState(self.ofs_network,state)
+        if rc != 0:
+            return rc
+        # the cache does not survive a reboot or a new run.
+        return self.setupProvisioningCache()
 
+    ##
+    # @fn getCheckpointRequires(self,requires=[]):      
+    #
+    # @param self The object pointer
+    # @param requires Names of the checkpointed setup stages a stage depends on.
+    #
+    # @return requires plus the stage that created the cloud nodes, if there is one.
+        
+    def getCheckpointRequires(self,requires=[]):
+        if self.config.number_new_cloud_nodes > 0:
+            return ["setupNewCloudCluster"] + requires
+        return requires
 
-        print ""
-        print "==================================================================="
-        print "Downloading and building OrangeFS from %s resource %s" % (self.config.ofs_resource_type,self.config.ofs_resource_location)
- 
-        # Build OrangeFS using the parameters from the config file. Additional build parameters will be added here.
-        rc = self.ofs_network.buildOFSFromSource(
-        resource_type=self.config.ofs_resource_type,
-        resource_location=self.config.ofs_resource_location,
-        build_kmod=self.config.ofs_build_kmod,
-        enable_strict=self.config.enable_strict,
-        enable_fuse=self.config.install_fuse,
-        enable_shared=self.config.install_shared,
-        enable_hadoop=self.config.install_hadoop,
-        ofs_prefix=self.config.install_prefix,
-        db4_prefix=self.config.db4_prefix,
-        ofs_patch_files=self.config.ofs_patch_files,
-        configure_opts=self.config.configure_opts,
-        security_mode=self.config.ofs_security_mode,
-        debug=self.config.ofs_compile_debug,
-        svn_options=self.config.svn_options,
-        hadoop_version=self.config.hadoop_version,
-        ofs_database=self.config.ofs_database,
-        svn_username=self.config.svn_username,
-        svn_password=self.config.svn_password
-        )
+    ##
+    # @fn runCheckpointed(self,name,function,args=[],kwargs={},inputs={},requires=[],verify=None,restore=None):      
+    #
+    #    Runs a setup stage and records a checkpoint when it succeeds. With config.resume,
+    #    a stage whose checkpoint matches is not run. Its node state is restored and verify
+    #    must still pass instead. If it does not, the restore is undone and the stage runs.
+    #    See OFSCheckpoint.
+    #
+    # @param self The object pointer
+    # @param name Stage name
+    # @param function Function that runs the stage. Returns 0 on success. A stage that returns None is not checkpointed.
+    # @param args List of arguments for function. Part of the fingerprint.
+    # @param kwargs Dictionary of keyword arguments for function. Part of the fingerprint.
+    # @param inputs Dictionary of other things the stage depends on. Part of the fingerprint.
+    # @param requires Names of the checkpointed stages the stage depends on.
+    # @param verify Function that returns 0 if the restored state is still true on the nodes.
+    # @param restore Function that takes the saved state and returns 0. Default is OFSCheckpoint.applyNetworkState.
+    #
+    # @return Return code of the stage. 0 if it was resumed.
         
-        if rc != 0:
-            print "Could not build OrangeFS. Aborting."
-            return rc
+    def runCheckpointed(self,name,function,args=[],kwargs={},inputs={},requires=[],verify=None,restore=None):
+        if self.checkpoint is None:
+            return function(*args,**kwargs)
         
-        print ""
-        print "==================================================================="
-        print "Installing OrangeFS to "+self.config.install_prefix
-        rc = self.ofs_network.installOFSBuild(install_opts=self.config.install_opts)
-        if rc != 0:
-            print "Could not install OrangeFS. Aborting."
-            return rc
+        fingerprint = self.checkpoint.getFingerprint(name,{"args" : args,"kwargs" : kwargs,"inputs" : inputs,"nodes" : [node.ip_address for node in self.ofs_network.network_nodes]},requires)
+        if self.config.resume == True:
+            entry = self.checkpoint.lookup(name,fingerprint)
+            if entry is not None:
+                rollback = OFSCheckpoint.getRollbackState(self.ofs_network)
+                if restore is None:
+                    rc = OFSCheckpoint.applyNetworkState(self.ofs_network,entry["state"])
+                else:
+                    rc = restore(entry["state"])
+                if rc == 0 and verify is not None:
+                    rc = verify()
+                if rc == 0:
+                    msg = "Resuming: %s finished at %s. Skipping it." % (name,time.ctime(entry["time"]))
+                    print msg
+                    logging.info(msg)
+                    return 0
+                msg = "Resuming: the checkpoint of %s no longer holds on the nodes. Running it again." % name
+                print msg
+                logging.info(msg)
+                # e.g. drop the resumed cloud nodes, or the stage would add its nodes after them.
+                OFSCheckpoint.rollbackNetworkState(self.ofs_network,rollback)
+        
+        self.checkpoint.invalidate(name)
+        before = OFSCheckpoint.getNetworkState(self.ofs_network)
+        rc = function(*args,**kwargs)
+        if rc is None:
+            logging.warning("%s returned no return code. It is not checkpointed." % name)
+        elif rc == 0:
+            self.checkpoint.record(name,fingerprint,self.ofs_network,before)
+        return rc
 
+    ##
+    # @fn getCheckpointedStage(self,name,function,inputs={},requires=[],verify=None):      
+    #
+    # @param self The object pointer
+    #
+    # @return Function for OFSStageGraph that calls function through runCheckpointed. See runCheckpointed for the parameters.
+        
+    def getCheckpointedStage(self,name,function,inputs={},requires=[],verify=None):
+        def stage(*args,**kwargs):
+            return self.runCheckpointed(name,function,list(args),kwargs,inputs,self.getCheckpointRequires(requires),verify)
+        return stage
 
-        # Cert based security must be done before copy. Key based must be done after copy. 
-        if self.config.ofs_security_mode is not None:
-            if self.config.ofs_security_mode.lower() == "cert":
-                print ""
-                print "==================================================================="
-                print "Generating OrangeFS security certificates"
-                rc = self.ofs_network.generateOFSCertificates(self.config.ldap_server_uri,self.config.ldap_admin,self.config.ldap_admin_password,self.config.ldap_container)
+    ##
+    # @fn setupProvisioningCache(self):      
+    #
+    #    Starts the package and download cache on the first node and points all nodes at it, if the config asks for it.
+    #
+    # @param self The object pointer
+    #
+    # @return 0 on success or if the cache is disabled.
+        
+    def setupProvisioningCache(self):
+        if self.config.provisioning_cache != True:
+            return 0
+        print "===========================================================" 
+        print "Starting provisioning cache"
+        OFSTestTrace.setPhase("Start provisioning cache")
+        return self.ofs_network.setupProvisioningCache(port=self.config.provisioning_cache_port,cache_dir=self.config.provisioning_cache_dir,local_dir=self.config.provisioning_cache_local,mirror_dir=self.config.provisioning_mirror,offline=self.config.provisioning_offline)
 
-        print ""
-        print "==================================================================="
-        print "Configure OrangeFS Server"
-        rc = self.ofs_network.configureOFSServer(
-                                                 ofs_fs_name=self.config.ofs_fs_name,
-                                                 pvfs2genconfig_opts=self.config.pvfs2genconfig_opts,
-                                                 security=self.config.ofs_security_mode,
-                                                 ofs_data_location = self.config.ofs_data_location,
-                                                 ofs_metadata_location = self.config.ofs_metadata_location,
-                                                 number_metadata_servers=self.config.number_metadata_servers,
-                                                 dedicated_client=self.config.dedicated_client,
-                                                 servers_per_node=self.config.servers_per_node,
-                                                 number_data_servers=self.config.number_data_servers
-                                                 )
+    ##
+    # @fn setupOFS(self):      
+    #
+    #    Builds the OFSTestNetwork as specified by the config.
+    #
+    # @param self The object pointer
+        
+    def setupOFS(self):
 
-        if rc != 0:
-            print "Could not configure OrangeFS servers. Aborting."
-            return rc
+        # Each stage names what it needs and what it makes. Stages that do not depend on
+        # each other run at the same time. With max_parallel_stages=1 the stages run in
+        # the order they are added here.
+        OFSTestTrace.setPhase("Set up OrangeFS")
+        max_parallel = self.config.max_parallel_stages
+        if self.checkpoint is not None and max_parallel != 1:
+            # A checkpoint holds what changed while its stage ran, which would include
+            # the changes of any stage running at the same time.
+            logging.info("Checkpoints are kept. Running the setup stages one at a time.")
+            max_parallel = 1
+        graph = OFSStageGraph.OFSStageGraph(max_parallel=max_parallel)
+        
+        # Stages with a checkpoint are skipped by --resume if nothing changed. See runCheckpointed.
+        network = self.ofs_network
+        patch_digests = []
+        for patch in self.config.ofs_patch_files:
+            if os.path.isfile(patch):
+                patch_digests.append(OFSBuildCache.getFileDigest(patch))
+        
+        # Build OrangeFS using the parameters from the config file. Additional build parameters will be added here.
+        graph.addStage("Build OrangeFS",self.getCheckpointedStage("buildOFSFromSource",network.buildOFSFromSource,inputs={"patches" : patch_digests},
+        verify=lambda: network.verifyNodes(network.network_nodes[:1],"ofs_source_location")),
+        kwargs={
+        'resource_type' : self.config.ofs_resource_type,
+        'resource_location' : self.config.ofs_resource_location,
+        'build_kmod' : self.config.ofs_build_kmod,
+        'enable_strict' : self.config.enable_strict,
+        'enable_fuse' : self.config.install_fuse,
+        'enable_shared' : self.config.install_shared,
+        'enable_hadoop' : self.config.install_hadoop,
+        'ofs_prefix' : self.config.install_prefix,
+        'db4_prefix' : self.config.db4_prefix,
+        'ofs_patch_files' : self.config.ofs_patch_files,
+        'configure_opts' : self.config.configure_opts,
+        'security_mode' : self.config.ofs_security_mode,
+        'debug' : self.config.ofs_compile_debug,
+        'svn_options' : self.config.svn_options,
+        'hadoop_version' : self.config.hadoop_version,
+        'ofs_database' : self.config.ofs_database,
+        'svn_username' : self.config.svn_username,
+        'svn_password' : self.config.svn_password,
+        'incremental_build' : self.config.incremental_build,
+        'build_location' : self.config.ofs_build_location,
+        'ccache_dir' : self.config.ccache_dir,
+        'make_jobs' : self.config.make_jobs,
+        'distributed_build' : self.config.distributed_build
+        },
+        provides=["ofs_build"],
+        description="Downloading and building OrangeFS from %s resource %s" % (self.config.ofs_resource_type,self.config.ofs_resource_location))
+        
+        graph.addStage("Install OrangeFS",self.getCheckpointedStage("installOFSBuild",network.installOFSBuild,requires=["buildOFSFromSource"],
+        verify=lambda: network.verifyNodes(network.network_nodes[:1],"ofs_installation_location","/bin/pvfs2-ping")),kwargs={'install_opts' : self.config.install_opts},requires=["ofs_build"],provides=["ofs_install"],
+        description="Installing OrangeFS to "+self.config.install_prefix)
 
+        # Cert based security must be done before copy. Key based must be done after copy. 
+        security_mode = ""
+        if self.config.ofs_security_mode is not None:
+            security_mode = self.config.ofs_security_mode.lower()
+        
+        server_requires = ["ofs_install"]
+        if security_mode == "cert":
+            graph.addStage("Generate security certificates",self.getCheckpointedStage("generateOFSCertificates",network.generateOFSCertificates,requires=["installOFSBuild"]),
+            args=[self.config.ldap_server_uri,self.config.ldap_admin,self.config.ldap_admin_password,self.config.ldap_container],
+            requires=["ofs_install"],provides=["ofs_certificates"],required=False,description="Generating OrangeFS security certificates")
+            server_requires.append("ofs_certificates")
+
+        graph.addStage("Configure OrangeFS servers",self.getCheckpointedStage("configureOFSServer",network.configureOFSServer,requires=["installOFSBuild"],
+        verify=lambda: network.verifyNodes(network.network_nodes[:1],"ofs_conf_file")),
+        kwargs={
+        'ofs_fs_name' : self.config.ofs_fs_name,
+        'pvfs2genconfig_opts' : self.config.pvfs2genconfig_opts,
+        'security' : self.config.ofs_security_mode,
+        'ofs_data_location' : self.config.ofs_data_location,
+        'ofs_metadata_location' : self.config.ofs_metadata_location,
+        'number_metadata_servers' : self.config.number_metadata_servers,
+        'dedicated_client' : self.config.dedicated_client,
+        'servers_per_node' : self.config.servers_per_node,
+        'number_data_servers' : self.config.number_data_servers
+        },
+        requires=server_requires,provides=["ofs_config"],description="Configure OrangeFS Server")
 
         # This should be part of the image creation
         # TODO: Is this function still necessary?
+        copy_requires = ["ofs_install","ofs_config"]
+        tests_requires = ["ofs_install"]
         if self.config.install_MPI == True or self.config.run_mpi_tests == True:
-            print ""
-            print "==================================================================="
-            print "Install OpenMPI"
-            self.ofs_network.configureOpenMPI()
-
-        
+            # ROMIO is built against the OrangeFS installation.
+            graph.addStage("Install OpenMPI",self.getCheckpointedStage("configureOpenMPI",network.configureOpenMPI,requires=["installOFSBuild"],
+            verify=lambda: network.verifyNodes(attribute="openmpi_installation_location",suffix="/bin/mpicc")),requires=["ofs_install"],provides=["openmpi"],required=False)
+            tests_requires.append("openmpi")
 
         if self.config.install_tests:
-            print ""
-            print "==================================================================="
-            print "Installing OrangeFS Tests"
-            rc = self.ofs_network.installOFSTests(configure_options=self.config.configure_opts)
-            if rc != 0:
-                print "Could not install OrangeFS tests. Aborting."
-                return rc
-
-            print ""
-            print "==================================================================="
-            print "Installing Third-Party Benchmarks"
-            rc = self.ofs_network.installBenchmarks()
-            if rc != 0:
-                print "Could not install third-party benchmarks. Aborting."
-                return rc
+            graph.addStage("Install OrangeFS tests",self.ofs_network.installOFSTests,kwargs={'configure_options' : self.config.configure_opts},requires=tests_requires,provides=["ofs_tests"],
+            description="Installing OrangeFS Tests")
+            copy_requires.append("ofs_tests")
+            
+            # The benchmarks only need to be downloaded and unpacked.
+            graph.addStage("Install benchmarks",self.getCheckpointedStage("installBenchmarks",network.installBenchmarks,
+            verify=lambda: network.verifyNodes(network.network_nodes[:1],"ofs_extra_tests_location")),provides=["benchmarks"],description="Installing Third-Party Benchmarks")
 
-        print ""
-        print "==================================================================="
-        print "Copy installation to all nodes"
         # TODO: Should handle this with exceptions.
-        rc = self.ofs_network.copyOFSToNodeList()
+        graph.addStage("Copy installation to nodes",self.getCheckpointedStage("copyOFSToNodeList",network.copyOFSToNodeList,requires=["installOFSBuild","configureOFSServer"],
+        verify=lambda: network.verifyNodes(attribute="ofs_installation_location",suffix="/bin/pvfs2-ping")),requires=copy_requires,provides=["ofs_nodes"],
+        description="Copy installation to all nodes")
 
-        if self.config.ofs_security_mode:
-            if self.config.ofs_security_mode.lower() == "key":
-                print ""
-                print "==================================================================="
-                print "Generating OrangeFS security keys"
+        server_requires = ["ofs_nodes"]
+        if security_mode == "key":
+            graph.addStage("Generate security keys",self.getCheckpointedStage("generateOFSKeys",network.generateOFSKeys,requires=["copyOFSToNodeList"]),requires=["ofs_nodes"],provides=["ofs_keys"],
+            description="Generating OrangeFS security keys")
+            server_requires.append("ofs_keys")
 
-                rc = self.ofs_network.generateOFSKeys()
-
-
-                    
-        
-        print ""
-        print "==================================================================="
-        print "Start OFS Server"
-        rc = self.ofs_network.startOFSServers()
         #TODO: Need to handle error conditions
+        graph.addStage("Start OrangeFS servers",self.getCheckpointedStage("startOFSServers",network.startOFSServers,requires=["copyOFSToNodeList","configureOFSServer","generateOFSKeys"],
+        verify=network.verifyOFSServers),requires=server_requires,provides=["ofs_servers"],description="Start OFS Server")
         
-        print ""
-        print "==================================================================="
-        print "Start OFS Client"
-        rc = self.ofs_network.startOFSClientAllNodes(security=self.config.ofs_security_mode,disable_acache=self.config.ofs_disable_acache)
-
+        graph.addStage("Start OrangeFS clients",self.ofs_network.startOFSClientAllNodes,
+        kwargs={'security' : self.config.ofs_security_mode,'disable_acache' : self.config.ofs_disable_acache},
+        requires=["ofs_servers"],provides=["ofs_clients"],description="Start OFS Client")
 
         if self.config.install_hadoop == True or self.config.run_hadoop_tests == True:
-            print ""
-            print "==================================================================="
-            print "Setup Hadoop"
-            self.ofs_network.setupHadoop(hadoop_version=self.config.hadoop_version)
+            graph.addStage("Setup Hadoop",self.ofs_network.setupHadoop,kwargs={'hadoop_version' : self.config.hadoop_version},requires=["ofs_clients"],provides=["hadoop_config"],required=False)
         
+        rc = graph.run()
+        report = graph.formatReport()
+        print ""
+        print "==================================================================="
+        print report
+        logging.info(report)
+        if rc != 0:
+            print "Could not set up OrangeFS. Aborting."
+            return rc
         
         return self.checkNetwork()
 
@@ -484,10 +733,156 @@ class OFSTestMain(object):
     #
 
     def writeOutputHeader(self,filename,header,mode='a+'):
+        if filename == self.config.log_file and self.results_store is not None:
+            self.results_store.addSection(header)
         output = open(filename,mode)
-        output.write("%s ==================================================\n" % header)
+        output.write(OFSResultsStore.formatHeader(header))
         output.close()
     
+    ##
+    # @fn getTestNodes(self):
+    #
+    # @param self The object pointer
+    #
+    # @return The client nodes that run test shards, head node first. See config.test_shards.
+    
+    def getTestNodes(self):
+        nodes = self.ofs_network.network_nodes
+        if self.config.test_shards > 0:
+            nodes = nodes[:self.config.test_shards]
+        return nodes
+    
+    ##
+    # @fn runTestShard(self,package,function_group,node,index,shard_tests,results,state):
+    #
+    # Runs the tests of one shard on one node, one after another. Runs in a thread of its own.
+    # The time of each test is added to the test history.
+    #
+    # @param self The object pointer
+    # @param package Test package, e.g. vfs-kmod
+    # @param function_group Test module, e.g. OFSVFSTest
+    # @param node OFSTestNode that runs the tests
+    # @param index Shard number. None runs the tests at the mount point itself.
+    # @param shard_tests List of test functions
+    # @param results Dictionary test function -> rc. Shared by all shards.
+    # @param state Dictionary with the first failure ("rc"), the (start,end) ("times") and OFSTestNode.test_record ("records") of each test and a lock. Shared by all shards.
+    
+    def runTestShard(self,package,function_group,node,index,shard_tests,results,state):
+        
+        mount_point = node.ofs_mount_point
+        if index is not None:
+            # usrint tests do not mount OrangeFS. Create the directory through the library.
+            preload = ""
+            if function_group.mount_fs == False:
+                preload = "LD_PRELOAD=%s/lib/libofs.so:%s/lib/libpvfs2.so " % (node.ofs_installation_location,node.ofs_installation_location)
+            directory = OFSTestShards.getShardDirectory(mount_point,package,index)
+            node.runSingleCommand("%smkdir -p %s" % (preload,directory))
+            node.ofs_mount_point = directory
+            shard_log = OFSTestShards.getShardLogFile(package,index)
+            self.writeOutputHeader(shard_log,"%s shard %d on %s" % (package,index,node.hostname),'w+')
+        
+        try:
+            for callable in shard_tests:
+                if state["rc"] != 0 and self.config.stop_on_failure == True:
+                    break
+                start = time.time()
+                test_record = None
+                try:
+                    rc = node.runOFSTest(package,callable,timeout=self.config.test_timeout)
+                    test_record = node.test_record
+                except:
+                    print "Unexpected error:", sys.exc_info()[0]
+                    traceback.print_exc()
+                    rc = -888
+                end = time.time()
+                # the time of a test that raised says nothing about how long it takes.
+                if self.test_history is not None and rc != -888:
+                    self.test_history.record(package,callable.__name__,end - start,rc)
+                state["lock"].acquire()
+                results[callable] = rc
+                state["times"][callable] = (start,end)
+                state["records"][callable] = test_record
+                if rc != 0 and state["rc"] == 0:
+                    state["rc"] = rc
+                state["lock"].release()
+                if index is not None:
+                    self.writeOutput(shard_log,callable,rc)
+        finally:
+            node.ofs_mount_point = mount_point
+    
+    ##
+    # @fn runTestGroup(self,package,function_group,filename):
+    #
+    # Runs the tests of a test module. The tests are split into shards that run at the same
+    # time on the client nodes, then the exclusive tests run on the head node. The shards are
+    # balanced by the times in the test history. The results are written to filename in the
+    # order of function_group.tests, the schedule with the predicted and actual times to
+    # OFSTestShards.getScheduleFile(package). See OFSTestShards.
+    #
+    # @param self The object pointer
+    # @param package Test package, e.g. vfs-kmod
+    # @param function_group Test module, e.g. OFSVFSTest
+    # @param filename Results file
+    #
+    # @return 0 if all tests passed or stop_on_failure is off. Otherwise the rc of the first failure, -888 for an exception.
+    
+    def runTestGroup(self,package,function_group,filename):
+        
+        head_node = self.ofs_network.network_nodes[0]
+        nodes = self.getTestNodes()
+        exclusive = getattr(function_group,"exclusive",[])
+        head_node_tests = getattr(function_group,"head_node_tests",[])
+        if self.test_history is not None:
+            durations = self.test_history.getDurations(package,function_group.tests)
+        else:
+            durations = dict([(callable,self.config.test_default_duration) for callable in function_group.tests])
+        (shards,exclusive_tests) = OFSTestShards.planShards(function_group.tests,len(nodes),exclusive,head_node_tests,durations)
+        hostnames = [node.hostname for node in nodes]
+        
+        msg = "Predicted time of %s tests on %d node(s): %.1f s" % (package,len(nodes),OFSTestShards.predictTime(shards,exclusive_tests,durations))
+        print msg
+        logging.info(msg)
+        
+        results = {}
+        state = {"rc" : 0, "times" : {}, "records" : {}, "lock" : threading.Lock()}
+        start = time.time()
+        
+        if len(nodes) == 1:
+            # Only the head node. Run at the mount point as always.
+            self.runTestShard(package,function_group,head_node,None,shards[0],results,state)
+        else:
+            threads = []
+            for index in range(len(shards)):
+                if len(shards[index]) == 0:
+                    continue
+                msg = "Shard %d of %s on %s: %s" % (index,package,nodes[index].hostname,", ".join([callable.__name__ for callable in shards[index]]))
+                print msg
+                logging.info(msg)
+                t = threading.Thread(target=self.runTestShard,args=(package,function_group,nodes[index],index,shards[index],results,state),name="%s-shard%d" % (package,index))
+                t.setDaemon(True)
+                t.start()
+                threads.append(t)
+            for t in threads:
+                t.join()
+        
+        # Exclusive tests have the file system to themselves.
+        if state["rc"] == 0 or self.config.stop_on_failure == False:
+            self.runTestShard(package,function_group,head_node,None,exclusive_tests,results,state)
+        
+        schedule = OFSTestShards.formatSchedule(package,hostnames,shards,exclusive_tests,durations,state["times"],time.time() - start)
+        print schedule
+        schedule_file = open(OFSTestShards.getScheduleFile(package),"a+")
+        schedule_file.write(schedule + "\n")
+        schedule_file.close()
+        
+        for callable in function_group.tests:
+            if callable in results:
+                self.writeOutput(filename,callable,results[callable],state["records"].get(callable))
+        
+        if self.config.stop_on_failure == True:
+            return state["rc"]
+        return 0
+    
     ##
     # @fn   runTest(self):       
     #
@@ -509,6 +904,7 @@ class OFSTestMain(object):
         print ""
         print "==================================================================="
         print "Run Tests"
+        OFSTestTrace.setPhase("Run tests")
         
 
         # TODO: Move this section to OFSTestNetwork
@@ -523,21 +919,28 @@ class OFSTestMain(object):
         # where all the tests will be run.
         head_node = self.ofs_network.network_nodes[0]
         
-        # Set the LD_LIBRARY_PATH and LIBRARY_PATH on the head node
+        # Set the LD_LIBRARY_PATH and LIBRARY_PATH on every node. Test shards run on all of them.
         # TODO: Do we still need to do this?
-        if self.config.run_mpi_tests == True:
-            head_node.setEnvironmentVariable("LD_LIBRARY_PATH","/opt/db4/lib:%s/lib64:%s/lib:%s/lib" % (head_node.ofs_installation_location,head_node.ofs_installation_location,head_node.openmpi_installation_location))
-        else:
-            head_node.setEnvironmentVariable("LD_LIBRARY_PATH","/opt/db4/lib:%s/lib64:%s/lib" % (head_node.ofs_installation_location,head_node.ofs_installation_location))
+        for node in self.ofs_network.network_nodes:
+            if self.config.run_mpi_tests == True:
+                node.setEnvironmentVariable("LD_LIBRARY_PATH","/opt/db4/lib:%s/lib64:%s/lib:%s/lib" % (node.ofs_installation_location,node.ofs_installation_location,node.openmpi_installation_location))
+            else:
+                node.setEnvironmentVariable("LD_LIBRARY_PATH","/opt/db4/lib:%s/lib64:%s/lib" % (node.ofs_installation_location,node.ofs_installation_location))
     
         # Go home.
         head_node.changeDirectory("~")
 
+        # Record the results. The output file is generated from the results store.
+        if self.config.results_db is not None and self.config.results_db != "":
+            self.results_store = OFSResultsStore.OFSResultsStore(self.config.results_db,self.config.results_history_db)
+            self.results_store.startRun(self.config,self.ofs_network.network_nodes)
+
         # Print the header in the output file. Overwrite previous.
         self.writeOutputHeader(filename,"Running OrangeFS Tests",'w+')
 
         # Run the sysint tests, if required.
         if self.config.run_sysint_tests == True:
+            OFSTestTrace.setPhase("Sysint tests")
             # Sysint tests are located in OFSSysintTest
             import OFSSysintTest
             
@@ -550,22 +953,14 @@ class OFSTestMain(object):
 
             # The list of sysint tests to run is found in OFSSysintTest.test.
             # This is an array of strings that correspond to function names.
-            # The functions are run in the order they are listed in the array.
-            for callable in OFSSysintTest.tests:
-                try:
-                    rc = head_node.runOFSTest("sysint",callable)
-                    self.writeOutput(filename,callable,rc)
-                except:
-                    print "Unexpected error:", sys.exc_info()[0]
-                    traceback.print_exc()
-                    if self.config.stop_on_failure == True:
-                        return -888
-                    pass
-                if rc != 0 and self.config.stop_on_failure == True:
-                    return rc
+            # The results are reported in the order they are listed in the array.
+            rc = self.runTestGroup("sysint",OFSSysintTest,filename)
+            if rc != 0:
+                return rc
 
         # Run the kmod vfs tests, if required.
         if self.config.run_vfs_tests == True or self.config.run_vfs_benchmarks == True:
+            OFSTestTrace.setPhase("VFS tests (kmod)")
             # vfs tests are located in OFSVFSTest
             # The same tests are used for both kmod-vfs and fuse.
             import OFSVFSTest
@@ -602,24 +997,15 @@ class OFSTestMain(object):
     
                     # The list of vfs tests to run is found in OFSVFSTest.test.
                     # This is an array of strings that correspond to function names.
-                    # The functions are run in the order they are listed in the array.
-                    for callable in OFSVFSTest.tests:
-                        try:
-                            rc = head_node.runOFSTest("vfs-%s" % mount_type,callable)
-                            self.writeOutput(filename,callable,rc)
-                        except:
-                            print "Unexpected error:", sys.exc_info()[0]
-                            traceback.print_exc()
-                            if self.config.stop_on_failure == True:
-                                return -888
-                            pass
-                        if rc != 0 and self.config.stop_on_failure == True:
-                            return rc
-                            # if not, print failure.
+                    # The results are reported in the order they are listed in the array.
+                    rc = self.runTestGroup("vfs-%s" % mount_type,OFSVFSTest,filename)
+                    if rc != 0:
+                        return rc
 
 
                         
             if self.config.run_vfs_benchmarks == True:
+                OFSTestTrace.setPhase("VFS benchmarks (kmod)")
                 import OFSVFSBenchmarks
                 # Make sure filesystem is mounted or we will get false positives.
                 rc = head_node.checkMount()
@@ -639,19 +1025,10 @@ class OFSTestMain(object):
     
                     # The list of vfs tests to run is found in OFSVFSTest.test.
                     # This is an array of strings that correspond to function names.
-                    # The functions are run in the order they are listed in the array.
-                    for callable in OFSVFSBenchmarks.tests:
-                        try:
-                            rc = head_node.runOFSTest("vfs-%s" % mount_type,callable)
-                            self.writeOutput(filename,callable,rc)
-                        except:
-                            print "Unexpected error:", sys.exc_info()[0]
-                            traceback.print_exc()
-                            if self.config.stop_on_failure == True:
-                                return -888
-                            pass
-                        if rc != 0 and self.config.stop_on_failure == True:
-                            return rc
+                    # Benchmarks are exclusive, so they run on the head node in the order they are listed.
+                    rc = self.runTestGroup("vfs-%s" % mount_type,OFSVFSBenchmarks,filename)
+                    if rc != 0:
+                        return rc
 
                 else:
                     self.writeOutputHeader(filename,"VFS Tests (%s) could not run. Mount failed." % mount_type)           
@@ -666,6 +1043,7 @@ class OFSTestMain(object):
         
         # run fuse tests, if required.
         if self.config.run_fuse_tests == True:
+            OFSTestTrace.setPhase("VFS tests (fuse)")
             # fuse tests are almost identical to kmod-vfs tests.
             # The only difference is that the OrangeFS client is NOT running and 
             # the filesystem is mounted with the fuse module instead of kmod.
@@ -690,20 +1068,10 @@ class OFSTestMain(object):
 
                 # The list of vfs tests to run is found in OFSVFSTest.test.
                 # This is an array of strings that correspond to function names.
-                # The functions are run in the order they are listed in the array.
-                for callable in OFSVFSTest.tests:
-                    try:
-                        rc = head_node.runOFSTest("vfs-%s" % mount_type,callable)
-                        self.writeOutput(filename,callable,rc)
-                    except:
-                        print "Unexpected error:", sys.exc_info()[0]
-                        traceback.print_exc()
-                        if self.config.stop_on_failure == True:
-                            return -888
-
-                        pass
-                    if rc != 0 and self.config.stop_on_failure == True:
-                        return rc
+                # The results are reported in the order they are listed in the array.
+                rc = self.runTestGroup("vfs-%s" % mount_type,OFSVFSTest,filename)
+                if rc != 0:
+                    return rc
 
                 
 
@@ -720,6 +1088,7 @@ class OFSTestMain(object):
 
         # run the usrint tests, if required.
         if self.config.run_usrint_tests == True:
+            OFSTestTrace.setPhase("Usrint tests")
             # usrint tests are located in OFSUsrintTest
 
             import OFSUsrintTest
@@ -735,24 +1104,15 @@ class OFSTestMain(object):
                 
                 # The list of usrint tests to run is found in OFSUsrintTest.test.
                 # This is an array of strings that correspond to function names.
-                # The functions are run in the order they are listed in the array.
-                for callable in OFSUsrintTest.tests:
-                    try:
-                        rc = head_node.runOFSTest("usrint",callable)
-                        self.writeOutput(filename,callable,rc)
-                    except:
-                        print "Unexpected error:", sys.exc_info()[0]
-                        traceback.print_exc()
-                        if self.config.stop_on_failure == True:
-                            return -888
-
-                        pass
-                    if rc != 0 and self.config.stop_on_failure == True:
-                        return rc
+                # The results are reported in the order they are listed in the array.
+                rc = self.runTestGroup("usrint",OFSUsrintTest,filename)
+                if rc != 0:
+                    return rc
 
                 
         # run the mpi tests, if required.
         if self.config.run_mpi_tests == True or self.config.run_mpi_benchmarks == True:
+            OFSTestTrace.setPhase("MPI tests")
             
             # Remount OrangeFS
             self.ofs_network.unmountOFSFilesystemAllNodes()
@@ -766,8 +1126,8 @@ class OFSTestMain(object):
                 
                 for callable in OFSMpiVFSTest.tests:
                     try:
-                        rc = head_node.runOFSTest("mpivfs-%s" % mount_type,callable)
-                        self.writeOutput(filename,callable,rc)
+                        rc = head_node.runOFSTest("mpivfs-%s" % mount_type,callable,timeout=self.config.test_timeout)
+                        self.writeOutput(filename,callable,rc,head_node.test_record)
                     except:
                         print "Unexpected error:", sys.exc_info()[0]
                         traceback.print_exc()
@@ -790,8 +1150,8 @@ class OFSTestMain(object):
                     # unmount OrangeFS
                     self.ofs_network.unmountOFSFilesystemAllNodes()
                     try:
-                        rc = head_node.runOFSTest("mpiio", callable)
-                        self.writeOutput(filename,callable,rc)
+                        rc = head_node.runOFSTest("mpiio", callable,timeout=self.config.test_timeout)
+                        self.writeOutput(filename,callable,rc,head_node.test_record)
                     except:
                         print "Unexpected error:", sys.exc_info()[0]
                         traceback.print_exc()
@@ -815,8 +1175,8 @@ class OFSTestMain(object):
                 # The functions are run in the order they are listed in the array.
                 for callable in OFSMpiBenchmarks.tests:
                     try:
-                        rc = head_node.runOFSTest("mpi-bench", callable)
-                        self.writeOutput(filename,callable,rc)
+                        rc = head_node.runOFSTest("mpi-bench", callable,timeout=self.config.test_timeout)
+                        self.writeOutput(filename,callable,rc,head_node.test_record)
                     except:
                         print "Unexpected error:", sys.exc_info()[0]
                         traceback.print_exc()
@@ -829,6 +1189,7 @@ class OFSTestMain(object):
 
         # run the hadoop tests, if required.
         if self.config.run_hadoop_tests == True:
+            OFSTestTrace.setPhase("Hadoop tests")
             
             # run the hadoop tests, if required.
             import OFSHadoopTest
@@ -845,8 +1206,8 @@ class OFSTestMain(object):
 
             for callable in OFSHadoopTest.tests:
                 try:
-                    rc = head_node.runOFSTest("hadoop", callable)
-                    self.writeOutput(filename,callable,rc)
+                    rc = head_node.runOFSTest("hadoop", callable,timeout=self.config.test_timeout)
+                    self.writeOutput(filename,callable,rc,head_node.test_record)
                 except:
                     print "Unexpected error:", sys.exc_info()[0]
                     traceback.print_exc()
@@ -860,6 +1221,7 @@ class OFSTestMain(object):
 
         # run miscellaneous tests after run.
         if True == True:
+            OFSTestTrace.setPhase("Misc post-run tests")
             
             
             import OFSMiscPostTest
@@ -877,8 +1239,8 @@ class OFSTestMain(object):
             for node in self.ofs_network.network_nodes:
                 for callable in OFSMiscPostTest.tests:
                     try:
-                        rc = node.runOFSTest("misc-post", callable)
-                        self.writeOutput(filename,callable,rc)
+                        rc = node.runOFSTest("misc-post", callable,timeout=self.config.test_timeout)
+                        self.writeOutput(filename,callable,rc,node.test_record)
                     except:
                         print "Unexpected error:", sys.exc_info()[0]
                         traceback.print_exc()
@@ -981,7 +1343,11 @@ class OFSTestMain(object):
 
     
     def doPostTest(self):
-    
+        
+        OFSTestTrace.setPhase("Post test")
+        # Keep the cache before the nodes go away, and leave the nodes without the proxy.
+        if self.config.provisioning_cache == True:
+            self.ofs_network.saveProvisioningCache()
         try:
             if self.config.cloud_delete_after_test:
                 print "Test complete. Deleting all cloud nodes."
@@ -18,9 +18,19 @@ import os
 import OFSTestNode
 import OFSTestLocalNode 
 import OFSTestRemoteNode 
+import OFSSSHConnectionManager
+import OFSNodeFactsCache
+import OFSBuildCache
+import OFSDistributedBuild
+import OFSProvisioningCache
+import OFSConnectivityCheck
+import OFSExecutionEngine
+import OFSTestWait
+import OFSBroadcast
 import Queue
 import threading
 import time
+import uuid
 from pprint import pprint
 import logging
 
@@ -51,6 +61,66 @@ class OFSTestNetwork(object):
         self.number_mpi_slots = 1
         self.number_mpi_hosts = 1
         self.logfile="cloudnodes.lst"
+        
+        ## @var max_workers
+        # Maximum number of nodes runSimultaneousCommands and gather work on at once. None or 0 is no limit.
+        self.max_workers = 32
+        
+        ## @var command_timeout
+        # Default command timeout in seconds given to every node added to the network. None is no timeout.
+        self.command_timeout = None
+        
+        ## @var node_facts_cache
+        # OFSNodeFactsCache given to every node added to the network. None disables caching. See setNodeFactsCache.
+        self.node_facts_cache = None
+        
+        ## @var connectivity_matrix
+        # Result of the last getConnectivityMatrix. None until it runs.
+        self.connectivity_matrix = None
+        
+        ## @var connectivity_matrix_nodes
+        # Hostnames in the order of the rows and columns of connectivity_matrix.
+        self.connectivity_matrix_nodes = []
+        
+        ## @var broadcast_fanout
+        # Children per node in the broadcast tree. 1 is a chain. See broadcast.
+        self.broadcast_fanout = 2
+        
+        ## @var broadcast_compression
+        # Compression of the broadcast stream: none, gzip, lz4 or zstd. See OFSBroadcast.COMPRESSORS.
+        self.broadcast_compression = "none"
+        
+        ## @var build_cache
+        # OFSBuildCache of installed OrangeFS builds and custom kernel packages. None disables it. See setBuildCache.
+        self.build_cache = None
+        
+        ## @var kernel_build_once
+        # Build a custom kernel on one node and install the package on all others. See installCustomKernelOnNodes.
+        self.kernel_build_once = True
+        
+        ## @var provisioning_cache_node
+        # Node that runs the provisioning cache. None if there is none. See setupProvisioningCache.
+        self.provisioning_cache_node = None
+        
+        ## @var provisioning_cache_url
+        # http://address:port of the provisioning cache.
+        self.provisioning_cache_url = ""
+        
+        ## @var provisioning_cache_dir
+        # Cache directory on provisioning_cache_node.
+        self.provisioning_cache_dir = ""
+        
+        ## @var provisioning_cache_local
+        # Directory on the local machine the cache is loaded from and saved to. Empty string for none.
+        self.provisioning_cache_local = ""
+        
+        ## @var provisioning_cache_mirror
+        # Stand-in mirror directory on provisioning_cache_node. Empty string for none.
+        self.provisioning_cache_mirror = ""
+        
+        ## @var provisioning_cache_offline
+        # Does the provisioning cache never go upstream?
+        self.provisioning_cache_offline = False
 
     ##
     # @fn  findNode(self,ip_address="",hostname=""):
@@ -101,8 +171,15 @@ class OFSTestNetwork(object):
     def addRemoteNode(self,username,ip_address,key,is_cloud=False,ext_ip_address=None):
         #This function adds a remote node
         
+        # All commands and copies from the local machine reuse one ssh connection to the node.
+        if ext_ip_address == None:
+            ssh_connection = OFSSSHConnectionManager.OFSSSHConnectionManager(ip_address,key)
+        else:
+            ssh_connection = OFSSSHConnectionManager.OFSSSHConnectionManager(ext_ip_address,key)
+        
         # Is this a remote machine or existing cloud node?
-        remote_node = OFSTestRemoteNode.OFSTestRemoteNode(username=username,ip_address=ip_address,key=key,local_node=self.local_master,is_cloud=is_cloud,ext_ip_address=ext_ip_address)
+        remote_node = OFSTestRemoteNode.OFSTestRemoteNode(username=username,ip_address=ip_address,key=key,local_node=self.local_master,is_cloud=is_cloud,ext_ip_address=ext_ip_address,ssh_connection=ssh_connection,node_facts_cache=self.node_facts_cache)
+        remote_node.command_timeout = self.command_timeout
                 
         # Add to the node dictionary
         self.network_nodes.append(remote_node)
@@ -110,73 +187,276 @@ class OFSTestNetwork(object):
         # Return the new node
         return remote_node
 
+    ##
+    #  @fn setNodeFactsCache(self,filename):
+    #
+    #    Keeps the facts learned about each node in filename, so the next run on the same
+    #    nodes can skip discovery. Must be called before nodes are added.
+    #
+    # @param self The object pointer
+    # @param filename Cache file on the local machine. None or "" disables caching.
+    
+    def setNodeFactsCache(self,filename):
+        if filename is None or filename == "":
+            self.node_facts_cache = None
+        else:
+            self.node_facts_cache = OFSNodeFactsCache.OFSNodeFactsCache(filename)
+
+    ##
+    #  @fn setBuildCache(self,directory,max_megabytes=4096):
+    #
+    #    Keeps installed OrangeFS builds in directory, so a later run with the same source,
+    #    patches, options and platform skips the build. See OFSBuildCache.
+    #
+    # @param self The object pointer
+    # @param directory Cache directory on the local machine. None or "" disables the cache.
+    # @param max_megabytes Total size of the cached builds.
+    
+    def setBuildCache(self,directory,max_megabytes=4096):
+        if directory is None or directory == "":
+            self.build_cache = None
+        else:
+            self.build_cache = OFSBuildCache.OFSBuildCache(directory,max_megabytes*1048576)
+
+    ##
+    #  @fn closeSSHConnections(self,node_list=None):
+    #
+    #    Closes the persistent ssh connections from the local machine to the nodes. 
+    #    If every node in the network is closed, the control socket directory is removed and
+    #    the handshakes saved by the connections are reported.
+    #
+    # @param self The object pointer
+    # @param node_list List of nodes. Default is all nodes in network.
+    
+    def closeSSHConnections(self,node_list=None):
+        close_all = False
+        if node_list is None:
+            node_list = self.network_nodes
+            close_all = True
+        
+        for node in node_list:
+            node.closeSSHConnection()
+        
+        if close_all == True:
+            saved = sum([node.ssh_connection.getHandshakesSaved() for node in node_list if node.ssh_connection is not None])
+            msg = "ssh master connections saved %d handshakes" % saved
+            print msg
+            logging.info(msg)
+            OFSSSHConnectionManager.OFSSSHConnectionManager.removeControlDirectory()
 
     ##
-    #    @fn runSimultaneousCommands(self,node_list,node_function=OFSTestNode.OFSTestNode.runSingleCommand,args=[],kwargs={})
+    #  @fn enableRemoteAgents(self,node_list=None):
     #
-    #    Runs a command on multiple nodes.
+    #    Runs later commands on the nodes through a persistent OFSRemoteAgent. Each agent is started on first use.
+    #    Nodes without Python keep using one ssh process per command.
+    #
+    # @param self The object pointer
+    # @param node_list List of nodes. Default is all nodes in network.
+    
+    def enableRemoteAgents(self,node_list=None):
+        if node_list is None:
+            node_list = self.network_nodes
+        
+        for node in node_list:
+            node.use_remote_agent = True
+
+
+    ##
+    #    @fn runSimultaneousCommands(self,node_list,node_function=OFSTestNode.OFSTestNode.runSingleCommand,args=[],kwargs={},max_workers=None,deadline=None)
+    #
+    #    Runs a command on multiple nodes with a bounded pool of worker threads.
+    #
+    #    If the deadline passes, the commands of nodes that are still running are killed
+    #    (see OFSTestNode.cancelCommands) and nodes that have not started are skipped.
+    #    Seconds each node took are kept in last_command_times.
     #
     #    @param self The object pointer
     #    @param node_list  List of nodes to run command on 
     #    @param node_function Python function to run on all OFSTestNodes. Default is OFSTestNode.runSingleCommand
     #    @param args Arguments to Python node_function
     #    @param kwargs Keyword args to Python node_function
+    #    @param max_workers Maximum number of nodes worked on at once. Default is self.max_workers.
+    #    @param deadline Seconds the whole run may take. None is no limit.
     #
+    #    @return Dictionary node -> return value of node_function, or the exception it raised.
+    #    Nodes stopped by the deadline have an OFSExecutionEngine.OFSTimeoutError.
         
         
-    def runSimultaneousCommands(self,node_list=None,node_function=OFSTestNode.OFSTestNode.runSingleCommand,args=[],kwargs={}):
-        
-        #passes in a thread class that does the work on a node list with arguments args
+    def runSimultaneousCommands(self,node_list=None,node_function=OFSTestNode.OFSTestNode.runSingleCommand,args=[],kwargs={},max_workers=None,deadline=None):
         
         if node_list is None:
             node_list = self.network_nodes
+        
+        if max_workers is None:
+            max_workers = self.max_workers
+        
+        number_workers = len(node_list)
+        if max_workers is not None and max_workers > 0:
+            number_workers = min(number_workers,max_workers)
          
         queue = Queue.Queue()
-        class NodeThread(threading.Thread):
-
-            def __init__(self, queue):
-                threading.Thread.__init__(self)
-                self.queue = queue
-          
-            def run(self):
-                while True:
-                    #grabs host from queue
-                    #print "Queue length is %d" % self.queue.qsize()
-                    node = self.queue.get()
-                    
-                    try:
-    
-                        #runs the selected node function
-                        if len(args) > 0:
-                            rc = node_function(node,*args)
-                        elif len(kwargs) > 0:
-                            rc = node_function(node,**kwargs)
-                        else:
-                            rc = node_function(node)
-                    except:
-                        logging.exception("Thread failed!");
-    
-                    #signals to queue job is done
-                    self.queue.task_done()
-          
+        for node in node_list:
+            queue.put(node)
+        
+        results = {}
+        start_times = {}
+        self.last_command_times = {}
+        lock = threading.Lock()
+        
+        def worker():
+            while True:
+                try:
+                    node = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                
+                lock.acquire()
+                # skipped by the deadline?
+                if node in results:
+                    lock.release()
+                    continue
+                start_times[node] = time.time()
+                lock.release()
+                
+                # commands run on the local machine for this node are cancelled with it.
+                OFSTestNode.setCommandOwner(node)
+                try:
+                    #runs the selected node function
+                    rc = node_function(node,*args,**kwargs)
+                except Exception as e:
+                    logging.exception("Thread failed!")
+                    rc = e
+                OFSTestNode.setCommandOwner(None)
+                
+                lock.acquire()
+                # a cancelled node keeps its timeout result
+                if node not in results:
+                    results[node] = rc
+                    self.last_command_times[node] = time.time() - start_times[node]
+                lock.release()
+                node.resumeCommands()
           
         start = time.time()
-          
-          
-        #spawn a pool of threads, and pass them queue instance 
-        #pool of threads will be the same number as the node list
-        for n in node_list:
-            t = NodeThread(queue)
+        
+        threads = []
+        for i in range(number_workers):
+            t = threading.Thread(target=worker)
             t.setDaemon(True)
             t.start()
-              
-        #populate queue with data   
+            threads.append(t)
+        
+        # wait for the workers, or for the deadline
+        for t in threads:
+            while t.isAlive():
+                if deadline is None:
+                    t.join(1)
+                else:
+                    remaining = start + deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    t.join(min(remaining,1))
+        
+        if len([t for t in threads if t.isAlive()]) > 0:
+            self.cancelStuckNodes(node_list,queue,results,start_times,lock,deadline)
+            # let the workers of cancelled nodes unwind
+            for t in threads:
+                t.join(10)
+        
         for node in node_list:
-            queue.put(node)
-           
-        #wait on the queue until everything has been processed     
-        queue.join()
-          
+            if isinstance(results[node],Exception):
+                logging.error("Operation failed on %s: %s" % (node.hostname,results[node]))
+        
+        logging.info("Ran %s on %d nodes with %d workers in %.1fs" % (node_function.__name__,len(node_list),number_workers,time.time()-start))
+        return results
+    
+    ##
+    #    @fn cancelStuckNodes(self,node_list,queue,results,start_times,lock,deadline):
+    #
+    #    Called by runSimultaneousCommands when the deadline passes. Skips the nodes that have not
+    #    started and kills the commands of the nodes that are still running.
+    #
+    #    @param self The object pointer
+    #    @param node_list List of nodes of the run
+    #    @param queue Queue of nodes not yet started
+    #    @param results Dictionary of results so far
+    #    @param start_times Dictionary node -> time the node was started
+    #    @param lock Lock protecting results and start_times
+    #    @param deadline Deadline in seconds, for the messages
+    
+    def cancelStuckNodes(self,node_list,queue,results,start_times,lock,deadline):
+        
+        try:
+            while True:
+                queue.get_nowait()
+        except Queue.Empty:
+            pass
+        
+        lock.acquire()
+        try:
+            now = time.time()
+            for node in node_list:
+                if node in results:
+                    continue
+                if node in start_times:
+                    print "Deadline of %gs passed. Cancelling commands on %s" % (deadline,node.hostname)
+                    node.cancelCommands()
+                    results[node] = OFSExecutionEngine.OFSTimeoutError("Cancelled after deadline of %gs" % deadline)
+                    self.last_command_times[node] = now - start_times[node]
+                else:
+                    results[node] = OFSExecutionEngine.OFSTimeoutError("Not started before deadline of %gs" % deadline)
+        finally:
+            lock.release()
+
+    ##
+    # @fn gather(self,node_list=None,op=None,concurrency=None,timeout=None,args=[],kwargs={}):
+    #
+    #    Runs an operation on multiple nodes from one event loop and collects the results.
+    #    Commands honour cancelCommands(), command_timeout and command_deadline of their node,
+    #    but do not use the remote agent or streaming capture. See OFSExecutionEngine.
+    #
+    #    @param self The object pointer
+    #    @param node_list List of nodes to run op on
+    #    @param op Shell command string, or function op(node,*args,**kwargs) that returns a
+    #    coroutine or command task, e.g. OFSTestNode.OFSTestNode.startOFSServerAsync. Wrap
+    #    blocking functions with OFSExecutionEngine.inThread.
+    #    @param concurrency Maximum number of nodes worked on at once. Default is self.max_workers.
+    #    @param timeout Seconds each node may take. Commands of late nodes are killed, on the node too.
+    #    @param args Arguments to op
+    #    @param kwargs Keyword args to op
+    #
+    #    @return Dictionary node -> result of op (usually rc), or the exception it raised.
+
+    def gather(self,node_list=None,op=None,concurrency=None,timeout=None,args=[],kwargs={}):
+
+        if node_list is None:
+            node_list = self.network_nodes
+
+        if concurrency is None:
+            concurrency = self.max_workers
+
+        engine = OFSExecutionEngine.OFSExecutionEngine(concurrency)
+        for node in node_list:
+            if isinstance(op,basestring):
+                work = node.runSingleCommandAsync(op)
+            else:
+                try:
+                    work = op(node,*args,**kwargs)
+                except Exception as e:
+                    logging.exception("Could not start operation on %s" % node.hostname)
+                    # reported like any other failure
+                    work = e
+            engine.spawn(node,work,timeout)
+
+        results = engine.run()
+
+        ## @var last_gather_times
+        # Seconds each node took in the last call to gather.
+        self.last_gather_times = engine.getElapsedTimes()
+
+        for node in node_list:
+            if isinstance(results[node],Exception):
+                logging.error("Operation failed on %s: %s" % (node.hostname,results[node]))
+        return results
 
     ##
     # @fn   addCloudConnection(self,cloud_config_file,key_name,key_location)
@@ -224,7 +504,7 @@ class OFSTestNetwork(object):
     #    @param security_group_ids List of security group ids for this instance.
     #    @param spot_instance_bid Maximum bid for spot instances. Ignored if not applicable.
     #
-    #    @returns list of new nodes.
+    #    @return 0 on success. 1 if not all nodes could be created or the new nodes do not answer.
 
 
     
@@ -240,19 +520,16 @@ class OFSTestNetwork(object):
         for new_node in new_ofs_test_nodes:
             self.network_nodes.append(new_node)
         
-        # return the list of newly created nodes.
+        if len(new_ofs_test_nodes) < number_nodes:
+            print "Could create only %d of %d new cloud nodes" % (len(new_ofs_test_nodes),number_nodes)
+            return 1
         
-        rc = self.checkExternalConnectivity()
-        count = 0
-        while rc != 0 and count < 300:
-            count += 10
-            print "Waiting %ds of 300s for connectivity to new nodes" % count 
-            time.sleep(10)
-            rc = self.checkExternalConnectivity()
-            
-            
+        print "Waiting up to 300s for connectivity to new nodes"
+        if not OFSTestWait.waitUntil(lambda: self.checkExternalConnectivity() == 0,"connectivity to new nodes",timeout=300):
+            print "New cloud nodes do not answer after 300s"
+            return 1
         
-        return new_ofs_test_nodes
+        return 0
     
     
     def logNewCloudNodes(self,new_ofs_test_nodes):
@@ -271,6 +548,8 @@ class OFSTestNetwork(object):
 #    @param self The object pointer
 #    @param node_list list of nodes to upload the keys.
 #
+#    @return 0 on success, 1 as soon as an upload fails.
+#
 
  
 
@@ -278,18 +557,36 @@ class OFSTestNetwork(object):
         # if a list is not provided upload all keys
         if node_list is None:
             node_list = self.network_nodes
-            
+        
+        # every node gets the keys of every node, in one copy per node.
+        key_files = {}
         for node in node_list:
-            self.runSimultaneousCommands(node_list=node_list,node_function=OFSTestRemoteNode.OFSTestRemoteNode.uploadRemoteKeyFromLocal, args=[self.local_master,node.ext_ip_address])
+            key_files[node.ext_ip_address] = self.local_master.getRemoteKeyFile(node.ext_ip_address)
+        
+        results = self.gather(node_list,OFSTestRemoteNode.OFSTestRemoteNode.uploadRemoteKeysFromLocalAsync,args=[self.local_master,key_files])
+        failed = [n for n in node_list if results[n] != 0]
+        if len(failed) > 0:
+            print "Could not upload keys to %s" % ",".join([n.ext_ip_address for n in failed])
+            return 1
+        
+        return 0
         
 
     ##      
-    # @fn enablePasswordlessSSH(self,node_list=None):
+    # @fn enablePasswordlessSSH(self,node_list=None,user=None):
     #
     # Enable passwordless SSH for the node for the current user.
     #
+    # The host keys of all nodes are scanned at once from the local machine. Each node
+    # then gets one known_hosts file with every node under its hostname, internal and
+    # external address, itself as localhost, and the public keys of the uploaded ssh keys
+    # in authorized_keys. All nodes are updated in parallel. See OFSTestNode.updateSSHKeysAsync.
+    #
     #    @param self The object pointer
     #    @param node_list List of nodes to enable passwordless ssh
+    #    @param user User to enable passwordless ssh for. Default is the current user of each node.
+    #
+    #    @return 0 on success. Number of nodes that could not be updated on failure.
             
 
     def enablePasswordlessSSH(self,node_list=None,user=None):
@@ -297,28 +594,52 @@ class OFSTestNetwork(object):
         if node_list is None:
             node_list = self.network_nodes
         
-
-        
-        for src_node in node_list:
-            
-            if user is None:
-                user = src_node.current_user
-        
-            if user == "root":
-                home_dir = "/root"
-            else:
-                home_dir = "/home/"+user
-            
+        # one ssh-keyscan checks all nodes in parallel.
+        output = []
+        addresses = [node.ext_ip_address for node in node_list]
+        self.local_master.runSingleCommand("/usr/bin/ssh-keyscan -T 10 %s 2> /dev/null" % " ".join(addresses),output)
+        host_keys = {}
+        if len(output) > 1:
+            for line in output[1].split('\n'):
+                fields = line.split()
+                if len(fields) < 3 or fields[0].startswith("#"):
+                    continue
+                host_keys.setdefault(fields[0],[]).append(" ".join(fields[1:]))
+        
+        known_hosts = ""
+        for node in node_list:
+            keys = host_keys.get(node.ext_ip_address,[])
+            if len(keys) == 0:
+                print "Could not scan ssh host key of %s" % node.ext_ip_address
+            # the host key is the same under every name of the node.
+            names = []
+            for name in [node.hostname,node.ip_address,node.ext_ip_address]:
+                if name not in names and name != "":
+                    names.append(name)
+            for key in keys:
+                known_hosts += "%s %s\n" % (",".join(names),key)
+        
+        # public keys of the keys uploaded by uploadKeys.
+        authorized_keys = []
+        for key_file in sorted(set([self.local_master.getRemoteKeyFile(address) for address in addresses])):
+            public_key = self.local_master.runSingleCommandBacktick("ssh-keygen -y -P '' -f %s 2> /dev/null" % key_file)
+            if public_key != "" and public_key not in authorized_keys:
+                authorized_keys.append(public_key)
+        
+        engine = OFSExecutionEngine.OFSExecutionEngine(self.max_workers)
+        for node in node_list:
             # passwordless access to localhost
-            src_node.runSingleCommand("/usr/bin/ssh-keyscan localhost >> %s/.ssh/known_hosts" % home_dir)
-            src_node.runSingleCommand("/usr/bin/ssh-keyscan 127.0.0.1 >> %s/.ssh/known_hosts" % home_dir)
-            
-            for dest_node in node_list:
-                # passwordless access to all other nodes
-                logging.info("Enabling passwordless SSH from %s to %s/%s/%s" % (src_node.hostname,dest_node.hostname,dest_node.ip_address,dest_node.ext_ip_address))
-                src_node.runSingleCommand("/usr/bin/ssh-keyscan %s >> %s/.ssh/known_hosts" % (dest_node.hostname,home_dir))
-                src_node.runSingleCommand("/usr/bin/ssh-keyscan %s >> %s/.ssh/known_hosts" % (dest_node.ext_ip_address,home_dir))
-                src_node.runSingleCommand("/usr/bin/ssh-keyscan %s >> %s/.ssh/known_hosts" % (dest_node.ip_address,home_dir))
+            local_known_hosts = ""
+            for key in host_keys.get(node.ext_ip_address,[]):
+                local_known_hosts += "localhost,127.0.0.1 %s\n" % key
+            logging.info("Enabling passwordless SSH from %s to all nodes" % node.hostname)
+            engine.spawn(node,node.updateSSHKeysAsync(known_hosts + local_known_hosts,authorized_keys,user))
+        results = engine.run()
+        
+        failed = [node for node in node_list if results[node] != 0]
+        for node in failed:
+            print "Could not enable passwordless SSH on %s" % node.hostname
+        return len(failed)
                 
 
     ##      
@@ -337,6 +658,7 @@ class OFSTestNetwork(object):
             return
         
         failures = 0
+        remote_node.closeSSHConnection()
         rc = self.terminateCloudInstance(remote_node.ip_address)
         
         # if the node was terminated, remove it from the list.
@@ -405,6 +727,7 @@ class OFSTestNetwork(object):
             logging.exception("Node at %s is not controlled by the cloud manager." % remote_node.ip_address)
             return
         
+        remote_node.closeSSHConnection()
         rc = self.cloud_connection_manager.stopCloudInstance(remote_node.ip_address)
         
         # if the node was terminated, remove it from the list.
@@ -440,16 +763,23 @@ class OFSTestNetwork(object):
 
 
     ##
-    # @fn updateEtcHosts(self,node_list=None):
+    # @fn updateEtcHosts(self,node_list=None,max_slots=None):
     #
     # This function updates the etc hosts file on each node with the hostname and ip
     # address. Also creates the necessary mpihosts config files.
     #
+    # The hosts entries and the host files are built once from the probed node facts and
+    # written to all nodes in parallel. /etc/hosts gets a managed section that is replaced
+    # on every run. See OFSTestNode.updateHostFiles.
+    #
     #    @param self The object pointer
     #    @param node_list List of nodes in network
+    #    @param max_slots Maximum MPI slots per node. None uses all cores. See OFSTestNode.getMPISlots.
+    #
+    #    @return 0 on success. Number of nodes that could not be updated on failure.
 
 
-    def updateEtcHosts(self,node_list=None):
+    def updateEtcHosts(self,node_list=None,max_slots=None):
         
         #This function updates the etc hosts file on each node with the 
         if node_list is None:
@@ -458,35 +788,112 @@ class OFSTestNetwork(object):
         
         self.number_mpi_hosts = len(node_list) 
 
+        hosts_block = ""
+        openmpihosts = ""
+        mpichhosts = ""
         self.number_mpi_slots = 0
+        for node in node_list:
+            mpi_slots = node.getMPISlots(max_slots)
+            hosts_block += "%s     %s\n" % (node.ip_address,node.hostname)
+            openmpihosts += "%s   slots=%d\n" % (node.hostname,mpi_slots)
+            mpichhosts += "%s:%d\n" % (node.hostname,mpi_slots)
+            self.number_mpi_slots += mpi_slots
         
         for node in node_list:
-            node.number_mpi_slots = 0
+            node.number_mpi_slots = self.number_mpi_slots
             node.number_mpi_hosts = self.number_mpi_hosts
             node.created_openmpihosts = "/home/%s/openmpihosts" % node.current_user
             node.created_mpichhosts = "/home/%s/mpichhosts" % node.current_user
-            for n2 in node_list:
-                # limit slots to 4 per node.
-                mpi_slots = 4
-                if n2.number_cores < 4:
-                    mpi_slots = n2.number_cores
-                    
-                node.number_mpi_slots += mpi_slots
-                # can we ping the node?
-                #print "Pinging %s from local node" % n2.hostname
-                rc = node.runSingleCommandAsRoot("ping -c 1 %s" % n2.hostname)
-                # if not, add to the /etc/hosts file
-                if rc != 0:
-                    logging.info("Could not ping %s at %s from %s. Manually adding to /etc/hosts" % (n2.hostname,n2.ip_address,node.hostname))
-                node.runSingleCommandAsRoot('bash -c \'echo -e "%s     %s     %s" >> /etc/hosts\'' % (n2.ip_address,n2.hostname,n2.hostname))
-                # also create mpihosts files while we're here.
-                node.runSingleCommand('echo "%s   slots=%d" >> %s' % (n2.hostname,mpi_slots,node.created_openmpihosts))
-                node.runSingleCommand('echo "%s:%d" >> %s' % (n2.hostname,mpi_slots,node.created_mpichhosts))
-            
-            
-            self.number_mpi_slots = node.number_mpi_slots
-                    
-            node.hostname = node.runSingleCommandBacktick("hostname")
+        
+        results = self.gather(node_list,OFSTestNode.OFSTestNode.updateHostFilesAsync,args=[hosts_block,openmpihosts,mpichhosts])
+        failed = [node for node in node_list if results[node] != 0]
+        for node in failed:
+            print "Could not update /etc/hosts and MPI host files on %s" % node.hostname
+        return len(failed)
+
+    ##
+    # @fn waitForRebootAsync(self,node,timeout=480):
+    #
+    #    Waits until a node answers with a new boot id. Replaces the fixed 180s wait after a reboot.
+    #    Coroutine, see OFSExecutionEngine.
+    #
+    #    @param self The object pointer
+    #    @param node Node that is rebooting. node.boot_id is the boot id before the reboot.
+    #    @param timeout Seconds to wait at most.
+    #
+    #    @return (via OFSExecutionEngine.Return) True if the node is back.
+
+    def waitForRebootAsync(self,node,timeout=480):
+        rc = yield OFSTestWait.waitUntilAsync(node.hasRebootedAsync,"reboot of %s" % node.ext_ip_address,timeout=timeout,old_wait=180,args=[node.boot_id],initial_delay=10)
+        raise OFSExecutionEngine.Return(rc)
+
+    ##
+    # @fn installCustomKernelOnNodes(self,node_list,kernel_git_location,kernel_git_branch)
+    #
+    # Builds a custom kernel on the first node and installs it on all nodes, instead of
+    # building it on every node. The package is taken from the build cache if the same
+    # commit was built before with the same base config, architecture and compiler. The
+    # nodes must be rebooted afterwards.
+    #
+    #    @param self The object pointer
+    #    @param node_list Nodes to install the kernel on. The first one builds it.
+    #    @param kernel_git_location url of git repository from which the custom kernel will be built.
+    #    @param kernel_git_branch url of git branch from which the custom kernel will be built.
+    #
+    #    @return 0 on success. Number of nodes without the new kernel on failure.
+    
+    def installCustomKernelOnNodes(self,node_list,kernel_git_location,kernel_git_branch):
+        build_node = node_list[0]
+        package_name = "ofstest-kernel-%s.tar.gz" % uuid.uuid4().hex
+        package_file = "/tmp/%s" % package_name
+        
+        key = None
+        if self.build_cache is not None:
+            parts = build_node.getCustomKernelKey(kernel_git_location,kernel_git_branch)
+            if parts is not None:
+                parts["location"] = kernel_git_location
+                key = OFSBuildCache.getKey(parts)
+        
+        release = ""
+        entry = None
+        if key is not None:
+            entry = self.build_cache.lookup(key)
+        if entry is not None:
+            print "Using cached custom kernel %s" % key
+            rc = self.local_master.copyToRemoteNode(self.build_cache.getArchivePath(key),build_node,package_file,False)
+            if rc == 0:
+                release = entry["attributes"].get("kernel_release","")
+            else:
+                self.build_cache.invalidate(key)
+        
+        if release == "":
+            print "Building custom kernel on %s for %d nodes" % (build_node.hostname,len(node_list))
+            rc = build_node.buildCustomKernel(kernel_git_location,kernel_git_branch)
+            if rc != 0:
+                return len(node_list)
+            release = build_node.packageCustomKernel(package_file)
+            if release == "":
+                return len(node_list)
+            if key is not None:
+                local_package = "%s.%d.part" % (self.build_cache.getArchivePath(key),os.getpid())
+                if not os.path.isdir(self.build_cache.directory):
+                    os.makedirs(self.build_cache.directory)
+                if self.local_master.copyFromRemoteNode(build_node,package_file,local_package,False) == 0:
+                    self.build_cache.store(key,local_package,{"kernel_release" : release},"linux %s %s on %s" % (kernel_git_branch,release,build_node.distro))
+                elif os.path.exists(local_package):
+                    os.remove(local_package)
+        
+        # send the package to all nodes, then install it everywhere at once.
+        failed = self.broadcast(build_node,[package_name],node_list,source_dir="/tmp")
+        for node in failed:
+            build_node.copyToRemoteNode(package_file,node,package_file,False)
+        results = self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.installKernelPackageAsync,args=[package_file])
+        failed = [node for node in node_list if results[node] != 0]
+        for node in failed:
+            print "Could not install custom kernel %s on %s" % (release,node.hostname)
+        if len(failed) == 0:
+            print "Installed custom kernel %s on %d nodes" % (release,len(node_list))
+        return len(failed)
 
     ##
     # @fn updateNodes(self,node_list, custom_kernel=False, kernel_git_location=None, kernel_git_branch=None,host_prefix="ofsnode")
@@ -504,36 +911,221 @@ class OFSTestNetwork(object):
         if node_list is None:
             node_list = self.network_nodes
             
+        # A custom kernel is built once and installed on all nodes before they reboot.
+        build_kernel_once = custom_kernel and self.kernel_build_once and len(node_list) > 1
+        
         # Run updateNode on the nodes simultaneously. 
-        self.runSimultaneousCommands(node_list=node_list,node_function=OFSTestNode.OFSTestNode.updateNode,args=[custom_kernel,kernel_git_location,kernel_git_branch])
-        # Wait for reboot
-        print "Waiting 180s for nodes to reboot"
-        time.sleep(180)
-        
-        rc = self.checkExternalConnectivity()
-        count = 0
-        while rc != 0 and count < 300:
-            count += 10
-            print "Waiting %ds of 300s for connectivity to new nodes" % count 
-            time.sleep(10)
-            rc = self.checkExternalConnectivity()
+        results = self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.updateNodeAsync,args=[custom_kernel and not build_kernel_once,kernel_git_location,kernel_git_branch],kwargs={'reboot':not build_kernel_once})
+        failed = [n for n in node_list if results[n] != 0]
+        if len(failed) > 0:
+            # no point waiting for nodes that never started to reboot.
+            print "Update failed on %s" % ",".join([n.hostname for n in failed])
+            self.closeSSHConnections(node_list)
+            return 1
+        
+        if build_kernel_once:
+            rc = self.installCustomKernelOnNodes(node_list,kernel_git_location,kernel_git_branch)
+            if rc != 0:
+                print "Could not install custom kernel on %d nodes. Continuing with default kernel." % rc
+            self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.rebootAsync)
+
+        # ssh master connections do not survive the reboot.
+        self.closeSSHConnections(node_list)
+        # Wait for reboot. A node is back when it answers with a new boot id.
+        print "Waiting up to 480s for nodes to reboot"
+        results = self.gather(node_list=node_list,op=self.waitForRebootAsync,kwargs={'timeout':480})
+        failed = [n for n in node_list if results[n] != True]
+        if len(failed) > 0:
+            print "Nodes did not come back from reboot: %s" % ",".join([n.hostname for n in failed])
+            return len(failed)
         
+        print "Nodes rebooted."
+        # node information may have changed during reboot. Probe all nodes at once.
+        old_hostnames = dict([(node,node.hostname) for node in node_list])
+        rc = self.probeNodeFacts(node_list)
         if rc != 0:
             return rc
         
-        print "Nodes rebooted."
         # workaround for strange cuer1 issue where hostname changes on reboot.
         for node in node_list:
-            # node information may have changed during reboot.
-            old_hostname = node.hostname
-            node.currentNodeInformation(host_prefix)
-            tmp_hostname = node.runSingleCommandBacktick("hostname")
-            if tmp_hostname != old_hostname:
-                logging.info( "Hostname changed from %s to %s! Resetting to %s" % (old_hostname,tmp_hostname,old_hostname))
+            old_hostname = old_hostnames[node]
+            if node.hostname != old_hostname:
+                logging.info( "Hostname changed from %s to %s! Resetting to %s" % (old_hostname,node.hostname,old_hostname))
                 node.runSingleCommandAsRoot("hostname %s" % old_hostname)
+                node.hostname = old_hostname
+        
+        # the provisioning cache did not survive the reboot.
+        if self.provisioning_cache_node in node_list:
+            return self.startProvisioningCache()
         
         return 0
     
+    ##
+    # @fn probeNodeFacts(self,node_list=None,data_locations=None):
+    #
+    # Runs the node fact probe on all nodes at once and updates their attributes.
+    # See OFSTestNode.probeNodeFacts.
+    #
+    #    @param self The object pointer
+    #    @param node_list List of nodes to probe
+    #    @param data_locations Directories to report free disk space for. Default is each node's OrangeFS locations.
+    #
+    #    @return 0 if every node answered, 1 otherwise.
+    
+    def probeNodeFacts(self,node_list=None,data_locations=None):
+        if node_list is None:
+            node_list = self.network_nodes
+        
+        results = self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.probeNodeFactsAsync,args=[data_locations])
+        
+        rc = 0
+        for node in node_list:
+            facts = results[node]
+            if isinstance(facts,Exception) or facts.get("home_group","") == "":
+                print "Could not probe node %s at %s" % (node.hostname,node.ext_ip_address)
+                rc = 1
+            else:
+                node.applyNodeFacts(facts)
+                logging.info("Node: %s %s %s %s" % (node.hostname,node.distro,node.kernel_version,node.processor_type))
+        return rc
+    
+    ##
+    # @fn setupProvisioningCache(self,head_node=None,node_list=None,port=OFSProvisioningCache.DEFAULT_PORT,cache_dir="",local_dir="",mirror_dir="",offline=False):
+    #
+    # Starts the provisioning cache on head_node and points the package managers and
+    # downloads of all nodes at it, so each package and tarball is downloaded once. See
+    # OFSProvisioningCache.
+    #
+    #    @param self The object pointer
+    #    @param head_node Node that runs the cache. Default is the first node.
+    #    @param node_list Nodes that use the cache.
+    #    @param port Port of the cache.
+    #    @param cache_dir Cache directory on head_node. Default is ~/ofstest-provisioning-cache.
+    #    @param local_dir Directory on the local machine with a cache from an earlier run. It is copied to head_node first. See saveProvisioningCache.
+    #    @param mirror_dir Directory on the local machine with a stand-in mirror, laid out as <host>/<path>. Empty string for none.
+    #    @param offline Never download from upstream. Everything must be in the cache or the mirror.
+    #
+    #    @return 0 on success. Not 0 if the cache could not be started or nodes could not use it.
+    
+    def setupProvisioningCache(self,head_node=None,node_list=None,port=OFSProvisioningCache.DEFAULT_PORT,cache_dir="",local_dir="",mirror_dir="",offline=False):
+        if node_list is None:
+            node_list = self.network_nodes
+        if head_node is None:
+            head_node = node_list[0]
+        if cache_dir is None or cache_dir == "":
+            cache_dir = "/home/%s/ofstest-provisioning-cache" % head_node.current_user
+        
+        self.provisioning_cache_node = head_node
+        self.provisioning_cache_dir = cache_dir
+        self.provisioning_cache_url = "http://%s:%d" % (head_node.ip_address,port)
+        self.provisioning_cache_local = local_dir
+        self.provisioning_cache_offline = offline
+        self.provisioning_cache_mirror = ""
+        
+        head_node.runSingleCommand("mkdir -p %s" % cache_dir)
+        if local_dir is not None and local_dir != "" and os.path.isdir(local_dir):
+            print "Loading provisioning cache from %s to %s" % (local_dir,head_node.hostname)
+            self.local_master.copyToRemoteNode(local_dir.rstrip("/")+"/",head_node,cache_dir+"/",True)
+        if mirror_dir is not None and mirror_dir != "":
+            self.provisioning_cache_mirror = cache_dir + "-mirror"
+            head_node.runSingleCommand("mkdir -p %s" % self.provisioning_cache_mirror)
+            rc = self.local_master.copyToRemoteNode(mirror_dir.rstrip("/")+"/",head_node,self.provisioning_cache_mirror+"/",True)
+            if rc != 0:
+                print "Could not copy mirror %s to %s" % (mirror_dir,head_node.hostname)
+                return rc
+        
+        rc = self.startProvisioningCache()
+        if rc != 0:
+            self.provisioning_cache_node = None
+            return rc
+        
+        results = self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.useProvisioningCacheAsync,args=[self.provisioning_cache_url])
+        failed = [node for node in node_list if results[node] != 0]
+        for node in failed:
+            print "Could not point %s at the provisioning cache" % node.hostname
+        return len(failed)
+    
+    ##
+    # @fn startProvisioningCache(self):
+    #
+    # Starts or restarts the provisioning cache set up by setupProvisioningCache and waits until it answers.
+    #
+    #    @param self The object pointer
+    #
+    #    @return 0 on success.
+    
+    def startProvisioningCache(self):
+        head_node = self.provisioning_cache_node
+        url = self.provisioning_cache_url
+        mode = "online"
+        if self.provisioning_cache_offline:
+            mode = "offline"
+        print "Starting provisioning cache on %s at %s (%s)" % (head_node.hostname,url,mode)
+        port = int(url.rsplit(":",1)[1])
+        rc = head_node.runSingleCommand(OFSProvisioningCache.getStartCommand(self.provisioning_cache_dir,head_node.ip_address,port,self.provisioning_cache_mirror,self.provisioning_cache_offline))
+        if rc == 0:
+            ready = OFSTestWait.waitUntil(lambda: head_node.getProvisioningCacheStatus(url) is not None,"provisioning cache on %s" % head_node.hostname,timeout=30)
+            if not ready:
+                rc = 1
+        if rc != 0:
+            print "Could not start provisioning cache on %s" % head_node.hostname
+            head_node.runSingleCommand("cat %s/proxy.log" % self.provisioning_cache_dir)
+        return rc
+    
+    ##
+    # @fn stopProvisioningCache(self,node_list=None):
+    #
+    # Points the package managers and wget of all nodes back at direct downloads and stops
+    # the provisioning cache, so the nodes are left as they were found.
+    #
+    #    @param self The object pointer
+    #    @param node_list Nodes that used the cache.
+    #
+    #    @return Number of nodes that could not be pointed back.
+    
+    def stopProvisioningCache(self,node_list=None):
+        head_node = self.provisioning_cache_node
+        if head_node is None:
+            return 0
+        if node_list is None:
+            node_list = self.network_nodes
+        
+        results = self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.useProvisioningCacheAsync,args=[""])
+        failed = [node for node in node_list if results[node] != 0]
+        for node in failed:
+            print "Could not point %s back at direct downloads" % node.hostname
+        
+        print "Stopping provisioning cache on %s" % head_node.hostname
+        head_node.runSingleCommand(OFSProvisioningCache.getStopCommand(self.provisioning_cache_dir))
+        self.provisioning_cache_node = None
+        return len(failed)
+    
+    ##
+    # @fn saveProvisioningCache(self):
+    #
+    # Prints the cache statistics, stops the cache (see stopProvisioningCache) and copies it
+    # to the local machine, so a later run, e.g. on new cloud nodes, starts warm. Only new
+    # files are copied.
+    #
+    #    @param self The object pointer
+    #
+    #    @return 0 on success.
+    
+    def saveProvisioningCache(self):
+        head_node = self.provisioning_cache_node
+        if head_node is None:
+            return 0
+        msg = OFSProvisioningCache.formatStatus(head_node.getProvisioningCacheStatus(self.provisioning_cache_url))
+        print msg
+        logging.info(msg)
+        self.stopProvisioningCache()
+        if self.provisioning_cache_local is None or self.provisioning_cache_local == "":
+            return 0
+        if not os.path.isdir(self.provisioning_cache_local):
+            os.makedirs(self.provisioning_cache_local)
+        print "Saving provisioning cache from %s to %s" % (head_node.hostname,self.provisioning_cache_local)
+        return self.local_master.copyFromRemoteNode(head_node,self.provisioning_cache_dir+"/",self.provisioning_cache_local.rstrip("/")+"/",True)
+    
     ##
     # @fn installRequiredSoftware(self,node_list=None):
     #
@@ -634,6 +1226,11 @@ class OFSTestNetwork(object):
     #    @param ofs_database Database for metadata storage (bdb or lmdb)
     #    @param svn_username Username to use to log in to svn
     #    @param svn_password Password to use to log into svn
+    #    @param incremental_build Keep the build directory between runs and only rebuild what changed
+    #    @param build_location Build directory for incremental builds. None uses ~/ofs-build/<source directory>.
+    #    @param ccache_dir ccache directory for incremental builds. None uses ~/.ccache-ofstest, "" disables ccache.
+    #    @param make_jobs Parallel make jobs. None uses the number of cores of the build node.
+    #    @param distributed_build Spread compile jobs over node_list with distcc. See setupDistributedBuild.
     
           
 
@@ -659,7 +1256,12 @@ class OFSTestNetwork(object):
         hadoop_version="hadoop-2.6.0",
         ofs_database="lmdb",
         svn_username="",
-        svn_password=""
+        svn_password="",
+        incremental_build=False,
+        build_location=None,
+        ccache_dir=None,
+        make_jobs=None,
+        distributed_build=False
         ):
         
         output = []
@@ -715,6 +1317,48 @@ class OFSTestNetwork(object):
                 logging.exception("Could not upload patch at %s to buildnode %s" % (patch,build_node.hostname))
                 return rc
 
+        # the same build may be in the build cache.
+        build_node.ofs_build_cache_key = None
+        build_node.ofs_build_cached = False
+        if self.build_cache is not None:
+            build_options = {
+                "build_kmod" : build_kmod,
+                "enable_strict" : enable_strict,
+                "enable_fuse" : enable_fuse,
+                "enable_shared" : enable_shared,
+                "enable_hadoop" : enable_hadoop,
+                "ofs_prefix" : ofs_prefix,
+                "db4_prefix" : db4_prefix,
+                "security_mode" : security_mode,
+                "configure_opts" : configure_opts,
+                "make_opts" : make_opts,
+                "hadoop_version" : hadoop_version,
+                "ofs_database" : ofs_database
+                }
+            key = self.getOFSBuildCacheKey(build_node,ofs_patch_files,build_options)
+            if key != "":
+                rc = self.deployCachedOFSBuild(build_node,key,ofs_patch_files)
+                if rc == 0:
+                    return rc
+                build_node.ofs_build_cache_key = key
+
+        build_node.build_stage_times = []
+        build_node.incremental_build = False
+        build_node.ccache_dir = ""
+        build_node.make_jobs = make_jobs
+        if incremental_build:
+            if build_location is None or build_location == "":
+                build_location = "/home/%s/ofs-build/%s" % (build_node.current_user,os.path.basename(build_node.ofs_source_location.rstrip("/")))
+            if ccache_dir is None:
+                ccache_dir = "/home/%s/.ccache-ofstest" % build_node.current_user
+            rc = build_node.setupIncrementalBuild(build_location,ccache_dir,make_jobs)
+            if rc != 0:
+                return rc
+        build_node.ccache_stats = build_node.getCCacheStats()
+        build_node.distcc_hosts = ""
+        build_node.distcc_jobs = 0
+        if distributed_build:
+            self.setupDistributedBuild(build_node,node_list)
 
         rc = build_node.configureOFSSource(build_kmod=build_kmod,enable_strict=enable_strict,enable_shared=enable_shared,enable_fuse=enable_fuse,ofs_prefix=ofs_prefix,db4_prefix=db4_prefix,ofs_patch_files=ofs_patch_files,configure_opts=configure_opts,security_mode=security_mode,enable_hadoop=enable_hadoop,hadoop_version=hadoop_version,ofs_database=ofs_database)
         if rc != 0:
@@ -727,6 +1371,55 @@ class OFSTestNetwork(object):
         return rc
 
    
+    ##
+    #    @fn setupDistributedBuild(self,build_node,node_list=None):
+    #
+    #    Makes the nodes of node_list compile workers of build_node with distcc. Only nodes
+    #    with distcc and the same gcc version and target as build_node are used. Without
+    #    such nodes, build_node builds alone.
+    #
+    #    @param self The object pointer
+    #    @param build_node Node on which OrangeFS and OpenMPI are built
+    #    @param node_list Candidate workers. build_node is skipped.
+    #
+    #    @return Number of workers.
+    
+    def setupDistributedBuild(self,build_node,node_list=None):
+        if node_list is None:
+            node_list = self.network_nodes
+        build_node.distcc_hosts = ""
+        build_node.distcc_jobs = 0
+        
+        candidates = [node for node in node_list if node is not build_node]
+        results = self.gather(node_list=[build_node]+candidates,op=OFSTestNode.OFSTestNode.getCompilerAsync)
+        build_compiler = results[build_node]
+        if not isinstance(build_compiler,dict) or not build_compiler["distcc"]:
+            print "distcc is not installed on build node %s. Building locally." % build_node.hostname
+            return 0
+        
+        workers = []
+        for node in candidates:
+            compiler = results[node]
+            if not isinstance(compiler,dict):
+                print "Could not check the compiler of %s. Not using it for the build." % node.hostname
+            elif not compiler["distcc"]:
+                print "distcc is not installed on %s. Not using it for the build." % node.hostname
+            elif not OFSDistributedBuild.isCompatible(build_compiler,compiler):
+                print "Compiler of %s (%s, %s) does not match build node %s (%s, %s). Not using it for the build." % (node.hostname,compiler["version"],compiler["machine"],build_node.hostname,build_compiler["version"],build_compiler["machine"])
+            else:
+                workers.append(node)
+        
+        if len(workers) == 0:
+            print "No compile workers match the compiler of %s. Building locally." % build_node.hostname
+            return 0
+        
+        build_node.distcc_hosts = OFSDistributedBuild.getDistccHosts(build_node.number_cores,[(node.current_user,node.hostname,node.number_cores) for node in workers])
+        # distcc keeps jobs in flight while others are sent. Twice the cores keeps the workers busy.
+        build_node.distcc_jobs = 2 * sum([max(node.number_cores,1) for node in [build_node]+workers])
+        print "Distributing the build over %d nodes: DISTCC_HOSTS=%s, make -j %d" % (len(workers)+1,build_node.distcc_hosts,build_node.distcc_jobs)
+        logging.info("DISTCC_HOSTS=%s" % build_node.distcc_hosts)
+        return len(workers)
+    
     ##    
     #    @fn installOFSBuild(self,build_node=None,install_opts="",node_list=None):
     #
@@ -743,7 +1436,128 @@ class OFSTestNetwork(object):
         
         if build_node is None:
             build_node = self.network_nodes[0]
-        return build_node.installOFSSource(install_opts)
+        
+        if build_node.ofs_build_cached:
+            print "OrangeFS was deployed from the build cache. Nothing to install."
+            return 0
+        
+        rc = build_node.installOFSSource(install_opts)
+        report = build_node.getBuildReport()
+        print report
+        logging.info(report)
+        if rc == 0 and build_node.ofs_build_cache_key is not None:
+            self.storeOFSBuild(build_node)
+        return rc
+    
+    ##
+    #    @fn getOFSBuildCacheKey(self,build_node,ofs_patch_files,build_options):
+    #
+    #    Build cache key of an OrangeFS build. The source must be on build_node.
+    #
+    #    @param self The object pointer
+    #    @param build_node Node on which OrangeFS is built
+    #    @param ofs_patch_files List of local patch files
+    #    @param build_options Dictionary of the configure and make options of buildOFSFromSource
+    #
+    #    @return Key, or "" if the source could not be hashed.
+    
+    def getOFSBuildCacheKey(self,build_node,ofs_patch_files,build_options):
+        source_digest = build_node.getOFSSourceDigest()
+        if source_digest == "":
+            return ""
+        
+        patch_digests = []
+        for patch in ofs_patch_files:
+            try:
+                patch_digests.append([os.path.basename(patch),OFSBuildCache.getFileDigest(patch)])
+            except IOError:
+                logging.exception("Could not read patch %s" % patch)
+                return ""
+        
+        parts = {
+            "source" : source_digest,
+            "patches" : patch_digests,
+            "options" : build_options,
+            "distro" : build_node.distro,
+            "platform" : build_node.runSingleCommandBacktick("uname -rm")
+            }
+        key = OFSBuildCache.getKey(parts)
+        logging.info("OrangeFS build cache key %s for %r" % (key,parts))
+        return key
+    
+    ##
+    #    @fn deployCachedOFSBuild(self,build_node,key,ofs_patch_files=[]):
+    #
+    #    Deploys a cached OrangeFS build to build_node instead of building it.
+    #
+    #    @param self The object pointer
+    #    @param build_node Node on which OrangeFS is built
+    #    @param key Build cache key
+    #    @param ofs_patch_files Patches are still applied, so the source matches the build.
+    #
+    #    @return 0 if the build was deployed. Not 0 if it was not cached or could not be deployed.
+    
+    def deployCachedOFSBuild(self,build_node,key,ofs_patch_files=[]):
+        entry = self.build_cache.lookup(key)
+        if entry is None:
+            print "OrangeFS build %s is not cached. Building." % key
+            return 1
+        
+        attributes = entry.get("attributes",{})
+        ofs_prefix = attributes.get("ofs_installation_location")
+        if ofs_prefix is None or ofs_prefix == "":
+            return 1
+        
+        print "Deploying cached OrangeFS build %s to %s" % (key,build_node.hostname)
+        remote_archive = "/tmp/ofs-build-%s.tar.gz" % key
+        rc = self.local_master.copyToRemoteNode(self.build_cache.getArchivePath(key),build_node,remote_archive,False)
+        if rc == 0:
+            rc = build_node.deployOFSInstallationArchive(remote_archive,ofs_prefix)
+        build_node.runSingleCommand("rm -f %s" % remote_archive)
+        if rc != 0:
+            logging.exception("Could not deploy cached OrangeFS build %s. Building." % key)
+            self.build_cache.invalidate(key)
+            return rc
+        
+        build_node.patchOFSSource(ofs_patch_files)
+        for name in OFSBuildCache.BUILD_ATTRIBUTES:
+            if name in attributes:
+                setattr(build_node,name,attributes[name])
+        if build_node.ofs_mount_point == "":
+            build_node.ofs_mount_point = "/tmp/mount/orangefs"
+        build_node.ofs_build_cached = True
+        return 0
+    
+    ##
+    #    @fn storeOFSBuild(self,build_node):
+    #
+    #    Adds the installed OrangeFS build on build_node to the build cache under build_node.ofs_build_cache_key.
+    #
+    #    @param self The object pointer
+    #    @param build_node Node on which OrangeFS was built and installed
+    #
+    #    @return 0 on success. Not 0 if the build could not be cached. The build is fine either way.
+    
+    def storeOFSBuild(self,build_node):
+        key = build_node.ofs_build_cache_key
+        remote_archive = "/tmp/ofs-build-%s.tar.gz" % key
+        rc = build_node.archiveOFSInstallation(remote_archive)
+        if rc == 0:
+            # copy next to the cache first. The cache moves it in place.
+            local_archive = "%s.%d.part" % (self.build_cache.getArchivePath(key),os.getpid())
+            if not os.path.isdir(self.build_cache.directory):
+                os.makedirs(self.build_cache.directory)
+            rc = self.local_master.copyFromRemoteNode(build_node,remote_archive,local_archive,False)
+            if rc == 0:
+                attributes = dict([(name,getattr(build_node,name)) for name in OFSBuildCache.BUILD_ATTRIBUTES])
+                self.build_cache.store(key,local_archive,attributes,"%s %s on %s %s" % (build_node.ofs_branch,build_node.ofs_installation_location,build_node.distro,build_node.kernel_version))
+                print "Stored OrangeFS build %s in the build cache" % key
+            elif os.path.exists(local_archive):
+                os.remove(local_archive)
+        build_node.runSingleCommand("rm -f %s" % remote_archive)
+        if rc != 0:
+            logging.exception("Could not store OrangeFS build %s in the build cache" % key)
+        return rc
     
    
     ##    
@@ -812,11 +1626,24 @@ class OFSTestNetwork(object):
     #    
     #    @param self The object pointer
     #    @param destination_list List of nodes to copy OrangeFS to. OFS should already be at destination_list[0].
+    #
+    #    @return 0 on success. Number of nodes without the installation on failure.
         
     def copyOFSToNodeList(self,destination_list=None):
         if destination_list is None:
             destination_list = self.network_nodes;
-        self.copyResourceToNodeList(node_function=OFSTestNode.OFSTestNode.copyOFSInstallationToNode,destination_list=destination_list)
+        source_node = destination_list[0]
+        failed = self.broadcast(source_node,[source_node.ofs_installation_location],destination_list[1:])
+        # fall back to rsync for the nodes the broadcast did not reach.
+        if len(failed) > 0:
+            self.copyResourceToNodeList(node_function=OFSTestNode.OFSTestNode.copyOFSInstallationToNode,destination_list=[source_node]+failed)
+        for node in destination_list[1:]:
+            if node not in failed:
+                node.setOFSInstallationFromNode(source_node)
+        if len(failed) > 0:
+            # the rsync copy does not report errors.
+            return self.verifyNodes(failed,"ofs_installation_location","/bin/pvfs2-ping")
+        return 0
 
 
 
@@ -832,7 +1659,83 @@ class OFSTestNetwork(object):
     def copyOpenMPIToNodeList(self,destination_list=None):
         if destination_list is None:
             destination_list = self.network_nodes;
-        self.copyResourceToNodeList(node_function=OFSTestNode.OFSTestNode.copyOpenMPIInstallationToNode,destination_list=destination_list)
+        source_node = destination_list[0]
+        # OpenMPI and all MPI benchmarks go in one stream.
+        failed = self.broadcast(source_node,source_node.getOpenMPIInstallationPaths(),destination_list[1:])
+        # fall back to rsync for the nodes the broadcast did not reach.
+        if len(failed) > 0:
+            self.copyResourceToNodeList(node_function=OFSTestNode.OFSTestNode.copyOpenMPIInstallationToNode,destination_list=[source_node]+failed)
+        for node in destination_list[1:]:
+            if node not in failed:
+                node.setOpenMPIInstallationFromNode(source_node)
+
+    ##
+    #  @fn broadcast(self,source_node,paths,node_list,source_dir="/",destination_dir=None,fanout=None,compression=None):
+    #
+    # Copies files and directories from source_node to every node of node_list in one tar
+    # stream. The stream is passed from node to node through a tree with fanout children
+    # per node while each node unpacks it. See OFSBroadcast. Prints the bandwidth of each hop.
+    #
+    #    @param self The object pointer
+    #    @param source_node Node that has the files.
+    #    @param paths Files and directories to copy. Relative to source_dir, or absolute if source_dir is "/".
+    #    @param node_list Nodes to copy to. source_node is skipped.
+    #    @param source_dir Directory on source_node the paths are relative to.
+    #    @param destination_dir Directory on the nodes the paths are unpacked into. Default is source_dir.
+    #    @param fanout Children per node. 1 is a chain. Default is self.broadcast_fanout.
+    #    @param compression Compression of the stream. Default is self.broadcast_compression.
+    #
+    #    @return List of nodes that did not get the files.
+
+    def broadcast(self,source_node,paths,node_list,source_dir="/",destination_dir=None,fanout=None,compression=None):
+        if destination_dir is None:
+            destination_dir = source_dir
+        if fanout is None:
+            fanout = self.broadcast_fanout
+        if compression is None:
+            compression = self.broadcast_compression
+        
+        node_list = [node for node in node_list if node is not source_node]
+        paths = [path.lstrip("/") for path in paths if path is not None and path.strip("/") != ""]
+        if len(node_list) == 0 or len(paths) == 0:
+            return []
+        
+        # node 0 is the source. Each relay reaches its children by internal address, like rsync.
+        nodes = [source_node] + node_list
+        tree = OFSBroadcast.getTree(len(nodes),fanout)
+        edges = []
+        for (parent,child) in tree:
+            try:
+                key = nodes[parent].getRemoteKeyFile(nodes[child].ext_ip_address)
+            except KeyError:
+                key = None
+            edges.append((parent,child,"%s@%s" % (nodes[child].current_user,nodes[child].ip_address),key))
+        
+        msg = "Broadcasting %s from %s to %d nodes (fanout %d, compression %s)" % (",".join(paths),source_node.hostname,len(node_list),fanout,compression)
+        print msg
+        logging.info(msg)
+        
+        command = OFSBroadcast.getSendCommand(OFSBroadcast.getPlan(edges),paths,source_dir,destination_dir,compression,token=uuid.uuid4().hex)
+        output = []
+        start = time.time()
+        source_node.runSingleCommand(command,output)
+        elapsed = time.time() - start
+        
+        report = {}
+        if len(output) > 1:
+            report = OFSBroadcast.parseReport(output[1])
+        msg = OFSBroadcast.formatReport(report,[node.hostname for node in nodes],tree)
+        print msg
+        logging.info(msg)
+        
+        failed = [nodes[index] for index in range(1,len(nodes)) if report.get(index,{}).get("rc") != 0]
+        total = report.get(0,{}).get("bytes",0)
+        msg = "Broadcast of %.1f MB to %d nodes took %.1fs. %d failed." % (total/1048576.0,len(node_list),elapsed,len(failed))
+        print msg
+        logging.info(msg)
+        if len(failed) > 0:
+            logging.warn("Broadcast did not reach %s" % ",".join([node.hostname for node in failed]))
+        return failed
 
 
     ##    
@@ -928,8 +1831,13 @@ class OFSTestNetwork(object):
     def stopOFSServers(self,node_list=None):
         if node_list is None:
             node_list = self.network_nodes
-        self.runSimultaneousCommands(node_list=node_list,node_function=OFSTestNode.OFSTestNode.stopOFSServer)
-        time.sleep(20)
+        self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.stopOFSServerAsync)
+        
+        def isStopped(node):
+            running = yield node.isProcessRunningAsync("pvfs2-server")
+            raise OFSExecutionEngine.Return(not running)
+        
+        self.gather(node_list=node_list,op=lambda node: OFSTestWait.waitUntilAsync(isStopped,"OrangeFS server exit on %s" % node.hostname,timeout=60,old_wait=20,args=[node]))
 
    
     ##    
@@ -939,13 +1847,25 @@ class OFSTestNetwork(object):
     #
     #    @param self The object pointer
     #    @param node_list List of nodes in network.
+    #
+    #    @return 0 on success. Number of nodes where the servers could not start, or 1 if the servers do not answer.
      
 
     def startOFSServers(self,node_list=None):
         if node_list is None:
             node_list = self.network_nodes
-        self.runSimultaneousCommands(node_list=node_list,node_function=OFSTestNode.OFSTestNode.startOFSServer)
-        time.sleep(20)
+        results = self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.startOFSServerAsync)
+        failed = [node for node in node_list if results[node] != 0]
+        for node in failed:
+            print "Could not start the OrangeFS servers on %s" % node.hostname
+        if len(failed) > 0:
+            return len(failed)
+        # all servers answer pvfs2-ping once the file system is up.
+        node = node_list[0]
+        if not OFSExecutionEngine.runCoroutine(OFSTestWait.waitUntilAsync(node.isOFSServerReadyAsync,"OrangeFS servers",timeout=120,old_wait=20)):
+            print "OrangeFS servers do not answer pvfs2-ping"
+            return 1
+        return 0
 
    
     ##    
@@ -956,13 +1876,18 @@ class OFSTestNetwork(object):
     #    @param security OFS security mode: None,"Key","Cert"
     #    @param node_list List of nodes in network.
     #    @param disable_acache Disable the acache
+    #
+    #    @return 0 on success. Number of nodes where the client could not start on failure.
      
 
     def startOFSClientAllNodes(self,security=None,node_list=None,disable_acache=False):
         if node_list is None:
             node_list = self.network_nodes
-        for node in node_list:
-            self.startOFSClient(client_node=node,security=security,disable_acache=disable_acache)
+        results = self.gather(node_list=node_list,op=self.startOFSClientAsync,kwargs={'security':security,'disable_acache':disable_acache})
+        failed = [node for node in node_list if results[node] != 0]
+        for node in failed:
+            print "Could not start the OrangeFS client on %s" % node.hostname
+        return len(failed)
    
     ##    
     #    @fn startOFSClient(self,client_node=None,security=None,disable_acache=False):
@@ -980,13 +1905,28 @@ class OFSTestNetwork(object):
             node_list = self.network_nodes
         if client_node is None:
             client_node = node_list[0]
-        client_node.installKernelModule()
-        #client_node.runSingleCommand('/sbin/lsmod | grep pvfs')
-        client_node.startOFSClient(security=security,disable_acache=disable_acache)
+        return OFSExecutionEngine.runCoroutine(self.startOFSClientAsync(client_node,security,disable_acache))
 
+    ##
+    # @fn startOFSClientAsync(self,client_node,security=None,disable_acache=False):
+    #
+    #    Coroutine version of startOFSClient. See OFSExecutionEngine.
+    #
+    #    @param self The object pointer
+    #    @param client_node Node on which to run OrangeFS client
+    #    @param security OFS security mode: None,"Key","Cert"
+    #    @param disable_acache Disable the acache
 
-        time.sleep(10)
+    def startOFSClientAsync(self,client_node,security=None,disable_acache=False):
+        yield client_node.installKernelModuleAsync()
+        #client_node.runSingleCommand('/sbin/lsmod | grep pvfs')
+        rc = yield client_node.startOFSClientAsync(security=security,disable_acache=disable_acache)
+
+        running = yield OFSTestWait.waitUntilAsync(client_node.isProcessRunningAsync,"pvfs2-client-core on %s" % client_node.hostname,timeout=60,old_wait=10,args=["pvfs2-client-core"])
+        if rc == 0 and not running:
+            rc = 1
         #client_node.runSingleCommand('ps aux | grep pvfs')
+        raise OFSExecutionEngine.Return(rc)
 
     ##
     # @fn mountOFSFilesystem(self,mount_fuse=False,client_node=None,node_list=None):
@@ -1002,12 +1942,27 @@ class OFSTestNetwork(object):
             node_list = self.network_nodes
         if client_node is None:
             client_node = node_list[0]
-        client_node.mountOFSFilesystem(mount_fuse=mount_fuse)
-        time.sleep(10)
-        print "Checking mount"
-        mount_res=client_node.runSingleCommandBacktick("mount | grep -i pvfs")
+        return OFSExecutionEngine.runCoroutine(self.mountOFSFilesystemAsync(client_node,mount_fuse))
+
+    ##
+    # @fn mountOFSFilesystemAsync(self,client_node,mount_fuse=False):
+    #
+    #    Coroutine version of mountOFSFilesystem. See OFSExecutionEngine.
+    #
+    #    @param self The object pointer
+    #    @param client_node Node on which to run OrangeFS client
+    #    @param mount_fuse Mount using fuse module?
+
+    def mountOFSFilesystemAsync(self,client_node,mount_fuse=False):
+        # mountOFSFilesystemAsync waits for the mount.
+        yield client_node.mountOFSFilesystemAsync(mount_fuse=mount_fuse)
+        output = []
+        rc = yield client_node.runSingleCommandAsync("mount | grep -i pvfs",output)
+        mount_res = output[1].rstrip('\n')
+        print "Checking mount on %s" % client_node.hostname
         print mount_res
         logging.info("Checking Mount: "+mount_res)
+        raise OFSExecutionEngine.Return(rc)
 
    
     ##    
@@ -1020,10 +1975,9 @@ class OFSTestNetwork(object):
 
 
     def mountOFSFilesystemAllNodes(self,mount_fuse=False,node_list=None):
-        
-        # TODO: make this multithreaded
-        for node in self.network_nodes:
-            self.mountOFSFilesystem(mount_fuse=mount_fuse,client_node=node)
+        if node_list is None:
+            node_list = self.network_nodes
+        return self.gather(node_list=node_list,op=self.mountOFSFilesystemAsync,kwargs={'mount_fuse':mount_fuse})
    
     ##    
     #    @fn stopOFSClient(self,client_node=None,node_list=None):
@@ -1055,9 +2009,7 @@ class OFSTestNetwork(object):
     def stopOFSClientAllNodes(self,node_list=None):
         if node_list is None:
             node_list = self.network_nodes
-        # TODO: make this multithreaded
-        for node in node_list:
-            self.stopOFSClient(node)
+        return self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.stopOFSClientAsync)
 
    
     ##    
@@ -1073,9 +2025,7 @@ class OFSTestNetwork(object):
     def unmountOFSFilesystemAllNodes(self,node_list=None):
         if node_list is None:
             node_list = self.network_nodes
-        # TODO: make this multithreaded
-        for node in node_list:
-            node.unmountOFSFilesystem()
+        return self.gather(node_list=node_list,op=OFSTestNode.OFSTestNode.unmountOFSFilesystemAsync)
 
    
     ##    
@@ -1662,6 +2612,18 @@ class OFSTestNetwork(object):
         # remove list of slaves. We will be rebuilding it.
         master_node.runSingleCommand("rm %s/conf/slaves" % master_node.hadoop_location)
 
+        # copy templates to all nodes in one broadcast
+        if master_node.hadoop_version == "hadoop-1.2.1":
+            conf_templates = "%s/src/client/hadoop/orangefs-hadoop1/src/main/resources/conf" % master_node.ofs_source_location
+            hadoop_conf = master_node.hadoop_location+"/conf"
+        else:
+            conf_templates = "%s/src/client/hadoop/orangefs-hadoop2/src/main/resources/conf" % master_node.ofs_source_location
+            hadoop_conf = master_node.hadoop_location+"/etc/hadoop"
+        master_node.runSingleCommand("mkdir -p %s && cp -a %s/. %s/" % (hadoop_conf,conf_templates,hadoop_conf))
+        failed = self.broadcast(master_node,["."],hadoop_nodes,source_dir=conf_templates,destination_dir=hadoop_conf)
+        for node in failed:
+            master_node.copyToRemoteNode(source="%s/" % conf_templates,destination_node=node,destination="%s/" % (hadoop_conf),recursive=True)
+
 
         for node in hadoop_nodes:
             
@@ -1669,14 +2631,12 @@ class OFSTestNetwork(object):
             node.hadoop_location = "/opt/"+master_node.hadoop_version
             node.hadoop_examples_location = node.hadoop_location+"/share/hadoop/mapreduce/hadoop*examples*.jar"
             node.hadoop_test_location = node.hadoop_location+"/share/hadoop/mapreduce/hadoop-mapreduce-client-jobclient-*-tests.jar"
-            # copy templates to node
+            # templates were copied to node above
             #master_node.copyToRemoteNode(source="%s/test/automated/hadoop-tests.d/conf/" % master_node.ofs_source_location,destination_node=node,destination="%s/conf/" % node.hadoop_location,recursive=True)
             if master_node.hadoop_version == "hadoop-1.2.1":
                 hadoop_conf=node.hadoop_location+"/conf"
-                master_node.copyToRemoteNode(source="%s/src/client/hadoop/orangefs-hadoop1/src/main/resources/conf/" % master_node.ofs_source_location,destination_node=node,destination="%s/" % (hadoop_conf),recursive=True)
             else:
                 hadoop_conf=node.hadoop_location+"/etc/hadoop"
-                master_node.copyToRemoteNode(source="%s/src/client/hadoop/orangefs-hadoop2/src/main/resources/conf/" % master_node.ofs_source_location,destination_node=node,destination="%s/" % (hadoop_conf),recursive=True)
 #              setup hadoop-env.sh
                      #JAVA_HOME should be set in the image.
             node.jdk6_location = node.runSingleCommandBacktick("echo \$JAVA_HOME")
@@ -1720,13 +2680,14 @@ class OFSTestNetwork(object):
         else:
             master_node.runSingleCommand("%s/src/client/hadoop/orangefs-hadoop2/scripts/examples/hadoop/start_hadoop.sh" % master_node.ofs_source_location)
             
-        time.sleep(20)
         # hadoop dfs -ls is our "ping" for hadoop. 
-        rc = master_node.runSingleCommand("%s/bin/hadoop dfs -ls /" % master_node.hadoop_location)
-        if rc != 0:
+        ready = OFSTestWait.waitUntil(lambda: master_node.runSingleCommand("%s/bin/hadoop dfs -ls /" % master_node.hadoop_location) == 0,"hadoop on %s" % master_node.hostname,timeout=120,old_wait=20,initial_delay=2)
+        if not ready:
             print "Hadoop setup failed. See logs for more information."
+            rc = 1
         else:
             print "Hadoop setup successfully"
+            rc = 0
             master_node.runSingleCommand("%s/bin/hadoop dfs -mkdir -p /user/%s" % (master_node.hadoop_location,master_node.current_user))
             
         return rc
@@ -1757,22 +2718,27 @@ class OFSTestNetwork(object):
     ##
     # @fn checkNetwork(self):
     #
-    # Checks connectivity between the nodes in the network.
+    # Checks connectivity between the nodes in the network. Every node pings every node by
+    # hostname and connects to the OrangeFS TCP port. See getConnectivityMatrix.
     #
     # @param self the object pointer
     #
-    #
+    # @return Number of node pairs that could not ping.
         
     def checkNetwork(self):
         
         print "==========================================================================="
         print "Testing network connectivity"
         
+        port = 0
+        if len(self.network_nodes) > 0:
+            port = self.network_nodes[0].ofs_tcp_port
+        matrix = self.getConnectivityMatrix(port=port)
+        
         failed = 0
         for srcnode in self.network_nodes:
             for destnode in self.network_nodes:
-                rc = srcnode.runSingleCommandAsRoot("ping -c 1 %s" % destnode.hostname)
-                if rc != 0:
+                if matrix[srcnode.hostname][destnode.hostname]["ping"] != True:
                     print "Could not ping %s from %s." % (destnode.hostname,srcnode.hostname)
                     failed = failed + 1
         
@@ -1781,22 +2747,127 @@ class OFSTestNetwork(object):
        
         
         return failed
+    
+    ##
+    # @fn getConnectivityMatrix(self,node_list=None,port=0,remote_user="root"):
+    #
+    # Checks all pairs of nodes. Each source node runs one connectivity check for all
+    # destinations. The sources run in parallel. See OFSConnectivityCheck.
+    #
+    # The matrix is kept in connectivity_matrix for writeConnectivityMatrix.
+    #
+    # @param self the object pointer
+    # @param node_list List of nodes. Default is all nodes in network.
+    # @param port TCP port to connect to, e.g. ofs_tcp_port. 0 checks ping only.
+    # @param remote_user User to run the checks as.
+    #
+    # @return Dictionary source hostname -> destination hostname -> result, with ping,
+    # rtt_ms, tcp and tcp_ms. See OFSConnectivityCheck.parseCheckOutput.
+    
+    def getConnectivityMatrix(self,node_list=None,port=0,remote_user="root"):
+        if node_list is None:
+            node_list = self.network_nodes
+        
+        destinations = [node.hostname for node in node_list]
+        results = self.gather(node_list,OFSTestNode.OFSTestNode.checkConnectivityAsync,args=[destinations,port,remote_user])
+        
+        matrix = {}
+        for node in node_list:
+            row = results[node]
+            if isinstance(row,Exception):
+                row = dict([(destination,OFSConnectivityCheck.getUnreachableResult()) for destination in destinations])
+            matrix[node.hostname] = row
+        
+        self.connectivity_matrix = matrix
+        self.connectivity_matrix_nodes = destinations
+        return matrix
+    
+    ##
+    # @fn writeConnectivityMatrix(self,filename):
+    #
+    # Writes the round trip time tables of the last getConnectivityMatrix to filename.
+    #
+    # @param self the object pointer
+    # @param filename Output file
+    
+    def writeConnectivityMatrix(self,filename):
+        if self.connectivity_matrix is None:
+            return
+        output = open(filename,"w")
+        output.write(OFSConnectivityCheck.formatMatrix(self.connectivity_matrix,self.connectivity_matrix_nodes))
+        output.write("\n")
+        output.close()
   
     ##
     # @fn checkExternalConnectivity(self):
     #
-    # Checks connectivity to the nodes in the network from the local machine via ping
+    # Checks connectivity to the nodes in the network from the local machine via ping.
+    # All nodes are checked at once. The ssh port is checked too, for the log.
     #
     # @param self the object pointer
     #
-    #
+    # @return Number of nodes that could not be pinged.
     
     def checkExternalConnectivity(self):
+        destinations = [node.ext_ip_address for node in self.network_nodes]
+        results = self.local_master.checkConnectivity(destinations,port=22)
         rc = 0
-        for node in self.network_nodes:
-            rc += self.local_master.runSingleCommandAsRoot("ping -c 1 %s" % node.ext_ip_address )
+        for destination in destinations:
+            result = results[destination]
+            logging.info("External connectivity to %s: ping %r (%r ms), ssh %r (%r ms)" % (destination,result["ping"],result["rtt_ms"],result["tcp"],result["tcp_ms"]))
+            if result["ping"] != True:
+                rc += 1
         return rc
     
+    
+    ##
+    # @fn verifyNodes(self,node_list=None,attribute=None,suffix=""):
+    #
+    #    Checks that the nodes answer and, if attribute is given, that the path in that node
+    #    attribute exists on each of them. Verifies resumed setup stages. See OFSCheckpoint.
+    #
+    #    @param self The object pointer
+    #    @param node_list Nodes to check
+    #    @param attribute Name of an OFSTestNode attribute that holds a path, e.g. ofs_installation_location.
+    #    @param suffix Appended to the path, e.g. /bin/pvfs2-ping.
+    #
+    #    @return Number of nodes where the check failed.
+    
+    def verifyNodes(self,node_list=None,attribute=None,suffix=""):
+        if node_list is None:
+            node_list = self.network_nodes
+        commands = {}
+        for node in node_list:
+            if attribute is None:
+                commands[node] = "true"
+            elif getattr(node,attribute,"") in [None,""]:
+                commands[node] = None
+            else:
+                commands[node] = "test -e %s%s" % (getattr(node,attribute),suffix)
+        checked = [node for node in node_list if commands[node] is not None]
+        results = self.gather(node_list=checked,op=lambda node: node.runSingleCommandAsync(commands[node]))
+        failed = [node for node in node_list if commands[node] is None or results[node] != 0]
+        for node in failed:
+            if attribute is None:
+                logging.info("%s does not answer" % node.hostname)
+            else:
+                logging.info("%s%s is not on %s" % (getattr(node,attribute,""),suffix,node.hostname))
+        return len(failed)
+    
+    ##
+    # @fn verifyOFSServers(self,node_list=None):
+    #
+    #    @param self The object pointer
+    #    @param node_list Nodes of the file system. The first node pings the servers.
+    #
+    #    @return 0 if the OrangeFS servers answer.
+    
+    def verifyOFSServers(self,node_list=None):
+        if node_list is None:
+            node_list = self.network_nodes
+        if OFSExecutionEngine.runCoroutine(node_list[0].isOFSServerReadyAsync()):
+            return 0
+        return 1
     ##
     # @fn getInstanceList()
     #
@@ -27,17 +27,69 @@
 
 import os
 import subprocess
+import threading
 import shlex
 import cmd
 import time
 import sys
 import traceback
 import logging
+import OFSRemoteAgent
+import OFSOutputCapture
+import OFSExecutionEngine
+import OFSTestWait
+import OFSCommandWatchdog
+import OFSNodeProbe
+import OFSNodeFactsCache
+import OFSConnectivityCheck
+import OFSTestTrace
+import OFSBuildStats
+import OFSDistributedBuild
+import OFSKernelPackage
+import OFSProvisioningCache
+import uuid
+import base64
+import hashlib
 
 ## @var batch_count
 # global variable for batch counting
 batch_count = 0
 
+## @var ETC_HOSTS_BEGIN
+# First line of the section of /etc/hosts written by updateHostFiles.
+ETC_HOSTS_BEGIN = "# BEGIN OFSTest managed hosts"
+
+## @var ETC_HOSTS_END
+# Last line of the section of /etc/hosts written by updateHostFiles.
+ETC_HOSTS_END = "# END OFSTest managed hosts"
+
+## @var COMMAND_TIMEOUT_RC
+# Return code of a command or test that was killed by its timeout. No real exit status or
+# signal gives this value.
+COMMAND_TIMEOUT_RC = -124
+
+## @var command_owner
+# Thread local. command_owner.node is the node the thread works for, if any. See setCommandOwner.
+command_owner = threading.local()
+
+##
+# @fn setCommandOwner(node):
+# Marks the calling thread as working for node. Commands the thread runs on other nodes,
+# e.g. an rsync on the local machine, are then also cancelled by node.cancelCommands().
+#
+# @param node OFSTestNode, or None.
+
+def setCommandOwner(node):
+    command_owner.node = node
+
+##
+# @fn getCommandOwner():
+#
+# @return Node the calling thread works for, or None.
+
+def getCommandOwner():
+    return getattr(command_owner,"node",None)
+
 class OFSTestNode(object):
     
     ## @var node_number
@@ -103,6 +155,86 @@ class OFSTestNode(object):
         # type of processor (i386/x86_64)
         self.processor_type = "x86_64"
         
+        ## @var node_facts
+        # Last reply of the node fact probe. See OFSNodeProbe.
+        self.node_facts = {}
+        
+        ## @var numa_nodes
+        # NUMA layout. List of dictionaries with node, cpus (cpulist) and memory_kb.
+        self.numa_nodes = []
+        
+        ## @var total_memory_kb
+        # Total memory in kB
+        self.total_memory_kb = 0
+        
+        ## @var boot_id
+        # Linux boot id. Changes on every reboot.
+        self.boot_id = ""
+        
+        ## @var ofs_module_loaded
+        # Is the OrangeFS/pvfs2 kernel module loaded?
+        self.ofs_module_loaded = False
+        
+        ## @var ofs_module_available
+        # Can the OrangeFS/pvfs2 kernel module be loaded with modprobe?
+        self.ofs_module_available = False
+        
+        ## @var free_disk_kb
+        # Free disk space in kB at each probed data location.
+        self.free_disk_kb = {}
+        
+        ## @var node_facts_cache
+        # OFSNodeFactsCache shared by the network. None disables caching.
+        self.node_facts_cache = None
+        
+        ## @var test_record
+        # Package, name, node, start, end, rc, log files and metrics of the last test run by runOFSTest. See OFSResultsStore.
+        self.test_record = None
+        
+        ## @var ofs_build_cache_key
+        # Build cache key of the OrangeFS build on this node. None if the build is not to be cached. See OFSBuildCache.
+        self.ofs_build_cache_key = None
+        
+        ## @var ofs_build_cached
+        # True if the OrangeFS installation was deployed from the build cache. Nothing is left to build or install.
+        self.ofs_build_cached = False
+        
+        ## @var incremental_build
+        # Keep the build directory between runs and only rebuild what changed. See setupIncrementalBuild.
+        self.incremental_build = False
+        
+        ## @var ofs_build_location
+        # Build directory that is kept between runs in incremental mode.
+        self.ofs_build_location = ""
+        
+        ## @var ccache_dir
+        # ccache directory on this node. Empty string if ccache is not used.
+        self.ccache_dir = ""
+        
+        ## @var make_jobs
+        # Parallel make jobs. None uses the number of cores.
+        self.make_jobs = None
+        
+        ## @var distcc_hosts
+        # DISTCC_HOSTS of distributed builds. Empty string builds on this node alone. See OFSTestNetwork.setupDistributedBuild.
+        self.distcc_hosts = ""
+        
+        ## @var distcc_jobs
+        # Parallel make jobs of distributed builds.
+        self.distcc_jobs = 0
+        
+        ## @var provisioning_cache_url
+        # http://address:port of the provisioning cache. Empty string downloads directly. See OFSProvisioningCache.
+        self.provisioning_cache_url = ""
+        
+        ## @var build_stage_times
+        # List of (stage,seconds,rc) of the last OrangeFS build. See runBuildStage.
+        self.build_stage_times = []
+        
+        ## @var ccache_stats
+        # ccache statistics before the last OrangeFS build. See OFSBuildStats.parseCCacheStats.
+        self.ccache_stats = None
+        
         #------
         #
         # shell variables
@@ -113,6 +245,14 @@ class OFSTestNode(object):
         # main user login. Usually cloud-user for cloud instances.
         self.current_user = ""
         
+        ## @var directory_state
+        # Working directories of threads other than the main thread. See getCurrentDirectory.
+        self.directory_state = threading.local()
+        
+        ## @var main_directories
+        # (current,previous) directory of the main thread. Other threads start from it.
+        self.main_directories = ("~","~")
+        
         ## @var current_directory
         # current working directory
         self.current_directory = "~"
@@ -146,6 +286,44 @@ class OFSTestNode(object):
         # The keytable is a dictionary of locations of keys to remote machines on the current node.
         self.keytable = {}
         
+        ## @var ssh_connection
+        # OFSSSHConnectionManager for the persistent ssh connection from the local machine to this node.
+        # None for the local node.
+        self.ssh_connection = None
+        
+        ## @var use_remote_agent
+        # Run commands through a persistent OFSRemoteAgent instead of one ssh process per command?
+        self.use_remote_agent = False
+        
+        ## @var remote_agents
+        # Dictionary of running OFSRemoteAgents on this node, keyed by remote user.
+        self.remote_agents = {}
+        
+        ## @var running_processes
+        # Local processes (ssh, rsync, batch files) of the commands running for this node right now.
+        self.running_processes = []
+        
+        ## @var process_lock
+        # Protects running_processes and commands_cancelled.
+        self.process_lock = threading.Lock()
+        
+        ## @var commands_cancelled
+        # Set by cancelCommands(). While set, new commands fail at once.
+        self.commands_cancelled = False
+        
+        ## @var environment_lock
+        # Serializes saveEnvironment(). Setup steps running at the same time would otherwise
+        # interleave their rewrites of /etc/profile.d/orangefs.sh.
+        self.environment_lock = threading.Lock()
+        
+        ## @var command_timeout
+        # Default timeout in seconds for every command on this node. None is no timeout.
+        self.command_timeout = None
+        
+        ## @var command_deadline
+        # Time after which no command may run. Set by runOFSTest while a test with a timeout runs.
+        self.command_deadline = None
+        
         #----------------------------------------------------------
         #
         # orangefs related variables
@@ -316,7 +494,8 @@ class OFSTestNode(object):
     # 
     # @fn currentNodeInformation(self):
     #
-    # Logs into the node to gain information about the system
+    # Logs into the node to gain information about the system. All facts come from one
+    # run of the node fact probe (see probeNodeFacts).
     #
     # @param self The object pointer
     
@@ -325,15 +504,13 @@ class OFSTestNode(object):
         
         self.distro = ""
 
-
+        # A warm node from the last run needs no discovery.
+        facts = self.loadNodeFactsFromCache()
+        
         # can we ssh in? We'll need the group if we can't, so let's try this first.
-        #rc = self.runSingleCommand("ls -l /home/ | grep %s | awk '{print \\$4}'" % self.current_user)
-        self.current_group = self.runSingleCommandBacktick(command="ls -l /home/ | grep %s | awk '{print \\$4}'" % self.current_user)
-
-        # is this a mac? Home located under /Users
-        # Wow, this is ugly. Need to stop hardcoding "/home"
-        if self.current_group.rstrip() == "":
-            self.current_group = self.runSingleCommandBacktick(command="ls -l /Users/ | grep %s | awk '{print \\$4}'" % self.current_user)
+        if facts is None:
+            facts = self.probeNodeFacts()
+        self.current_group = facts["home_group"]
 
         logging.info("Current group is "+self.current_group)
 
@@ -341,7 +518,8 @@ class OFSTestNode(object):
         # Gross hackery for SuseStudio images. OpenStack injects key into root, not user.
                     
         if self.current_group.rstrip() == "":
-            self.current_group = self.runSingleCommandBacktick(command="ls -l /home/ | grep %s | awk '{print \\$4}'" % self.current_user,remote_user="root")
+            facts = self.probeNodeFacts(remote_user="root")
+            self.current_group = facts["home_group"]
 
             logging.info("Current group for %s (from root) is %s" % (self.current_user,self.current_group))
             if self.current_group.rstrip() == "":
@@ -367,48 +545,14 @@ class OFSTestNode(object):
             # only implement this when we want to implement it.
             self.allowRootSshAccess();
                 
-        
-
-        # get kernel version and processor type
-        self.kernel_version = self.runSingleCommandBacktick("uname -r")
-        self.processor_type = self.runSingleCommandBacktick("uname -p")
-        self.number_cores = int(self.runSingleCommandBacktick("grep processor /proc/cpuinfo | wc -l"))
-        
-        
-        # Find the distribution. Unfortunately Linux distributions each have their own file for distribution information.
-            
-        # information for ubuntu and suse is in /etc/os-release
-
-        if self.runSingleCommand('test -f /etc/os-release') == 0:
-            #print "SuSE or Ubuntu based machine found"
-            pretty_name = self.runSingleCommandBacktick("cat /etc/os-release | grep PRETTY_NAME")
-            [var,self.distro] = pretty_name.split("=")
-        # for redhat based distributions, information is in /etc/system-release
-        elif self.runSingleCommand('test -f /etc/redhat-release') == 0:
-            #print "RedHat based machine found"
-            self.distro = self.runSingleCommandBacktick("cat /etc/redhat-release")
-        elif self.runSingleCommand('test -f /etc/lsb-release') == 0:
-            #print "Ubuntu based machine found"
-            #print self.runSingleCommandBacktick("cat /etc/lsb-release ")
-            pretty_name = self.runSingleCommandBacktick("cat /etc/lsb-release | grep DISTRIB_DESCRIPTION")
-            #print "Pretty name " + pretty_name
-            [var,self.distro] = pretty_name.split("=")    
-        # Mac OS X 
-        elif self.runSingleCommand('test -f /etc/SuSE-release') == 0: 
-            self.distro = self.runSingleCommandBacktick("head -n 1 /etc/SuSE-release").rstrip()
-
-            
-        elif self.runSingleCommandBacktick("uname").rstrip() == "Darwin":
-            #print "Mac OS X based machine found"
-            self.distro = "Mac OS X-%s" % self.runSingleCommandBacktick("sw_vers -productVersion")
+        # kernel version, processor type, cores, distribution and hostname
+        self.applyNodeFacts(facts)
         
         # Disable GSSAPI authentication, because it slows EVERYTHING down.
         # http://stackoverflow.com/questions/21498322/unexpected-behavior-of-ssh-in-centos-6-x
         #self.runSingleCommandAsBatch("sudo sed -i 's/GSSAPIAuthentication yes/GSSAPIAuthentication no/g' /etc/ssh/sshd", output)
         #self.runSingleCommandAsBatch("nohup sudo service sshd restart &", output)
         #time.sleep(15)
-        # get the hostname
-        self.hostname = self.runSingleCommandBacktick("hostname")
 
         # SuSE distros require a hostname kludge to get it to work. Otherwise all instances will be set to the same hostname
         # That's a better solution than what Openstack gives us. So why not? 
@@ -432,6 +576,12 @@ class OFSTestNode(object):
         else:
              logging.info("Node %s is not a Cloud Node!" % self.hostname)
         
+        # remember the facts with the hostname the node has now.
+        if self.node_facts_cache is not None:
+            facts = dict(facts)
+            facts["hostname"] = self.hostname
+            self.node_facts_cache.store(self.ip_address,self.boot_id,facts=facts)
+        
         # print out node information
         msg = "Node: %s %s %s %s" % (self.hostname,self.distro,self.kernel_version,self.processor_type)
         print msg
@@ -448,181 +598,1111 @@ class OFSTestNode(object):
         
     def allowRootSshAccess(self):
         logging.info("Cannot allow root ssh access on this machine.")
+    
+    ##
+    #
+    # @fn probeNodeFacts(self,data_locations=None,remote_user=None):
+    #
+    # Gathers the facts about this node in one remote execution. See OFSNodeProbe.
+    #
+    # @param self The object pointer
+    # @param data_locations Directories to report free disk space for. Default is the OrangeFS data, metadata and installation locations.
+    # @param remote_user User to run the probe as. Default is current user.
+    #
+    # @return Dictionary of node facts. home_group is empty if the node could not be reached.
+    
+    def probeNodeFacts(self,data_locations=None,remote_user=None):
+        return OFSExecutionEngine.runCoroutine(self.probeNodeFactsAsync(data_locations,remote_user))
+    
+    ##
+    #
+    # @fn probeNodeFactsAsync(self,data_locations=None,remote_user=None):
+    #
+    # Coroutine version of probeNodeFacts. See OFSExecutionEngine.
+    #
+    # @param self The object pointer
+    # @param data_locations Directories to report free disk space for.
+    # @param remote_user User to run the probe as. Default is current user.
+    
+    def probeNodeFactsAsync(self,data_locations=None,remote_user=None):
+        if data_locations is None:
+            data_locations = [self.ofs_data_location,self.ofs_metadata_location,self.ofs_installation_location]
         
+        output = []
+        rc = yield self.runSingleCommandAsync(OFSNodeProbe.getProbeCommand(self.current_user,data_locations),output,remote_user=remote_user)
+        facts = None
+        if rc == 0 and len(output) > 1:
+            facts = OFSNodeProbe.parseProbeOutput(output[1])
         
-       
-#==========================================================================
-# 
-# Utility functions
-#
-# These functions implement basic shell functionality 
-#
-#==========================================================================
-
+        # ssh itself failed. The caller will try another user.
+        if facts is None and rc == 255:
+            facts = {"home_group" : ""}
+        
+        # systems without bash or base64 get the facts one command at a time.
+        if facts is None:
+            logging.info("Node fact probe failed on %s. rc = %r. Using single commands." % (self.ext_ip_address,rc))
+            facts = yield self.queryNodeFactsAsync(remote_user)
+        
+        raise OFSExecutionEngine.Return(facts)
+    
     ##
-    # @fn changeDirectory(self, directory):
-    # Change the current directory on the node to run scripts.
+    #
+    # @fn checkConnectivity(self,destinations,port=0,remote_user=None):
+    #
+    # Checks whether this node can reach each destination by ping and, if port is given, by TCP.
+    # All destinations are checked at once in one remote execution. See OFSConnectivityCheck.
     #
     # @param self The object pointer
-    # @param directory New directory. Note: "-" will change to previous directory.
+    # @param destinations Hostnames or IP addresses to check.
+    # @param port TCP port to connect to. 0 checks ping only.
+    # @param remote_user User to run the check as. Default is current user.
+    #
+    # @return Dictionary destination -> result. See OFSConnectivityCheck.parseCheckOutput.
+    
+    def checkConnectivity(self,destinations,port=0,remote_user=None):
+        return OFSExecutionEngine.runCoroutine(self.checkConnectivityAsync(destinations,port,remote_user))
     
-    def changeDirectory(self, directory):
-        # cd "-" will restore previous directory
-        if directory is not "-":
-            if directory is "~":
-                directory = "/home/%s" % self.current_user 
-            self.previous_directory = self.current_directory
-            self.current_directory = directory
-        else:
-            self.restoreDirectory()
     ##
-    # @fn restoreDirectory(self):
-    # Restore directory - This restores the previous directory.
+    #
+    # @fn checkConnectivityAsync(self,destinations,port=0,remote_user=None):
+    #
+    # Coroutine version of checkConnectivity. See OFSExecutionEngine.
+    #
     # @param self The object pointer
+    # @param destinations Hostnames or IP addresses to check.
+    # @param port TCP port to connect to. 0 checks ping only.
+    # @param remote_user User to run the check as. Default is current user.
+    
+    def checkConnectivityAsync(self,destinations,port=0,remote_user=None):
+        output = []
+        rc = yield self.runSingleCommandAsync(OFSConnectivityCheck.getCheckCommand(destinations,port),output,remote_user=remote_user)
+        results = {}
+        if len(output) > 1:
+            results = OFSConnectivityCheck.parseCheckOutput(output[1])
+        if len(results) == 0:
+            logging.warn("Connectivity check did not run on %s. rc = %r" % (self.hostname,rc))
+        
+        # a destination the check could not report on is unreachable.
+        for destination in destinations:
+            if destination not in results:
+                results[destination] = OFSConnectivityCheck.getUnreachableResult()
+        raise OFSExecutionEngine.Return(results)
     
-    def restoreDirectory(self):
-        temp = self.current_directory
-        self.current_directory = self.previous_directory
-        self.previous_directory = temp
-
     ##
-    # @fn setEnvironmentVariable(self,variable,value):  
-    # set an environment variable to a value
-    # @param self The object pointer    
-    # @param variable Variable name
-    # @param value Value of variable
+    #
+    # @fn isReachableAsync(self):
+    #
+    # Readiness probe. Can a command run on the node? Tries the current user, then root. See OFSTestWait.
+    #
+    # @param self The object pointer
+    #
+    # @return (via OFSExecutionEngine.Return) True if whoami ran.
     
-    def setEnvironmentVariable(self,variable,value):
-        self.current_environment[variable] = value
-        self.saveEnvironment()
+    def isReachableAsync(self):
+        rc = yield self.runSingleCommandAsync("whoami")
+        if rc != 0:
+            rc = yield self.runSingleCommandAsRootAsync("whoami")
+        raise OFSExecutionEngine.Return(rc == 0)
     
     ##
-    # @fn unsetEnvironmentVariable(self,variable):
-    # Erase an environment variable
+    #
+    # @fn hasRebootedAsync(self,old_boot_id):
+    #
+    # Readiness probe. Is the node back up with a new boot id? See OFSTestWait.
+    #
     # @param self The object pointer
-    # @param variable Variable name
-    
-    def unsetEnvironmentVariable(self,variable):
-        del self.current_environment[variable]
-        self.saveEnvironment()
+    # @param old_boot_id Boot id before the reboot. If it is not known, any answer counts.
+    #
+    # @return (via OFSExecutionEngine.Return) True if the node answered with another boot id.
     
-    def saveEnvironment(self):
-        # Writes to /etc/profile.d/orangefs.sh
-        # Implement in subclass.
-        pass
+    def hasRebootedAsync(self,old_boot_id):
+        output = []
+        rc = yield self.runSingleCommandAsync("cat /proc/sys/kernel/random/boot_id",output)
+        if rc != 0 or len(output) < 2:
+            raise OFSExecutionEngine.Return(False)
+        boot_id = output[1].strip()
+        raise OFSExecutionEngine.Return(boot_id != "" and boot_id != old_boot_id)
     
-    ## 
-    # @fn setEnvironment(self, setenv): 
-    # This function sets the environment based on the output of setenv.
-    # 
+    ##
+    #
+    # @fn isOFSServerReadyAsync(self):
+    #
+    # Readiness probe. Do all OrangeFS servers answer pvfs2-ping from this node? See OFSTestWait.
+    #
     # @param self The object pointer
-    # @param setenv A string that is formatted like the output of the setenv command.
-     
-    def setEnvironment(self, setenv):
+    #
+    # @return (via OFSExecutionEngine.Return) True if pvfs2-ping succeeded.
+    
+    def isOFSServerReadyAsync(self):
+        rc = yield self.runSingleCommandAsync("PVFS2TAB_FILE=%s/etc/orangefstab %s/bin/pvfs2-ping -m %s" % (self.ofs_installation_location,self.ofs_installation_location,self.ofs_mount_point))
+        raise OFSExecutionEngine.Return(rc == 0)
     
-        variable_list = setenv.split('\n')
-        for variable in variable_list:
-            #split based on the equals sign
-            vname,value = variable.split('=')
-            self.setEnvironmentVariable(vname,value)
-          
     ##
-    # @fn clearEnvironment(self):
-    # Clear all environment variables
+    #
+    # @fn isOFSMountedAsync(self):
+    #
+    # Readiness probe. Is OrangeFS mounted at ofs_mount_point? See OFSTestWait.
+    #
     # @param self The object pointer
+    #
+    # @return (via OFSExecutionEngine.Return) True if it is mounted.
     
-    def clearEnvironment(self):
-        self.current_environment = {}
+    def isOFSMountedAsync(self):
+        rc = yield self.runSingleCommandAsync("mount | grep -q ' %s '" % self.ofs_mount_point)
+        raise OFSExecutionEngine.Return(rc == 0)
     
     ##
-    # @fn printWorkingDirectory(self):  
-    # 
+    #
+    # @fn isProcessRunningAsync(self,name):
+    #
+    # Readiness probe. Is a process with this command line running? See OFSTestWait.
+    #
     # @param self The object pointer
-    # @return current directory
+    # @param name Process name or command line, e.g. "pvfs2-client-core". Extended regular expression.
+    #
+    # @return (via OFSExecutionEngine.Return) True if a matching process runs.
     
-    def printWorkingDirectory(self):
-        return self.current_directory
+    def isProcessRunningAsync(self,name):
+        # [x]yz keeps pgrep from finding the shell that runs it.
+        rc = yield self.runSingleCommandAsync("pgrep -f '[%s]%s' > /dev/null" % (name[0],name[1:]))
+        raise OFSExecutionEngine.Return(rc == 0)
+    
+    ##
+    #
+    # @fn isOFSServerIdleAsync(self):
+    #
+    # Readiness probe. Have MPI jobs on this node ended and has the OrangeFS server stopped
+    # working? See OFSTestWait.SERVER_IDLE_SCRIPT.
+    #
+    # @param self The object pointer
+    #
+    # @return (via OFSExecutionEngine.Return) True if the node is idle.
     
+    def isOFSServerIdleAsync(self):
+        rc = yield self.runSingleCommandAsync(OFSTestWait.getServerIdleCommand())
+        raise OFSExecutionEngine.Return(rc == 0)
     
     ##
-    # @fn addBatchCommand(self,command):
-    # Add a command to the list of batch commands to be run.
-    # This is generally the single line of a shell script.
+    #
+    # @fn waitForOFSServerIdle(self,timeout=60,old_wait=None):
+    #
+    # Waits until isOFSServerIdleAsync is True.
+    #
     # @param self The object pointer
-    # @param command The command to add
+    # @param timeout Seconds to wait at most.
+    # @param old_wait Seconds of the fixed sleep this wait replaces. See OFSTestWait.recordWait.
+    #
+    # @return True if the node became idle in time.
     
-    def addBatchCommand(self,command):
-        self.batch_commands.append(command)
+    def waitForOFSServerIdle(self,timeout=60,old_wait=None):
+        return OFSExecutionEngine.runCoroutine(OFSTestWait.waitUntilAsync(self.isOFSServerIdleAsync,"idle OrangeFS server on %s" % self.hostname,timeout=timeout,old_wait=old_wait))
     
     ##
-    # @fn runSingleCommand(self,command,output=[],remote_user=None):
-    # This runs a single command and returns the return code of that command
     #
-    # command, stdout, and stderr are in the output list
+    # @fn updateSSHKeysAsync(self,known_hosts,authorized_keys=[],user=None):
+    #
+    # Adds host keys to known_hosts and public keys to authorized_keys of user in one command.
+    # Old known_hosts lines for the same host names are replaced, and keys already authorized
+    # are not added again, so running it twice changes nothing. Coroutine, see OFSExecutionEngine.
+    #
     # @param self The object pointer
-    # @param command The command to run
-    # @param output Output list
-    # @param remote_user User to run as. Default is current user.
+    # @param known_hosts known_hosts lines, one string.
+    # @param authorized_keys List of public key lines.
+    # @param user User whose ~/.ssh is updated. Default is current user.
+    #
+    # @return (via OFSExecutionEngine.Return) Return code of the command.
     
-    def runSingleCommand(self,command,output=[],remote_user=None,debug=False):
-        
-        
-        
-        #print command
-        if remote_user is None:
-            remote_user = self.current_user
+    def updateSSHKeysAsync(self,known_hosts,authorized_keys=[],user=None):
+        if user is None:
+            user = self.current_user
+        if user == "root":
+            ssh_dir = "/root/.ssh"
+        else:
+            ssh_dir = "/home/%s/.ssh" % user
+        
+        command = "mkdir -p %s && cd %s && touch known_hosts authorized_keys && " % (ssh_dir,ssh_dir)
+        command += "echo %s | base64 -d > known_hosts.ofstest && " % base64.b64encode(known_hosts)
+        # keep only the lines for other hosts, then add the new ones.
+        command += "awk 'NR == FNR {split(\\$1,a,/,/); for (i in a) names[a[i]] = 1; next} {split(\\$1,b,/,/); keep = 1; for (i in b) if (b[i] in names) keep = 0} keep == 1' known_hosts.ofstest known_hosts > known_hosts.new && "
+        command += "cat known_hosts.ofstest >> known_hosts.new && cat known_hosts.new > known_hosts && rm -f known_hosts.ofstest known_hosts.new"
+        for key in authorized_keys:
+            command += " && (grep -q -x -F '%s' authorized_keys || echo '%s' >> authorized_keys)" % (key,key)
+        command += " && chmod 600 known_hosts authorized_keys"
+        
+        rc = yield self.runSingleCommandAsync(command,remote_user=user)
+        if rc != 0:
+            logging.exception("Could not update ssh keys for %s on %s" % (user,self.hostname))
+        raise OFSExecutionEngine.Return(rc)
     
-        # get the correct format of the command line for the node we are running on.    
-        command_line = self.prepareCommandLine(command=command,remote_user=remote_user)
-        
-        if (debug):
-            print command_line
+    ##
+    #
+    # @fn queryNodeFactsAsync(self,remote_user=None):
+    #
+    # Gathers the basic node facts with one command per fact. Fallback for probeNodeFactsAsync.
+    #
+    # @param self The object pointer
+    # @param remote_user User to run the commands as. Default is current user.
+    #
+    # @return (via OFSExecutionEngine.Return) Dictionary of node facts in the format of OFSNodeProbe.
+    
+    def queryNodeFactsAsync(self,remote_user=None):
         
-        logging.info('---------------------------------------------------')
-        logging.info("Command: "+command_line)
-
-        del output[:]
-        output.append(command_line)
-
+        def backtick(command):
+            output = []
+            rc = yield self.runSingleCommandAsync(command,output,remote_user=remote_user)
+            if len(output) > 1:
+                raise OFSExecutionEngine.Return(output[1].rstrip('\n'))
+            raise OFSExecutionEngine.Return("")
         
-        # run via Popen
-        p = subprocess.Popen(command_line,shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE,bufsize=-1)
+        facts = {"numa" : [], "disk" : [], "memory_kb" : 0, "boot_id" : "", "module_loaded" : False, "module_available" : False}
         
-        # clear the output list, then append stdout,stderr to list to get pass-by-reference to work
-        for i in p.communicate():
-            output.append(i)
-
-        logging.info("RC: %r" % p.returncode)
+        facts["home_group"] = yield backtick("ls -l /home/ | grep %s | awk '{print \\$4}'" % self.current_user)
+        # is this a mac? Home located under /Users
+        if facts["home_group"].rstrip() == "":
+            facts["home_group"] = yield backtick("ls -l /Users/ | grep %s | awk '{print \\$4}'" % self.current_user)
+        if facts["home_group"].rstrip() == "":
+            raise OFSExecutionEngine.Return(facts)
+        
+        facts["os"] = yield backtick("uname")
+        facts["kernel"] = yield backtick("uname -r")
+        facts["processor"] = yield backtick("uname -p")
+        facts["hostname"] = yield backtick("hostname")
+        cores = yield backtick("grep processor /proc/cpuinfo | wc -l")
         try:
-            logging.info("STDOUT: %s" % output[1] )
-            logging.info("STDERR: %s" % output[2] )
-        except:
-            pass
-        
-        return p.returncode
+            facts["cores"] = int(cores)
+        except ValueError:
+            facts["cores"] = 1
+        
+        facts["distro"] = ""
+        if (yield self.runSingleCommandAsync('test -f /etc/os-release',remote_user=remote_user)) == 0:
+            pretty_name = yield backtick("cat /etc/os-release | grep PRETTY_NAME")
+            facts["distro"] = pretty_name.split("=",1)[-1]
+        elif (yield self.runSingleCommandAsync('test -f /etc/redhat-release',remote_user=remote_user)) == 0:
+            facts["distro"] = yield backtick("cat /etc/redhat-release")
+        elif (yield self.runSingleCommandAsync('test -f /etc/lsb-release',remote_user=remote_user)) == 0:
+            pretty_name = yield backtick("cat /etc/lsb-release | grep DISTRIB_DESCRIPTION")
+            facts["distro"] = pretty_name.split("=",1)[-1]
+        elif (yield self.runSingleCommandAsync('test -f /etc/SuSE-release',remote_user=remote_user)) == 0:
+            facts["distro"] = (yield backtick("head -n 1 /etc/SuSE-release")).rstrip()
+        elif facts["os"].rstrip() == "Darwin":
+            facts["distro"] = "Mac OS X-%s" % (yield backtick("sw_vers -productVersion"))
+        
+        raise OFSExecutionEngine.Return(facts)
     
     ##
-    # @fn runSingleCommandAsRoot(self,command,output=[]):
-    # This runs a single command as root and returns the return code of that command
     #
-    # command, stdout, and stderr are in the output list
+    # @fn applyNodeFacts(self,facts):
+    #
+    # Sets the node attributes from a node fact probe reply.
+    #
     # @param self The object pointer
-    # @param command The command to run
-    # @param output Output list
+    # @param facts Dictionary of node facts from probeNodeFacts()
+    
+    def applyNodeFacts(self,facts):
+        self.node_facts = facts
+        self.current_group = facts.get("home_group","")
+        self.kernel_version = facts.get("kernel","")
+        self.processor_type = facts.get("processor","")
+        self.number_cores = facts.get("cores",1)
+        self.distro = facts.get("distro","")
+        self.hostname = facts.get("hostname","")
+        self.numa_nodes = facts.get("numa",[])
+        self.total_memory_kb = facts.get("memory_kb",0)
+        self.boot_id = facts.get("boot_id","")
+        self.ofs_module_loaded = facts.get("module_loaded",False)
+        self.ofs_module_available = facts.get("module_available",False)
+        self.free_disk_kb = dict([(d["path"],d["free_kb"]) for d in facts.get("disk",[])])
     
-    def runSingleCommandAsRoot(self,command,output=[],debug=False):
-        return self.runSingleCommand(command=command,output=output,remote_user="root",debug=debug)
-     
     ##
-    # @fn runSingleCommandBacktick(self,command,output=[],remote_user=None):
-    # This runs a single command and returns the stdout of that command.
+    #
+    # @fn getMPISlots(self,max_slots=None):
+    #
+    # Works out how many MPI processes this node should run, from the probed CPU and NUMA layout.
+    #
     # @param self The object pointer
-    # @param command The command to run
-    # @param output Output list
-    # @param remote_user User to run as. Default is current user.
-          
-    def runSingleCommandBacktick(self,command,output=[],remote_user=None,debug=False):
-        
+    # @param max_slots Upper limit. It is rounded down to a multiple of the number of NUMA
+    # nodes, so the processes are spread evenly over the sockets. None is no limit.
+    #
+    # @return Number of MPI slots, at least 1.
+    
+    def getMPISlots(self,max_slots=None):
+        # the NUMA cpulists only name online CPUs.
+        numa_nodes = [n for n in self.numa_nodes if n.get("cpus","") != ""]
+        slots = 0
+        for numa_node in numa_nodes:
+            try:
+                slots += OFSNodeProbe.countCPUList(numa_node["cpus"])
+            except ValueError:
+                slots = 0
+                break
+        if slots == 0:
+            slots = self.number_cores
+        
+        if max_slots is not None and max_slots > 0 and slots > max_slots:
+            slots = max_slots
+            if len(numa_nodes) > 1 and max_slots >= len(numa_nodes):
+                slots = max_slots - (max_slots % len(numa_nodes))
+        
+        return max(slots,1)
+    
+    ##
+    #
+    # @fn updateHostFiles(self,hosts_block,openmpihosts,mpichhosts):
+    #
+    # Writes the managed section of /etc/hosts and the MPI host files. Running it again
+    # replaces them, so nothing is added twice.
+    #
+    # @param self The object pointer
+    # @param hosts_block Lines for the managed section of /etc/hosts
+    # @param openmpihosts Contents of the OpenMPI host file, created_openmpihosts.
+    # @param mpichhosts Contents of the MPICH host file, created_mpichhosts.
+    #
+    # @return 0 on success. Non-zero on failure.
+    
+    def updateHostFiles(self,hosts_block,openmpihosts,mpichhosts):
+        return OFSExecutionEngine.runCoroutine(self.updateHostFilesAsync(hosts_block,openmpihosts,mpichhosts))
+    
+    ##
+    #
+    # @fn updateHostFilesAsync(self,hosts_block,openmpihosts,mpichhosts):
+    #
+    # Coroutine version of updateHostFiles. See OFSExecutionEngine.
+    #
+    # @param self The object pointer
+    # @param hosts_block Lines for the managed section of /etc/hosts
+    # @param openmpihosts Contents of the OpenMPI host file
+    # @param mpichhosts Contents of the MPICH host file
+    
+    def updateHostFilesAsync(self,hosts_block,openmpihosts,mpichhosts):
+        # the contents are sent base64 encoded, so they need no quoting.
+        section = "%s\n%s%s\n" % (ETC_HOSTS_BEGIN,hosts_block,ETC_HOSTS_END)
+        command = "echo %s | base64 -d > /tmp/ofstest-hosts && " % base64.b64encode(section)
+        command += "awk '/^%s/ {skip=1} skip != 1 {print} /^%s/ {skip=0}' /etc/hosts > /tmp/ofstest-hosts.new && " % (ETC_HOSTS_BEGIN,ETC_HOSTS_END)
+        command += "cat /tmp/ofstest-hosts >> /tmp/ofstest-hosts.new && cat /tmp/ofstest-hosts.new > /etc/hosts && rm -f /tmp/ofstest-hosts /tmp/ofstest-hosts.new"
+        rc = yield self.runSingleCommandAsRootAsync(command)
+        if rc != 0:
+            logging.exception("Could not update /etc/hosts on %s" % self.hostname)
+            raise OFSExecutionEngine.Return(rc)
+        
+        rc = yield self.runSingleCommandAsync("echo %s | base64 -d > %s && echo %s | base64 -d > %s" % (base64.b64encode(openmpihosts),self.created_openmpihosts,base64.b64encode(mpichhosts),self.created_mpichhosts))
+        if rc != 0:
+            logging.exception("Could not write MPI host files on %s" % self.hostname)
+        raise OFSExecutionEngine.Return(rc)
+    
+    ##
+    #
+    # @fn getNodeFactsCacheKey(self,install_location=""):
+    #
+    # Reads what decides whether the cached facts of this node are still good, with one remote command.
+    #
+    # @param self The object pointer
+    # @param install_location OrangeFS installation location. Its pvfs2-server modification time is read.
+    #
+    # @return (boot id, modification time of install_location/sbin/pvfs2-server). Empty strings for what could not be read.
+    
+    def getNodeFactsCacheKey(self,install_location=""):
+        command = "cat /proc/sys/kernel/random/boot_id 2> /dev/null"
+        if install_location != "" and install_location is not None:
+            command += "; stat -c %%Y %s/sbin/pvfs2-server 2> /dev/null" % install_location
+        output = []
+        # stat fails if the installation is gone. The boot id is still good.
+        self.runSingleCommand(command,output)
+        if len(output) < 2:
+            return ("","")
+        lines = output[1].split('\n')
+        boot_id = lines[0].strip()
+        install_mtime = ""
+        if len(lines) > 1:
+            install_mtime = lines[1].strip()
+        return (boot_id,install_mtime)
+    
+    ##
+    #
+    # @fn loadNodeFactsFromCache(self):
+    #
+    # Looks up the facts of this node (distribution, kernel, cores, hostname...) in the node
+    # facts cache. The OrangeFS settings are not restored here. See loadInstallationFromCache.
+    #
+    # @param self The object pointer
+    #
+    # @return Dictionary of node facts, or None if the node must be probed.
+    
+    def loadNodeFactsFromCache(self):
+        if self.node_facts_cache is None:
+            return None
+        
+        if self.node_facts_cache.getEntry(self.ip_address) is None:
+            return None
+        
+        (boot_id,install_mtime) = self.getNodeFactsCacheKey()
+        
+        entry = self.node_facts_cache.lookup(self.ip_address,boot_id)
+        if entry is None or entry["facts"].get("home_group","") == "":
+            return None
+        
+        msg = "Using cached facts for %s (boot id %s)" % (self.ip_address,boot_id)
+        print msg
+        logging.info(msg)
+        return entry["facts"]
+    
+    ##
+    #
+    # @fn loadInstallationFromCache(self):
+    #
+    # Restores the OrangeFS, OpenMPI and benchmark settings found on the last run, if the
+    # node has not rebooted and the OrangeFS installation has not changed since. Only for
+    # existing installations. See findExistingOFSInstallation.
+    #
+    # @param self The object pointer
+    #
+    # @return True if the settings were restored.
+    
+    def loadInstallationFromCache(self):
+        if self.node_facts_cache is None:
+            return False
+        
+        entry = self.node_facts_cache.getEntry(self.ip_address)
+        if entry is None or entry.get("attributes") is None:
+            return False
+        
+        (boot_id,install_mtime) = self.getNodeFactsCacheKey(entry["attributes"].get("ofs_installation_location",""))
+        attributes = self.node_facts_cache.lookupAttributes(self.ip_address,boot_id,install_mtime)
+        if attributes is None:
+            return False
+        
+        self.applyCachedAttributes(attributes)
+        return True
+    
+    ##
+    #
+    # @fn getCachedAttributes(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Dictionary of the node settings kept in the node facts cache.
+    
+    def getCachedAttributes(self):
+        attributes = {}
+        for name in OFSNodeFactsCache.CACHED_ATTRIBUTES:
+            attributes[name] = getattr(self,name)
+        attributes["pvfs2tab_file"] = self.current_environment.get("PVFS2TAB_FILE")
+        return attributes
+    
+    ##
+    #
+    # @fn applyCachedAttributes(self,attributes):
+    #
+    # Sets the node settings saved by getCachedAttributes().
+    #
+    # @param self The object pointer
+    # @param attributes Dictionary from getCachedAttributes()
+    
+    def applyCachedAttributes(self,attributes):
+        for name in OFSNodeFactsCache.CACHED_ATTRIBUTES:
+            if name in attributes:
+                setattr(self,name,attributes[name])
+        if attributes.get("pvfs2tab_file") is not None:
+            self.setEnvironmentVariable("PVFS2TAB_FILE",attributes["pvfs2tab_file"])
+    
+    ##
+    #
+    # @fn saveNodeFactsToCache(self):
+    #
+    # Saves the current node settings and the installation they belong to in the node facts cache.
+    #
+    # @param self The object pointer
+    
+    def saveNodeFactsToCache(self):
+        if self.node_facts_cache is None:
+            return
+        (boot_id,install_mtime) = self.getNodeFactsCacheKey(self.ofs_installation_location)
+        self.node_facts_cache.store(self.ip_address,boot_id,attributes=self.getCachedAttributes(),install_mtime=install_mtime)
+        
+        
+       
+#==========================================================================
+# 
+# Utility functions
+#
+# These functions implement basic shell functionality 
+#
+#==========================================================================
+
+    ##
+    # @fn changeDirectory(self, directory):
+    # Change the current directory on the node to run scripts.
+    #
+    # @param self The object pointer
+    # @param directory New directory. Note: "-" will change to previous directory.
+    
+    def changeDirectory(self, directory):
+        # cd "-" will restore previous directory
+        if directory is not "-":
+            if directory is "~":
+                directory = "/home/%s" % self.current_user 
+            self.previous_directory = self.current_directory
+            self.current_directory = directory
+        else:
+            self.restoreDirectory()
+    ##
+    # @fn restoreDirectory(self):
+    # Restore directory - This restores the previous directory.
+    # @param self The object pointer
+    
+    def restoreDirectory(self):
+        self.setDirectories(self.previous_directory,self.current_directory)
+
+    ##
+    # @fn getDirectories(self):
+    #
+    # Each thread has its own working directory on the node, so setup stages that run at
+    # the same time on one node (see OFSStageGraph) do not change each other's directory.
+    # A thread that has not changed directory yet uses the directory of the main thread.
+    #
+    # @param self The object pointer
+    #
+    # @return (current,previous) directory of the calling thread.
+
+    def getDirectories(self):
+        return getattr(self.directory_state,"directories",self.main_directories)
+
+    ##
+    # @fn setDirectories(self,current,previous):
+    #
+    # Sets the working directories of the calling thread. See getDirectories.
+    #
+    # @param self The object pointer
+    # @param current Current directory
+    # @param previous Previous directory
+
+    def setDirectories(self,current,previous):
+        if threading.current_thread().name == "MainThread":
+            self.main_directories = (current,previous)
+        else:
+            self.directory_state.directories = (current,previous)
+
+    ##
+    # @fn getCurrentDirectory(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Current directory of the calling thread.
+
+    def getCurrentDirectory(self):
+        return self.getDirectories()[0]
+
+    ##
+    # @fn setCurrentDirectory(self,directory):
+    #
+    # @param self The object pointer
+    # @param directory New current directory of the calling thread.
+
+    def setCurrentDirectory(self,directory):
+        self.setDirectories(directory,self.getDirectories()[1])
+
+    ##
+    # @fn getPreviousDirectory(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Previous directory of the calling thread.
+
+    def getPreviousDirectory(self):
+        return self.getDirectories()[1]
+
+    ##
+    # @fn setPreviousDirectory(self,directory):
+    #
+    # @param self The object pointer
+    # @param directory New previous directory of the calling thread.
+
+    def setPreviousDirectory(self,directory):
+        self.setDirectories(self.getDirectories()[0],directory)
+
+    current_directory = property(getCurrentDirectory,setCurrentDirectory)
+    previous_directory = property(getPreviousDirectory,setPreviousDirectory)
+
+    ##
+    # @fn setEnvironmentVariable(self,variable,value):  
+    # set an environment variable to a value
+    # @param self The object pointer    
+    # @param variable Variable name
+    # @param value Value of variable
+    
+    def setEnvironmentVariable(self,variable,value):
+        self.current_environment[variable] = value
+        self.saveEnvironment()
+    
+    ##
+    # @fn setEnvironmentVariableAsync(self,variable,value):  
+    # Coroutine version of setEnvironmentVariable. See OFSExecutionEngine.
+    # @param self The object pointer    
+    # @param variable Variable name
+    # @param value Value of variable
+    
+    def setEnvironmentVariableAsync(self,variable,value):
+        self.current_environment[variable] = value
+        return self.saveEnvironmentAsync()
+    
+    ##
+    # @fn unsetEnvironmentVariable(self,variable):
+    # Erase an environment variable
+    # @param self The object pointer
+    # @param variable Variable name
+    
+    def unsetEnvironmentVariable(self,variable):
+        del self.current_environment[variable]
+        self.saveEnvironment()
+    
+    def saveEnvironment(self):
+        # Writes to /etc/profile.d/orangefs.sh
+        # Implement in subclass.
+        pass
+    
+    def saveEnvironmentAsync(self):
+        # Coroutine version of saveEnvironment. Implement in subclass.
+        return None
+    
+    ## 
+    # @fn setEnvironment(self, setenv): 
+    # This function sets the environment based on the output of setenv.
+    # 
+    # @param self The object pointer
+    # @param setenv A string that is formatted like the output of the setenv command.
+     
+    def setEnvironment(self, setenv):
+    
+        variable_list = setenv.split('\n')
+        for variable in variable_list:
+            #split based on the equals sign
+            vname,value = variable.split('=')
+            self.setEnvironmentVariable(vname,value)
+          
+    ##
+    # @fn clearEnvironment(self):
+    # Clear all environment variables
+    # @param self The object pointer
+    
+    def clearEnvironment(self):
+        self.current_environment = {}
+    
+    ##
+    # @fn printWorkingDirectory(self):  
+    # 
+    # @param self The object pointer
+    # @return current directory
+    
+    def printWorkingDirectory(self):
+        return self.current_directory
+    
+    
+    ##
+    # @fn addBatchCommand(self,command):
+    # Add a command to the list of batch commands to be run.
+    # This is generally the single line of a shell script.
+    # @param self The object pointer
+    # @param command The command to add
+    
+    def addBatchCommand(self,command):
+        self.batch_commands.append(command)
+    
+    ##
+    # @fn runSingleCommand(self,command,output=None,remote_user=None,debug=False,stream=False,line_callback=None,stderr_callback=None,timeout=None):
+    # This runs a single command and returns the return code of that command
+    #
+    # command, stdout, and stderr are in the output list
+    #
+    # In streaming mode, stdout and stderr are read as the command runs and written to spill files.
+    # output[1] and output[2] then hold only the head and tail of each stream, and output[3] and 
+    # output[4] hold the names of the stdout and stderr spill files.
+    #
+    # @param self The object pointer
+    # @param command The command to run
+    # @param output Output list
+    # @param remote_user User to run as. Default is current user.
+    # @param debug Print the command line?
+    # @param stream Capture output in streaming mode? Implied by line_callback or stderr_callback.
+    # @param line_callback Function called with each line of stdout as it arrives.
+    # @param stderr_callback Function called with each line of stderr as it arrives.
+    # @param timeout Seconds before the command is killed. Default is command_timeout.
+    #
+    # @return Return code of the command. COMMAND_TIMEOUT_RC if it timed out.
+    
+    @OFSTestTrace.traced("command")
+    def runSingleCommand(self,command,output=None,remote_user=None,debug=False,stream=False,line_callback=None,stderr_callback=None,timeout=None):
+        
+        if output is None:
+            output = []
+        
+        if line_callback is not None or stderr_callback is not None:
+            stream = True
+        
+        #print command
+        if remote_user is None:
+            remote_user = self.current_user
+        
+        # a command with a timeout records where it runs, so the watchdog can kill it there.
+        timeout = self.getCommandTimeout(timeout)
+        token = None
+        if timeout is not None:
+            token = uuid.uuid4().hex[:16]
+            command = self.trackRemoteCommand(command,token)
+    
+        # get the correct format of the command line for the node we are running on.    
+        command_line = self.prepareCommandLine(command=command,remote_user=remote_user)
+        
+        if (debug):
+            print command_line
+        
+        logging.info('---------------------------------------------------')
+        logging.info("Command: "+command_line)
+
+        del output[:]
+        output.append(command_line)
+
+        if self.isCancelled(output):
+            return -1
+        if self.isPastDeadline(timeout,output):
+            return COMMAND_TIMEOUT_RC
+
+        # use the remote agent if there is one and it is not busy with another command.
+        # The agent returns the whole output at once, so streaming commands use ssh.
+        # Commands with a timeout use ssh so they can be killed.
+        agent = None
+        if stream == False and timeout is None:
+            agent = self.getRemoteAgent(remote_user)
+        if agent is not None:
+            reply = agent.run(OFSRemoteAgent.unquoteCommand("cd %s; %s" % (self.current_directory,command)),wait=False)
+            if reply is not None:
+                output.append(reply["stdout"])
+                output.append(reply["stderr"])
+                logging.info("RC: %r (remote agent, %.3fs)" % (reply["rc"],reply["wall_time"]))
+                logging.info("STDOUT: %s" % output[1] )
+                logging.info("STDERR: %s" % output[2] )
+                return reply["rc"]
+        
+        # the agent may have been killed by cancelCommands()
+        if self.isCancelled(output):
+            return -1
+        
+        # run via Popen
+        p = self.startCommandProcess(command_line)
+        rc = self.waitForCommand(p,output,stream,line_callback,stderr_callback,timeout,token,remote_user)
+
+        logging.info("RC: %r" % rc)
+        try:
+            logging.info("STDOUT: %s" % output[1] )
+            logging.info("STDERR: %s" % output[2] )
+        except:
+            pass
+        
+        return rc
+    
+    ##
+    # @fn waitForCommand(self,process,output,stream=False,line_callback=None,stderr_callback=None,timeout=None,token=None,remote_user=None):
+    # Collects the output of a process started by startCommandProcess() and waits for it to exit.
+    #
+    # If timeout passes first, the watchdog kills the command on both sides (see killTimedOutCommand).
+    # Output read up to then is kept.
+    # @param self The object pointer
+    # @param process subprocess.Popen object
+    # @param output Output list. stdout and stderr are appended.
+    # @param stream Capture output in streaming mode?
+    # @param line_callback Function called with each line of stdout as it arrives.
+    # @param stderr_callback Function called with each line of stderr as it arrives.
+    # @param timeout Seconds before the command is killed. None is no timeout.
+    # @param token Tracking token from trackRemoteCommand(), or None.
+    # @param remote_user User the command runs as.
+    #
+    # @return Return code of the command. COMMAND_TIMEOUT_RC if it timed out.
+    
+    def waitForCommand(self,process,output,stream=False,line_callback=None,stderr_callback=None,timeout=None,token=None,remote_user=None):
+        timed_out = []
+        watch = None
+        if timeout is not None:
+            watch = OFSCommandWatchdog.watch(timeout,self.killTimedOutCommand,[process,token,remote_user,timed_out,timeout])
+        try:
+            if stream == True:
+                self.captureCommandOutput(process,output,line_callback,stderr_callback)
+            else:
+                # append stdout,stderr to list to get pass-by-reference to work
+                for i in process.communicate():
+                    output.append(i)
+        finally:
+            OFSCommandWatchdog.cancel(watch)
+            self.endCommandProcess(process)
+        
+        if len(timed_out) > 0:
+            msg = "Command timed out after %gs and was killed. Output is partial." % timeout
+            print msg
+            if len(output) >= 3:
+                output[2] = output[2] + "\n" + msg
+            return COMMAND_TIMEOUT_RC
+        
+        return process.returncode
+    
+    ##
+    # @fn getCommandTimeout(self,timeout=None):
+    # Works out how long the next command may run.
+    #
+    # @param self The object pointer
+    # @param timeout Timeout requested by the caller. Default is command_timeout.
+    #
+    # @return Seconds, limited by command_deadline. None is no timeout.
+    
+    def getCommandTimeout(self,timeout=None):
+        if timeout is None:
+            timeout = self.command_timeout
+        if self.command_deadline is not None:
+            remaining = self.command_deadline - time.time()
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+        return timeout
+    
+    ##
+    # @fn isPastDeadline(self,timeout,output=None):
+    # Checks whether a command's time is already up before it starts. If so, fills in output
+    # for the command that will not be run.
+    #
+    # @param self The object pointer
+    # @param timeout Timeout from getCommandTimeout()
+    # @param output Output list of the command
+    #
+    # @return True if the command must not be run.
+    
+    def isPastDeadline(self,timeout,output=None):
+        if timeout is None or timeout > 0:
+            return False
+        if output is not None:
+            output.append("")
+            output.append("Command not run. Deadline passed.")
+        logging.info("Deadline passed on %s. Not running." % self.hostname)
+        return True
+    
+    ##
+    # @fn trackRemoteCommand(self,command,token):
+    # Adds whatever the command needs so that killRemoteCommand() can find it later.
+    # Local commands run in the local process group, so nothing is added here.
+    #
+    # @param self The object pointer
+    # @param command Shell command
+    # @param token Unique name for this command
+    #
+    # @return Shell command to run.
+    
+    def trackRemoteCommand(self,command,token):
+        return command
+    
+    ##
+    # @fn killRemoteCommand(self,token,remote_user=None):
+    # Kills the process group of a tracked command on the node. Nothing to do for local commands.
+    #
+    # @param self The object pointer
+    # @param token Token passed to trackRemoteCommand()
+    # @param remote_user User the command runs as.
+    
+    def killRemoteCommand(self,token,remote_user=None):
+        pass
+    
+    ##
+    # @fn killTimedOutCommand(self,process,token,remote_user,timed_out,timeout):
+    # Called by the watchdog when a command runs past its timeout. Kills the remote side,
+    # then the local process group, so the waiting thread gets the partial output at once.
+    #
+    # @param self The object pointer
+    # @param process subprocess.Popen object of the command
+    # @param token Token passed to trackRemoteCommand(), or None.
+    # @param remote_user User the command runs as.
+    # @param timed_out List. True is appended to mark the command as timed out.
+    # @param timeout Timeout in seconds, for the log.
+    
+    def killTimedOutCommand(self,process,token,remote_user,timed_out,timeout):
+        timed_out.append(True)
+        logging.warn("Command on %s timed out after %gs. Killing it." % (self.hostname,timeout))
+        if token is not None:
+            # ssh can be slow. Do not hold up the watchdog.
+            t = threading.Thread(target=self.killRemoteCommand,args=(token,remote_user))
+            t.setDaemon(True)
+            t.start()
+        OFSExecutionEngine.killProcessGroup(process)
+    
+    ##
+    # @fn startCommandProcess(self,command_line):
+    # Starts a local process for a command on this node, in its own process group.
+    #
+    # The process is tracked in running_processes until endCommandProcess() is called, so
+    # cancelCommands() can kill it together with everything it started.
+    # @param self The object pointer
+    # @param command_line Shell command line to run on the local machine.
+    #
+    # @return subprocess.Popen object with stdout and stderr pipes.
+    
+    def startCommandProcess(self,command_line):
+        p = subprocess.Popen(command_line,shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE,bufsize=-1,preexec_fn=os.setsid)
+        self.addCommandProcess(p)
+        return p
+    
+    ##
+    # @fn addCommandProcess(self,process):
+    # Tracks a local process that runs a command for this node, so cancelCommands() kills it.
+    # Call endCommandProcess() when it exits.
+    #
+    # @param self The object pointer
+    # @param process subprocess.Popen object, in its own process group.
+    
+    def addCommandProcess(self,process):
+        self.process_lock.acquire()
+        self.running_processes.append(process)
+        self.process_lock.release()
+        
+        owner = getCommandOwner()
+        if owner is not None and owner is not self:
+            owner.process_lock.acquire()
+            try:
+                owner.running_processes.append(process)
+                # cancelled while the process was starting
+                if owner.commands_cancelled == True:
+                    OFSExecutionEngine.killProcessGroup(process)
+            finally:
+                owner.process_lock.release()
+    
+    ##
+    # @fn endCommandProcess(self,process):
+    # Stops tracking a process started by startCommandProcess().
+    #
+    # @param self The object pointer
+    # @param process subprocess.Popen object
+    
+    def endCommandProcess(self,process):
+        self.process_lock.acquire()
+        if process in self.running_processes:
+            self.running_processes.remove(process)
+        self.process_lock.release()
+        
+        owner = getCommandOwner()
+        if owner is not None and owner is not self:
+            owner.process_lock.acquire()
+            if process in owner.running_processes:
+                owner.running_processes.remove(process)
+            owner.process_lock.release()
+    
+    ##
+    # @fn cancelCommands(self):
+    # Kills the process groups of all commands running for this node, and the remote agents.
+    # Commands started afterwards fail at once until resumeCommands() is called. This
+    # includes commands on other nodes run by a thread working for this node. See setCommandOwner.
+    #
+    # @param self The object pointer
+    
+    def cancelCommands(self):
+        self.process_lock.acquire()
+        try:
+            self.commands_cancelled = True
+            for p in self.running_processes:
+                OFSExecutionEngine.killProcessGroup(p)
+        finally:
+            self.process_lock.release()
+        
+        # a command waiting on an agent returns when the agent's ssh session dies.
+        for agent in self.remote_agents.values():
+            if agent.process is not None:
+                try:
+                    agent.process.kill()
+                except OSError:
+                    pass
+        logging.warn("Cancelled running commands on %s" % self.hostname)
+    
+    ##
+    # @fn resumeCommands(self):
+    # Allows commands to run again after cancelCommands().
+    #
+    # @param self The object pointer
+    
+    def resumeCommands(self):
+        self.commands_cancelled = False
+    
+    ##
+    # @fn isCancelled(self,output=None):
+    # Checks whether commands on this node, or of the node the calling thread works for, have
+    # been cancelled. If so, fills in output for the command that will not be run.
+    #
+    # @param self The object pointer
+    # @param output Output list of the command
+    #
+    # @return True if the command must not be run.
+    
+    def isCancelled(self,output=None):
+        cancelled_node = self
+        if self.commands_cancelled == False:
+            cancelled_node = getCommandOwner()
+            if cancelled_node is None or cancelled_node.commands_cancelled == False:
+                return False
+        if output is not None:
+            output.append("")
+            output.append("Command not run. Commands on %s were cancelled." % cancelled_node.hostname)
+        logging.info("Commands on %s were cancelled. Not running." % cancelled_node.hostname)
+        return True
+    
+    ##
+    # @fn captureCommandOutput(self,process,output,line_callback=None,stderr_callback=None):
+    # Reads stdout and stderr of a running command in streaming mode and appends them to output.
+    #
+    # Appends the stdout window, stderr window, stdout spill file and stderr spill file to output.
+    # @param self The object pointer
+    # @param process subprocess.Popen object of the command
+    # @param output Output list
+    # @param line_callback Function called with each line of stdout as it arrives.
+    # @param stderr_callback Function called with each line of stderr as it arrives.
+    #
+    # @return Return code of the command
+    
+    def captureCommandOutput(self,process,output,line_callback=None,stderr_callback=None):
+        label = self.hostname
+        if label == "":
+            label = self.ext_ip_address
+        (stdout_file,stderr_file) = OFSOutputCapture.newSpillFiles(label)
+        stdout_capture = OFSOutputCapture.OFSOutputCapture(stdout_file,line_callback)
+        stderr_capture = OFSOutputCapture.OFSOutputCapture(stderr_file,stderr_callback)
+        
+        rc = OFSOutputCapture.captureProcess(process,stdout_capture,stderr_capture)
+        
+        output.append(stdout_capture.getWindow())
+        output.append(stderr_capture.getWindow())
+        output.append(stdout_file)
+        output.append(stderr_file)
+        logging.info("Full output in %s and %s (%d and %d bytes)" % (stdout_file,stderr_file,stdout_capture.total_bytes,stderr_capture.total_bytes))
+        return rc
+    
+    ##
+    # @fn runSingleCommandAsRoot(self,command,output=None,debug=False,stream=False,line_callback=None,stderr_callback=None,timeout=None):
+    # This runs a single command as root and returns the return code of that command
+    #
+    # command, stdout, and stderr are in the output list
+    # @param self The object pointer
+    # @param command The command to run
+    # @param output Output list
+    # @param debug Print the command line?
+    # @param stream Capture output in streaming mode? See runSingleCommand.
+    # @param line_callback Function called with each line of stdout as it arrives.
+    # @param stderr_callback Function called with each line of stderr as it arrives.
+    # @param timeout Seconds before the command is killed. See runSingleCommand.
+    
+    def runSingleCommandAsRoot(self,command,output=None,debug=False,stream=False,line_callback=None,stderr_callback=None,timeout=None):
+        return self.runSingleCommand(command=command,output=output,remote_user="root",debug=debug,stream=stream,line_callback=line_callback,stderr_callback=stderr_callback,timeout=timeout)
+     
+    ##
+    # @fn runSingleCommandBacktick(self,command,output=None,remote_user=None):
+    # This runs a single command and returns the stdout of that command.
+    # @param self The object pointer
+    # @param command The command to run
+    # @param output Output list
+    # @param remote_user User to run as. Default is current user.
+          
+    def runSingleCommandBacktick(self,command,output=None,remote_user=None,debug=False):
+        
+        if output is None:
+            output = []
+        
         if remote_user is None:
             remote_user = self.current_user
       
@@ -634,23 +1714,118 @@ class OFSTestNode(object):
             return ""
     
     ##
-    # @fn runOFSTest(self,package,test_function,output=[],logfile="",errfile=""):
+    # @fn runSingleCommandAsync(self,command,output=None,remote_user=None):
+    # Asynchronous version of runSingleCommand. The command is not run until an OFSExecutionEngine
+    # coroutine yields the returned task. The coroutine then resumes with the return code, and
+    # command, stdout, and stderr are in the output list.
+    #
+    # The command honours cancelCommands(), command_timeout and command_deadline. It does not
+    # use the remote agent or streaming capture. See OFSExecutionEngine.
+    #
+    # @param self The object pointer
+    # @param command The command to run
+    # @param output Output list
+    # @param remote_user User to run as. Default is current user.
+    #
+    # @return OFSCommandTask
+    
+    def runSingleCommandAsync(self,command,output=None,remote_user=None):
+        if remote_user is None:
+            remote_user = self.current_user
+        command_line = self.prepareCommandLine(command=command,remote_user=remote_user)
+        return OFSExecutionEngine.OFSCommandTask(command_line,output,node=self,command=command,remote_user=remote_user)
+    
+    ##
+    # @fn prepareCommandTask(self,task,track=False):
+    # Called by OFSExecutionEngine before it starts a task of this node. Gives the task the
+    # timeout of runSingleCommand and makes its command killable on the node.
+    #
+    # @param self The object pointer
+    # @param task OFSCommandTask from runSingleCommandAsync
+    # @param track Track the command on the node even without a timeout?
+    #
+    # @return None to start the task. A return code if it must not run: cancelled or past the deadline.
+    
+    def prepareCommandTask(self,task,track=False):
+        task.timeout = self.getCommandTimeout()
+        if task.timeout is not None or track == True:
+            task.token = uuid.uuid4().hex[:16]
+            task.command_line = self.prepareCommandLine(command=self.trackRemoteCommand(task.command,task.token),remote_user=task.remote_user)
+            task.output[0] = task.command_line
+        if self.isCancelled(task.output):
+            return -1
+        if self.isPastDeadline(task.timeout,task.output):
+            return COMMAND_TIMEOUT_RC
+        return None
+    
+    ##
+    # @fn watchCommandTask(self,task):
+    # Called by OFSExecutionEngine when the process of a task of this node started. Tracks
+    # it for cancelCommands() and gives it to the watchdog.
+    #
+    # @param self The object pointer
+    # @param task OFSCommandTask
+    
+    def watchCommandTask(self,task):
+        self.addCommandProcess(task.process)
+        if task.timeout is not None:
+            task.watch = OFSCommandWatchdog.watch(task.timeout,self.killTimedOutCommand,[task.process,task.token,task.remote_user,task.timed_out,task.timeout])
+    
+    ##
+    # @fn finishCommandTask(self,task):
+    # Called by OFSExecutionEngine when the process of a task of this node exited.
+    #
+    # @param self The object pointer
+    # @param task OFSCommandTask
+    #
+    # @return Return code of the command. COMMAND_TIMEOUT_RC if it timed out.
+    
+    def finishCommandTask(self,task):
+        OFSCommandWatchdog.cancel(task.watch)
+        self.endCommandProcess(task.process)
+        if len(task.timed_out) > 0:
+            msg = "Command timed out after %gs and was killed. Output is partial." % task.timeout
+            print msg
+            if len(task.output) >= 3:
+                task.output[2] = task.output[2] + "\n" + msg
+            return COMMAND_TIMEOUT_RC
+        return task.process.returncode
+    
+    ##
+    # @fn runSingleCommandAsRootAsync(self,command,output=None):
+    # Asynchronous version of runSingleCommandAsRoot. See runSingleCommandAsync.
+    #
+    # @param self The object pointer
+    # @param command The command to run
+    # @param output Output list
+    #
+    # @return OFSCommandTask
+    
+    def runSingleCommandAsRootAsync(self,command,output=None):
+        return self.runSingleCommandAsync(command=command,output=output,remote_user="root")
+    
+    ##
+    # @fn runOFSTest(self,package,test_function,output=None,logfile="",errfile="",timeout=None):
     # This method runs an OrangeFS test on the given node
     #
     # Output and errors are written to the output and errfiles
     # 
-    # return is return code from the test function
+    # return is return code from the test function, or COMMAND_TIMEOUT_RC if the test ran out of time.
+    # A test function may return (rc,metrics). The metrics are kept in test_record.
     # @param self The object pointer
     # @param package Test package name
     # @param test_function Test function to run.
     # @param output Output list
     # @param logfile File to log stdout
     # @param errfile File to log stderr
+    # @param timeout Seconds the whole test may take. Commands still running then are killed.
     
     
 #
-    def runOFSTest(self,package,test_function,output=[],logfile="",errfile=""):
+    def runOFSTest(self,package,test_function,output=None,logfile="",errfile="",timeout=None):
 
+        if output is None:
+            output = []
        
         msg = "Running test %s-%s" % (package,test_function.__name__)
         print msg
@@ -661,8 +1836,28 @@ class OFSTestNode(object):
             logfile = "%s-%s.log" % (package,test_function.__name__)
         
                 
-        # Run the test function
-        rc = test_function(self,output)
+        # Run the test function. With a timeout, every command of the test stops at the deadline.
+        start = time.time()
+        if timeout is not None:
+            self.command_deadline = start + timeout
+        try:
+            rc = test_function(self,output)
+        finally:
+            self.command_deadline = None
+        
+        # Benchmarks return their metrics with the return code. See OFSBenchmarkMetrics.
+        metrics = {}
+        if isinstance(rc,tuple):
+            (rc,metrics) = rc
+        
+        if timeout is not None and time.time() - start >= timeout:
+            msg = "Test %s-%s timed out after %gs" % (package,test_function.__name__,timeout)
+            print msg
+            logging.warn(msg)
+            rc = COMMAND_TIMEOUT_RC
+        
+        end = time.time()
+        OFSTestTrace.record("test",self,"%s-%s" % (package,test_function.__name__),start,end,rc)
 
         try:
             # write the command, return code, stdout and stderr of last program to logfile
@@ -671,6 +1866,10 @@ class OFSTestNode(object):
             logfile_h.write('RC: %r\n' % rc)
             logfile_h.write('STDOUT:' + output[1]+'\n')
             logfile_h.write('STDERR:' + output[2]+'\n')
+            # streaming mode keeps the full output in spill files.
+            if len(output) >= 5:
+                logfile_h.write('STDOUT_FILE:' + output[3]+'\n')
+                logfile_h.write('STDERR_FILE:' + output[4]+'\n')
             
         except:
             
@@ -679,6 +1878,11 @@ class OFSTestNode(object):
             rc = -999
         
         logfile_h.close()
+        
+        self.test_record = {"package" : package, "name" : test_function.__name__, "node" : self.hostname, "start" : start, "end" : end, "rc" : rc, "logfile" : os.path.abspath(logfile), "metrics" : metrics}
+        if len(output) >= 5:
+            self.test_record["stdout_file"] = output[3]
+            self.test_record["stderr_file"] = output[4]
             
         
         return rc
@@ -706,31 +1910,35 @@ class OFSTestNode(object):
         return command
     
     ##
-    # @fn runAllBatchCommands(self,output=[]):
+    # @fn runAllBatchCommands(self,output=None,debug=False,stream=False,line_callback=None,timeout=None):
     # This method runs all the batch commands in the list. 
     # Should not be implemented here, but in the subclass.
     # @param self The object pointer
     # @param output Output list
+    # @param debug Print debugging information?
+    # @param stream Capture output in streaming mode? See runSingleCommand.
+    # @param line_callback Function called with each line of stdout as it arrives.
+    # @param timeout Seconds before the batch is killed. See runSingleCommand.
 
        
-    def runAllBatchCommands(self,output=[],debug=False):
+    def runAllBatchCommands(self,output=None,debug=False,stream=False,line_callback=None,timeout=None):
         # implemented in child class
         pass
     
     ##
-    # @fn runSingleCommandAsBatch(self,command,output=[]):
+    # @fn runSingleCommandAsBatch(self,command,output=None):
     # Run a single command as a batchfile. Some systems require this for passwordless sudo
     # @param self The object pointer
     # @param command Shell command to be run.
     # @param output Output list
     
     
-    def runSingleCommandAsBatch(self,command,output=[],debug=False):
+    def runSingleCommandAsBatch(self,command,output=None,debug=False):
         self.addBatchCommand(command)
         self.runAllBatchCommands(output,debug)
     
     ##
-    # @fn runBatchFile(self,filename,output=[]):
+    # @fn runBatchFile(self,filename,output=None):
     # Run a batch file through the system.
     #
     # Not sure why this is here
@@ -738,7 +1946,7 @@ class OFSTestNode(object):
     # @param filename Batch file name
     # @param output Output list
     
-    def runBatchFile(self,filename,output=[]):
+    def runBatchFile(self,filename,output=None):
         #copy the old batch file to the batch commands list
         batch_file = open(filename,'r')
         self.batch_commands = batch_file.readlines()
@@ -762,6 +1970,36 @@ class OFSTestNode(object):
     def copyToRemoteNode(self, source, destination_node, destination, recursive=False):
         # implimented in subclass
         pass
+    
+    ##
+    # @fn copyToRemoteNodeAsync(self, source, destination_node, destination, recursive=False):
+    # Asynchronous version of copyToRemoteNode. See runSingleCommandAsync.
+    # @param self The object pointer
+    # @param source Source file or directory
+    # @param destination_node Node to which files should be copied
+    # @param destination Destination file or directory on remote node.
+    # @param recursive Copy recursively?
+    #
+    # @return OFSCommandTask
+    
+    def copyToRemoteNodeAsync(self, source, destination_node, destination, recursive=False):
+        return self.runSingleCommandAsync(self.getCopyToRemoteNodeCommand(source,destination_node,destination,recursive))
+    
+    ##
+    # @fn getCopyToRemoteNodeCommand(self, source, destination_node, destination, recursive=False):
+    # Returns the command that copies files from this node to destination_node. 
+    # Should not be implemented here, but in the subclass.
+    # @param self The object pointer
+    # @param source Source file or directory
+    # @param destination_node Node to which files should be copied
+    # @param destination Destination file or directory on remote node.
+    # @param recursive Copy recursively?
+    #
+    # @return Command to run on this node.
+    
+    def getCopyToRemoteNodeCommand(self, source, destination_node, destination, recursive=False):
+        # implimented in subclass
+        pass
 
     ##
     #
@@ -830,6 +2068,61 @@ class OFSTestNode(object):
         #
         self.keytable[address] = keylocation
     
+    ##
+    # @fn getSSHConnectionOptions(self,remote_user=None):
+    #
+    # Returns the ssh options that reuse the persistent connection from the local machine to this node.
+    # Only valid for ssh commands that run on the local machine.
+    #
+    # @param self The object pointer
+    # @param remote_user User on this node. Defaults to current_user.
+    #
+    # @return String of ssh options. Empty if there is no persistent connection.
+    
+    def getSSHConnectionOptions(self,remote_user=None):
+        if self.ssh_connection is None:
+            return ""
+        if remote_user == None:
+            remote_user = self.current_user
+        return self.ssh_connection.getSSHOptions(remote_user)
+    
+    ##
+    # @fn closeSSHConnection(self):
+    #
+    # Closes the persistent ssh connections from the local machine to this node.
+    #
+    # @param self The object pointer
+    
+    def closeSSHConnection(self):
+        self.stopRemoteAgents()
+        if self.ssh_connection is not None:
+            self.ssh_connection.closeAllConnections()
+    
+    ##
+    # @fn getRemoteAgent(self,remote_user=None):
+    #
+    # Returns the running OFSRemoteAgent for remote_user. Implemented in subclass.
+    #
+    # @param self The object pointer
+    # @param remote_user User on this node. Defaults to current_user.
+    #
+    # @return OFSRemoteAgent, or None if commands should use ssh.
+    
+    def getRemoteAgent(self,remote_user=None):
+        return None
+    
+    ##
+    # @fn stopRemoteAgents(self):
+    #
+    # Stops all OFSRemoteAgents running on this node.
+    #
+    # @param self The object pointer
+    
+    def stopRemoteAgents(self):
+        for user in self.remote_agents.keys():
+            self.remote_agents[user].stop()
+        self.remote_agents = {}
+    
     ##
     # @fn copyLocal(self, source, destination, recursive):
     # This runs the copy command locally 
@@ -877,67 +2170,139 @@ class OFSTestNode(object):
     
     
     
-    def updateNode(self,custom_kernel=False,kernel_git_location=None,kernel_git_branch=None):
+    def updateNode(self,custom_kernel=False,kernel_git_location=None,kernel_git_branch=None,reboot=True):
+        return OFSExecutionEngine.runCoroutine(self.updateNodeAsync(custom_kernel,kernel_git_location,kernel_git_branch,reboot))
+
+    ##
+    # @fn updateNodeAsync(self,custom_kernel=False,kernel_git_location=None,kernel_git_branch=None,reboot=True):
+    #
+    # Coroutine version of updateNode. See OFSExecutionEngine.
+    # @param self The object pointer
+    # @param custom_kernel Build a custom linux kernel?
+    # @param kernel_git_location url of git repository from which the custom kernel will be built.
+    # @param kernel_git_branch url of git branch from which the custom kernel will be built.
+    # @param reboot Reboot when done? Without, the caller must reboot, e.g. with rebootAsync.
+
+    def updateNodeAsync(self,custom_kernel=False,kernel_git_location=None,kernel_git_branch=None,reboot=True):
         logging.info("Update Node. Distro is " + self.distro)
            
         rc = 0
         
         if "ubuntu" in self.distro.lower() or "mint" in self.distro.lower() or "debian" in self.distro.lower():
-            rc = self.runSingleCommandAsRoot("DEBIAN_FRONTEND=noninteractive apt-get -y update &> apt.out")
+            rc = yield self.runSingleCommandAsRootAsync("DEBIAN_FRONTEND=noninteractive apt-get -y update &> apt.out")
             if rc != 0:
-                self.runSingleCommandAsRoot("cat apt.out")
+                yield self.runSingleCommandAsRootAsync("cat apt.out")
             
-            rc = self.runSingleCommandAsRoot("DEBIAN_FRONTEND=noninteractive apt-get -y dist-upgrade &>> apt.out")
+            rc = yield self.runSingleCommandAsRootAsync("DEBIAN_FRONTEND=noninteractive apt-get -y dist-upgrade &>> apt.out")
             
             if rc != 0:
-                self.runSingleCommandAsRoot("cat apt.out")
+                yield self.runSingleCommandAsRootAsync("cat apt.out")
             
         elif "suse" in self.distro.lower():
-            rc = self.runSingleCommandAsRoot("zypper --non-interactive update &> zypper.out")
+            rc = yield self.runSingleCommandAsRootAsync("zypper --non-interactive update &> zypper.out")
             if rc != 0:
-                self.runSingleCommandAsRoot("cat zypper.out")
+                yield self.runSingleCommandAsRootAsync("cat zypper.out")
 
             
         #elif "oracle" in self.distro.lower() or "centos" in self.distro.lower() or "scientific linux" in self.distro.lower() or "red hat" in self.distro.lower() or "fedora" in self.distro.lower():
         # Assume Red Hat based system as the default.
         else:
             # disable SELINUX
-            self.runSingleCommandAsRoot("bash -c 'echo \\\"SELINUX=Disabled\\\" > /etc/selinux/config'")
-            rc = self.runSingleCommandAsRoot("yum install -y perl wget &> yum.out")
+            yield self.runSingleCommandAsRootAsync("bash -c 'echo \\\"SELINUX=Disabled\\\" > /etc/selinux/config'")
+            rc = yield self.runSingleCommandAsRootAsync("yum install -y perl wget &> yum.out")
         
             if rc != 0:
-                self.runSingleCommandAsRoot("cat yum.out")
+                yield self.runSingleCommandAsRootAsync("cat yum.out")
             
             # boot into the lt or ml kernel if installed.
             # TODO: This is bad. I know it. Do it the right way.
-            self.runSingleCommandAsRoot("if rpm -qa | grep kernel-lt; then sed -i s/DEFAULTKERNEL=kernel/DEFAULTKERNEL=kernel-lt/g /etc/sysconfig/kernel; fi")
-            self.runSingleCommandAsRoot("if rpm -qa | grep kernel-ml; then sed -i s/DEFAULTKERNEL=kernel/DEFAULTKERNEL=kernel-ml/g /etc/sysconfig/kernel; fi")
+            yield self.runSingleCommandAsRootAsync("if rpm -qa | grep kernel-lt; then sed -i s/DEFAULTKERNEL=kernel/DEFAULTKERNEL=kernel-lt/g /etc/sysconfig/kernel; fi")
+            yield self.runSingleCommandAsRootAsync("if rpm -qa | grep kernel-ml; then sed -i s/DEFAULTKERNEL=kernel/DEFAULTKERNEL=kernel-ml/g /etc/sysconfig/kernel; fi")
             
             
-            self.runSingleCommandAsRoot("yum update --disableexcludes=main -y &> yum.out")
+            yield self.runSingleCommandAsRootAsync("yum update --disableexcludes=main -y &> yum.out")
             if rc != 0:
-                self.runSingleCommandAsRoot("cat yum.out")
+                yield self.runSingleCommandAsRootAsync("cat yum.out")
 
             
 
-            rc = self.runSingleCommandAsRoot("mkdir -p /var/log/journal")
+            rc = yield self.runSingleCommandAsRootAsync("mkdir -p /var/log/journal")
                     
         #self.runAllBatchCommands()
         if custom_kernel:
-            rc = self.installCustomKernel(kernel_git_location,kernel_git_branch)
+            rc = yield OFSExecutionEngine.inThread(self.installCustomKernel,kernel_git_location,kernel_git_branch)
             if rc != 0:
                 print "Could not install custom kernel. Continuing with default kernel."
             else:
                 self.custom_kernel = True
         
-        rc = self.runSingleCommandAsRoot("nohup /sbin/reboot &")
         msg = "Node "+self.hostname+" at "+self.ip_address+" updated."
         print msg
         logging.info(msg)
         
-        msg = "Node "+self.hostname+" at "+self.ip_address+" Rebooting."
-        print msg
-        logging.info(msg)
+        if reboot:
+            yield self.rebootAsync()
+        raise OFSExecutionEngine.Return(0)
+    
+    ##
+    # @fn getDownloadCommand(self,url,output_document=None,options=""):
+    #
+    # @param self The object pointer
+    # @param url url of the file
+    # @param output_document File to write. None uses the last part of the url, like wget.
+    # @param options More wget options
+    #
+    # @return wget command that downloads url, through the provisioning cache if there is one.
+    
+    def getDownloadCommand(self,url,output_document=None,options=""):
+        words = ["wget","--quiet"]
+        if options != "":
+            words.append(options)
+        if self.provisioning_cache_url == "":
+            if output_document is not None:
+                words.append("--output-document=%s" % output_document)
+            words.append(url)
+        else:
+            if output_document is None:
+                output_document = os.path.basename(url)
+            words.append("--no-proxy --output-document=%s '%s'" % (output_document,OFSProvisioningCache.getFetchURL(self.provisioning_cache_url,url)))
+        return " ".join(words)
+    
+    ##
+    # @fn useProvisioningCacheAsync(self,proxy_url):
+    #
+    # Points apt, yum, dnf, zypper and wget of this node at the provisioning cache. Coroutine. See OFSExecutionEngine.
+    #
+    # @param self The object pointer
+    # @param proxy_url http://address:port of the cache. Empty string goes back to direct downloads.
+    #
+    # @return (via OFSExecutionEngine.Return) 0 on success.
+    
+    def useProvisioningCacheAsync(self,proxy_url):
+        if proxy_url == "":
+            rc = yield self.runSingleCommandAsRootAsync(OFSProvisioningCache.getClientCommand("off"))
+        else:
+            rc = yield self.runSingleCommandAsRootAsync(OFSProvisioningCache.getClientCommand(proxy_url))
+        if rc == 0:
+            self.provisioning_cache_url = proxy_url
+        raise OFSExecutionEngine.Return(rc)
+    
+    ##
+    # @fn getProvisioningCacheStatus(self,proxy_url):
+    #
+    # Readiness probe of the provisioning cache. See OFSTestWait.
+    #
+    # @param self The object pointer
+    # @param proxy_url http://address:port of the cache.
+    #
+    # @return Dictionary of cache counters, or None if the cache does not answer.
+    
+    def getProvisioningCacheStatus(self,proxy_url):
+        output = []
+        rc = self.runSingleCommand("wget --quiet --no-proxy --output-document=- %s/status" % proxy_url,output)
+        if rc != 0 or len(output) < 2:
+            return None
+        return OFSProvisioningCache.parseStatus(output[1])
     
     ##
     # @fn installCustomKernel(self,kernel_git_location,kernel_git_branch)
@@ -951,6 +2316,35 @@ class OFSTestNode(object):
     
     def installCustomKernel(self,kernel_git_location,kernel_git_branch):
         
+        rc = self.buildCustomKernel(kernel_git_location,kernel_git_branch)
+        if rc != 0:
+            return rc
+        
+        number_cores = self.runSingleCommandBacktick("cat /proc/cpuinfo | grep 'core id' | wc -l")
+        
+        rc = self.runSingleCommandAsRoot("make -j %s modules_install 2>&1 > kinstall.log" % number_cores)
+        if rc != 0:
+            print "Could not make modules_install"
+            return rc
+        
+        rc = self.runSingleCommandAsRoot("make -j %s install 2>&1 >> kinstall.log" % number_cores)
+        if rc != 0:
+            print "Could not make install"
+            return rc
+        
+        return self.setDefaultKernel()
+    
+    ##
+    # @fn buildCustomKernel(self,kernel_git_location,kernel_git_branch)
+    #
+    # This clones and compiles a custom linux kernel from the git location and branch in ~/linux.
+    #
+    # @param self The object pointer
+    # @param kernel_git_location The location of the git repository containing the kernel
+    # @param kernel_git_branch The location of the git branch you want to use.
+    
+    def buildCustomKernel(self,kernel_git_location,kernel_git_branch):
+        
         self.changeDirectory("/home/"+self.current_user)
         print "Cloning kernel repository: git clone %s" %kernel_git_location
         rc = self.runSingleCommand("git clone %s" % kernel_git_location)
@@ -974,12 +2368,8 @@ class OFSTestNode(object):
             print "Could not make olddefconfig"
             return rc
         
-        
-        # CRYPTO_AES_NI_INTEL causes kernel panic on boot as of 4.2.0_rc2. Do not compile it.
-        self.runSingleCommand("sed -i s/CONFIG_CRYPTO_AES_NI_INTEL=y/CONFIG_CRYPTO_AES_NI_INTEL=n/ ./.config")
-        
-        # Enable OrangeFS
-        self.runSingleCommand("echo 'CONFIG_ORANGEFS_FS=m' >> ./.config",)
+        for edit in OFSKernelPackage.CONFIG_EDITS:
+            self.runSingleCommand(edit)
         
         rc = self.runSingleCommand("make -j %s bzImage 2>&1 >> kbuild.log" % number_cores)
         if rc != 0:
@@ -991,16 +2381,16 @@ class OFSTestNode(object):
             print "Could not make modules"
             return rc
         
-        rc = self.runSingleCommandAsRoot("make -j %s modules_install 2>&1 > kinstall.log" % number_cores)
-        if rc != 0:
-            print "Could not make modules_install"
-            return rc
-        
-        rc = self.runSingleCommandAsRoot("make -j %s install 2>&1 >> kinstall.log" % number_cores)
-        if rc != 0:
-            print "Could not make install"
-            return rc
-        
+        return rc
+    
+    ##
+    # @fn setDefaultKernel(self)
+    #
+    # Boots the newest installed kernel from now on.
+    #
+    # @param self The object pointer
+    
+    def setDefaultKernel(self):
         print "Setting default kernel to new kernel"
         
         # first is for debugging purposes
@@ -1014,6 +2404,80 @@ class OFSTestNode(object):
             return rc
         
         return rc
+    
+    ##
+    # @fn getCustomKernelKey(self,kernel_git_location,kernel_git_branch)
+    #
+    # @param self The object pointer
+    # @param kernel_git_location The location of the git repository containing the kernel
+    # @param kernel_git_branch The location of the git branch you want to use.
+    #
+    # @return Dictionary of what a custom kernel built on this node depends on. See OFSKernelPackage.parseKeyOutput. None if the commit is not known.
+    
+    def getCustomKernelKey(self,kernel_git_location,kernel_git_branch):
+        output = []
+        rc = self.runSingleCommand(OFSKernelPackage.getKeyCommand(kernel_git_location,kernel_git_branch),output)
+        if rc != 0 or len(output) < 2:
+            return None
+        return OFSKernelPackage.parseKeyOutput(output[1])
+    
+    ##
+    # @fn packageCustomKernel(self,package_file)
+    #
+    # Packs the kernel built by buildCustomKernel for installKernelPackageAsync.
+    #
+    # @param self The object pointer
+    # @param package_file Archive to create on this node.
+    #
+    # @return Kernel release. Empty string on failure.
+    
+    def packageCustomKernel(self,package_file):
+        output = []
+        rc = self.runSingleCommand(OFSKernelPackage.getPackageCommand("/home/%s/linux" % self.current_user,package_file),output)
+        if rc != 0 or len(output) < 2:
+            logging.exception("Could not package custom kernel on %s" % self.hostname)
+            if len(output) > 1:
+                logging.info(output[1])
+            return ""
+        return OFSKernelPackage.getRelease(output[1])
+    
+    ##
+    # @fn installKernelPackageAsync(self,package_file)
+    #
+    # Installs a kernel package from packageCustomKernel and makes it the default kernel.
+    # Coroutine. See OFSExecutionEngine.
+    #
+    # @param self The object pointer
+    # @param package_file Archive on this node.
+    #
+    # @return (via OFSExecutionEngine.Return) 0 on success.
+    
+    def installKernelPackageAsync(self,package_file):
+        output = []
+        rc = yield self.runSingleCommandAsRootAsync(OFSKernelPackage.getInstallCommand(package_file),output)
+        if rc != 0:
+            logging.exception("Could not install kernel package %s on %s: %s" % (package_file,self.hostname,output))
+            raise OFSExecutionEngine.Return(rc)
+        
+        rc = yield OFSExecutionEngine.inThread(self.setDefaultKernel)
+        if rc == 0:
+            self.custom_kernel = True
+        yield self.runSingleCommandAsync("rm -f %s" % package_file)
+        raise OFSExecutionEngine.Return(rc)
+    
+    ##
+    # @fn rebootAsync(self)
+    #
+    # Starts a reboot. See OFSTestNetwork.waitForRebootAsync. Coroutine. See OFSExecutionEngine.
+    #
+    # @param self The object pointer
+    
+    def rebootAsync(self):
+        rc = yield self.runSingleCommandAsRootAsync("nohup /sbin/reboot &")
+        msg = "Node "+self.hostname+" at "+self.ip_address+" Rebooting."
+        print msg
+        logging.info(msg)
+        raise OFSExecutionEngine.Return(0)
     #
     
 
@@ -1037,7 +2501,7 @@ class OFSTestNode(object):
             
             self.changeDirectory("/opt")
             print "Downloading %s" % self.hadoop_version
-            self.runSingleCommand("wget --quiet http://www.gtlib.gatech.edu/pub/apache/hadoop/core/%s/%s.tar.gz" % (self.hadoop_version,self.hadoop_version),output )
+            self.runSingleCommand(self.getDownloadCommand("http://www.gtlib.gatech.edu/pub/apache/hadoop/core/%s/%s.tar.gz" % (self.hadoop_version,self.hadoop_version)),output )
             print "Installing %s to %s" % (self.hadoop_version,self.hadoop_location)
             self.runSingleCommand("tar -zxf %s.tar.gz" % self.hadoop_version)
         else:
@@ -1095,7 +2559,7 @@ class OFSTestNode(object):
             tempdir = self.current_directory
             self.changeDirectory(build_location)
             
-            rc = self.runSingleCommand("wget --quiet %s" % url)
+            rc = self.runSingleCommand(self.getDownloadCommand(url))
             if rc != 0:
                 logging.exception( "Could not download %s from %s." % (self.openmpi_version,url))
                 self.changeDirectory(tempdir)
@@ -1133,7 +2597,7 @@ class OFSTestNode(object):
             
     
             logging.info( "Configuring %s" % self.openmpi_version)
-            rc = self.runSingleCommand(configure,output)
+            rc = self.runCompileStage("openmpi",configure,output)
             
             if rc != 0:
                 logging.exception( "Configure of %s failed. rc=%d" % (self.openmpi_version,rc))
@@ -1142,7 +2606,7 @@ class OFSTestNode(object):
                 return rc
             
             logging.info( "Making %s" % self.openmpi_version)
-            rc = self.runSingleCommand("make &> openmpimake.log")
+            rc = self.runCompileStage("openmpi","&> openmpimake.log",None,True)
             if rc != 0:
                 logging.exception( "Make of %s failed.")
                 self.runSingleCommand("cat openmpimake.log")
@@ -1196,7 +2660,7 @@ class OFSTestNode(object):
         rc = self.changeDirectory(build_location+"/mdtest") 
         
         # install mdtest
-        rc = self.runSingleCommand("wget --quiet %s/mdtest-1.9.3.tgz" % self.url_base)
+        rc = self.runSingleCommand(self.getDownloadCommand("%s/mdtest-1.9.3.tgz" % self.url_base))
 
         if rc != 0:
             print "Warning: Could not download mdtest"
@@ -1218,7 +2682,7 @@ class OFSTestNode(object):
         rc = self.changeDirectory(build_location) 
         
         # install mdtest
-        rc = self.runSingleCommand("wget --quiet %s/simul-1.14.tar.gz" % self.url_base)
+        rc = self.runSingleCommand(self.getDownloadCommand("%s/simul-1.14.tar.gz" % self.url_base))
 
         if rc != 0:
             print "Warning: Could not download simul"
@@ -1245,7 +2709,7 @@ class OFSTestNode(object):
         rc = self.changeDirectory(build_location) 
         
         # install mdtest
-        rc = self.runSingleCommand("wget --quiet %s/miranda_io-1.0.1.tar.gz" % self.url_base)
+        rc = self.runSingleCommand(self.getDownloadCommand("%s/miranda_io-1.0.1.tar.gz" % self.url_base))
 
         if rc != 0:
             print "Warning: Could not download miranda_io"
@@ -1277,7 +2741,7 @@ class OFSTestNode(object):
         #mpi-tile-io
         rc = self.changeDirectory(build_location)
 
-        rc = self.runSingleCommand("wget --quiet %s/mpi-tile-io-omnibond.tar.gz" % self.url_base)
+        rc = self.runSingleCommand(self.getDownloadCommand("%s/mpi-tile-io-omnibond.tar.gz" % self.url_base))
 
         if rc != 0:
             print "Warning: Could not download mpi-tile-io"
@@ -1299,7 +2763,7 @@ class OFSTestNode(object):
         #NPB
         rc = self.changeDirectory(build_location)
 
-        rc = self.runSingleCommand("wget --quiet %s/NPB3.3.1-omnibond.tar.gz" % self.url_base)
+        rc = self.runSingleCommand(self.getDownloadCommand("%s/NPB3.3.1-omnibond.tar.gz" % self.url_base))
 
         if rc != 0:
             print "Warning: Could not download NPB3.3.1"
@@ -1348,7 +2812,7 @@ class OFSTestNode(object):
             
         self.changeDirectory(build_location)
         rc = 0
-        rc = self.runSingleCommand("wget --quiet %s/IOR-2.10.3.tgz" % self.url_base)
+        rc = self.runSingleCommand(self.getDownloadCommand("%s/IOR-2.10.3.tgz" % self.url_base))
         if rc != 0:
             print "Warning: Could not download IOR"
             
@@ -1444,7 +2908,7 @@ class OFSTestNode(object):
         self.runSingleCommand("mkdir -p "+dest_dir)
         self.changeDirectory(dest_dir)
         self.runSingleCommand("rm " + tarfile)
-        rc = self.runSingleCommand("wget --quiet " + tarurl, output)
+        rc = self.runSingleCommand(self.getDownloadCommand(tarurl), output)
         if rc != 0:
             logging.exception("Could not download benchmarks")
             
@@ -1499,7 +2963,7 @@ class OFSTestNode(object):
         tarfile = os.path.basename(tarurl)
         self.changeDirectory(dest_dir)
         self.runSingleCommand("rm " + tarfile)
-        self.runSingleCommand("wget --quiet " + tarurl)
+        self.runSingleCommand(self.getDownloadCommand(tarurl))
         tarflags = ""
         taridx = 0
     
@@ -1522,11 +2986,11 @@ class OFSTestNode(object):
         tardir = tarfile[:taridx]
         self.runSingleCommand("tar %s %s" % (tarflags, tarfile))
         self.changeDirectory(tardir)
-        self.runSingleCommand("./prepare")
-        self.runSingleCommand("./configure "+ configure_options)
+        self.runBuildStage("configure","./prepare")
+        self.runCompileStage("configure","./configure "+ configure_options)
         
-        self.runSingleCommand("make "+ make_options)
-        self.runSingleCommand("make install "+install_options)
+        self.runCompileStage("make",make_options,None,True)
+        self.runBuildStage("install","make install "+install_options)
     
     
     ##
@@ -1548,7 +3012,7 @@ class OFSTestNode(object):
         self.changeDirectory(dest_dir)
         self.runSingleCommand("rm " + tarfile)
         output = []
-        rc = self.runSingleCommand("wget --quiet " + tarurl)
+        rc = self.runSingleCommand(self.getDownloadCommand(tarurl))
         if rc != 0:
             logging.exception("Could not download OrangeFS")
 
@@ -1740,22 +3204,15 @@ class OFSTestNode(object):
         output = []
 
         # Installs patches to OrangeFS. Assumes patches are p1.
-        logging.info( ofs_patch_files)
-        for patch in ofs_patch_files:
-            
-            patch_name = os.path.basename(patch)
-            
-            logging.info( "Patching: patch -p0 < %s" % patch_name)
-            rc = self.runSingleCommand("patch -p0 < %s" % patch_name)
-            if rc != 0:
-                logging.exception( "Patch Failed!")
+        self.patchOFSSource(ofs_patch_files)
        
-        # Run prepare. 
-        rc = self.runSingleCommand("./prepare")
-        if rc != 0:
-            logging.exception( self.ofs_source_location+"/prepare failed!") 
-            
-            return rc
+        # Run prepare. Incremental builds run it later, only if they run configure.
+        if not self.incremental_build:
+            rc = self.runBuildStage("configure","./prepare")
+            if rc != 0:
+                logging.exception( self.ofs_source_location+"/prepare failed!") 
+                
+                return rc
         
         #sanity check for OFS installation prefix
         rc = self.runSingleCommand("mkdir -p "+ofs_prefix)
@@ -1820,8 +3277,22 @@ class OFSTestNode(object):
         elif security_mode.lower() == "cert":
             configure_opts = configure_opts+" --enable-security-cert"
         
-        print "Configuring OrangeFS"
-        rc = self.runSingleCommand("./configure %s &> configure-orangefs.out" % configure_opts, output)
+        # configure rewrites the Makefiles, which rebuilds everything. An incremental build
+        # skips it if the options and the build system did not change since the last run.
+        configure_digest = hashlib.sha256(configure_opts).hexdigest()
+        if self.incremental_build and self.runSingleCommand("[ -f config.status ] && grep -qx %s .ofstest-configure && ! find . -maxdepth 2 -newer .ofstest-configure \\( -name 'configure*' -o -name 'Makefile.in' -o -name '*.m4' \\) | grep -q ." % configure_digest) == 0:
+            print "OrangeFS configuration has not changed. Not running configure."
+            rc = 0
+        else:
+            if self.incremental_build:
+                rc = self.runBuildStage("configure","./prepare")
+                if rc != 0:
+                    logging.exception( self.ofs_source_location+"/prepare failed!") 
+                    return rc
+            print "Configuring OrangeFS"
+            rc = self.runCompileStage("configure","./configure %s &> configure-orangefs.out" % configure_opts, output)
+            if rc == 0 and self.incremental_build:
+                self.runSingleCommand("echo %s > .ofstest-configure" % configure_digest)
         
         # did configure run correctly?
         if rc == 0:
@@ -1839,6 +3310,80 @@ class OFSTestNode(object):
 
         return rc
     
+    ##
+    # @fn patchOFSSource(self,ofs_patch_files=[]):
+    #
+    # Applies patches to the OrangeFS source. The patch files must be in the source directory.
+    #
+    # @param self The object pointer
+    # @param ofs_patch_files List of patch files for OrangeFS
+    
+    def patchOFSSource(self,ofs_patch_files=[]):
+        self.changeDirectory(self.ofs_source_location)
+        logging.info( ofs_patch_files)
+        for patch in ofs_patch_files:
+            
+            patch_name = os.path.basename(patch)
+            
+            logging.info( "Patching: patch -p0 < %s" % patch_name)
+            rc = self.runSingleCommand("patch -p0 < %s" % patch_name)
+            if rc != 0:
+                logging.exception( "Patch Failed!")
+    
+    ##
+    # @fn getOFSSourceDigest(self):
+    #
+    # Hashes every file of the OrangeFS source tree, so the same source gives the same
+    # digest however it was obtained. Build logs (*.out) are left out.
+    #
+    # @param self The object pointer
+    #
+    # @return Hex SHA-256 of the source tree. Empty string on failure.
+    
+    def getOFSSourceDigest(self):
+        output = []
+        rc = self.runSingleCommand("cd %s && find . -type f ! -name '*.out' -print0 | LC_ALL=C sort -z | xargs -0 sha256sum | sha256sum | cut -d ' ' -f 1" % self.ofs_source_location,output)
+        if rc != 0 or len(output) < 2:
+            logging.exception("Could not hash OrangeFS source at %s" % self.ofs_source_location)
+            return ""
+        return output[1].strip()
+    
+    ##
+    # @fn archiveOFSInstallation(self,archive_file):
+    #
+    # Packs the OrangeFS installation into a compressed tar archive. Paths are relative to /.
+    #
+    # @param self The object pointer
+    # @param archive_file Archive to create on this node.
+    #
+    # @return Return code of tar.
+    
+    def archiveOFSInstallation(self,archive_file):
+        rc = self.runSingleCommand("tar -C / -czf %s %s" % (archive_file,self.ofs_installation_location.strip("/")))
+        if rc != 0:
+            logging.exception("Could not archive OrangeFS installation at %s" % self.ofs_installation_location)
+        return rc
+    
+    ##
+    # @fn deployOFSInstallationArchive(self,archive_file,ofs_prefix):
+    #
+    # Unpacks an archive from archiveOFSInstallation in place of configure, make and make install.
+    #
+    # @param self The object pointer
+    # @param archive_file Archive on this node.
+    # @param ofs_prefix Installation location in the archive.
+    #
+    # @return Return code of tar.
+    
+    def deployOFSInstallationArchive(self,archive_file,ofs_prefix):
+        # configureOFSSource opens /opt for the installation.
+        self.runSingleCommandAsRoot("chmod a+w /opt")
+        self.runSingleCommand("rm -rf %s && mkdir -p %s" % (ofs_prefix,ofs_prefix))
+        rc = self.runSingleCommand("tar -C / -xzf %s" % archive_file)
+        if rc != 0:
+            logging.exception("Could not deploy OrangeFS archive %s to %s" % (archive_file,ofs_prefix))
+        return rc
+    
     ##
     # @fn checkMount(self,mount_point=None,output=[]):
     #
@@ -1854,7 +3399,7 @@ class OFSTestNode(object):
 
 
         
-    def checkMount(self,mount_point=None,output=[]):
+    def checkMount(self,mount_point=None,output=None):
         if mount_point is None:
             mount_point = self.ofs_mount_point
         mount_check = self.runSingleCommand("mount | grep %s" % mount_point,output)
@@ -1897,8 +3442,10 @@ class OFSTestNode(object):
         self.changeDirectory(self.ofs_source_location)
         output = []
  
-        # Make
-        rc = self.runSingleCommand("make clean && make %s &> make-orangefs.out" % make_options, output)
+        # Make. An incremental build keeps the objects of the last run.
+        if not self.incremental_build:
+            rc = self.runBuildStage("make","make clean &> make-clean.out")
+        rc = self.runCompileStage("make","%s &> make-orangefs.out" % make_options, output, True)
         if rc != 0:
             logging.exception( "Build (make) of of OrangeFS at %s Failed!" % self.ofs_source_location)
             self.runSingleCommand("cat make-orangefs.out")
@@ -1911,7 +3458,7 @@ class OFSTestNode(object):
             return rc;
         
         if self.build_kmod:
-            rc = self.runSingleCommand("make kmod &> make-kmod.out",output)
+            rc = self.runCompileStage("kmod","kmod &> make-kmod.out",output,True)
             self.module_name = "pvfs2"
             if rc != 0:
                 self.runSingleCommand("cat make-kmod.out")
@@ -1920,6 +3467,168 @@ class OFSTestNode(object):
             
         return rc
     
+    ##
+    # @fn getCompilerAsync(self):
+    #
+    # Coroutine. See OFSExecutionEngine.
+    #
+    # @param self The object pointer
+    #
+    # @return (via OFSExecutionEngine.Return) gcc version, target and distcc availability from OFSDistributedBuild.parseCompilerProbe. None if gcc did not answer.
+    
+    def getCompilerAsync(self):
+        output = []
+        yield self.runSingleCommandAsync(OFSDistributedBuild.COMPILER_PROBE_COMMAND,output)
+        if len(output) < 2:
+            raise OFSExecutionEngine.Return(None)
+        raise OFSExecutionEngine.Return(OFSDistributedBuild.parseCompilerProbe(output[1]))
+    
+    ##
+    # @fn getMakeJobs(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Number of parallel make jobs: make_jobs if set, else distcc_jobs for distributed builds, else the number of cores.
+    
+    def getMakeJobs(self):
+        if self.make_jobs is not None and int(self.make_jobs) > 0:
+            return int(self.make_jobs)
+        if self.distcc_hosts != "" and self.distcc_jobs > 0:
+            return self.distcc_jobs
+        return max(int(self.number_cores),1)
+    
+    ##
+    # @fn getCompilerEnvironment(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Shell commands that make the following commands compile through ccache and distcc, as configured.
+    
+    def getCompilerEnvironment(self):
+        return OFSBuildStats.getCCacheEnvironment(self.ccache_dir) + OFSDistributedBuild.getDistccEnvironment(self.distcc_hosts,self.ccache_dir != "")
+    
+    ##
+    # @fn runCompileStage(self,stage,command,output=None,make=False):
+    #
+    # Runs a build command that compiles, through ccache and distcc as configured. If a
+    # distributed build fails, distcc is turned off and the command runs again on this node.
+    #
+    # @param self The object pointer
+    # @param stage Build stage, e.g. configure, make or kmod
+    # @param command Shell command. For make, the make arguments.
+    # @param output Output list
+    # @param make Run make with getMakeJobs() parallel jobs and command as arguments?
+    #
+    # @return Return code of the command.
+    
+    def runCompileStage(self,stage,command,output=None,make=False):
+        while True:
+            if make:
+                full_command = "make -j %d %s" % (self.getMakeJobs(),command)
+            else:
+                full_command = command
+            rc = self.runBuildStage(stage,self.getCompilerEnvironment() + full_command,output)
+            if rc == 0 or self.distcc_hosts == "":
+                return rc
+            print "Distributed %s failed on %s. Building locally." % (stage,self.hostname)
+            logging.warn("Distributed %s failed with DISTCC_HOSTS=%s. Building locally." % (stage,self.distcc_hosts))
+            self.distcc_hosts = ""
+            self.distcc_jobs = 0
+    
+    ##
+    # @fn runBuildStage(self,stage,command,output=None,as_root=False):
+    #
+    # Runs a build command and adds its time to build_stage_times.
+    #
+    # @param self The object pointer
+    # @param stage Build stage, e.g. configure, make, kmod or install
+    # @param command Shell command
+    # @param output Output list
+    # @param as_root Run as root?
+    #
+    # @return Return code of the command.
+    
+    def runBuildStage(self,stage,command,output=None,as_root=False):
+        start = time.time()
+        if as_root:
+            rc = self.runSingleCommandAsRoot(command,output)
+        else:
+            rc = self.runSingleCommand(command,output)
+        self.build_stage_times.append((stage,time.time() - start,rc))
+        return rc
+    
+    ##
+    # @fn setupIncrementalBuild(self,build_location,ccache_dir="",make_jobs=None):
+    #
+    # Builds OrangeFS in build_location, which is kept between runs, so make only rebuilds
+    # what changed. Compiles through ccache if ccache_dir is given and ccache is installed.
+    # Call after the source was copied. See syncOFSBuildLocation.
+    #
+    # @param self The object pointer
+    # @param build_location Build directory on this node
+    # @param ccache_dir ccache directory on this node. Empty string for no ccache.
+    # @param make_jobs Parallel make jobs. None uses the number of cores.
+    #
+    # @return 0 on success. Not 0 if the source could not be copied to build_location.
+    
+    def setupIncrementalBuild(self,build_location,ccache_dir="",make_jobs=None):
+        self.incremental_build = True
+        self.ofs_build_location = build_location
+        self.make_jobs = make_jobs
+        self.ccache_dir = ""
+        if ccache_dir is not None and ccache_dir != "":
+            if self.runSingleCommand("which ccache") != 0:
+                print "ccache is not installed on %s. Building without it." % self.hostname
+            elif self.runSingleCommand("mkdir -p %s" % ccache_dir) == 0:
+                self.ccache_dir = ccache_dir
+        return self.syncOFSBuildLocation()
+    
+    ##
+    # @fn syncOFSBuildLocation(self):
+    #
+    # Copies the OrangeFS source into ofs_build_location and builds there. Only files whose
+    # contents changed are copied, so make sees the others as up to date.
+    #
+    # @param self The object pointer
+    #
+    # @return Return code of rsync.
+    
+    def syncOFSBuildLocation(self):
+        if self.ofs_build_location == "" or self.ofs_build_location.rstrip("/") == self.ofs_source_location.rstrip("/"):
+            return 0
+        rc = self.runSingleCommand("mkdir -p %s && rsync -rlc %s/ %s/" % (self.ofs_build_location,self.ofs_source_location.rstrip("/"),self.ofs_build_location.rstrip("/")))
+        if rc != 0:
+            logging.exception("Could not copy OrangeFS source from %s to build directory %s" % (self.ofs_source_location,self.ofs_build_location))
+            return rc
+        self.ofs_source_location = self.ofs_build_location.rstrip("/")
+        return rc
+    
+    ##
+    # @fn getCCacheStats(self):
+    #
+    # @param self The object pointer
+    #
+    # @return ccache statistics of ccache_dir from OFSBuildStats.parseCCacheStats, or None without ccache.
+    
+    def getCCacheStats(self):
+        if self.ccache_dir == "":
+            return None
+        output = []
+        self.runSingleCommand("export CCACHE_DIR=%s; %s" % (self.ccache_dir,OFSBuildStats.CCACHE_STATS_COMMAND),output)
+        if len(output) < 2:
+            return None
+        return OFSBuildStats.parseCCacheStats(output[1])
+    
+    ##
+    # @fn getBuildReport(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Build time per stage and the ccache hit rate of the last OrangeFS build.
+    
+    def getBuildReport(self):
+        return OFSBuildStats.formatBuildReport(self.hostname,self.build_stage_times,OFSBuildStats.getCCacheDelta(self.ccache_stats,self.getCCacheStats()),self.incremental_build)
+    
     ##
     # @fn getKernelVersion(self):
     #
@@ -1946,10 +3655,7 @@ class OFSTestNode(object):
     def installOFSSource(self,install_options="",install_as_root=False):
         self.changeDirectory(self.ofs_source_location)
         output = []
-        if install_as_root:
-            rc = self.runSingleCommandAsRoot("make install &> make-install.out",output)
-        else:
-            rc = self.runSingleCommand("make install &> make-install.out",output)
+        rc = self.runBuildStage("install","make install &> make-install.out",output,install_as_root)
         
         if rc != 0:
             logging.exception("Could not install OrangeFS from %s to %s" % (self.ofs_source_location,self.ofs_installation_location))
@@ -1957,7 +3663,7 @@ class OFSTestNode(object):
             return rc
         
         if self.build_kmod:
-            rc = self.runSingleCommand("make kmod_install kmod_prefix=%s &> make-kmod-install.out" % self.ofs_installation_location,output)
+            rc = self.runBuildStage("install","make kmod_install kmod_prefix=%s &> make-kmod-install.out" % self.ofs_installation_location,output)
             if rc != 0:
                 self.runSingleCommandAsRoot("cat make-kmod-install.out")
                 logging.exception("Could not install OrangeFS from %s to %s" % (self.ofs_source_location,self.ofs_installation_location))
@@ -1965,7 +3671,7 @@ class OFSTestNode(object):
         if self.enable_hadoop:
             if self.hadoop_version == 'hadoop-1.2.1':
                 self.changeDirectory("%s/src/client/hadoop/orangefs-hadoop1" % self.ofs_source_location)
-                rc = self.runSingleCommand("mvn -Dmaven.compiler.target=1.6 -Dmaven.compiler.source=1.6 -DskipTests clean package &> build-hadoop.out")
+                rc = self.runBuildStage("hadoop","mvn -Dmaven.compiler.target=1.6 -Dmaven.compiler.source=1.6 -DskipTests clean package &> build-hadoop.out")
                 if rc != 0:
                     self.runSingleCommand("cat build-hadoop.out")
                     logging.exception("Could not build and install hadoop1 libraries" )
@@ -1974,7 +3680,7 @@ class OFSTestNode(object):
                 self.restoreDirectory()
             else:
                 self.changeDirectory("%s/src/client/hadoop/orangefs-hadoop2" % self.ofs_source_location)
-                rc = self.runSingleCommand("mvn -Dmaven.compiler.target=1.7 -Dmaven.compiler.source=1.7 -DskipTests clean package &> build-hadoop.out")
+                rc = self.runBuildStage("hadoop","mvn -Dmaven.compiler.target=1.7 -Dmaven.compiler.source=1.7 -DskipTests clean package &> build-hadoop.out")
                 if rc != 0:
                     logging.exception("Could not build and install hadoop2 libraries" )
                     self.runSingleCommand("cat build-hadoop.out")
@@ -2068,13 +3774,24 @@ class OFSTestNode(object):
 
     def copyOFSInstallationToNode(self,destination_node,*args,**kwargs):
         rc = self.copyToRemoteNode(self.ofs_installation_location+"/", destination_node, self.ofs_installation_location, True)
-        destination_node.ofs_installation_location = self.ofs_installation_location
-        destination_node.ofs_branch =self.ofs_branch
+        destination_node.setOFSInstallationFromNode(self)
+        return rc
+    
+    ##
+    # @fn setOFSInstallationFromNode(self,source_node):
+    #
+    # Sets the OrangeFS installation attributes after the installation of source_node was
+    # copied to this node. See copyOFSInstallationToNode and OFSTestNetwork.copyOFSToNodeList.
+    # @param self The object pointer
+    # @param source_node OFSTestNode from which the installation was copied.
+    
+    def setOFSInstallationFromNode(self,source_node):
+        self.ofs_installation_location = source_node.ofs_installation_location
+        self.ofs_branch = source_node.ofs_branch
         # TODO: Copy ofs_conf_file, don't just link
         #rc = self.copyToRemoteNode(self.ofs_conf_file+"/", destination_node, self.ofs_conf_file, True)
-        destination_node.ofs_conf_file =self.ofs_conf_file
-        destination_node.ofs_fs_name = destination_node.runSingleCommandBacktick("grep Name %s | awk '{print \\$2}'" % destination_node.ofs_conf_file)
-        return rc
+        self.ofs_conf_file = source_node.ofs_conf_file
+        self.ofs_fs_name = self.runSingleCommandBacktick("grep Name %s | awk '{print \\$2}'" % self.ofs_conf_file)
     
     
         ##
@@ -2089,18 +3806,7 @@ class OFSTestNode(object):
 
     def copyOpenMPIInstallationToNode(self,destination_node,*args,**kwargs):
         
-        destination_node.openmpi_source_location = self.openmpi_source_location
-        destination_node.openmpi_installation_location = self.openmpi_installation_location
-        destination_node.ior_installation_location = self.ior_installation_location
-        destination_node.mdtest_installation_location = self.mdtest_installation_location
-        destination_node.simul_installation_location = self.simul_installation_location
-        destination_node.miranda_io_installation_location = self.miranda_io_installation_location
-        destination_node.heidelberg_installation_location = self.heidelberg_installation_location
-        destination_node.mpiiotest_installation_location = self.mpiiotest_installation_location
-        destination_node.stadler_installation_location = self.stadler_installation_location
-        destination_node.mpi_tile_io_installation_location = self.mpi_tile_io_installation_location
-        destination_node.npb_mpi_installation_location = self.npb_mpi_installation_location
-        destination_node.created_openmpihosts = self.created_openmpihosts
+        destination_node.setOpenMPIInstallationFromNode(self)
 
         
         rc = destination_node.runSingleCommand("mkdir -p " + destination_node.openmpi_source_location)
@@ -2183,6 +3889,51 @@ class OFSTestNode(object):
     
        
     
+    ##
+    # @fn setOpenMPIInstallationFromNode(self,source_node):
+    #
+    # Sets the OpenMPI and MPI benchmark attributes after the installation of source_node was
+    # copied to this node. See copyOpenMPIInstallationToNode and OFSTestNetwork.copyOpenMPIToNodeList.
+    # @param self The object pointer
+    # @param source_node OFSTestNode from which the installation was copied.
+    
+    def setOpenMPIInstallationFromNode(self,source_node):
+        self.openmpi_source_location = source_node.openmpi_source_location
+        self.openmpi_installation_location = source_node.openmpi_installation_location
+        self.ior_installation_location = source_node.ior_installation_location
+        self.mdtest_installation_location = source_node.mdtest_installation_location
+        self.simul_installation_location = source_node.simul_installation_location
+        self.miranda_io_installation_location = source_node.miranda_io_installation_location
+        self.heidelberg_installation_location = source_node.heidelberg_installation_location
+        self.mpiiotest_installation_location = source_node.mpiiotest_installation_location
+        self.stadler_installation_location = source_node.stadler_installation_location
+        self.mpi_tile_io_installation_location = source_node.mpi_tile_io_installation_location
+        self.npb_mpi_installation_location = source_node.npb_mpi_installation_location
+        self.created_openmpihosts = source_node.created_openmpihosts
+    
+    ##
+    # @fn getOpenMPIInstallationPaths(self):
+    #
+    # @param self The object pointer
+    #
+    # @return Files and directories copied by copyOpenMPIInstallationToNode that are set on this node.
+    
+    def getOpenMPIInstallationPaths(self):
+        paths = [
+            self.openmpi_source_location,
+            self.openmpi_installation_location,
+            self.created_openmpihosts,
+            self.ior_installation_location,
+            self.mdtest_installation_location,
+            self.simul_installation_location,
+            self.miranda_io_installation_location,
+            self.heidelberg_installation_location,
+            self.stadler_installation_location,
+            self.mpi_tile_io_installation_location,
+            self.npb_mpi_installation_location
+            ]
+        return [path for path in paths if path is not None and path != ""]
+    
     ##
     # @fn copyOFSUserCertsToNode(self,user,destination_node):
     #
@@ -2360,7 +4111,18 @@ class OFSTestNode(object):
         
       
     def startOFSServer(self,run_as_root=False,debug_mask="network,client,server"):
+        return OFSExecutionEngine.runCoroutine(self.startOFSServerAsync(run_as_root,debug_mask))
         
+    ##
+    # @fn startOFSServerAsync(self,run_as_root=False,debug_mask="network,client,server"):
+    #
+    # Coroutine version of startOFSServer. See OFSExecutionEngine.
+    # @param self The object pointer
+    # @param run_as_root Run as root user
+    # @param debug_mask Debug mask for server
+
+    def startOFSServerAsync(self,run_as_root=False,debug_mask="network,client,server"):
+
         output = []
         self.changeDirectory(self.ofs_installation_location)
         #print self.runSingleCommand("pwd")
@@ -2380,26 +4142,26 @@ class OFSTestNode(object):
         
         
         print "Attempting to start OFSServer for host %s" % self.hostname
-        self.setEnvironmentVariable("LD_LIBRARY_PATH",self.db4_lib_dir+":"+self.ofs_installation_location+"/lib64:"+self.ofs_installation_location+"/lib")
+        yield self.setEnvironmentVariableAsync("LD_LIBRARY_PATH",self.db4_lib_dir+":"+self.ofs_installation_location+"/lib64:"+self.ofs_installation_location+"/lib")
 
 
         # need to get the alias list from orangefs.conf file
         if self.alias_list is None:
-            self.alias_list = self.getAliasesFromConfigFile(self.ofs_conf_file)
+            self.alias_list = yield OFSExecutionEngine.inThread(self.getAliasesFromConfigFile,self.ofs_conf_file)
         
         if len(self.alias_list) == 0:
             logging.exception( "Could not find any aliases in %s/etc/orangefs.conf" % self.ofs_installation_location)
-            return -1
+            raise OFSExecutionEngine.Return(-1)
 
         #Now set up the pvfs2tab_file
         self.ofs_mount_point = "/tmp/mount/orangefs"
-        self.runSingleCommand("mkdir -p "+ self.ofs_mount_point)
-        self.runSingleCommand("mkdir -p %s/etc" % self.ofs_installation_location)
-        self.runSingleCommand("echo \"%s://%s:%d/%s %s pvfs2 defaults 0 0\" > %s/etc/orangefstab" % (self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name,self.ofs_mount_point,self.ofs_installation_location))
-        self.runSingleCommandAsRoot("ln -s %s/etc/orangefstab /etc/pvfs2tab" % self.ofs_installation_location)
-        self.setEnvironmentVariable("PVFS2TAB_FILE",self.ofs_installation_location + "/etc/orangefstab")
-        self.setEnvironmentVariable("OFS_SRC_DIR",self.ofs_source_location)
-        self.setEnvironmentVariable("OFS_INSTALL_DIR",self.ofs_installation_location)
+        yield self.runSingleCommandAsync("mkdir -p "+ self.ofs_mount_point)
+        yield self.runSingleCommandAsync("mkdir -p %s/etc" % self.ofs_installation_location)
+        yield self.runSingleCommandAsync("echo \"%s://%s:%d/%s %s pvfs2 defaults 0 0\" > %s/etc/orangefstab" % (self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name,self.ofs_mount_point,self.ofs_installation_location))
+        yield self.runSingleCommandAsRootAsync("ln -s %s/etc/orangefstab /etc/pvfs2tab" % self.ofs_installation_location)
+        self.current_environment["PVFS2TAB_FILE"] = self.ofs_installation_location + "/etc/orangefstab"
+        self.current_environment["OFS_SRC_DIR"] = self.ofs_source_location
+        yield self.setEnvironmentVariableAsync("OFS_INSTALL_DIR",self.ofs_installation_location)
 
 
 
@@ -2411,14 +4173,14 @@ class OFSTestNode(object):
             if self.hostname in alias:
                 
                 # create storage space for the server
-                rc = self.runSingleCommand("%s/sbin/pvfs2-server -p %s/pvfs2-server-%s.pid -f %s/etc/orangefs.conf -a %s" % ( self.ofs_installation_location,self.ofs_installation_location,self.hostname,self.ofs_installation_location,alias),output)
+                rc = yield self.runSingleCommandAsync("%s/sbin/pvfs2-server -p %s/pvfs2-server-%s.pid -f %s/etc/orangefs.conf -a %s" % ( self.ofs_installation_location,self.ofs_installation_location,self.hostname,self.ofs_installation_location,alias),output)
                 if rc != 0:
                     # If storage space is already there, creating it will fail. Try deleting and recreating.
-                    rc = self.runSingleCommand("%s/sbin/pvfs2-server -p %s/pvfs2-server-%s.pid -r %s/etc/orangefs.conf -a %s" % ( self.ofs_installation_location,self.ofs_installation_location,self.hostname,self.ofs_installation_location,alias),output)
-                    rc = self.runSingleCommand("%s/sbin/pvfs2-server -p %s/pvfs2-server-%s.pid -f %s/etc/orangefs.conf -a %s" % ( self.ofs_installation_location,self.ofs_installation_location,self.hostname,self.ofs_installation_location,alias),output)
+                    rc = yield self.runSingleCommandAsync("%s/sbin/pvfs2-server -p %s/pvfs2-server-%s.pid -r %s/etc/orangefs.conf -a %s" % ( self.ofs_installation_location,self.ofs_installation_location,self.hostname,self.ofs_installation_location,alias),output)
+                    rc = yield self.runSingleCommandAsync("%s/sbin/pvfs2-server -p %s/pvfs2-server-%s.pid -f %s/etc/orangefs.conf -a %s" % ( self.ofs_installation_location,self.ofs_installation_location,self.hostname,self.ofs_installation_location,alias),output)
                     if rc != 0:
                         logging.exception( "Could not create OrangeFS storage space")
-                        return rc
+                        raise OFSExecutionEngine.Return(rc)
               
                 
                 # Are we running this as root? 
@@ -2429,25 +4191,25 @@ class OFSTestNode(object):
                     
                 server_start = "%s %s/sbin/pvfs2-server -p %s/pvfs2-server-%s.pid %s/etc/orangefs.conf -a %s" % (prefix,self.ofs_installation_location,self.ofs_installation_location,self.hostname,self.ofs_installation_location,alias)
                 print server_start
-                rc = self.runSingleCommand(server_start,output)
+                rc = yield self.runSingleCommandAsync(server_start,output)
                 
-                # give the servers 15 seconds to get running
+                # wait for the server to get running
                 print "Starting OrangeFS servers..."
-                time.sleep(15)
+                yield OFSTestWait.waitUntilAsync(self.isProcessRunningAsync,"OrangeFS server %s on %s" % (alias,self.hostname),timeout=60,old_wait=15,args=["pvfs2-server.* -a %s" % alias])
 
         #Now set up the pvfs2tab_file
         self.ofs_mount_point = "/tmp/mount/orangefs"
-        self.runSingleCommand("mkdir -p "+ self.ofs_mount_point)
-        self.runSingleCommand("mkdir -p %s/etc" % self.ofs_installation_location)
-        self.runSingleCommand("echo \"%s://%s:%d/%s %s pvfs2 defaults 0 0\" > %s/etc/orangefstab" % (self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name,self.ofs_mount_point,self.ofs_installation_location))
-        self.runSingleCommandAsRoot("ln -s %s/etc/orangefstab /etc/pvfs2tab" % self.ofs_installation_location)
-        self.setEnvironmentVariable("OFS_MOUNTPOINT",self.ofs_mount_point)
+        yield self.runSingleCommandAsync("mkdir -p "+ self.ofs_mount_point)
+        yield self.runSingleCommandAsync("mkdir -p %s/etc" % self.ofs_installation_location)
+        yield self.runSingleCommandAsync("echo \"%s://%s:%d/%s %s pvfs2 defaults 0 0\" > %s/etc/orangefstab" % (self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name,self.ofs_mount_point,self.ofs_installation_location))
+        yield self.runSingleCommandAsRootAsync("ln -s %s/etc/orangefstab /etc/pvfs2tab" % self.ofs_installation_location)
+        yield self.setEnvironmentVariableAsync("OFS_MOUNTPOINT",self.ofs_mount_point)
 
 
         # set the debug mask
-        self.runSingleCommand("%s/bin/pvfs2-set-debugmask -m %s \"%s\"" % (self.ofs_installation_location,self.ofs_mount_point,debug_mask))
+        yield self.runSingleCommandAsync("%s/bin/pvfs2-set-debugmask -m %s \"%s\"" % (self.ofs_installation_location,self.ofs_mount_point,debug_mask))
        
-        return 0
+        raise OFSExecutionEngine.Return(0)
     
     ##
     # @fn stopOFSServer(self):
@@ -2458,11 +4220,20 @@ class OFSTestNode(object):
     #-------------------------------
         
     def stopOFSServer(self):
-        # Kill'em all and let root sort 'em out.        
-        # TODO: Install killall on SuSE based systems. 
-        self.runSingleCommand("killall -s 9 pvfs2-server")
+        return OFSExecutionEngine.runCoroutine(self.stopOFSServerAsync())
         
+    ##
+    # @fn stopOFSServerAsync(self):
+    #
+    # Coroutine version of stopOFSServer. See OFSExecutionEngine.
+    # @param self The object pointer
         
+    def stopOFSServerAsync(self):
+        # Kill'em all and let root sort 'em out.        
+        # TODO: Install killall on SuSE based systems. 
+        return self.runSingleCommandAsync("killall -s 9 pvfs2-server")
+
+
     #============================================================================ 
     #
     # OFSClientFunctions
@@ -2480,7 +4251,16 @@ class OFSTestNode(object):
 
 
     def installKernelModule(self):
+        return OFSExecutionEngine.runCoroutine(self.installKernelModuleAsync())
         
+    ##
+    # @fn installKernelModuleAsync(self):
+    #
+    # Coroutine version of installKernelModule. See OFSExecutionEngine.
+    # @param self The object pointer
+
+    def installKernelModuleAsync(self):
+
         # Installing Kernel Module is a root task, therefore, it must be done via batch.
         # The following shell commands are implemented in Python:
         '''
@@ -2489,23 +4269,24 @@ class OFSTestNode(object):
         '''
         output = []
         # first check to see if the kernel module is already installed.
-        rc = self.runSingleCommand("/sbin/lsmod | grep -E 'pvfs2|orangefs'",output)
+        rc = yield self.runSingleCommandAsync("/sbin/lsmod | grep -E 'pvfs2|orangefs'",output)
         if rc == 0:
             print output[1]
-            return 0
+            raise OFSExecutionEngine.Return(0)
         else:
             # try installing the in-tree orangefs module.
-            rc = self.runSingleCommandAsRoot("modprobe -v orangefs")
+            rc = yield self.runSingleCommandAsRootAsync("modprobe -v orangefs")
             if rc == 0:
-                return 0
+                raise OFSExecutionEngine.Return(0)
 
         # get the kernel version if it has been updated
-        self.kernel_version = self.runSingleCommandBacktick("uname -r")
+        yield self.runSingleCommandAsync("uname -r",output)
+        self.kernel_version = output[1].rstrip('\n')
         
-        rc = self.runSingleCommandAsRoot("/sbin/insmod %s/lib/modules/%s/kernel/fs/pvfs2/pvfs2.ko 2>&1 | tee pvfs2-kernel-module.log" % (self.ofs_installation_location,self.kernel_version))
-        self.runSingleCommandAsRoot("/sbin/lsmod >> pvfs2-kernel-module.log")
+        rc = yield self.runSingleCommandAsRootAsync("/sbin/insmod %s/lib/modules/%s/kernel/fs/pvfs2/pvfs2.ko 2>&1 | tee pvfs2-kernel-module.log" % (self.ofs_installation_location,self.kernel_version))
+        yield self.runSingleCommandAsRootAsync("/sbin/lsmod >> pvfs2-kernel-module.log")
         
-        return rc
+        raise OFSExecutionEngine.Return(rc)
         
      
     ##
@@ -2516,6 +4297,17 @@ class OFSTestNode(object):
     # @param security OFS security level None,"Key","Cert"
 
     def startOFSClient(self,security=None,disable_acache=False):
+        return OFSExecutionEngine.runCoroutine(self.startOFSClientAsync(security,disable_acache))
+
+    ##
+    # @fn startOFSClientAsync(self,security=None,disable_acache=False):
+    #
+    # Coroutine version of startOFSClient. See OFSExecutionEngine.
+    # @param self The object pointer
+    # @param security OFS security level None,"Key","Cert"
+    # @param disable_acache Disable the acache
+
+    def startOFSClientAsync(self,security=None,disable_acache=False):
         # Starting the OFS Client is a root task, therefore, it must be done via batch.
         # The following shell command is implimented in Python
         '''
@@ -2531,15 +4323,15 @@ class OFSTestNode(object):
         '''
         
         # if the client is already running, return.
-        rc = self.runSingleCommand("/bin/ps -f --no-heading -u root | grep pvfs2-client")
+        rc = yield self.runSingleCommandAsync("/bin/ps -f --no-heading -u root | grep pvfs2-client")
         if rc == 0:
-            return 0
+            raise OFSExecutionEngine.Return(0)
         
         # Clear the shared memory objects
-        self.clearSHM()
+        yield self.runSingleCommandAsRootAsync("rm /dev/shm/pvfs\*")
         
         # install the kernel module, if necessary
-        self.installKernelModule()
+        yield self.installKernelModuleAsync()
         
         # TODO: Add cert-based security.
         keypath = ""
@@ -2560,15 +4352,15 @@ class OFSTestNode(object):
         print ""
         
         # start the client 
-        self.runSingleCommandAsRoot("LD_LIBRARY_PATH=%s:%s/lib64:%s/lib PVFS2TAB_FILE=%s/etc/orangefstab  %s/sbin/pvfs2-client -p %s/sbin/pvfs2-client-core -L %s/pvfs2-client-%s.log %s %s" % (self.db4_lib_dir,self.ofs_installation_location,self.ofs_installation_location,self.ofs_installation_location,self.ofs_installation_location,self.ofs_installation_location,self.ofs_installation_location,self.ofs_branch,acache_flag,keypath))
+        yield self.runSingleCommandAsRootAsync("LD_LIBRARY_PATH=%s:%s/lib64:%s/lib PVFS2TAB_FILE=%s/etc/orangefstab  %s/sbin/pvfs2-client -p %s/sbin/pvfs2-client-core -L %s/pvfs2-client-%s.log %s %s" % (self.db4_lib_dir,self.ofs_installation_location,self.ofs_installation_location,self.ofs_installation_location,self.ofs_installation_location,self.ofs_installation_location,self.ofs_installation_location,self.ofs_branch,acache_flag,keypath))
         # change the protection on the logfile to 644
-        self.runSingleCommandAsRoot("chmod 644 %s/pvfs2-client-%s.log" % (self.ofs_installation_location,self.ofs_branch))
+        yield self.runSingleCommandAsRootAsync("chmod 644 %s/pvfs2-client-%s.log" % (self.ofs_installation_location,self.ofs_branch))
         
 
         # change the protection on the logfile to 644
-        self.runSingleCommandAsRoot('echo "clientcore,clientcore_timing,msgpair,server,client" | sudo tee /proc/sys/pvfs2/client-debug')
+        yield self.runSingleCommandAsRootAsync('echo "clientcore,clientcore_timing,msgpair,server,client" | sudo tee /proc/sys/pvfs2/client-debug')
         
-        return 0
+        raise OFSExecutionEngine.Return(0)
         
     ##
     # @fn mountOFSFilesystem(self,mount_fuse=False,mount_point=None):
@@ -2580,6 +4372,17 @@ class OFSTestNode(object):
 
       
     def mountOFSFilesystem(self,mount_fuse=False,mount_point=None):
+        return OFSExecutionEngine.runCoroutine(self.mountOFSFilesystemAsync(mount_fuse,mount_point))
+
+    ##
+    # @fn mountOFSFilesystemAsync(self,mount_fuse=False,mount_point=None):
+    #
+    # Coroutine version of mountOFSFilesystem. See OFSExecutionEngine.
+    # @param self The object pointer
+    # @param mount_fuse Mount with fuse module?
+    # @param mount_point OFS Mountpoint. Default is /tmp/mount/orangefs
+
+    def mountOFSFilesystemAsync(self,mount_fuse=False,mount_point=None):
         # Mounting the OFS Filesystem is a root task, therefore, it must be done via batch.
         # The following shell command is implimented in Python
         '''
@@ -2596,7 +4399,7 @@ class OFSTestNode(object):
         output = []
         
         # is the filesystem already mounted?
-        rc = self.checkMount(output)
+        rc = yield self.runSingleCommandAsync("mount | grep %s" % self.ofs_mount_point,output)
         if rc == 0:
             logging.warn( "OrangeFS already mounted at %s" % output[1])
             return
@@ -2608,22 +4411,22 @@ class OFSTestNode(object):
             self.ofs_mount_point = "/tmp/mount/orangefs"
 
         # create the mount_point directory    
-        self.runSingleCommand("mkdir -p %s" % self.ofs_mount_point)
+        yield self.runSingleCommandAsync("mkdir -p %s" % self.ofs_mount_point)
         
         # mount with fuse
         if mount_fuse:
             print "Mounting OrangeFS service at %s://%s:%d/%s at mount_point %s via fuse" % (self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name,self.ofs_mount_point)
-            self.runSingleCommand("%s/bin/pvfs2fuse %s -o fs_spec=%s://%s:%d/%s -o nonempty" % (self.ofs_installation_location,self.ofs_mount_point,self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name),output)
+            yield self.runSingleCommandAsync("%s/bin/pvfs2fuse %s -o fs_spec=%s://%s:%d/%s -o nonempty" % (self.ofs_installation_location,self.ofs_mount_point,self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name),output)
             #print output
             
         #mount with kmod
         else:
             print "Mounting OrangeFS service at %s://%s:%d/%s at mount_point %s" % (self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name,self.ofs_mount_point)
-            self.runSingleCommandAsRoot("mount -t pvfs2 %s://%s:%d/%s %s" % (self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name,self.ofs_mount_point))
+            yield self.runSingleCommandAsRootAsync("mount -t pvfs2 %s://%s:%d/%s %s" % (self.ofs_protocol,self.hostname,self.ofs_tcp_port,self.ofs_fs_name,self.ofs_mount_point))
 
         
-        print "Waiting 10 seconds for mount"            
-        time.sleep(10)
+        print "Waiting for mount"
+        yield OFSTestWait.waitUntilAsync(self.isOFSMountedAsync,"OrangeFS mount on %s" % self.hostname,timeout=60,old_wait=10)
 
     ##
     # @fn unmountOFSFilesystem(self):
@@ -2634,9 +4437,23 @@ class OFSTestNode(object):
 
     
     def unmountOFSFilesystem(self):
+        return OFSExecutionEngine.runCoroutine(self.unmountOFSFilesystemAsync())
+
+    ##
+    # @fn unmountOFSFilesystemAsync(self):
+    #
+    # Coroutine version of unmountOFSFilesystem. See OFSExecutionEngine.
+    # @param self The object pointer
+
+    def unmountOFSFilesystemAsync(self):
         print "Unmounting OrangeFS mounted at " + self.ofs_mount_point
-        self.runSingleCommandAsRoot("umount -f -l %s" % self.ofs_mount_point)
-        time.sleep(10)
+        yield self.runSingleCommandAsRootAsync("umount -f -l %s" % self.ofs_mount_point)
+        
+        def isUnmounted():
+            mounted = yield self.isOFSMountedAsync()
+            raise OFSExecutionEngine.Return(not mounted)
+        
+        yield OFSTestWait.waitUntilAsync(isUnmounted,"OrangeFS unmount on %s" % self.hostname,timeout=30,old_wait=10)
 
     ##
     # @fn stopOFSClient(self):
@@ -2647,17 +4464,30 @@ class OFSTestNode(object):
     
 
     def stopOFSClient(self):
+        return OFSExecutionEngine.runCoroutine(self.stopOFSClientAsync())
         
+    ##
+    # @fn stopOFSClientAsync(self):
+    #
+    # Coroutine version of stopOFSClient. See OFSExecutionEngine.
+    # @param self The object pointer
+
+    def stopOFSClientAsync(self):
+
         # Unmount the filesystem.
-        self.unmountOFSFilesystem()
+        yield self.unmountOFSFilesystemAsync()
         print "Stopping pvfs2-client process"
-        self.runSingleCommandAsRoot("killall pvfs2-client")
-        time.sleep(10)
-        self.runSingleCommandAsRoot("killall -s 9 pvfs2-client")
-        time.sleep(2)
-
+        yield self.runSingleCommandAsRootAsync("killall pvfs2-client")
         
-    
+        def isStopped():
+            running = yield self.isProcessRunningAsync("pvfs2-client")
+            raise OFSExecutionEngine.Return(not running)
+        
+        stopped = yield OFSTestWait.waitUntilAsync(isStopped,"pvfs2-client exit on %s" % self.hostname,timeout=10,old_wait=10)
+        if not stopped:
+            yield self.runSingleCommandAsRootAsync("killall -s 9 pvfs2-client")
+            yield OFSTestWait.waitUntilAsync(isStopped,"pvfs2-client kill on %s" % self.hostname,timeout=5,old_wait=2)
+
  
     ##
     # @fn findExistingOFSInstallation(self):
@@ -2669,6 +4499,11 @@ class OFSTestNode(object):
         
 
     def findExistingOFSInstallation(self):
+        # found on an earlier run of this boot. See OFSNodeFactsCache.
+        if self.loadInstallationFromCache() == True:
+            logging.info("Using cached OrangeFS installation %s on %s" % (self.ofs_installation_location,self.hostname))
+            return 0
+        
         # to find OrangeFS server, first finr the pvfs2-server file
         #ps -ef | grep -v grep| grep pvfs2-server | awk {'print $8'}
         output = []
@@ -2717,6 +4552,12 @@ class OFSTestNode(object):
             #print output
             self.setEnvironmentVariable("PVFS2TAB_FILE",output[1].rstrip())
         
+        # the aliases are needed to start the servers. Read them now so they are cached too.
+        if self.alias_list is None:
+            self.alias_list = self.getAliasesFromConfigFile(self.ofs_conf_file)
+        
+        self.saveNodeFactsToCache()
+        
         # to find source
         # find the directory
         #find / -name pvfs2-config.h.in -print 2> /dev/null
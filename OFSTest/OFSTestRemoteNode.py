@@ -14,13 +14,20 @@ import cmd
 import time
 import sys
 import OFSTestNode
+import OFSSSHConnectionManager
+import OFSRemoteAgent
+import OFSExecutionEngine
+import OFSTestWait
+import OFSTestTrace
+import threading
+import uuid
 import logging
 
 
 class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
  
     ##
-    # @fn __init__(self,username,ip_address,key,local_node,is_cloud=False,ext_ip_address=None):
+    # @fn __init__(self,username,ip_address,key,local_node,is_cloud=False,ext_ip_address=None,ssh_connection=None,node_facts_cache=None):
     #
     # Initialization routine.
     #
@@ -31,10 +38,12 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
     # @param local_node OFSTestLocalNode object that represents the local machine
     # @param is_cloud Is this an cloud/OpenStack node?
     # @param ext_ip_address IP address of node accessible from local machine if different from cluster IP.
+    # @param ssh_connection OFSSSHConnectionManager for this node. A new one is created if None.
+    # @param node_facts_cache OFSNodeFactsCache with the facts of earlier runs. None disables caching.
     # 
     # @return None, but will print ssh command used to access node.
  
-    def __init__(self,username,ip_address,key,local_node,is_cloud=False,ext_ip_address=None):
+    def __init__(self,username,ip_address,key,local_node,is_cloud=False,ext_ip_address=None,ssh_connection=None,node_facts_cache=None):
 
         print "-----------------------------------------------------------"    
         super(OFSTestRemoteNode,self).__init__()
@@ -57,18 +66,21 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
             
         self.ssh_command = "/usr/bin/ssh %s %s@%s" % (ssh_key_parm,self.current_user,self.ext_ip_address)
         
-        count = 0
-        rc = -1
-        while rc != 0 and count < 15:
-            print "Waited %ds of 300s for ssh to become active on %s." % (count*20,self.ext_ip_address)
-            rc = self.runSingleCommand('whoami')
-            if rc != 0:
-                rc = self.runSingleCommandAsRoot('whoami')
-            
-            time.sleep(20)
-            count+=1
-
-        if count == 15:
+        # all ssh traffic from the local machine to this node shares one master connection per user.
+        if ssh_connection == None:
+            ssh_connection = OFSSSHConnectionManager.OFSSSHConnectionManager(self.ext_ip_address,self.sshLocalKeyFile)
+        self.ssh_connection = ssh_connection
+        
+        # facts learned about this node on earlier runs.
+        self.node_facts_cache = node_facts_cache
+        
+        ## @var remote_agent_lock
+        # Only one thread may start the remote agent for a user.
+        self.remote_agent_lock = threading.Lock()
+        
+        print "Waiting up to 300s for ssh to become active on %s." % self.ext_ip_address
+        ready = OFSExecutionEngine.runCoroutine(OFSTestWait.waitUntilAsync(self.isReachableAsync,"ssh on %s" % self.ext_ip_address,timeout=300,old_wait=20,initial_delay=2))
+        if not ready:
             return
         
         self.currentNodeInformation()
@@ -134,14 +146,29 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
         
         
     ##       
-    # @fn runAllBatchCommands(self,output=[]):
+    # @fn runAllBatchCommands(self,output=None,debug=False,stream=False,line_callback=None,timeout=None):
     #
     # Writes stored batch commands to a file, then runs them.
     # 
     # @param self The object pointer
     # @param output Output of command
+    # @param debug Print debugging information?
+    # @param stream Capture output in streaming mode? See runSingleCommand.
+    # @param line_callback Function called with each line of stdout as it arrives.
+    # @param timeout Seconds before the batch is killed. See runSingleCommand.
+    #
+    # @return Return code of the batch. COMMAND_TIMEOUT_RC if it timed out.
 
-    def runAllBatchCommands(self,output=[],debug=False):
+    @OFSTestTrace.traced("batch")
+    def runAllBatchCommands(self,output=None,debug=False,stream=False,line_callback=None,timeout=None):
+        if output is None:
+            output = []
+        if line_callback is not None:
+            stream = True
+        timeout = self.getCommandTimeout(timeout)
+        token = None
+        if timeout is not None:
+            token = uuid.uuid4().hex[:16]
         OFSTestNode.batch_count = OFSTestNode.batch_count+1
 
         
@@ -150,8 +177,13 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
         script_file = open(batchfilename,'w')
         script_file.write("#!/bin/bash\n")
         script_file.write("script runcommand\n")
+        if token is not None:
+            # record the process group so the watchdog can kill the batch on the node.
+            pgid_file = self.getCommandTrackingFile(token)
+            script_file.write("echo $(ps -o pgid= -p $$) > %s\n" % pgid_file)
+            script_file.write("trap 'rm -f %s' EXIT\n" % pgid_file)
         
-        for element in self.current_environment:
+        for element in self.current_environment.keys():
             script_file.write("export %s=%s\n" % (element, self.current_environment[element]))
         
         # change to current directory
@@ -183,42 +215,179 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
         script_file.close()
         logging.info("---- End generated batchfile: %s -------------------------" % batchfilename)            
         
+        # The remote agent can run the batch file as stdin of bash -s, just like ssh.
+        agent = None
+        if stream == False and timeout is None:
+            agent = self.getRemoteAgent()
+        if agent is not None:
+            script_file = open(batchfilename,'r')
+            reply = agent.run("bash -s",stdin=script_file.read(),wait=False)
+            script_file.close()
+            if reply is not None:
+                del output[:]
+                output.append("remote agent %s@%s: bash -s < %s" % (self.current_user,self.ext_ip_address,batchfilename))
+                output.append(reply["stdout"])
+                output.append(reply["stderr"])
+                logging.info("RC: %r (remote agent, %.3fs)" % (reply["rc"],reply["wall_time"]))
+                logging.info("STDOUT: %s" % output[1] )
+                logging.info("STDERR: %s" % output[2] )
+                self.batch_commands = []
+                return reply["rc"]
+        
         ssh_key_parm = ''
         if self.sshLocalKeyFile is not None:
             ssh_key_parm = '-i %s' % self.sshLocalKeyFile
 
 
-        command_line = "/usr/bin/ssh %s %s@%s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no \"bash -s\" < %s" % (ssh_key_parm,self.current_user,self.ext_ip_address,batchfilename)
+        command_line = "/usr/bin/ssh %s %s@%s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no %s \"bash -s\" < %s" % (ssh_key_parm,self.current_user,self.ext_ip_address,self.getSSHConnectionOptions(),batchfilename)
         
         logging.info("Command:" + command_line)
-        p = subprocess.Popen(command_line,shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE,bufsize=-1)
-        
         # clear the output list, then append stdout,stderr to list to get pass-by-reference to work
         del output[:]
         output.append(command_line)
-        for i in p.communicate():
-            output.append(i)
-        
-        logging.info("RC: %r" % p.returncode)
+        if self.isCancelled(output):
+            self.batch_commands = []
+            return -1
+        if self.isPastDeadline(timeout,output):
+            self.batch_commands = []
+            return OFSTestNode.COMMAND_TIMEOUT_RC
+        p = self.startCommandProcess(command_line)
+        rc = self.waitForCommand(p,output,stream,line_callback,timeout=timeout,token=token,remote_user=self.current_user)
+        
+        logging.info("RC: %r" % rc)
         logging.info("STDOUT: %s" % output[1] )
         logging.info("STDERR: %s" % output[2] )
         # now clear out the batch commands list
         self.batch_commands = []    
 
-        return p.returncode
+        return rc
+        
+
+    ##
+    # @fn getCommandTrackingFile(self,token):
+    #
+    # @param self The object pointer
+    # @param token Token of a tracked command
+    #
+    # @return File on the node that holds the process group id of the tracked command.
+
+    def getCommandTrackingFile(self,token):
+        return "/tmp/ofstest-%s.pgid" % token
+
+    ##
+    # @fn trackRemoteCommand(self,command,token):
+    #
+    # Makes the command write its process group id on the node. sshd starts every session
+    # in a new process group, so the group holds the command and everything it started.
+    #
+    # @param self The object pointer
+    # @param command Shell command, escaped for prepareCommandLine.
+    # @param token Unique name for this command
+    #
+    # @return Shell command to run.
+
+    def trackRemoteCommand(self,command,token):
+        pgid_file = self.getCommandTrackingFile(token)
+        return "echo \\$(ps -o pgid= -p \\$\\$) > %s; trap 'rm -f %s' EXIT; %s" % (pgid_file,pgid_file,command)
+
+    ##
+    # @fn killRemoteCommand(self,token,remote_user=None):
+    #
+    # Kills the process group of a tracked command on the node. Uses sudo when the
+    # command started processes as root.
+    #
+    # @param self The object pointer
+    # @param token Token passed to trackRemoteCommand()
+    # @param remote_user User the command runs as.
+
+    def killRemoteCommand(self,token,remote_user=None):
+        pgid_file = self.getCommandTrackingFile(token)
+        command = "if [ -f %s ]; then PGID=\\$(cat %s); rm -f %s; kill -9 -- -\\$PGID || sudo -n kill -9 -- -\\$PGID; fi" % (pgid_file,pgid_file,pgid_file)
+        command_line = self.prepareCommandLine(command=command,remote_user=remote_user)
+        logging.info("Killing timed out command on %s: %s" % (self.hostname,command_line))
+        devnull = open(os.devnull,'w')
+        rc = subprocess.call(command_line,shell=True,stdout=devnull,stderr=devnull)
+        devnull.close()
+        if rc != 0:
+            logging.info("Could not kill remote process group of command %s on %s. rc = %d" % (token,self.hostname,rc))
+
+    ##       
+    # @fn getRemoteAgent(self,remote_user=None):
+    #
+    # Returns the running OFSRemoteAgent for remote_user, starting it on first use.
+    # 
+    # @param self The object pointer
+    # @param remote_user User on this node. Defaults to current_user.
+    #
+    # @return OFSRemoteAgent, or None if commands should use ssh.
+
+    def getRemoteAgent(self,remote_user=None):
+        if self.use_remote_agent == False:
+            return None
+        
+        if remote_user == None:
+            remote_user = self.current_user
         
+        self.remote_agent_lock.acquire()
+        try:
+            agent = self.remote_agents.get(remote_user)
+            if agent is None:
+                # A failed agent stays in the table so we don't try again for every command.
+                agent = OFSRemoteAgent.OFSRemoteAgent(self,remote_user)
+                self.remote_agents[remote_user] = agent
+                agent.start()
+        finally:
+            self.remote_agent_lock.release()
+        
+        if agent.isRunning():
+            return agent
+        return None
+
+    ##       
+    # @fn saveEnvironment(self):
+    #
+    # Writes the current environment to /etc/profile.d/orangefs.sh and orangefs.csh. One save
+    # runs at a time on each node, so every save writes the whole environment at that time.
+    # 
+    # @param self The object pointer
 
     def saveEnvironment(self):
-        done = self.runSingleCommand("grep 'source /etc/profile.d/orangefs.sh' /home/%s/.bashrc" % self.current_user)
+        self.environment_lock.acquire()
+        try:
+            OFSExecutionEngine.runCoroutine(self.writeEnvironmentAsync())
+        finally:
+            self.environment_lock.release()
+    
+    ##       
+    # @fn saveEnvironmentAsync(self):
+    #
+    # Coroutine version of saveEnvironment. See OFSExecutionEngine. Runs in a worker thread,
+    # so waiting for another save does not hold up the event loop.
+    # 
+    # @param self The object pointer
+
+    def saveEnvironmentAsync(self):
+        return OFSExecutionEngine.inThread(self.saveEnvironment)
+    
+    ##       
+    # @fn writeEnvironmentAsync(self):
+    #
+    # Rewrites /etc/profile.d/orangefs.sh and orangefs.csh. Coroutine. Called by saveEnvironment with environment_lock held.
+    # 
+    # @param self The object pointer
+
+    def writeEnvironmentAsync(self):
+        environment = dict(self.current_environment)
+        done = yield self.runSingleCommandAsync("grep 'source /etc/profile.d/orangefs.sh' /home/%s/.bashrc" % self.current_user)
         
         if done != 0:
-            self.runSingleCommand("echo 'source /etc/profile.d/orangefs.sh' >> /home/%s/.bashrc" % self.current_user)
-            self.runSingleCommand("chmod u+x /home/%s/.bashrc" % self.current_user )
+            yield self.runSingleCommandAsync("echo 'source /etc/profile.d/orangefs.sh' >> /home/%s/.bashrc" % self.current_user)
+            yield self.runSingleCommandAsync("chmod u+x /home/%s/.bashrc" % self.current_user )
         
-        self.runSingleCommandAsRoot("rm -f /etc/profile.d/orangefs.sh /etc/profile.d/orangefs.csh")
-        for variable in self.current_environment:
-            self.runSingleCommandAsRoot("bash -c 'echo export %s=%s >> /etc/profile.d/orangefs.sh'" % (variable,self.current_environment[variable]))
-            self.runSingleCommandAsRoot("bash -c 'echo setenv %s %s >> /etc/profile.d/orangefs.csh'" % (variable,self.current_environment[variable]))
+        yield self.runSingleCommandAsRootAsync("rm -f /etc/profile.d/orangefs.sh /etc/profile.d/orangefs.csh")
+        for variable in environment.keys():
+            yield self.runSingleCommandAsRootAsync("bash -c 'echo export %s=%s >> /etc/profile.d/orangefs.sh'" % (variable,environment[variable]))
+            yield self.runSingleCommandAsRootAsync("bash -c 'echo setenv %s %s >> /etc/profile.d/orangefs.csh'" % (variable,environment[variable]))
 
     ##       
     # @fn prepareCommandLine(self,command,outfile="",append_out=False,errfile="",append_err=False,remote_user=None):
@@ -269,7 +438,7 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
             ssh_key_parm = '-i %s' % self.sshLocalKeyFile
 
         
-        command_chunks = ["/usr/bin/ssh %s %s@%s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no -o BatchMode=yes \"" %  (ssh_key_parm,remote_user,self.ext_ip_address)]
+        command_chunks = ["/usr/bin/ssh %s %s@%s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no -o BatchMode=yes %s \"" %  (ssh_key_parm,remote_user,self.ext_ip_address,self.getSSHConnectionOptions(remote_user))]
 
         # change to proper directory
         command_chunks.append("cd %s; " % self.current_directory)
@@ -305,8 +474,33 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
     # @return Return code of copy command.
     
      
+    @OFSTestTrace.traced("copy")
     def copyToRemoteNode(self, source, destination_node, destination, recursive=False):
-        # This runs the copy command remotely 
+        output = []
+        rc = self.runSingleCommand(self.getCopyToRemoteNodeCommand(source,destination_node,destination,recursive),output)
+        if rc != 0:
+            logging.exception( "Could not copy to remote node")
+            logging.exception( output)
+        return rc
+    
+    ##
+    #
+    # @fn getCopyToRemoteNodeCommand(self, source, destination_node, destination, recursive=False):
+    #
+    # Returns the rsync command that copies files from this node to the remote node.
+    #
+    # @param self The object pointer
+    # @param source Source file or directory
+    # @param destination_node Node to which files should be copied
+    # @param destination Destination file or directory on remote node.
+    # @param recursive Copy recursively?
+    #
+    # @return rsync command to run on this node.
+    
+    def getCopyToRemoteNodeCommand(self, source, destination_node, destination, recursive=False):
+        # This runs the copy command remotely. The ssh to this node reuses the persistent connection.
+        # The inner ssh from this node to destination_node is not multiplexed. A master started 
+        # inside the remote session would hold its pipes open until ControlPersist expires.
         rflag = ""
         # verify source file exists
         if recursive == True:
@@ -323,13 +517,7 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
         
 
         rsync_command = "rsync %s -e \\\"ssh %s -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no\\\" %s %s@%s:%s" % (rflag,ssh_key_parm,source,destination_node.current_user,destination_node.ip_address,destination)
-        #print rsync_command
-        output = []
-        rc = self.runSingleCommand(rsync_command,output)
-        if rc != 0:
-            logging.exception( "Could not copy to remote node")
-            logging.exception( output)
-        return rc
+        return rsync_command
     
     ##
     #
@@ -347,8 +535,9 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
     
       
       
+    @OFSTestTrace.traced("copy")
     def copyFromRemoteNode(self, source_node, source, destination, recursive=False):
-        # This runs the copy command remotely 
+        # This runs the copy command remotely. See copyToRemoteNode for multiplexing. 
         rflag = ""
         # verify source file exists
         if recursive == True:
@@ -441,6 +630,31 @@ class OFSTestRemoteNode(OFSTestNode.OFSTestNode):
         
         return 0
 
+    ##
+    #
+    # @fn uploadRemoteKeysFromLocalAsync(self,local_node,key_files):
+    #
+    # Uploads the keys used to access many remote nodes from the local machine with one
+    # copy, and adds them to the key table. Coroutine, see OFSExecutionEngine.
+    #
+    # @param self The object pointer
+    # @param local_node OFSTestLocalNode object that represents the local machine  
+    # @param key_files Dictionary remote address -> key file on the local machine.
+    #
+    # @return (via OFSExecutionEngine.Return) Return code of the copy.
+    
+    def uploadRemoteKeysFromLocalAsync(self,local_node,key_files):
+        # usually every node is accessed with the same cloud key.
+        distinct_keys = sorted(set(key_files.values()))
+        rc = yield local_node.copyToRemoteNodeAsync(" ".join(distinct_keys),self,'~/.ssh/',False)
+        if rc != 0:
+            print "Upload of keys %s from local to %s failed!" % (",".join(distinct_keys),self.ext_ip_address)
+            raise OFSExecutionEngine.Return(rc)
+        
+        for (remote_address,remote_key) in key_files.items():
+            self.keytable[remote_address] = "/home/%s/.ssh/%s" % (self.current_user,os.path.basename(remote_key))
+        raise OFSExecutionEngine.Return(0)
+
     ##
     #
     # @fn allowRootSshAccess(self)
@@ -0,0 +1,154 @@
+#!/usr/bin/python
+##
+#
+# @file OFSTestShards.py
+#
+# @brief Splits a test group over the client nodes so independent tests run at the same time.
+#
+# Every client node gets a shard: a list of tests it runs one after another. The shards
+# run at the same time, each in a subdirectory of the OrangeFS mount point, so the files
+# of one shard do not collide with those of another. See OFSTestMain.runTestGroup.
+#
+# A test group module may list two kinds of tests that cannot go in any shard:
+#
+#   exclusive        Tests that need the whole file system or the whole cluster, e.g.
+#                    xfstests, LTP and the benchmarks. They run on the head node after the
+#                    shards, one at a time, at the mount point itself.
+#   head_node_tests  Tests that need something only the head node has, e.g. the OrangeFS
+#                    source tree. They always go in shard 0, which runs on the head node.
+#
+# Example (OFSVFSTest.py):
+#
+#   exclusive = [ltp, xfstests, list_add_corruption]
+#   head_node_tests = [direct, fstest, fsx, shelltest]
+#
+# The shards are balanced by the time each test took in earlier runs (see OFSTestHistory):
+# the longest test goes first, to the shard that has the least work so far. This keeps one
+# node from running a long test at the end while the others wait. formatSchedule() writes
+# the plan with the predicted and the actual times.
+#
+
+##
+# @fn getShardTime(shard,durations=None):
+#
+# @param shard List of test functions
+# @param durations Dictionary test function -> predicted seconds. None counts every test as 1.
+#
+# @return Predicted seconds of the shard.
+
+def getShardTime(shard,durations=None):
+    if durations is None:
+        return len(shard)
+    return sum([durations.get(test,0) for test in shard])
+
+##
+# @fn planShards(tests,number_shards,exclusive=[],head_node_tests=[],durations=None):
+#
+# Puts the tests in shards, longest processing time first: the head node tests go to
+# shard 0, then each other test, the longest first, goes to the shard with the least
+# predicted time so far. Every shard keeps the order of tests.
+#
+# @param tests List of test functions in the order they are reported.
+# @param number_shards Number of client nodes. Shard 0 is the head node.
+# @param exclusive Tests that must run alone.
+# @param head_node_tests Tests that must run on the head node.
+# @param durations Dictionary test function -> predicted seconds. None counts every test as 1.
+#
+# @return (list of number_shards lists of tests, list of exclusive tests)
+
+def planShards(tests,number_shards,exclusive=[],head_node_tests=[],durations=None):
+    number_shards = max(1,number_shards)
+    shards = [[] for i in range(number_shards)]
+    exclusive_tests = [test for test in tests if test in exclusive]
+    shards[0] = [test for test in tests if test in head_node_tests and test not in exclusive]
+    free_tests = [test for test in tests if test not in exclusive and test not in head_node_tests]
+    # sorted() is stable, so equal tests keep their order.
+    for test in sorted(free_tests,key=lambda t: -getShardTime([t],durations)):
+        # the lowest index wins a tie, so the head node gets the first test.
+        index = min(range(number_shards),key=lambda i: (getShardTime(shards[i],durations),i))
+        shards[index].append(test)
+    for shard in shards:
+        shard.sort(key=lambda t: tests.index(t))
+    return (shards,exclusive_tests)
+
+##
+# @fn predictTime(shards,exclusive_tests,durations):
+#
+# @param shards Shards from planShards()
+# @param exclusive_tests Exclusive tests from planShards()
+# @param durations Dictionary test function -> predicted seconds.
+#
+# @return Predicted wall time: the longest shard, then the exclusive tests one after another.
+
+def predictTime(shards,exclusive_tests,durations):
+    return max([getShardTime(shard,durations) for shard in shards] + [0]) + getShardTime(exclusive_tests,durations)
+
+##
+# @fn getShardDirectory(mount_point,package,index):
+#
+# @param mount_point OrangeFS mount point
+# @param package Test package, e.g. vfs-kmod
+# @param index Shard number
+#
+# @return Directory where the shard runs its tests.
+
+def getShardDirectory(mount_point,package,index):
+    return "%s/%s-shard%d" % (mount_point,package,index)
+
+##
+# @fn getShardLogFile(package,index):
+#
+# @param package Test package, e.g. vfs-kmod
+# @param index Shard number
+#
+# @return Local file with the results of the shard.
+
+def getShardLogFile(package,index):
+    return "%s-shard%d.log" % (package,index)
+
+##
+# @fn getScheduleFile(package):
+#
+# @param package Test package, e.g. vfs-kmod
+#
+# @return Local file with the schedule of the test group.
+
+def getScheduleFile(package):
+    return "%s-schedule.log" % package
+
+##
+# @fn formatSchedule(package,hostnames,shards,exclusive_tests,durations,times={},wall_time=None):
+#
+# @param package Test package, e.g. vfs-kmod
+# @param hostnames Host name of the node of each shard
+# @param shards Shards from planShards()
+# @param exclusive_tests Exclusive tests from planShards()
+# @param durations Dictionary test function -> predicted seconds.
+# @param times Dictionary test function -> (start,end) of the tests that ran.
+# @param wall_time Seconds the whole group took. None if it did not run yet.
+#
+# @return Text table of the shards and tests with predicted and actual seconds.
+
+def formatSchedule(package,hostnames,shards,exclusive_tests,durations,times={},wall_time=None):
+
+    def getActual(tests):
+        ran = [times[test][1] - times[test][0] for test in tests if test in times]
+        if len(ran) == 0:
+            return "-"
+        return "%.1f" % sum(ran)
+
+    lines = ["Schedule of %s" % package]
+    lines.append("%-28s %-24s %13s %10s" % ("Test","Shard","Predicted (s)","Actual (s)"))
+    groups = [("shard %d on %s" % (index,hostnames[index]),shards[index]) for index in range(len(shards))]
+    groups.append(("exclusive on %s" % hostnames[0],exclusive_tests))
+    for (name,tests) in groups:
+        if len(tests) == 0:
+            continue
+        for test in tests:
+            lines.append("%-28s %-24s %13.1f %10s" % (test.__name__[:28],name[:24],durations.get(test,0),getActual([test])))
+        lines.append("%-28s %-24s %13.1f %10s" % ("total",name[:24],getShardTime(tests,durations),getActual(tests)))
+    actual = "-"
+    if wall_time is not None:
+        actual = "%.1f" % wall_time
+    lines.append("Wall time: predicted %.1f s, actual %s s" % (predictTime(shards,exclusive_tests,durations),actual))
+    return "\n".join(lines)
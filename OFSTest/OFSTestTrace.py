@@ -0,0 +1,357 @@
+#!/usr/bin/python
+##
+#
+# @file OFSTestTrace.py
+#
+# @brief Records a span for every command, copy and cloud call of a test run.
+#
+# Each span holds the node, the phase of the run (see setPhase), the start and end time,
+# the return code and the number of output bytes. OFSTestNode.runSingleCommand, the batch
+# runs, the copies, the commands of OFSExecutionEngine and the cloud connection managers
+# all record spans.
+#
+# writeChromeTrace() writes the spans as Chrome trace event JSON. Load it in
+# chrome://tracing or https://ui.perfetto.dev to see the run as a timeline with one row
+# per node. getPhaseSummary() adds the spans up per phase and names the slowest node.
+#
+# Spans nest: a test span holds the commands of the test, a copy span the command that
+# copies. Busy time is therefore the time a node had at least one span open, not the sum
+# of its spans.
+#
+
+import os
+import time
+import json
+import threading
+import inspect
+import logging
+
+## @var enabled
+# Record spans? Set to False to turn tracing off.
+enabled = True
+
+## @var spans
+# Finished spans, in the order they ended.
+spans = []
+
+## @var current_phase
+# Name of the phase of the test run new spans belong to.
+current_phase = "startup"
+
+## @var phase_start
+# Start time of current_phase.
+phase_start = time.time()
+
+## @var MAX_NAME
+# Longest command text kept in a span.
+MAX_NAME = 256
+
+trace_lock = threading.Lock()
+
+##
+# @fn setPhase(name):
+#
+# Starts a new phase of the test run. The phase that was running is recorded as a span of its own.
+#
+# @param name Phase name, e.g. "Build OrangeFS"
+
+def setPhase(name):
+    global current_phase,phase_start
+    now = time.time()
+    trace_lock.acquire()
+    try:
+        if enabled:
+            spans.append({"category" : "phase", "node" : "", "name" : current_phase, "phase" : current_phase, "start" : phase_start, "end" : now, "rc" : None, "bytes" : 0})
+        current_phase = name
+        phase_start = now
+    finally:
+        trace_lock.release()
+    logging.info("Phase: %s" % name)
+
+##
+# @fn getNodeLabel(node):
+#
+# @param node OFSTestNode, cloud connection manager or string.
+#
+# @return Name of the trace row for node.
+
+def getNodeLabel(node):
+    if isinstance(node,str):
+        return node
+    hostname = getattr(node,"hostname","")
+    if hostname is not None and hostname != "":
+        return hostname
+    ip_address = getattr(node,"ext_ip_address","")
+    if ip_address is not None and ip_address != "":
+        return ip_address
+    return node.__class__.__name__
+
+##
+# @fn getOutputBytes(output):
+#
+# @param output Output list of a command: [command_line, stdout, stderr], with spill files in [3] and [4] in stream mode.
+#
+# @return Number of bytes of stdout and stderr.
+
+def getOutputBytes(output):
+    if output is None:
+        return 0
+    # stream mode keeps only a window in memory. The spill files have everything.
+    if len(output) > 4:
+        total = 0
+        for filename in output[3:5]:
+            try:
+                total += os.path.getsize(filename)
+            except (OSError,TypeError):
+                pass
+        return total
+    total = 0
+    for text in output[1:3]:
+        if isinstance(text,basestring):
+            total += len(text)
+    return total
+
+##
+# @fn record(category,node,name,start,end,rc=None,output=None):
+#
+# Adds a finished span.
+#
+# @param category Kind of span: command, batch, copy, cloud...
+# @param node Node the span ran on. See getNodeLabel.
+# @param name Command or function
+# @param start Start time
+# @param end End time
+# @param rc Return code. Anything that is not an int is recorded as None.
+# @param output Output list. See getOutputBytes.
+
+def record(category,node,name,start,end,rc=None,output=None):
+    if not enabled:
+        return
+    # cloud calls return instance lists and such. Only return codes are kept.
+    if not isinstance(rc,(int,long)) or isinstance(rc,bool):
+        rc = None
+    span = {"category" : category, "node" : getNodeLabel(node), "name" : str(name)[:MAX_NAME], "phase" : current_phase, "start" : start, "end" : end, "rc" : rc, "bytes" : getOutputBytes(output)}
+    trace_lock.acquire()
+    spans.append(span)
+    trace_lock.release()
+
+##
+# @fn traced(category):
+#
+# Decorator that records a span for every call of a method. The method's object is the node.
+#
+# If the method has an output argument and the caller did not pass one, a list is passed
+# so the output bytes can be counted. The span is named after the command or the string
+# arguments of the call.
+#
+# @param category Kind of span
+#
+# @return Decorator
+
+def traced(category):
+    def decorator(function):
+        argument_names = inspect.getargspec(function)[0]
+        output_index = None
+        if "output" in argument_names:
+            output_index = argument_names.index("output")
+
+        def wrapper(*args,**kwargs):
+            if not enabled:
+                return function(*args,**kwargs)
+
+            output = None
+            if output_index is not None:
+                if len(args) > output_index:
+                    output = args[output_index]
+                    if output is None:
+                        output = []
+                        args = args[:output_index] + (output,) + args[output_index+1:]
+                else:
+                    output = kwargs.get("output")
+                    if output is None:
+                        output = []
+                        kwargs["output"] = output
+
+            name = kwargs.get("command")
+            if name is None:
+                name = " ".join([a for a in args[1:] if isinstance(a,str)] + [getattr(a,"hostname","") for a in args[1:] if hasattr(a,"hostname")])
+            name = "%s %s" % (function.__name__,name)
+
+            start = time.time()
+            rc = None
+            try:
+                rc = function(*args,**kwargs)
+                return rc
+            finally:
+                record(category,args[0],name,start,time.time(),rc,output)
+
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorator
+
+##
+# @fn getSpans():
+#
+# @return Copy of the list of finished spans. The phase still running is included and ends now.
+
+def getSpans():
+    trace_lock.acquire()
+    try:
+        span_list = list(spans)
+        span_list.append({"category" : "phase", "node" : "", "name" : current_phase, "phase" : current_phase, "start" : phase_start, "end" : time.time(), "rc" : None, "bytes" : 0})
+        return span_list
+    finally:
+        trace_lock.release()
+
+##
+# @fn writeChromeTrace(filename):
+#
+# Writes all spans as Chrome trace event JSON. Every node gets a row (process). Spans that
+# overlap on a node without nesting are put on separate lanes (threads) of the row.
+#
+# @param filename Output file
+
+def writeChromeTrace(filename):
+    span_list = getSpans()
+    trace_start = min([s["start"] for s in span_list])
+
+    node_ids = {"" : 0}
+    events = [{"name" : "process_name", "ph" : "M", "pid" : 0, "args" : {"name" : "phases"}}]
+    lanes = {}
+
+    span_list.sort(key=lambda s: (s["start"],-s["end"]))
+    for span in span_list:
+        pid = node_ids.get(span["node"])
+        if pid is None:
+            pid = len(node_ids)
+            node_ids[span["node"]] = pid
+            events.append({"name" : "process_name", "ph" : "M", "pid" : pid, "args" : {"name" : span["node"]}})
+
+        # each lane is a stack of end times of open spans.
+        node_lanes = lanes.setdefault(pid,[])
+        tid = None
+        for index in range(len(node_lanes)):
+            stack = node_lanes[index]
+            while len(stack) > 0 and stack[-1] <= span["start"]:
+                stack.pop()
+            if len(stack) == 0 or span["end"] <= stack[-1]:
+                stack.append(span["end"])
+                tid = index
+                break
+        if tid is None:
+            node_lanes.append([span["end"]])
+            tid = len(node_lanes) - 1
+
+        events.append({
+            "name" : span["name"],
+            "cat" : span["category"],
+            "ph" : "X",
+            "pid" : pid,
+            "tid" : tid,
+            "ts" : int((span["start"] - trace_start) * 1000000),
+            "dur" : int((span["end"] - span["start"]) * 1000000),
+            "args" : {"phase" : span["phase"], "rc" : span["rc"], "bytes" : span["bytes"]}
+            })
+
+    f = open(filename,'w')
+    try:
+        json.dump({"traceEvents" : events, "displayTimeUnit" : "ms"},f)
+    finally:
+        f.close()
+
+##
+# @fn getBusyTime(intervals):
+#
+# @param intervals List of (start,end) of the spans of one node
+#
+# @return Seconds covered by at least one interval. Nested and overlapping spans count once.
+
+def getBusyTime(intervals):
+    busy = 0.0
+    (busy_start,busy_end) = (None,None)
+    for (start,end) in sorted(intervals):
+        if busy_end is None or start > busy_end:
+            if busy_end is not None:
+                busy += busy_end - busy_start
+            (busy_start,busy_end) = (start,end)
+        else:
+            busy_end = max(busy_end,end)
+    if busy_end is not None:
+        busy += busy_end - busy_start
+    return busy
+
+##
+# @fn getPhaseSummary():
+#
+# Adds up the spans of each phase. Spans without a node (stages) hold the work of the
+# nodes, so like the phases they count as spans but not as busy time.
+#
+# @return List of dictionaries, one per phase in run order, with phase, wall_time, spans,
+# busy_time (sum of the busy time of each node, see getBusyTime), failed (spans with
+# non-zero rc), bytes, slowest_node and slowest_node_time (busy time of the slowest node).
+
+def getPhaseSummary():
+    span_list = getSpans()
+    phases = []
+    summary = {}
+    for span in span_list:
+        if span["category"] == "phase":
+            continue
+        name = span["phase"]
+        row = summary.get(name)
+        if row is None:
+            row = {"phase" : name, "start" : span["start"], "end" : span["end"], "spans" : 0, "failed" : 0, "bytes" : 0, "nodes" : {}}
+            summary[name] = row
+            phases.append(name)
+        row["start"] = min(row["start"],span["start"])
+        row["end"] = max(row["end"],span["end"])
+        row["spans"] += 1
+        if span["rc"] is not None and span["rc"] != 0:
+            row["failed"] += 1
+        row["bytes"] += span["bytes"]
+        if span["node"] != "":
+            row["nodes"].setdefault(span["node"],[]).append((span["start"],span["end"]))
+
+    # phase spans give the real wall time, including time spent outside any command.
+    for span in span_list:
+        if span["category"] == "phase" and span["phase"] in summary:
+            row = summary[span["phase"]]
+            row["start"] = min(row["start"],span["start"])
+            row["end"] = max(row["end"],span["end"])
+
+    rows = []
+    for name in phases:
+        row = summary[name]
+        busy_times = dict([(node,getBusyTime(intervals)) for (node,intervals) in row["nodes"].items()])
+        slowest = ("",0.0)
+        if len(busy_times) > 0:
+            slowest = max(busy_times.items(),key=lambda item: item[1])
+        rows.append({"phase" : name, "wall_time" : row["end"] - row["start"], "spans" : row["spans"], "busy_time" : sum(busy_times.values()), "failed" : row["failed"], "bytes" : row["bytes"], "slowest_node" : slowest[0], "slowest_node_time" : slowest[1]})
+    return rows
+
+##
+# @fn formatPhaseSummary():
+#
+# @return getPhaseSummary() as a text table.
+
+def formatPhaseSummary():
+    lines = ["%-40s %10s %7s %10s %6s %10s  %s" % ("Phase","Wall (s)","Spans","Busy (s)","Failed","Output KB","Slowest node (busy s)")]
+    for row in getPhaseSummary():
+        lines.append("%-40s %10.1f %7d %10.1f %6d %10d  %s (%.1f)" % (row["phase"][:40],row["wall_time"],row["spans"],row["busy_time"],row["failed"],row["bytes"]/1024,row["slowest_node"],row["slowest_node_time"]))
+    return "\n".join(lines)
+
+##
+# @fn writePhaseSummary(filename):
+#
+# Writes formatPhaseSummary() to filename.
+#
+# @param filename Output file
+
+def writePhaseSummary(filename):
+    f = open(filename,'w')
+    try:
+        f.write(formatPhaseSummary())
+        f.write("\n")
+    finally:
+        f.close()
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+##
+#
+# @file OFSTestWait.py
+#
+# @brief Waits until something is ready instead of sleeping for a fixed time.
+#
+# waitUntil() calls a probe until it returns True or a deadline passes. The first retry
+# comes quickly. Each later retry waits longer, up to a limit, with some random jitter
+# so many nodes do not all poll at the same moment.
+#
+# waitUntilAsync() does the same from a coroutine (see OFSExecutionEngine). Its probe may
+# be a coroutine, so a probe can run a command on a node.
+#
+# The probes for nodes are methods of OFSTestNode: isReachableAsync, hasRebootedAsync,
+# isOFSServerReadyAsync, isOFSMountedAsync, isOFSServerIdleAsync, isProcessRunningAsync.
+# The cloud connection managers probe the instance state.
+#
+# Every wait is recorded with the fixed sleep it replaced. formatTimeSaved() reports the
+# time saved.
+#
+
+import time
+import types
+import base64
+import random
+import logging
+import threading
+import OFSExecutionEngine
+
+## @var INITIAL_DELAY
+# Seconds before the first retry.
+INITIAL_DELAY = 1.0
+
+## @var MAX_DELAY
+# Longest time between two retries.
+MAX_DELAY = 15.0
+
+## @var BACKOFF
+# Each retry waits this many times longer than the one before.
+BACKOFF = 1.5
+
+## @var JITTER
+# Retry delays vary randomly by this fraction.
+JITTER = 0.2
+
+## @var waits
+# Finished waits: dictionaries with description, elapsed, ready and old_wait.
+waits = []
+
+wait_lock = threading.Lock()
+
+## @var SERVER_IDLE_SCRIPT
+# Exits 0 if no MPI job runs on the node and the OrangeFS servers used at most the given
+# number of clock ticks of CPU time in one second. Argument: the number of ticks.
+SERVER_IDLE_SCRIPT = r'''
+max_ticks="${1:-5}"
+
+server_ticks() {
+    total=0
+    for p in $(pgrep pvfs2-server); do
+        t=$(awk '{print $14 + $15}' /proc/$p/stat 2>/dev/null)
+        total=$((total + ${t:-0}))
+    done
+    echo $total
+}
+
+if pgrep -f '[o]rted|[m]piexec|[m]pirun' > /dev/null; then
+    exit 1
+fi
+before=$(server_ticks)
+sleep 1
+after=$(server_ticks)
+[ $((after - before)) -le "$max_ticks" ]
+'''
+
+##
+# @fn getServerIdleCommand(max_ticks=5):
+#
+# @param max_ticks Clock ticks (usually 1/100 s) of server CPU time per second that still count as idle.
+#
+# @return Shell command that runs SERVER_IDLE_SCRIPT.
+
+def getServerIdleCommand(max_ticks=5):
+    return "echo %s | base64 -d | bash -s -- %d" % (base64.b64encode(SERVER_IDLE_SCRIPT),max_ticks)
+
+##
+# @fn getDelay(attempt,initial_delay=INITIAL_DELAY,max_delay=MAX_DELAY):
+#
+# @param attempt Number of probes done so far, starting with 1.
+# @param initial_delay Seconds before the first retry.
+# @param max_delay Longest time between two retries.
+#
+# @return Seconds to wait before the next probe.
+
+def getDelay(attempt,initial_delay=INITIAL_DELAY,max_delay=MAX_DELAY):
+    delay = min(initial_delay * (BACKOFF ** (attempt - 1)),max_delay)
+    return delay * random.uniform(1.0 - JITTER,1.0 + JITTER)
+
+##
+# @fn recordWait(description,elapsed,ready,old_wait=None):
+#
+# Records a finished wait and logs the time saved against the fixed sleep it replaced.
+#
+# @param description What was waited for
+# @param elapsed Seconds waited
+# @param ready Did the probe succeed before the deadline?
+# @param old_wait Seconds of the fixed sleep that was used before. None if there was none.
+
+def recordWait(description,elapsed,ready,old_wait=None):
+    wait_lock.acquire()
+    waits.append({"description" : description, "elapsed" : elapsed, "ready" : ready, "old_wait" : old_wait})
+    wait_lock.release()
+    if not ready:
+        logging.warn("Gave up waiting for %s after %.1fs" % (description,elapsed))
+    elif old_wait is not None:
+        logging.info("Waited %.1fs for %s. Saved %.1fs against the old %ds wait." % (elapsed,description,old_wait - elapsed,old_wait))
+    else:
+        logging.info("Waited %.1fs for %s." % (elapsed,description))
+
+##
+# @fn waitUntil(probe,description,timeout=300,old_wait=None,args=[],initial_delay=INITIAL_DELAY,max_delay=MAX_DELAY):
+#
+# Calls probe(*args) until it returns True or timeout seconds have passed. Exceptions
+# from the probe count as not ready.
+#
+# @param probe Function that returns True when the wait is over.
+# @param description What is waited for, for the log.
+# @param timeout Seconds to wait at most.
+# @param old_wait Seconds of the fixed sleep this wait replaces. See recordWait.
+# @param args Arguments for probe.
+# @param initial_delay Seconds before the first retry.
+# @param max_delay Longest time between two retries.
+#
+# @return True if probe returned True before the deadline, False if not.
+
+def waitUntil(probe,description,timeout=300,old_wait=None,args=[],initial_delay=INITIAL_DELAY,max_delay=MAX_DELAY):
+    start = time.time()
+    deadline = start + timeout
+    attempt = 0
+    ready = False
+    while True:
+        attempt += 1
+        try:
+            ready = (probe(*args) == True)
+        except Exception:
+            logging.exception("Probe for %s failed" % description)
+            ready = False
+        now = time.time()
+        if ready or now >= deadline:
+            break
+        time.sleep(min(getDelay(attempt,initial_delay,max_delay),deadline - now))
+    recordWait(description,time.time() - start,ready,old_wait)
+    return ready
+
+##
+# @fn waitUntilAsync(probe,description,timeout=300,old_wait=None,args=[],initial_delay=INITIAL_DELAY,max_delay=MAX_DELAY):
+#
+# Coroutine version of waitUntil. See OFSExecutionEngine. probe(*args) may return a
+# coroutine, e.g. node.isOFSMountedAsync. Other coroutines run while this one waits.
+#
+# @return (via OFSExecutionEngine.Return) True if probe returned True before the deadline, False if not.
+
+def waitUntilAsync(probe,description,timeout=300,old_wait=None,args=[],initial_delay=INITIAL_DELAY,max_delay=MAX_DELAY):
+    start = time.time()
+    deadline = start + timeout
+    attempt = 0
+    ready = False
+    while True:
+        attempt += 1
+        try:
+            result = probe(*args)
+            if isinstance(result,types.GeneratorType):
+                result = yield result
+            ready = (result == True)
+        except OFSExecutionEngine.Return:
+            raise
+        except Exception:
+            logging.exception("Probe for %s failed" % description)
+            ready = False
+        now = time.time()
+        if ready or now >= deadline:
+            break
+        yield OFSExecutionEngine.sleep(min(getDelay(attempt,initial_delay,max_delay),deadline - now))
+    recordWait(description,time.time() - start,ready,old_wait)
+    raise OFSExecutionEngine.Return(ready)
+
+##
+# @fn getTimeSaved():
+#
+# @return (seconds waited, seconds the replaced fixed sleeps would have taken) over all
+# waits that replaced one.
+
+def getTimeSaved():
+    wait_lock.acquire()
+    try:
+        replaced = [w for w in waits if w["old_wait"] is not None]
+    finally:
+        wait_lock.release()
+    return (sum([w["elapsed"] for w in replaced]),sum([w["old_wait"] for w in replaced]))
+
+##
+# @fn formatTimeSaved():
+#
+# @return One line report of the time saved by readiness probes.
+
+def formatTimeSaved():
+    (elapsed,old_wait) = getTimeSaved()
+    wait_lock.acquire()
+    try:
+        count = len(waits)
+        failed = len([w for w in waits if not w["ready"]])
+    finally:
+        wait_lock.release()
+    return "Readiness probes: %d waits (%d timed out), %.1fs waited against %ds of fixed sleeps. Saved %.1fs." % (count,failed,elapsed,old_wait,old_wait - elapsed)
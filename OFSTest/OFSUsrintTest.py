@@ -187,7 +187,7 @@ def bonnie(testing_node,output=[]):
         
     preload = "LD_PRELOAD=%s/lib/libofs.so:%s/lib/libpvfs2.so " % (testing_node.ofs_installation_location,testing_node.ofs_installation_location)
 
-    rc = testing_node.runSingleCommand("export %s; cd %s; %s/bonnie++-1.03e/bonnie++  -n 1:0:0:1  -r 8 -s 16 2>&1" % (preload,testing_node.ofs_mount_point,testing_node.ofs_extra_tests_location),output)
+    rc = testing_node.runSingleCommand("export %s; cd %s; %s/bonnie++-1.03e/bonnie++  -n 1:0:0:1  -r 8 -s 16 2>&1" % (preload,testing_node.ofs_mount_point,testing_node.ofs_extra_tests_location),output,stream=True)
     
     print output[1]
     print output[2]
@@ -245,7 +245,7 @@ def dbench(testing_node,output=[]):
         return rc
     
     #testing_node.changeDirectory(testing_node.ofs_mount_point)
-    rc = testing_node.runSingleCommand("%s bash -c 'cd %s; %s/dbench-3.03/dbench -c client.txt 10 -t 300'" %(preload,testing_node.ofs_mount_point,testing_node.ofs_extra_tests_location),output)
+    rc = testing_node.runSingleCommand("%s bash -c 'cd %s; %s/dbench-3.03/dbench -c client.txt 10 -t 300'" %(preload,testing_node.ofs_mount_point,testing_node.ofs_extra_tests_location),output,stream=True)
     
     print output[1]
     print output[2]   
@@ -280,7 +280,7 @@ def fdtree(testing_node,output=[]):
 
     # fdtree must be run from the mount_point, but need to cd to that directory w/usrint libraries.
     testing_node.changeDirectory("~")
-    rc = testing_node.runSingleCommand("%s cd %s; %s bash -c '%s/fdtree-1.0.1/fdtree.bash -l 4 -d 5'" % (preload,testing_node.ofs_mount_point,preload,testing_node.ofs_extra_tests_location),output)
+    rc = testing_node.runSingleCommand("%s cd %s; %s bash -c '%s/fdtree-1.0.1/fdtree.bash -l 4 -d 5'" % (preload,testing_node.ofs_mount_point,preload,testing_node.ofs_extra_tests_location),output,stream=True)
     
     print output[1]
     print output[2]
@@ -387,7 +387,7 @@ def iozone(testing_node,output=[]):
         if rc != 0:
             return rc
             
-    rc = testing_node.runSingleCommand("LD_PRELOAD=%s/lib/libofs.so:%s/lib/libpvfs2.so ./iozone -a -y 4096 -n $((1024*512)) -g $((4*1024*1024)) -f %s/test_iozone_file" %(testing_node.ofs_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point),output)
+    rc = testing_node.runSingleCommand("LD_PRELOAD=%s/lib/libofs.so:%s/lib/libpvfs2.so ./iozone -a -y 4096 -n $((1024*512)) -g $((4*1024*1024)) -f %s/test_iozone_file" %(testing_node.ofs_installation_location,testing_node.ofs_installation_location,testing_node.ofs_mount_point),output,stream=True)
     
     print output[1]
     print output[2]    
@@ -447,7 +447,7 @@ def ltp(testing_node,output=[]):
     #if testing_node.runSingleCommand("[ -f %s/runltp ]" % LTP_PREFIX):
     if True:
         testing_node.runSingleCommand("rm -rf ltp-" + LTP_ARCHIVE_VERSION + "*",output)
-        rc = testing_node.runSingleCommand("wget --quiet --no-check-certificate --output-document=%s %s/%s" % (LTP_ARCHIVE,LTP_URL,LTP_ARCHIVE),output)
+        rc = testing_node.runSingleCommand(testing_node.getDownloadCommand("%s/%s" % (LTP_URL,LTP_ARCHIVE),LTP_ARCHIVE,"--no-check-certificate"),output)
         if rc != 0:
             
             return rc
@@ -676,3 +676,12 @@ bonnie,
 dbench,
 simultaneous_ls
  ]
+
+## @var exclusive
+# Tests that must run alone on the head node. See OFSTestShards.
+# The benchmarks and LTP are installed on the head node only and need the whole file system.
+exclusive = [fdtree, iozone, ltp, bonnie, dbench]
+
+## @var head_node_tests
+# Tests that need the OrangeFS source tree, which is on the head node only. See OFSTestShards.
+head_node_tests = [fstest, fsx, shelltest]
@@ -23,6 +23,7 @@
 
 import inspect
 from datetime import datetime
+import OFSBenchmarkMetrics
 
 header = "OFS VFS Benchmarks(kmod)"
 prefix = "vfs-bench-kmod"
@@ -47,6 +48,9 @@ debug = True
 #   
 #        0: Test ran successfully
 #        !0: Test failed
+#
+#   Benchmarks that ran return (rc,metrics), metrics being a dictionary from 
+#   OFSBenchmarkMetrics.
 #------------------------------------------------------------------------------
 
 
@@ -109,6 +113,7 @@ def setKmodConfig():
 #   
 # @return 0 Test ran successfully
 # @return Not 0 Test failed
+# @return (rc,metrics) when the benchmark ran. See OFSBenchmarkMetrics.parseBonnie.
 #
 
 
@@ -136,12 +141,12 @@ def bonnie(testing_node,output=[]):
             return rc
         
     testing_node.changeDirectory(testing_node.ofs_mount_point)
-    rc = testing_node.runSingleCommand(testing_node.ofs_extra_tests_location+"/bonnie++-1.03e/bonnie++  -n 4:1:1:1  -r 16 -s 1024 ",output)
+    rc = testing_node.runSingleCommand(testing_node.ofs_extra_tests_location+"/bonnie++-1.03e/bonnie++  -n 4:1:1:1  -r 16 -s 1024 ",output,stream=True)
     print output[1]
     print output[2]
     
 
-    return rc
+    return (rc,OFSBenchmarkMetrics.parseBonnie(OFSBenchmarkMetrics.getStdout(output)))
 
 ##
 #
@@ -162,6 +167,7 @@ def bonnie(testing_node,output=[]):
 #   
 # @return 0 Test ran successfully
 # @return Not 0 Test failed
+# @return (rc,metrics) when the benchmark ran. See OFSBenchmarkMetrics.parseDbench.
 #
     
 def dbench(testing_node,output=[]):
@@ -202,12 +208,12 @@ def dbench(testing_node,output=[]):
     testing_node.changeDirectory(testing_node.ofs_mount_point)
     
     
-    rc = testing_node.runSingleCommand(testing_node.ofs_extra_tests_location+"/dbench-3.03/dbench -c client.txt 100 -t 300 ",output)
+    rc = testing_node.runSingleCommand(testing_node.ofs_extra_tests_location+"/dbench-3.03/dbench -c client.txt 100 -t 300 ",output,stream=True)
     print output[1]
     print output[2]
     
 
-    return rc
+    return (rc,OFSBenchmarkMetrics.parseDbench(OFSBenchmarkMetrics.getStdout(output)))
 
 ##
 #
@@ -224,6 +230,7 @@ def dbench(testing_node,output=[]):
 #   
 # @return 0 Test ran successfully
 # @return Not 0 Test failed
+# @return (rc,metrics) when the benchmark ran. See OFSBenchmarkMetrics.parseFdtree.
 #    
 
 def fdtree(testing_node,output=[]):
@@ -236,12 +243,12 @@ def fdtree(testing_node,output=[]):
     
     # Run fdtree from the mount_point
     testing_node.changeDirectory(testing_node.ofs_mount_point)
-    rc = testing_node.runSingleCommand(testing_node.ofs_extra_tests_location+"/fdtree-1.0.1/fdtree.bash -l 4 -d 5",output)
+    rc = testing_node.runSingleCommand(testing_node.ofs_extra_tests_location+"/fdtree-1.0.1/fdtree.bash -l 4 -d 5",output,stream=True)
     print output[1]
     print output[2]
 
     
-    return rc
+    return (rc,OFSBenchmarkMetrics.parseFdtree(OFSBenchmarkMetrics.getStdout(output)))
 
 
 
@@ -268,6 +275,7 @@ def fdtree(testing_node,output=[]):
 #   
 # @return 0 Test ran successfully
 # @return Not 0 Test failed
+# @return (rc,metrics) when the benchmark ran. See OFSBenchmarkMetrics.parseIozone.
 #
 
 def iozone(testing_node,output=[]):
@@ -292,13 +300,13 @@ def iozone(testing_node,output=[]):
     tmp = []
     testing_node.checkMount(mount_point=testing_node.ofs_mount_point,output=tmp)
     
-    rc = testing_node.runSingleCommand("./iozone -a -y 4096 -q 4096 -n $((1024*512)) -g $((1024*1024*4)) -f %s/test_iozone_file" % testing_node.ofs_mount_point,output)
+    rc = testing_node.runSingleCommand("./iozone -a -y 4096 -q 4096 -n $((1024*512)) -g $((1024*1024*4)) -f %s/test_iozone_file" % testing_node.ofs_mount_point,output,stream=True)
 
 
     print output[1]
     print output[2]
         
-    return rc
+    return (rc,OFSBenchmarkMetrics.parseIozone(OFSBenchmarkMetrics.getStdout(output)))
 
 
 
@@ -307,13 +315,14 @@ def dd(testing_node,output=[]):
     rc = testing_node.runSingleCommand("dd if=/dev/zero of=%s/gigfile bs=16M count=64" % testing_node.ofs_mount_point, output)
     print output[1]
     print output[2]
+    metrics = OFSBenchmarkMetrics.parseDd(OFSBenchmarkMetrics.getStderr(output))
     
     testing_node.runSingleCommand("rm %s/gigfile" % testing_node.ofs_mount_point)
-    return rc
+    return (rc,metrics)
 
 def linux_untar(testing_node,output=[]):
     
-    rc = testing_node.runSingleCommand("cd /tmp; wget --quiet https://cdn.kernel.org/pub/linux/kernel/v4.x/linux-4.1.15.tar.xz", output)
+    rc = testing_node.runSingleCommand("cd /tmp; " + testing_node.getDownloadCommand("https://cdn.kernel.org/pub/linux/kernel/v4.x/linux-4.1.15.tar.xz"), output)
     
     rc = testing_node.runSingleCommand("cd /tmp; unxz linux-4.1.15.tar.xz",output)
     
@@ -337,3 +346,12 @@ dbench,
 linux_untar
 
  ]
+
+## @var exclusive
+# Tests that must run alone on the head node. See OFSTestShards.
+# Benchmarks measure the whole file system, so they never share it.
+exclusive = list(tests)
+
+## @var head_node_tests
+# Tests that must run on the head node. See OFSTestShards.
+head_node_tests = []
@@ -327,7 +327,7 @@ def ltp(testing_node,output=[]):
     
     if testing_node.runSingleCommand("[ -f %s/runltp ]" % LTP_PREFIX):
         testing_node.runSingleCommand("rm -rf ltp-" + LTP_ARCHIVE_VERSION + "*",output)
-        rc = testing_node.runSingleCommand("wget --quiet --no-check-certificate --output-document=%s %s/%s" % (LTP_ARCHIVE,LTP_URL,LTP_ARCHIVE),output)
+        rc = testing_node.runSingleCommand(testing_node.getDownloadCommand("%s/%s" % (LTP_URL,LTP_ARCHIVE),LTP_ARCHIVE,"--no-check-certificate"),output)
         if rc != 0:
             
             return rc
@@ -383,7 +383,7 @@ def ltp(testing_node,output=[]):
     #print 'sudo PVFS2TAB_FILE=%s/etc/orangefstab LD_LIBRARY_PATH=/opt/db4/lib:%s/lib64:%s/lib ./runltp -b %s -p -l %s/ltp-pvfs-testcases-%s.log -d %s/ltp-tmp -f ltp-pvfs-testcases -A %s/zoo.tmp 2>&1 | tee %s/ltp-pvfs-testcases-%s.output' % (testing_node.ofs_installation_location,testing_node.ofs_installation_location,testing_node.ofs_installation_location,loop_dev,testing_node.ofs_installation_location, vfs_type, testing_node.ofs_mount_point,testing_node.ofs_extra_tests_location,testing_node.ofs_installation_location,vfs_type)
     print 'sudo PVFS2TAB_FILE=%s/etc/orangefstab LD_LIBRARY_PATH=/opt/db4/lib:%s/lib64:%s/lib ./runltp -b %s -p -l %s/ltp-pvfs-testcases-%s.log -d %s/ltp-tmp -f ltp-pvfs-testcases 2>&1 | tee %s/ltp-pvfs-testcases-%s.output' % (testing_node.ofs_installation_location,testing_node.ofs_installation_location,testing_node.ofs_installation_location,loop_dev,testing_node.ofs_installation_location, vfs_type, testing_node.ofs_mount_point,testing_node.ofs_installation_location,vfs_type)
     #rc = testing_node.runSingleCommandAsRoot('PVFS2TAB_FILE=%s/etc/orangefstab LD_LIBRARY_PATH=/opt/db4/lib:%s/lib64:%s/lib ./runltp -b %s -p -l %s/ltp-pvfs-testcases-%s.log -d %s/ltp-tmp -f ltp-pvfs-testcases -A %s/zoo.tmp 2>&1 | tee %s/ltp-pvfs-testcases-%s.output' % (testing_node.ofs_installation_location,testing_node.ofs_installation_location,testing_node.ofs_installation_location,loop_dev,testing_node.ofs_installation_location, vfs_type, testing_node.ofs_mount_point,testing_node.ofs_extra_tests_location,testing_node.ofs_installation_location,vfs_type),output)
-    rc = testing_node.runSingleCommandAsRoot('PVFS2TAB_FILE=%s/etc/orangefstab LD_LIBRARY_PATH=/opt/db4/lib:%s/lib64:%s/lib ./runltp -b %s -p -l %s/ltp-pvfs-testcases-%s.log -d %s/ltp-tmp -f ltp-pvfs-testcases 2>&1 | tee %s/ltp-pvfs-testcases-%s.output' % (testing_node.ofs_installation_location,testing_node.ofs_installation_location,testing_node.ofs_installation_location,loop_dev,testing_node.ofs_installation_location, vfs_type, testing_node.ofs_mount_point,testing_node.ofs_installation_location,vfs_type),output)
+    rc = testing_node.runSingleCommandAsRoot('PVFS2TAB_FILE=%s/etc/orangefstab LD_LIBRARY_PATH=/opt/db4/lib:%s/lib64:%s/lib ./runltp -b %s -p -l %s/ltp-pvfs-testcases-%s.log -d %s/ltp-tmp -f ltp-pvfs-testcases 2>&1 | tee %s/ltp-pvfs-testcases-%s.output' % (testing_node.ofs_installation_location,testing_node.ofs_installation_location,testing_node.ofs_installation_location,loop_dev,testing_node.ofs_installation_location, vfs_type, testing_node.ofs_mount_point,testing_node.ofs_installation_location,vfs_type),output,stream=True)
 
     # check to see if log file is there
     if testing_node.runSingleCommand("[ -f %s/ltp-pvfs-testcases-%s.log ]"% (testing_node.ofs_installation_location,vfs_type)):
@@ -572,7 +572,7 @@ def xfstests(testing_node,output=[]):
     rc = testing_node.runSingleCommand("cp %s/test/automated/vfs-tests.d/xfstests-exclude.list ./xfstests-exclude.list" % testing_node.ofs_source_location)
     if rc != 0:
         testing_node.runSingleCommand("http://orangefs.org/svn/orangefs/trunk/test/automated/vfs-tests.d/xfstests-exclude.list")
-    rc = testing_node.runSingleCommandAsRoot("TEST_DIR=%s TEST_DEV=%s://%s:%d/%s ./check -pvfs2 -E xfstests-exclude.list" % (testing_node.ofs_mount_point,testing_node.ofs_protocol,testing_node.hostname,testing_node.ofs_tcp_port,testing_node.ofs_fs_name),output)
+    rc = testing_node.runSingleCommandAsRoot("TEST_DIR=%s TEST_DEV=%s://%s:%d/%s ./check -pvfs2 -E xfstests-exclude.list" % (testing_node.ofs_mount_point,testing_node.ofs_protocol,testing_node.hostname,testing_node.ofs_tcp_port,testing_node.ofs_fs_name),output,stream=True)
     print output[1]
     print output[2]
 
@@ -603,3 +603,12 @@ ltp,
 xfstests,
 list_add_corruption
  ]
+
+## @var exclusive
+# Tests that must run alone on the head node. See OFSTestShards.
+# list_add_corruption checks dmesg after everything else ran.
+exclusive = [ltp, xfstests, list_add_corruption]
+
+## @var head_node_tests
+# Tests that need the OrangeFS source tree, which is on the head node only. See OFSTestShards.
+head_node_tests = [direct, fstest, fsx, shelltest]
@@ -1 +1 @@
-__all__ = ['OFSTestConfigMenu','OFSTestNode','OFSTestLocalNode','OFSTestRemoteNode','OFSVFSTest','OFSSysintTest','OFSTestConfig','OFSCloudConnectionManager','OFSTestMain','OFSMpiioTest','OFSTestConfigFile','OFSTestNetwork','OFSUsrintTest','OFSHadoopTest','OFSEC2ConnectionManager','OFSNovaConnectionManager']
+__all__ = ['OFSTestConfigMenu','OFSTestNode','OFSTestLocalNode','OFSTestRemoteNode','OFSVFSTest','OFSSysintTest','OFSTestConfig','OFSCloudConnectionManager','OFSTestMain','OFSMpiioTest','OFSTestConfigFile','OFSTestNetwork','OFSUsrintTest','OFSHadoopTest','OFSEC2ConnectionManager','OFSNovaConnectionManager','OFSSSHConnectionManager','OFSRemoteAgent','OFSOutputCapture','OFSExecutionEngine','OFSCommandWatchdog','OFSNodeProbe','OFSNodeFactsCache','OFSTestTrace','OFSConnectivityCheck','OFSTestWait','OFSBroadcast','OFSBuildCache','OFSBuildStats','OFSDistributedBuild','OFSKernelPackage','OFSProvisioningCache','OFSStageGraph','OFSCheckpoint','OFSTestShards','OFSTestHistory','OFSResultsStore','OFSBenchmarkMetrics','OFSJSONStore']